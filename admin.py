@@ -5,8 +5,16 @@ This module provides routes and functions for administrative tasks
 like database initialization and user management.
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from models import User, NotificationSetting, PrivacySetting
+from database import pool_stats
+from utils.formula_cache import formula_cache_stats, invalidate_formula_caches, set_formula_version
+from utils.body_fat_cascade import estimator_stats
+from utils.resource_governor import resource_stats
+from utils.model_preload import memory_report
+from utils.plan_cache import plan_cache_stats
+from utils.session_store import session_store_stats
+from utils.user_cache import user_cache_stats
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -91,4 +99,57 @@ def reset_db():
     db.drop_all()
     db.create_all()
     flash('Database has been reset.', 'success')
-    return redirect(url_for('admin.init_db'))
\ No newline at end of file
+    return redirect(url_for('admin.init_db'))
+
+@admin_bp.route('/formula_cache')
+def formula_cache():
+    """Show hit/miss statistics for the memoized formula caches."""
+    return jsonify(formula_cache_stats())
+
+@admin_bp.route('/plan_cache')
+def plan_cache():
+    """Show hit/miss statistics for the generated workout plan cache."""
+    return jsonify(plan_cache_stats())
+
+@admin_bp.route('/sessions')
+def sessions():
+    """Show session store reads, writes, skipped unchanged writes and bytes."""
+    # Import here to avoid circular import
+    from app import app
+    return jsonify(session_store_stats(app.session_interface))
+
+@admin_bp.route('/database')
+def database():
+    """Show connection pool settings, occupancy, checkout latency and saturation."""
+    return jsonify(pool_stats())
+
+@admin_bp.route('/user_cache')
+def user_cache():
+    """Show user loader hits (primary-key queries saved), misses and invalidations."""
+    return jsonify(user_cache_stats())
+
+@admin_bp.route('/body_fat_estimators')
+def body_fat_estimators():
+    """Show invocation counts, timings and time saved by the body-fat estimator cascade."""
+    return jsonify(estimator_stats())
+
+@admin_bp.route('/resources')
+def resources():
+    """Show this worker's CPU budget, native thread settings and run-queue contention."""
+    return jsonify(resource_stats())
+
+@admin_bp.route('/memory')
+def memory():
+    """Show unique and shared resident memory of the gunicorn master and its workers."""
+    return jsonify(memory_report())
+
+@admin_bp.route('/formula_cache/flush', methods=['POST'])
+def flush_formula_cache():
+    """Flush the formula caches of every worker, optionally switching to a new formula version."""
+    version = request.form.get('version')
+    if version and set_formula_version(version):
+        flash(f'Formula version set to {version}; caches flushed.', 'success')
+    else:
+        invalidate_formula_caches()
+        flash('Formula caches flushed in every worker.', 'success')
+    return redirect(url_for('index'))
@@ -2,17 +2,24 @@ import os
 import logging
 import uuid
 import datetime
+import hashlib
 import json
 import math
+import re
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Flask and SQLAlchemy imports
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+# Size native thread pools to this worker's CPU budget before NumPy, OpenCV
+# and TensorFlow are imported and read their thread settings
+from utils.resource_governor import apply_resource_limits
+apply_resource_limits()
+
+# Flask imports
+import click
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, send_file, g
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
@@ -71,11 +78,6 @@ except ImportError as e:
     logger.warning(f"Some advanced features not available: {str(e)}")
     ADVANCED_FEATURES_AVAILABLE = False
 
-
-# Define the base class for SQLAlchemy models
-class Base(DeclarativeBase):
-    pass
-
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = "super-secret-key"
@@ -85,29 +87,46 @@ app.config['SESSION_COOKIE_SECURE'] = False
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
-# Configure SQLAlchemy
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+# Configure SQLAlchemy: one pooled engine per process (see database.py)
+from database import db, configure_database, create_pooled_engine, session_pool_fraction
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(model_class=Base)
-db.init_app(app)
+configure_database(app, session_url=os.environ.get('SESSION_DATABASE_URL'))
+
+# Server-side sessions: the cookie only carries the session id, and the
+# data is kept in 'sql' (the app database, or SESSION_DATABASE_URL). 'memory'
+# is per process, so it is only for single-process development and tests.
+# A session database on the app database's server shares its connection budget
+from utils.session_store import create_session_interface, regenerate_session
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'sql')
+if os.environ.get('SESSION_DATABASE_URL'):
+    _session_engine = create_pooled_engine(os.environ['SESSION_DATABASE_URL'], fraction=session_pool_fraction(
+        app.config['SQLALCHEMY_DATABASE_URI'], os.environ['SESSION_DATABASE_URL']))
+else:
+    _session_engine = lambda: db.engine
+app.session_interface = create_session_interface(app.config['SESSION_BACKEND'], engine=_session_engine)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Import models and initialize db
+# Import models (bound to the same db)
 import models
-models.db = db
+
+# Logged-in users are served from a short-TTL cache of read-only snapshots,
+# invalidated when a user row changes
+from utils.user_cache import cached_user, watch_user_model
+watch_user_model(models.User)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return models.User.query.get(int(user_id))
+    return cached_user(int(user_id), models.User.query.get)
 
 @app.before_request
 def make_session_permanent():
-    session.permanent = True
-    session.modified = True
+    # Assigning marks the session modified, so only do it once
+    if not session.permanent:
+        session.permanent = True
 
 @app.context_processor
 def inject_auth():
@@ -131,6 +150,10 @@ def calculate_body_composition(weight, height, age, sex):
 def index():
     return render_template('index.html')
 
+# Activity levels of the results pages mapped to the calorie grid's
+RESULTS_ACTIVITY_LEVELS = {'sedentary': 'sedentary', 'light': 'light', 'moderate': 'moderate',
+                           'active': 'very_active', 'very_active': 'extra_active'}
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     try:
@@ -140,6 +163,7 @@ def analyze():
         age = int(request.form.get('age', 25))
         gender = request.form.get('gender', 'male')
         experience = request.form.get('experience', 'intermediate')
+        goal = request.form.get('goal', 'gain_muscle')
 
         # Print form data for debugging
         logger.info(f"📥 FULL FORM DATA: {request.form}")
@@ -152,9 +176,19 @@ def analyze():
         bmi = weight / (height_m * height_m)
         logger.info(f"📊 BMI: {bmi}")
 
-        # Calculate body composition using utility function
-        sex_value = 1 if gender.lower() == 'male' else 0
-        body_fat, lean_mass = calculate_body_composition(weight, height_m, age, sex_value)
+        # Estimate body fat once with the cascade, which adds the Navy formula
+        # when circumferences were entered; every figure below uses this value
+        from utils.body_fat_cascade import estimate_body_fat_cascade
+        circumferences = {f'{name}_cm': float(request.form[name])
+                          for name in ('waist', 'neck', 'hip') if request.form.get(name)}
+        body_fat_estimate = estimate_body_fat_cascade(
+            dict(weight_kg=weight, height_cm=height, age=age, gender=gender, **circumferences))
+        if body_fat_estimate is not None:
+            body_fat = body_fat_estimate['body_fat_percentage']
+        else:
+            sex_value = 1 if gender.lower() == 'male' else 0
+            body_fat, _ = calculate_body_composition(weight, height_m, age, sex_value)
+        lean_mass = 100.0 - body_fat
         logger.info(f"📊 Body composition - Fat: {body_fat}%, Lean Mass: {lean_mass}%")
 
         # Calculate fat mass and lean mass in kg
@@ -178,30 +212,35 @@ def analyze():
             weight_kg=weight,
             gender=gender,
             age=age,
-            experience=experience
+            experience=experience,
+            body_fat_estimate=body_fat_estimate,
+            **circumferences
         )
 
-        # Calculate caloric maintenance based on weight, height, age, gender
-        # Using Mifflin-St Jeor Equation
-        if gender.lower() == 'male':
-            bmr = 10 * weight + 6.25 * height - 5 * age + 5
-        else:
-            bmr = 10 * weight + 6.25 * height - 5 * age - 161
-
-        # Activity multipliers
-        activity_levels = {
-            'sedentary': 1.2,
-            'light': 1.375,
-            'moderate': 1.55,
-            'active': 1.725,
-            'very_active': 1.9
-        }
-
-        # Default to moderate activity
-        maintenance_calories = {level: round(bmr * multiplier) for level, multiplier in activity_levels.items()}
+        # Calories and macros for every activity level and goal, computed once
+        # and kept with the analysis for the results, nutrition and API pages
+        from utils.recommendations import calculate_calorie_grid, calorie_cell
+        calorie_grid = calculate_calorie_grid(weight, height, body_fat)
+        maintenance_calories = {level: calorie_cell(calorie_grid, 'maintain', grid_level)['maintenance']
+                                for level, grid_level in RESULTS_ACTIVITY_LEVELS.items()}
 
         # Store in session with multiple redundant approaches for reliability
         analysis_id = str(uuid.uuid4())  # Generate a unique ID for reference
+        if current_user.is_authenticated:
+            # Signed-in users get a stored analysis, which their workout plan is kept with
+            try:
+                analysis = models.Analysis(
+                    user_id=current_user.id, analysis_type='measurements',
+                    body_fat_percentage=body_fat, muscle_building_potential=muscle_potential,
+                    body_type=body_type,
+                    traits=json.loads(json.dumps(body_traits, default=lambda o: o.item() if hasattr(o, 'item') else str(o))),
+                    recommendations={'calorie_grid': calorie_grid, 'goal': goal})
+                db.session.add(analysis)
+                db.session.commit()
+                analysis_id = str(analysis.id)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Could not store analysis: {str(e)}")
         session['analysis_results'] = {
             'body_fat': body_fat,
             'lean_mass': lean_mass,
@@ -212,13 +251,15 @@ def analyze():
             'traits': body_traits,
             'bmi': bmi,
             'maintenance_calories': maintenance_calories,
+            'calorie_grid': calorie_grid,
             'id': analysis_id,
             'user_info': {
                 'height': height,
                 'weight': weight,
                 'age': age,
                 'gender': gender,
-                'experience': experience
+                'experience': experience,
+                'goal': goal
             }
         }
         
@@ -853,7 +894,10 @@ def view_analysis_results(analysis_id):
         return redirect(url_for('index'))
 
 def is_authenticated():
-    return auth.is_authenticated
+    # Templates ask several times per render; resolve once per request
+    if 'is_authenticated' not in g:
+        g.is_authenticated = auth.is_authenticated
+    return g.is_authenticated
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -861,9 +905,10 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         
-        user = User.query.filter_by(email=email).first()
+        user = models.User.query.filter_by(email=email).first()
         
         if user and user.check_password(password):
+            regenerate_session(session)
             login_user(user)
             flash('Login successful!', 'success')
             return redirect(url_for('index'))
@@ -883,13 +928,13 @@ def signup():
         experience = request.form.get('experience')
         
         # Check if user with email already exists
-        existing_user = User.query.filter_by(email=email).first()
+        existing_user = models.User.query.filter_by(email=email).first()
         if existing_user:
             flash('Email already registered', 'danger')
             return render_template('signup.html')
         
         # Create new user
-        new_user = User(
+        new_user = models.User(
             username=username,
             email=email,
             gender=gender
@@ -907,6 +952,7 @@ def signup():
         db.session.commit()
         
         # Log the user in
+        regenerate_session(session)
         login_user(new_user)
         flash('Account created successfully!', 'success')
         return redirect(url_for('index'))
@@ -917,6 +963,7 @@ def signup():
 @login_required
 def logout():
     logout_user()
+    regenerate_session(session)
     flash('You have been logged out', 'info')
     return redirect(url_for('index'))
 
@@ -924,36 +971,50 @@ def logout():
 def nutrition():
     return render_template('nutrition.html')
 
+def _calorie_grid(analysis_id):
+    """Calorie grid kept with an analysis: the stored analysis's, else the session's (None if neither)"""
+    from utils.recommendations import calculate_calorie_grid
+    if analysis_id.isdigit() and current_user.is_authenticated:
+        analysis = models.Analysis.query.filter_by(id=int(analysis_id), user_id=current_user.id).first()
+        if analysis is not None and (analysis.recommendations or {}).get('calorie_grid'):
+            return analysis.recommendations['calorie_grid']
+    results = session.get('analysis_results') or {}
+    if results.get('id') != analysis_id:
+        return None
+    if results.get('calorie_grid'):
+        return results['calorie_grid']
+    # Sessions from before the grid was kept
+    user_info = results.get('user_info') or {}
+    if user_info.get('weight') and user_info.get('height') and results.get('body_fat'):
+        return calculate_calorie_grid(user_info['weight'], user_info['height'], results['body_fat'])
+    return None
+
 @app.route('/nutrition/<analysis_id>')
 def nutrition_with_analysis(analysis_id):
-    """Display nutrition plan for a specific analysis"""
-    # Get analysis data from session or database
-    analysis_data = session.get('analysis_results', {})
+    """Display nutrition plan for a specific analysis (?goal= and ?activity= pick the grid cell)"""
+    from utils.recommendations import calorie_cell
+    from utils.meal_planner import generate_meal_plan
+    calorie_grid = _calorie_grid(analysis_id)
+    meals = None
     
-    # Generate personalized nutrition data based on analysis
-    if analysis_data:
-        # Calculate personalized macros based on user data
-        user_info = analysis_data.get('user_info', {})
-        maintenance_calories = analysis_data.get('maintenance_calories', {})
-        
-        # Determine goal-based calories (example: slight deficit for fat loss)
-        target_calories = maintenance_calories.get('moderate', 2200) - 300
-        
-        # Calculate macros (example: 1.8g protein per kg, 25% fat, rest carbs)
-        weight_kg = user_info.get('weight', 70)
-        protein_g = int(weight_kg * 1.8)
-        fat_g = int((target_calories * 0.25) / 9)
-        carb_g = int((target_calories - (protein_g * 4) - (fat_g * 9)) / 4)
-        
+    if calorie_grid:
+        # Slight deficit at moderate activity unless another cell is asked for
+        cell = calorie_cell(calorie_grid, request.args.get('goal', 'lose_fat'),
+                            request.args.get('activity', 'moderate'))
+        try:
+            # Today's meals from the week's plan
+            meal_plan = generate_meal_plan(cell, request.args.get('diet'))
+            meals = meal_plan['days'][datetime.date.today().weekday()]['meals']
+        except ValueError as e:
+            flash(str(e), 'warning')
         macros = {
-            'protein': protein_g,
-            'carbs': carb_g,
-            'fats': fat_g
+            'protein': cell['protein_g'],
+            'carbs': cell['carbs_g'],
+            'fats': cell['fat_g']
         }
-        
         calories = {
-            'maintenance': maintenance_calories.get('moderate', 2200),
-            'target': target_calories
+            'maintenance': cell['maintenance'],
+            'target': cell['target']
         }
     else:
         # Default values if no analysis data
@@ -963,7 +1024,31 @@ def nutrition_with_analysis(analysis_id):
     return render_template('nutrition.html', 
                          analysis_id=analysis_id,
                          macros=macros,
-                         calories=calories)
+                         calories=calories,
+                         meals=meals)
+
+@app.route('/api/analysis/<analysis_id>/calories')
+def api_calorie_grid(analysis_id):
+    """API endpoint to get the calorie and macro grid (activity level x goal) of an analysis"""
+    calorie_grid = _calorie_grid(analysis_id)
+    if calorie_grid is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    return jsonify(dict(calorie_grid, analysis_id=analysis_id))
+
+@app.route('/api/analysis/<analysis_id>/meal-plan')
+def api_meal_plan(analysis_id):
+    """API endpoint to get a week of meals for an analysis (?goal=, ?activity= and ?diet=vegan,gluten_free)"""
+    from utils.recommendations import calorie_cell
+    from utils.meal_planner import generate_meal_plan
+    calorie_grid = _calorie_grid(analysis_id)
+    if calorie_grid is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    cell = calorie_cell(calorie_grid, request.args.get('goal', 'lose_fat'), request.args.get('activity', 'moderate'))
+    try:
+        meal_plan = generate_meal_plan(cell, request.args.get('diet'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(meal_plan, analysis_id=analysis_id))
 
 @app.route('/workout')
 def workout():
@@ -974,98 +1059,510 @@ def workout_with_analysis(analysis_id):
     """Display workout plan for a specific analysis"""
     return render_template('workout.html', analysis_id=analysis_id)
 
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Goals stored on WorkoutPlan mapped to the generator's goals
+WORKOUT_GOALS = {'lose_fat': 'fat_loss', 'gain_muscle': 'muscle_gain', 'maintain': 'maintenance',
+                 'recomp': 'muscle_gain'}
+
+def _normalize_experience(experience):
+    experience = (experience or '').lower()
+    return experience if experience in ('beginner', 'intermediate', 'advanced') else 'intermediate'
+
+def _analysis_goal(analysis):
+    """Goal picked with a saved analysis (or its session copy), defaulting to gain_muscle"""
+    goal = (analysis.recommendations or {}).get('goal')
+    results = session.get('analysis_results') or {}
+    if goal not in WORKOUT_GOALS and results.get('id') == str(analysis.id):
+        goal = (results.get('user_info') or {}).get('goal')
+    return goal if goal in WORKOUT_GOALS else 'gain_muscle'
+
+def _create_workout_plan(analysis):
+    """Generate and store the workout plan for a saved analysis"""
+    from utils.workout_generator import generate_complete_workout_plan
+    from utils.periodization import DEFAULT_WEEKS, stored_plan
+    from utils.plan_cache import plan_seed
+    goal = _analysis_goal(analysis)
+    experience = _normalize_experience(analysis.user.experience_level)
+    plan = generate_complete_workout_plan(analysis.traits or {}, experience=experience,
+                                          goal=WORKOUT_GOALS[goal], seed=plan_seed(analysis.id))
+    workout_plan = models.WorkoutPlan(user_id=analysis.user_id, analysis_id=analysis.id, goal=goal,
+                                      duration_weeks=DEFAULT_WEEKS, training_split=plan['training_split'],
+                                      workout_schedule=stored_plan(plan, experience, WORKOUT_GOALS[goal]))
+    db.session.add(workout_plan)
+    db.session.commit()
+    return workout_plan
+
+def replan_clients(program, goal='gain_muscle', user_ids=None, workers=None, batch_size=None):
+    """
+    Store a new plan for the latest analysis of every user (or the given users).
+
+    Clients with identical plan inputs share one generated plan; see
+    utils.bulk_planner. Returns the throughput summary.
+    """
+    from sqlalchemy import func, insert
+    from utils.bulk_planner import DEFAULT_BATCH_SIZE, bulk_generate
+    latest = db.session.query(func.max(models.Analysis.id)).group_by(models.Analysis.user_id)
+    if user_ids:
+        latest = latest.filter(models.Analysis.user_id.in_(user_ids))
+    rows = (db.session.query(models.Analysis.id, models.Analysis.user_id, models.Analysis.traits,
+                             models.User.experience_level)
+            .join(models.User, models.User.id == models.Analysis.user_id)
+            .filter(models.Analysis.id.in_(latest.scalar_subquery())))
+    clients = ({'analysis_id': analysis_id, 'user_id': user_id, 'traits': traits,
+                'experience': _normalize_experience(experience), 'goal': WORKOUT_GOALS[goal]}
+               for analysis_id, user_id, traits, experience in rows)
+
+    def build_row(client, workout_schedule):
+        return {'user_id': client['user_id'], 'analysis_id': client['analysis_id'], 'goal': goal,
+                'duration_weeks': workout_schedule['mesocycle']['weeks'],
+                'training_split': workout_schedule['training_split'],
+                'workout_schedule': workout_schedule}
+
+    def write_rows(batch):
+        db.session.execute(insert(models.WorkoutPlan), batch)
+        db.session.commit()
+
+    return bulk_generate(clients, program, build_row, write_rows, workers=workers,
+                         batch_size=batch_size or DEFAULT_BATCH_SIZE)
+
+@app.cli.command('replan')
+@click.option('--program', required=True, help='Name of the program; seeds the new plans')
+@click.option('--goal', type=click.Choice(sorted(WORKOUT_GOALS)), default='gain_muscle', show_default=True)
+@click.option('--user', 'user_ids', type=int, multiple=True, help='Only re-plan these user ids')
+@click.option('--workers', type=int, default=None, help='Generating processes (default: usable CPUs)')
+@click.option('--batch-size', type=int, default=None, help='Rows per insert')
+def replan_command(program, goal, user_ids, workers, batch_size):
+    """Generate and store new workout plans for many clients at once."""
+    summary = replan_clients(program, goal, list(user_ids), workers, batch_size)
+    click.echo(json.dumps(summary, indent=2))
+
+@app.cli.command('migrate-history-indexes')
+def migrate_history_indexes_command():
+    """Create the (user, date) history indexes on an existing database."""
+    from utils.history import ensure_history_indexes
+    for name in ensure_history_indexes(db.engine):
+        click.echo(name)
+
+def _resolve_workout_plan(analysis_id):
+    """
+    Find the plan behind an analysis id without loading it.
+
+    Returns a tag that changes whenever the plan does, and a function
+    loading the stored plan (base week 'days' and its 'mesocycle'), or None
+    if the id is neither the user's saved analysis nor the session's.
+    """
+    from utils.plan_cache import plan_key, plan_seed
+    if analysis_id.isdigit() and current_user.is_authenticated:
+        analysis = models.Analysis.query.filter_by(id=int(analysis_id), user_id=current_user.id).first()
+        if analysis is not None:
+            # Stored plans are never edited, so id and creation time identify the content
+            row = (db.session.query(models.WorkoutPlan.id, models.WorkoutPlan.created_at)
+                   .filter_by(analysis_id=analysis.id)
+                   .order_by(models.WorkoutPlan.created_at.desc(), models.WorkoutPlan.id.desc()).first())
+            if row is None:
+                plan = _create_workout_plan(analysis)
+                row = (plan.id, plan.created_at)
+            plan_id, created_at = row
+            return (f"plan-{plan_id}-{created_at.isoformat()}",
+                    lambda: models.WorkoutPlan.query.get(plan_id).workout_schedule)
+
+    # Analyses kept only in the session get the same seeded plan every time;
+    # it comes from the plan cache instead of being stored
+    results = session.get('analysis_results') or {}
+    if results.get('id') != analysis_id:
+        return None
+    traits = results.get('traits') or {}
+    user_info = results.get('user_info') or {}
+    experience = _normalize_experience(user_info.get('experience'))
+    goal = WORKOUT_GOALS.get(user_info.get('goal'), 'muscle_gain')
+    seed = plan_seed(analysis_id)
+
+    def load():
+        from utils.workout_generator import generate_complete_workout_plan
+        from utils.periodization import stored_plan
+        plan = generate_complete_workout_plan(traits, experience=experience, goal=goal, seed=seed)
+        return stored_plan(plan, experience, goal)
+
+    return f"seed-{plan_key('api_workout', seed, traits=traits, experience=experience, goal=goal)}", load
+
+def _conditional_json(etag, load):
+    """JSON response with a strong ETag, answering 304 without loading when it matches"""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(load())
+    response.set_etag(etag)
+    # Cache but revalidate: a tab switch costs one conditional GET
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def _plan_week(stored, week):
+    """Days of a stored plan: the base week, or week N of its mesocycle"""
+    from utils.periodization import materialize_week, mesocycle_of
+    if week is None:
+        return stored['days']
+    mesocycle = mesocycle_of(stored)
+    if not 1 <= week <= mesocycle['weeks']:
+        raise LookupError(f"No week {week} in this {mesocycle['weeks']}-week plan")
+    return materialize_week(stored['days'], mesocycle['deltas'][week - 1])
+
+@app.route('/api/workout/<analysis_id>')
+def api_workout_week(analysis_id):
+    """API endpoint to get the whole week's workouts for an analysis (?week=N for a mesocycle week)"""
+    week = request.args.get('week', type=int)
+    try:
+        resolved = _resolve_workout_plan(analysis_id)
+        if resolved is None:
+            return jsonify({'error': 'Analysis not found'}), 404
+        tag, load = resolved
+        etag = hashlib.sha256(f"week|{week}|{tag}".encode('utf-8')).hexdigest()
+
+        def body():
+            days = _plan_week(load(), week)
+            return {'analysis_id': analysis_id, 'week': week, 'days': [dict(days[day], day=day) for day in WEEKDAYS]}
+
+        return _conditional_json(etag, body)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error fetching workout week for {analysis_id}: {str(e)}")
+        return jsonify({'error': 'Failed to load workout data'}), 500
+
+@app.route('/api/workout/<analysis_id>/mesocycle')
+def api_workout_mesocycle(analysis_id):
+    """API endpoint to get the week-by-week progression of an analysis's plan"""
+    from utils.periodization import mesocycle_of
+    try:
+        resolved = _resolve_workout_plan(analysis_id)
+        if resolved is None:
+            return jsonify({'error': 'Analysis not found'}), 404
+        tag, load = resolved
+        etag = hashlib.sha256(f"mesocycle|{tag}".encode('utf-8')).hexdigest()
+        return _conditional_json(etag, lambda: dict(mesocycle_of(load()), analysis_id=analysis_id))
+    except Exception as e:
+        logger.error(f"Error fetching mesocycle for {analysis_id}: {str(e)}")
+        return jsonify({'error': 'Failed to load workout data'}), 500
+
+@app.route('/api/workout/<int:analysis_id>/progress', methods=['POST'])
+@login_required
+def api_workout_progress(analysis_id):
+    """Log a week's training and regenerate the remaining weeks of the plan"""
+    from utils.periodization import DEFAULT_WEEKS, log_progress, mesocycle_of
+    payload = request.get_json(silent=True) or {}
+    try:
+        week = int(payload['week'])
+        completion = float(payload.get('completion', 1.0))
+        rpe = float(payload['rpe']) if payload.get('rpe') is not None else None
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'week is required; completion and rpe must be numbers'}), 400
+
+    analysis = models.Analysis.query.filter_by(id=analysis_id, user_id=current_user.id).first()
+    if analysis is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    plan = (models.WorkoutPlan.query.filter_by(analysis_id=analysis.id)
+            .order_by(models.WorkoutPlan.created_at.desc(), models.WorkoutPlan.id.desc()).first())
+    if plan is None:
+        plan = _create_workout_plan(analysis)
+    schedule = plan.workout_schedule
+    mesocycle = mesocycle_of(schedule, _normalize_experience(current_user.experience_level),
+                             WORKOUT_GOALS.get(plan.goal, 'muscle_gain'), plan.duration_weeks or DEFAULT_WEEKS)
+    try:
+        mesocycle = log_progress(mesocycle, week, completion, rpe)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Stored plans are never edited: the updated plan is a new row, which
+    # also gives it new ETags
+    updated = models.WorkoutPlan(user_id=plan.user_id, analysis_id=plan.analysis_id, goal=plan.goal,
+                                 duration_weeks=mesocycle['weeks'], training_split=plan.training_split,
+                                 workout_schedule=dict(schedule, mesocycle=mesocycle),
+                                 nutrition_plan=plan.nutrition_plan)
+    db.session.add(updated)
+    db.session.commit()
+    return jsonify(dict(mesocycle, analysis_id=str(analysis_id), plan_id=updated.id)), 201
+
 @app.route('/api/workout/<analysis_id>/<day>')
 def api_workout_day(analysis_id, day):
-    """API endpoint to get workout data for a specific day"""
+    """API endpoint to get workout data for a specific day (?week=N for a mesocycle week)"""
+    day = day.capitalize()
+    if day not in WEEKDAYS:
+        return jsonify({'error': f'No workout found for {day}'}), 404
+    week = request.args.get('week', type=int)
     try:
-        # Define workout plans for each day
-        workout_plans = {
-            'Monday': {
-                'type': 'Push',
-                'exercises': [
-                    {'name': 'Bench Press', 'focus': 'Chest, Triceps, Shoulders', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'Overhead Press', 'focus': 'Shoulders, Triceps', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'Incline Dumbbell Press', 'focus': 'Upper Chest, Shoulders', 'sets': '3', 'reps': '10-12', 'rest': '60s'},
-                    {'name': 'Dips', 'focus': 'Triceps, Lower Chest', 'sets': '3', 'reps': '8-12', 'rest': '60s'},
-                    {'name': 'Lateral Raises', 'focus': 'Side Delts', 'sets': '3', 'reps': '12-15', 'rest': '45s'},
-                    {'name': 'Tricep Pushdowns', 'focus': 'Triceps', 'sets': '3', 'reps': '10-12', 'rest': '45s'}
-                ]
-            },
-            'Tuesday': {
-                'type': 'Pull',
-                'exercises': [
-                    {'name': 'Pull-ups', 'focus': 'Lats, Biceps, Rear Delts', 'sets': '3', 'reps': '6-10', 'rest': '90s'},
-                    {'name': 'Barbell Rows', 'focus': 'Mid Traps, Rhomboids, Lats', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'Lat Pulldowns', 'focus': 'Lats, Biceps', 'sets': '3', 'reps': '10-12', 'rest': '60s'},
-                    {'name': 'Cable Rows', 'focus': 'Mid Traps, Rhomboids', 'sets': '3', 'reps': '10-12', 'rest': '60s'},
-                    {'name': 'Face Pulls', 'focus': 'Rear Delts, Mid Traps', 'sets': '3', 'reps': '12-15', 'rest': '45s'},
-                    {'name': 'Bicep Curls', 'focus': 'Biceps', 'sets': '3', 'reps': '10-12', 'rest': '45s'}
-                ]
-            },
-            'Wednesday': {
-                'type': 'Legs',
-                'exercises': [
-                    {'name': 'Squats', 'focus': 'Quads, Glutes, Core', 'sets': '3', 'reps': '8-10', 'rest': '2min'},
-                    {'name': 'Romanian Deadlifts', 'focus': 'Hamstrings, Glutes', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'Bulgarian Split Squats', 'focus': 'Quads, Glutes', 'sets': '3', 'reps': '10-12 each', 'rest': '60s'},
-                    {'name': 'Leg Curls', 'focus': 'Hamstrings', 'sets': '3', 'reps': '10-12', 'rest': '60s'},
-                    {'name': 'Calf Raises', 'focus': 'Calves', 'sets': '4', 'reps': '15-20', 'rest': '45s'},
-                    {'name': 'Plank', 'focus': 'Core', 'sets': '3', 'reps': '30-60s', 'rest': '45s'}
-                ]
-            },
-            'Thursday': {
-                'type': 'Rest',
-                'exercises': [
-                    {'name': 'Light Walking', 'focus': 'Active Recovery', 'sets': '1', 'reps': '20-30 min', 'rest': 'N/A'},
-                    {'name': 'Stretching', 'focus': 'Flexibility', 'sets': '1', 'reps': '15-20 min', 'rest': 'N/A'},
-                    {'name': 'Foam Rolling', 'focus': 'Recovery', 'sets': '1', 'reps': '10-15 min', 'rest': 'N/A'}
-                ]
-            },
-            'Friday': {
-                'type': 'Push',
-                'exercises': [
-                    {'name': 'Incline Barbell Press', 'focus': 'Upper Chest, Shoulders', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'Dumbbell Shoulder Press', 'focus': 'Shoulders, Triceps', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'Decline Dumbbell Press', 'focus': 'Lower Chest', 'sets': '3', 'reps': '10-12', 'rest': '60s'},
-                    {'name': 'Close-Grip Bench Press', 'focus': 'Triceps, Chest', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'Arnold Press', 'focus': 'Shoulders', 'sets': '3', 'reps': '10-12', 'rest': '60s'},
-                    {'name': 'Overhead Tricep Extension', 'focus': 'Triceps', 'sets': '3', 'reps': '10-12', 'rest': '45s'}
-                ]
-            },
-            'Saturday': {
-                'type': 'Pull',
-                'exercises': [
-                    {'name': 'Deadlifts', 'focus': 'Posterior Chain, Traps', 'sets': '3', 'reps': '5-8', 'rest': '2min'},
-                    {'name': 'Wide-Grip Pulldowns', 'focus': 'Lats, Rear Delts', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'T-Bar Rows', 'focus': 'Mid Traps, Lats', 'sets': '3', 'reps': '10-12', 'rest': '60s'},
-                    {'name': 'Reverse Flyes', 'focus': 'Rear Delts', 'sets': '3', 'reps': '12-15', 'rest': '45s'},
-                    {'name': 'Hammer Curls', 'focus': 'Biceps, Forearms', 'sets': '3', 'reps': '10-12', 'rest': '45s'},
-                    {'name': 'Shrugs', 'focus': 'Upper Traps', 'sets': '3', 'reps': '12-15', 'rest': '45s'}
-                ]
-            },
-            'Sunday': {
-                'type': 'Legs',
-                'exercises': [
-                    {'name': 'Front Squats', 'focus': 'Quads, Core', 'sets': '3', 'reps': '8-10', 'rest': '90s'},
-                    {'name': 'Stiff Leg Deadlifts', 'focus': 'Hamstrings, Glutes', 'sets': '3', 'reps': '10-12', 'rest': '90s'},
-                    {'name': 'Walking Lunges', 'focus': 'Quads, Glutes', 'sets': '3', 'reps': '12-15 each', 'rest': '60s'},
-                    {'name': 'Leg Extensions', 'focus': 'Quads', 'sets': '3', 'reps': '12-15', 'rest': '45s'},
-                    {'name': 'Seated Calf Raises', 'focus': 'Calves', 'sets': '4', 'reps': '15-20', 'rest': '45s'},
-                    {'name': 'Russian Twists', 'focus': 'Core', 'sets': '3', 'reps': '20-30', 'rest': '45s'}
-                ]
-            }
-        }
-        
-        workout_data = workout_plans.get(day)
-        if not workout_data:
-            return jsonify({'error': f'No workout found for {day}'}), 404
-            
-        return jsonify(workout_data)
-        
+        resolved = _resolve_workout_plan(analysis_id)
+        if resolved is None:
+            return jsonify({'error': 'Analysis not found'}), 404
+        tag, load = resolved
+        etag = hashlib.sha256(f"{day}|{week}|{tag}".encode('utf-8')).hexdigest()
+        return _conditional_json(etag, lambda: _plan_week(load(), week)[day])
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         logger.error(f"Error fetching workout for {day}: {str(e)}")
         return jsonify({'error': 'Failed to load workout data'}), 500
 
+def _get_user_scan(scan_id):
+    """Return the current user's 3D scan with the given id, or None."""
+    scan = models.BodyScan3D.query.get(scan_id)
+    if scan is None or scan.user_id != current_user.id or not scan.file_path:
+        return None
+    return scan
+
+@app.route('/scan3d/results/<int:scan_id>')
+@login_required
+def scan3d_results(scan_id):
+    """Display a 3D scan's measurements, body composition and 3D model"""
+    scan = _get_user_scan(scan_id)
+    if scan is None:
+        flash('Scan not found', 'warning')
+        return redirect(url_for('index'))
+    analysis = scan.analysis
+    # Scan measurements take precedence over the linked analysis's estimates
+    traits = {**((analysis.traits if analysis else None) or {}),
+              **(scan.measurements or {}), **(scan.body_composition or {})}
+    user_info = {
+        'height': current_user.height_cm,
+        'weight': current_user.weight_kg,
+        'gender': current_user.gender or '',
+        'experience': _normalize_experience(current_user.experience_level),
+        'date': scan.scan_date.strftime('%Y-%m-%d') if scan.scan_date else None,
+    }
+    return render_template('scan3d_results.html', scan_id=scan.id, scan_data={'file_format': scan.file_format},
+                           user_info=user_info, traits=traits,
+                           recommendations=analysis.recommendations if analysis else None, image_data=None)
+
+@app.route('/api/scan/<int:scan_id>/lod')
+@login_required
+def api_scan_lod_manifest(scan_id):
+    """Describe the decimated levels of detail available for a 3D scan"""
+    from utils.mesh_lod import get_lod_manifest
+    from utils.mesh_io import MeshFormatError
+    scan = _get_user_scan(scan_id)
+    if scan is None:
+        return jsonify({'error': 'Scan not found'}), 404
+    try:
+        manifest = get_lod_manifest(scan.id, scan.file_path, current_user.height_cm or 0.0)
+    except (OSError, MeshFormatError) as e:
+        logger.error(f"Error building LODs for scan {scan_id}: {str(e)}")
+        return jsonify({'error': 'Failed to prepare 3D model'}), 500
+
+    # The source signature makes level URLs change whenever the scan does
+    version = (manifest.get('source') or {}).get('mtime_ns', 0)
+    levels = [dict(level, url=url_for('api_scan_lod_level', scan_id=scan.id, level=level['level'], v=version))
+              for level in manifest['levels']]
+    return jsonify({'scan_id': scan.id, 'bounds': manifest['bounds'],
+                    'source_faces': manifest['source_faces'], 'levels': levels})
+
+@app.route('/api/scan/<int:scan_id>/lod/<int:level>')
+@login_required
+def api_scan_lod_level(scan_id, level):
+    """Stream one encoded level of detail (supports HTTP range requests)"""
+    from utils.mesh_lod import load_lod_manifest, lod_file_path
+    scan = _get_user_scan(scan_id)
+    manifest = load_lod_manifest(scan_id) if scan else None
+    if manifest is None or level >= len(manifest['levels']):
+        return jsonify({'error': 'Level not found'}), 404
+    response = send_file(lod_file_path(scan_id, level), mimetype='application/octet-stream',
+                         conditional=True, max_age=86400)
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+@app.route('/api/scan/<int:scan_id>/compare')
+@app.route('/api/scan/<int:scan_id>/compare/<int:baseline_id>')
+@login_required
+def api_scan_compare(scan_id, baseline_id=None):
+    """Regional body changes between a scan and an earlier one (the previous scan by default)"""
+    from utils.scan_compare import compare_meshes, comparison_key
+    from utils.mesh_io import load_mesh
+    scan = _get_user_scan(scan_id)
+    if scan is None:
+        return jsonify({'error': 'Scan not found'}), 404
+    if baseline_id is None:
+        baseline = scan.previous_scan()
+    else:
+        baseline = _get_user_scan(baseline_id)
+    if baseline is None or baseline.id == scan.id:
+        return jsonify({'error': 'No earlier scan to compare with'}), 404
+
+    try:
+        key = comparison_key(baseline.file_path, scan.file_path)
+        comparison = models.ScanComparison.query.filter_by(baseline_scan_id=baseline.id, scan_id=scan.id).first()
+        if comparison is None or comparison.cache_key != key:
+            height_cm = current_user.height_cm or 0.0
+            results = compare_meshes(load_mesh(baseline.file_path).normalize_to_body_frame(height_cm),
+                                     load_mesh(scan.file_path).normalize_to_body_frame(height_cm))
+            if comparison is None:
+                comparison = models.ScanComparison(user_id=current_user.id, baseline_scan_id=baseline.id,
+                                                   scan_id=scan.id)
+                db.session.add(comparison)
+            comparison.cache_key = key
+            comparison.results = results
+            comparison.created_at = datetime.datetime.utcnow()
+            db.session.commit()
+    except (OSError, ValueError) as e:
+        # MeshFormatError is a ValueError
+        db.session.rollback()
+        logger.error(f"Error comparing scans {baseline.id} and {scan_id}: {str(e)}")
+        return jsonify({'error': 'Failed to compare scans'}), 500
+
+    return jsonify({
+        'scan_id': scan.id,
+        'baseline_scan_id': baseline.id,
+        'baseline_date': baseline.scan_date.isoformat() if baseline.scan_date else None,
+        'scan_date': scan.scan_date.isoformat() if scan.scan_date else None,
+        'comparison': comparison.results,
+    })
+
+@app.route('/api/similar_physiques')
+@login_required
+def api_similar_physiques():
+    """Public profiles whose latest analysed photo looks most like the current user's"""
+    from utils.embedding_index import get_embedding_store
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    store = get_embedding_store()
+    if len(store.owner_rows(current_user.id)) == 0:
+        return jsonify({'error': 'Analyse a photo or scan first'}), 404
+
+    # Over-fetch since private profiles are filtered out afterwards
+    matches = store.similar_owners(current_user.id, k=4 * limit)
+    public = dict(db.session.query(models.User.id, models.User.username)
+                  .join(models.PrivacySetting, models.PrivacySetting.user_id == models.User.id)
+                  .filter(models.User.id.in_([user_id for user_id, _ in matches]),
+                          models.PrivacySetting.profile_visibility == 'public')
+                  .all()) if matches else {}
+    return jsonify({
+        'results': [{'username': public[user_id], 'similarity': similarity}
+                    for user_id, similarity in matches if user_id in public][:limit],
+    })
+
+@app.route('/api/history/<kind>')
+@login_required
+def api_history(kind):
+    """Keyset-paginated history (analyses, scans, workout_plans or measurements) for the profile and progress pages"""
+    from utils.history import DEFAULT_PAGE_SIZE, history_page
+    try:
+        page = history_page(db.session, kind, current_user.id, cursor=request.args.get('cursor'),
+                            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                            order=request.args.get('order', 'desc'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+# Uploaded scans are analysed off the request thread once their last chunk lands
+scan_processing_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('SCAN_PROCESSING_WORKERS', 1)))
+
+def _process_uploaded_scan(user_id, upload_id, scan_id):
+    """Analyse an uploaded scan and store the results on its BodyScan3D row"""
+    from utils.scan_upload import update_upload
+    with app.app_context():
+        metadata = update_upload(user_id, upload_id, status='processing')['metadata']
+        try:
+            scan = models.BodyScan3D.query.get(scan_id)
+            analysis = process_3d_scan(scan.file_path, metadata.get('height_cm', 0.0), metadata.get('weight_kg', 0.0),
+                                       user_id=user_id)
+            if not analysis:
+                raise ValueError("Scan could not be analysed")
+            scan.measurements = analysis.get('measurements')
+            scan.body_composition = analysis.get('body_composition')
+            db.session.commit()
+            update_upload(user_id, upload_id, status='complete')
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error processing uploaded scan {scan_id}: {str(e)}")
+            update_upload(user_id, upload_id, status='failed', error='Scan could not be processed')
+
+def _upload_error_response(error):
+    from utils.scan_upload import public_state
+    body = {'error': str(error)}
+    if error.state:
+        body['upload'] = public_state(error.state)
+    return jsonify(body), error.status
+
+@app.route('/api/scan/uploads', methods=['POST'])
+@login_required
+def api_scan_upload_create():
+    """Open a resumable upload session for a 3D scan file"""
+    from utils.scan_upload import create_upload, public_state, UploadError
+    data = request.get_json(silent=True) or {}
+    try:
+        metadata = {
+            'height_cm': float(data.get('height_cm') or current_user.height_cm or 0.0),
+            'weight_kg': float(data.get('weight_kg') or current_user.weight_kg or 0.0),
+        }
+        state = create_upload(current_user.id, data.get('filename'), data.get('size'),
+                              sha256=data.get('sha256'), metadata=metadata)
+    except UploadError as e:
+        return _upload_error_response(e)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Height and weight must be numbers'}), 400
+    return jsonify(public_state(state)), 201
+
+@app.route('/api/scan/uploads/<upload_id>', methods=['GET'])
+@login_required
+def api_scan_upload_status(upload_id):
+    """Report how much of an upload has been received and its processing status"""
+    from utils.scan_upload import get_upload, public_state, UploadError
+    try:
+        return jsonify(public_state(get_upload(current_user.id, upload_id)))
+    except UploadError as e:
+        return _upload_error_response(e)
+
+@app.route('/api/scan/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def api_scan_upload_chunk(upload_id):
+    """
+    Append one chunk, sent as the raw request body.
+
+    The chunk offset comes from a 'Content-Range: bytes start-end/total'
+    header or an 'offset' query parameter.
+    """
+    from utils.scan_upload import append_chunk, public_state, UploadError
+    content_range = re.match(r'bytes (\d+)-(\d+)/(\d+)', request.headers.get('Content-Range', ''))
+    offset = int(content_range.group(1)) if content_range else request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Missing chunk offset'}), 400
+
+    def register_scan(file_path):
+        # Runs before the upload is marked received: if the row cannot be
+        # inserted the last chunk is discarded and can be resent
+        scan = models.BodyScan3D(user_id=current_user.id, file_path=file_path,
+                                 file_format=os.path.splitext(file_path)[1])
+        try:
+            db.session.add(scan)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {'scan_id': scan.id}
+
+    try:
+        state = append_chunk(current_user.id, upload_id, offset, request.stream, request.content_length,
+                             on_complete=register_scan)
+    except UploadError as e:
+        return _upload_error_response(e)
+    if state['status'] != 'received':
+        return jsonify(public_state(state))
+
+    # Last chunk: start processing the registered scan
+    if ADVANCED_FEATURES_AVAILABLE:
+        scan_processing_executor.submit(_process_uploaded_scan, current_user.id, upload_id, state['scan_id'])
+    else:
+        logger.warning(f"3D scan processing not available, scan {state['scan_id']} stored unprocessed")
+    return jsonify(public_state(state)), 202
+
+@app.route('/api/scan/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def api_scan_upload_cancel(upload_id):
+    """Abandon an upload and free its quota"""
+    from utils.scan_upload import delete_upload, UploadError
+    try:
+        delete_upload(current_user.id, upload_id)
+    except UploadError as e:
+        return _upload_error_response(e)
+    return '', 204
+
 # Import admin_bp and register it after db is initialized
 from admin import admin_bp
 app.register_blueprint(admin_bp)
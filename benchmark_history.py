@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark history queries with and without the (user_id, date) indexes.
+
+Seeds every history table (analyses, body_scans, workout_plans,
+measurement_logs) with --rows rows spread over --users users, in a SQLite
+file or the database at --url. Then, first without and then with the
+history indexes (built by ensure_history_indexes, the migration), it prints
+each query's plan and the median time over random users of:
+
+- latest: the newest row (first page of one)
+- first page: the first --limit rows, newest first
+- deep page: page --depth, reached with the keyset cursor
+- deep offset: the same page with LIMIT/OFFSET, for comparison
+
+Usage:
+    python benchmark_history.py [--rows 1000000] [--users 1000] [--url URL]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, text
+
+import models
+from database import db, engine_options
+from utils.history import ensure_history_indexes, history_page, history_query, history_tables
+
+# Rows per insert statement while seeding
+SEED_BATCH = 50000
+
+# Users timed per query
+SAMPLED_USERS = 50
+
+
+def seed(engine, rows, users, rng):
+    """Fill each history table with rows spread over users and three years."""
+    db.metadata.create_all(engine)
+    now = datetime(2026, 1, 1)
+    span = 3 * 365 * 24 * 3600
+    with engine.begin() as connection:
+        connection.execute(insert(models.User.__table__),
+                           [{'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com'}
+                            for user_id in range(1, users + 1)])
+    extra = {
+        'analyses': lambda: {'analysis_type': 'image', 'body_type': 'Mesomorph',
+                             'body_fat_percentage': round(rng.uniform(8, 30), 1)},
+        'scans': lambda: {'file_format': 'ply'},
+        'workout_plans': lambda: {'goal': 'gain_muscle', 'duration_weeks': 8},
+        'measurements': lambda: {'weight_kg': round(rng.uniform(55, 110), 1)},
+    }
+    for kind, (model, date_name, _) in history_tables().items():
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            for offset in range(0, rows, SEED_BATCH):
+                batch = [{'user_id': rng.randint(1, users),
+                          date_name: now - timedelta(seconds=rng.randrange(span)), **extra[kind]()}
+                         for _ in range(min(SEED_BATCH, rows - offset))]
+                connection.execute(insert(model.__table__), batch)
+        print(f"Seeded {rows} {kind} in {time.perf_counter() - start:.1f} s")
+
+
+def drop_history_indexes(engine):
+    with engine.begin() as connection:
+        for model, _, _ in history_tables().values():
+            for index in model.__table__.indexes:
+                if index.name.endswith('_history'):
+                    connection.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+
+
+def explain(connection, query):
+    sql = str(query.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    return [' | '.join(str(column) for column in row) for row in connection.exec_driver_sql(prefix + sql)]
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run_queries(engine, kind, user_ids, limit, depth):
+    results = {}
+    with engine.connect() as connection:
+        print(f"  plan: {'; '.join(explain(connection, history_query(kind, user_ids[0], limit=limit)))}")
+        cursors = {}
+        for user_id in user_ids:
+            cursor = None
+            for _ in range(depth - 1):
+                cursor = history_page(connection, kind, user_id, cursor, limit)['next_cursor']
+                if cursor is None:
+                    break
+            cursors[user_id] = cursor
+
+        def each(query):
+            return lambda: [connection.execute(query(user_id)).all() for user_id in user_ids]
+
+        results['latest'] = timed(each(lambda user_id: history_query(kind, user_id, limit=1)), 3)
+        results['first page'] = timed(each(lambda user_id: history_query(kind, user_id, limit=limit)), 3)
+        results['deep page'] = timed(each(lambda user_id: history_query(kind, user_id, cursors[user_id], limit)), 3)
+        results['deep offset'] = timed(each(lambda user_id: history_query(kind, user_id, limit=limit)
+                                            .offset(limit * (depth - 1))), 3)
+    return {name: value / len(user_ids) for name, value in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='Rows per history table')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=20, help='Rows per page')
+    parser.add_argument('--depth', type=int, default=20, help='Page number of the deep page')
+    parser.add_argument('--url', help='Database URL (default: a new SQLite file)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    path = None
+    url = args.url
+    if url is None:
+        handle, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        url = f'sqlite:///{path}'
+    engine = create_engine(url, **engine_options(url))
+    rng = random.Random(args.seed)
+    try:
+        db.metadata.drop_all(engine)
+        seed(engine, args.rows, args.users, rng)
+        user_ids = rng.sample(range(1, args.users + 1), min(SAMPLED_USERS, args.users))
+        drop_history_indexes(engine)
+        with engine.begin() as connection:
+            if engine.dialect.name == 'sqlite':
+                connection.exec_driver_sql('ANALYZE')
+        before = {}
+        print("\nWithout history indexes")
+        for kind in history_tables():
+            print(kind)
+            before[kind] = run_queries(engine, kind, user_ids, args.limit, args.depth)
+
+        start = time.perf_counter()
+        ensure_history_indexes(engine)
+        with engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        print(f"\nMigration built the indexes in {time.perf_counter() - start:.1f} s")
+        print("\nWith history indexes")
+        for kind in history_tables():
+            print(kind)
+            after = run_queries(engine, kind, user_ids, args.limit, args.depth)
+            for name, milliseconds in after.items():
+                print(f"  {name:12s} {before[kind][name]:9.3f} ms -> {milliseconds:7.3f} ms per user")
+    finally:
+        engine.dispose()
+        if path is not None:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark 3D scan mesh loading.
+
+Generates a synthetic body-shaped mesh of the requested size, writes it as
+binary STL, binary PLY, ASCII PLY and OBJ, then loads each file in a fresh
+subprocess and reports load time and peak resident memory.
+
+Usage:
+    python benchmark_mesh_loading.py [--faces 2000000] [--keep DIR]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from utils.mesh_io import STL_HEADER_BYTES, STL_RECORD_DTYPE
+
+
+def make_synthetic_body(target_faces, height_cm=178.0):
+    """
+    Build a closed lathe surface with a rough human silhouette.
+
+    Args:
+        target_faces: Approximate number of triangles to generate
+        height_cm: Height of the figure in centimeters
+
+    Returns:
+        Tuple of (vertices float32 (N, 3), faces int32 (M, 3)) in meters
+    """
+    segments = max(16, int(np.sqrt(target_faces / 2)))
+    rings = max(8, target_faces // (2 * segments))
+    heights = np.linspace(0.0, 1.0, rings)
+    # Radius profile in fractions of height: legs, hips, waist, chest, neck, head
+    profile_h = np.array([0.0, 0.05, 0.28, 0.48, 0.53, 0.62, 0.72, 0.82, 0.85, 0.92, 1.0])
+    profile_r = np.array([0.03, 0.05, 0.09, 0.11, 0.16, 0.14, 0.17, 0.16, 0.06, 0.06, 0.01])
+    radii = np.interp(heights, profile_h, profile_r) * height_cm / 100.0
+    angles = np.linspace(0.0, 2 * np.pi, segments, endpoint=False)
+
+    ring_x = np.outer(radii, np.cos(angles))
+    ring_z = np.outer(radii, np.sin(angles)) * 0.7
+    ring_y = np.repeat(heights[:, None] * height_cm / 100.0, segments, axis=1)
+    vertices = np.stack([ring_x, ring_y, ring_z], axis=-1).reshape(-1, 3)
+    bottom = len(vertices)
+    top = bottom + 1
+    vertices = np.vstack([vertices, [[0, 0, 0], [0, height_cm / 100.0, 0]]]).astype(np.float32)
+
+    ring = np.arange(rings - 1)[:, None] * segments
+    col = np.arange(segments)[None, :]
+    a = ring + col
+    b = ring + (col + 1) % segments
+    c = a + segments
+    d = b + segments
+    quads = np.stack([np.stack([a, c, b], -1), np.stack([b, c, d], -1)], axis=2).reshape(-1, 3)
+    caps_bottom = np.stack([np.full(segments, bottom), col[0], (col[0] + 1) % segments], -1)
+    last = (rings - 1) * segments
+    caps_top = np.stack([np.full(segments, top), last + (col[0] + 1) % segments, last + col[0]], -1)
+    faces = np.vstack([quads, caps_bottom, caps_top]).astype(np.int32)
+    return vertices, faces
+
+
+def write_binary_stl(path, vertices, faces):
+    records = np.zeros(len(faces), dtype=STL_RECORD_DTYPE)
+    records['vertices'] = vertices[faces]
+    with open(path, 'wb') as handle:
+        handle.write(b'synthetic benchmark body'.ljust(STL_HEADER_BYTES - 4, b' '))
+        handle.write(np.uint32(len(faces)).tobytes())
+        records.tofile(handle)
+
+
+def write_ply(path, vertices, faces, binary=True):
+    header = (
+        "ply\n"
+        f"format {'binary_little_endian' if binary else 'ascii'} 1.0\n"
+        f"element vertex {len(vertices)}\n"
+        "property float x\nproperty float y\nproperty float z\n"
+        f"element face {len(faces)}\n"
+        "property list uchar int vertex_indices\n"
+        "end_header\n"
+    )
+    with open(path, 'wb') as handle:
+        handle.write(header.encode('ascii'))
+        if binary:
+            vertices.astype('<f4').tofile(handle)
+            records = np.zeros(len(faces), dtype=[('n', 'u1'), ('indices', '<i4', (3,))])
+            records['n'] = 3
+            records['indices'] = faces
+            records.tofile(handle)
+        else:
+            np.savetxt(handle, vertices, fmt='%.5f')
+            np.savetxt(handle, np.hstack([np.full((len(faces), 1), 3), faces]), fmt='%d')
+
+
+def write_obj(path, vertices, faces):
+    with open(path, 'wb') as handle:
+        np.savetxt(handle, vertices, fmt='v %.5f %.5f %.5f')
+        np.savetxt(handle, faces + 1, fmt='f %d %d %d')
+
+
+def measure_load(path):
+    """Load a mesh in this process and print timing and memory as one line."""
+    from utils.mesh_io import load_mesh
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    mesh = load_mesh(path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed:.3f} {rss_before / 1024:.1f} {peak / 1024:.1f} "
+          f"{mesh.vertex_count} {mesh.face_count} {mesh.nbytes / 1e6:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--faces', type=int, default=2_000_000, help='Approximate triangle count')
+    parser.add_argument('--keep', help='Directory to write the generated scan files to')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure_load(args.measure)
+        return
+
+    workdir = args.keep or tempfile.mkdtemp(prefix='mesh_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    vertices, faces = make_synthetic_body(args.faces)
+    files = {
+        'binary STL': os.path.join(workdir, 'body.stl'),
+        'binary PLY': os.path.join(workdir, 'body.ply'),
+        'ASCII PLY': os.path.join(workdir, 'body_ascii.ply'),
+        'OBJ': os.path.join(workdir, 'body.obj'),
+    }
+    print(f"Generating {len(vertices):,} vertices / {len(faces):,} faces in {workdir}")
+    write_binary_stl(files['binary STL'], vertices, faces)
+    write_ply(files['binary PLY'], vertices, faces, binary=True)
+    write_ply(files['ASCII PLY'], vertices, faces, binary=False)
+    write_obj(files['OBJ'], vertices, faces)
+
+    print(f"{'format':<12} {'file MB':>9} {'load s':>8} {'base RSS MB':>12} "
+          f"{'peak RSS MB':>12} {'mesh MB':>8}")
+    for label, path in files.items():
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--measure', path],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.split()
+        elapsed, base_rss, peak_rss, _, _, mesh_mb = output[-6:]
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{label:<12} {size_mb:>9.1f} {float(elapsed):>8.2f} {float(base_rss):>12.1f} "
+              f"{float(peak_rss):>12.1f} {float(mesh_mb):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
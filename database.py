@@ -1,14 +1,337 @@
 """
 Database configuration for MyGenetics.
 
-This module initializes the SQLAlchemy database connection.
+This module owns the one SQLAlchemy instance (``db``) that the models,
+the app and the blueprints share, and configures its engine:
+
+- DATABASE_URL, or a SQLite file (DATABASE_PATH, default
+  instance/mygenetics.sqlite) for local runs and benchmarks;
+- a connection pool sized to this worker's share of the database's
+  connection budget (DB_MAX_CONNECTIONS divided by WEB_CONCURRENCY), split
+  into a persistent part and overflow; DB_POOL_SIZE and DB_MAX_OVERFLOW
+  override the split. A session store engine (SESSION_DATABASE_URL) on the
+  same server takes SESSION_POOL_PERCENT of that budget and the app engine
+  the rest; on a separate server each gets the whole budget;
+- pre-ping (DB_POOL_PRE_PING), so connections the server dropped are
+  replaced instead of failing a request, and recycling after
+  DB_POOL_RECYCLE seconds, before managed databases close idle ones;
+- a statement timeout (DB_STATEMENT_TIMEOUT_MS) on PostgreSQL; SQLite has
+  none, so it gets the same value as its busy timeout, and WAL journaling.
+
+The pool records how long each checkout waited and how often it found the
+pool at capacity; ``pool_stats`` reports both for the diagnostics endpoint.
+Engines must not cross a fork: gunicorn's post_fork hook calls
+``dispose_after_fork`` (through utils/model_preload.py) so every worker
+opens its own connections.
 """
+import logging
+import os
+import threading
+import time
+from collections import deque
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import QueuePool
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Connections the database accepts from all workers of one deployment
+DEFAULT_MAX_CONNECTIONS = 20
+
+# Seconds before a pooled connection is replaced
+DEFAULT_POOL_RECYCLE = 300
+
+# Seconds a request waits for a connection before failing
+DEFAULT_POOL_TIMEOUT = 10
+
+# Milliseconds a statement may run
+DEFAULT_STATEMENT_TIMEOUT_MS = 30000
+
+# Checkout latencies kept for percentiles
+LATENCY_SAMPLES = 1024
+
+# Percentage of the connection budget a session engine on the app
+# database's server takes from the app engine
+DEFAULT_SESSION_POOL_PERCENT = 25
+
 
 # Define the base class for SQLAlchemy models
 class Base(DeclarativeBase):
     pass
 
 # Initialize SQLAlchemy
-db = SQLAlchemy(model_class=Base)
\ No newline at end of file
+db = SQLAlchemy(model_class=Base)
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording checkout latency and saturation."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = {'checkouts': 0, 'saturated': 0, 'timeouts': 0, 'peak_checked_out': 0,
+                        'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.metrics_lock = threading.Lock()
+
+    def capacity(self):
+        """Connections this pool may hold, or None if unbounded."""
+        return None if self._max_overflow < 0 else self.size() + self._max_overflow
+
+    def _do_get(self):
+        capacity = self.capacity()
+        saturated = capacity is not None and self.checkedout() >= capacity
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            with self.metrics_lock:
+                self.metrics['timeouts'] += 1
+            raise
+        waited = time.perf_counter() - start
+        with self.metrics_lock:
+            self.metrics['checkouts'] += 1
+            self.metrics['saturated'] += saturated
+            self.metrics['wait_seconds'] += waited
+            self.metrics['max_wait_seconds'] = max(self.metrics['max_wait_seconds'], waited)
+            self.metrics['peak_checked_out'] = max(self.metrics['peak_checked_out'], self.checkedout())
+            self.latencies.append(waited)
+        return connection
+
+    def recreate(self):
+        # Carries the metrics over when the engine is disposed
+        pool = super().recreate()
+        pool.metrics, pool.latencies, pool.metrics_lock = self.metrics, self.latencies, self.metrics_lock
+        return pool
+
+
+def database_url(instance_path=None):
+    """
+    URL of the app database.
+
+    Args:
+        instance_path: Directory of the default SQLite file
+
+    Returns:
+        DATABASE_URL, or a SQLite URL for DATABASE_PATH (default
+        <instance_path>/mygenetics.sqlite)
+    """
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        # Heroku-style URLs name the dialect 'postgres'
+        return 'postgresql://' + url[len('postgres://'):] if url.startswith('postgres://') else url
+    path = os.environ.get('DATABASE_PATH') or os.path.join(instance_path or 'instance', 'mygenetics.sqlite')
+    path = os.path.abspath(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return f'sqlite:///{path}'
+
+
+def same_server(url, other_url):
+    """
+    Whether two database URLs share one server's connection limit.
+
+    Args:
+        url: Database URL
+        other_url: Database URL
+
+    Returns:
+        True for the same host and port (or the same SQLite file)
+    """
+    url, other_url = make_url(url), make_url(other_url)
+    if url.get_backend_name() != other_url.get_backend_name():
+        return False
+    if url.get_backend_name() == 'sqlite':
+        return url.database == other_url.database
+    return (url.host, url.port) == (other_url.host, other_url.port)
+
+
+def session_pool_fraction(url, session_url):
+    """
+    Share of the connection budget for a session store engine.
+
+    Args:
+        url: App database URL
+        session_url: Session database URL
+
+    Returns:
+        SESSION_POOL_PERCENT as a fraction if both are on one server, else 1.0
+    """
+    if not same_server(url, session_url):
+        return 1.0
+    percent = _env_int('SESSION_POOL_PERCENT', DEFAULT_SESSION_POOL_PERCENT)
+    return min(99, max(1, percent)) / 100.0
+
+
+def pool_budget(workers=None, fraction=1.0):
+    """
+    Pool size and overflow for one worker.
+
+    Args:
+        workers: Worker processes sharing the database (default WEB_CONCURRENCY)
+        fraction: Share of DB_MAX_CONNECTIONS for this engine
+
+    Returns:
+        Tuple of (pool_size, max_overflow)
+    """
+    workers = workers or _env_int('WEB_CONCURRENCY', 1)
+    budget = int(_env_int('DB_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS) * fraction)
+    share = max(2, budget // max(1, workers))
+    pool_size = max(1, _env_int('DB_POOL_SIZE', share // 2))
+    max_overflow = max(0, _env_int('DB_MAX_OVERFLOW', share - pool_size))
+    return pool_size, max_overflow
+
+
+def engine_options(url, workers=None, fraction=1.0):
+    """
+    create_engine keyword arguments for a database URL.
+
+    Args:
+        url: Database URL
+        workers: Worker processes sharing the database (default WEB_CONCURRENCY)
+        fraction: Share of DB_MAX_CONNECTIONS for this engine
+
+    Returns:
+        Dictionary of engine options
+    """
+    url = make_url(url)
+    timeout_ms = _env_int('DB_STATEMENT_TIMEOUT_MS', DEFAULT_STATEMENT_TIMEOUT_MS)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # One in-memory database per connection: leave pooling to SQLAlchemy
+        return {}
+
+    pool_size, max_overflow = pool_budget(workers, fraction)
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', DEFAULT_POOL_RECYCLE),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    }
+    backend = url.get_backend_name()
+    if backend == 'postgresql' and timeout_ms:
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout_ms}'}
+    elif backend == 'sqlite':
+        options['connect_args'] = {'timeout': timeout_ms / 1000.0, 'check_same_thread': False}
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def create_pooled_engine(url, workers=None, fraction=1.0):
+    """
+    Engine for a database other than the app's (e.g. a session store),
+    pooled like the app's.
+
+    Args:
+        url: Database URL
+        workers: Worker processes sharing the database (default WEB_CONCURRENCY)
+        fraction: Share of DB_MAX_CONNECTIONS for this engine; use
+            session_pool_fraction when it is on the app database's server
+
+    Returns:
+        SQLAlchemy Engine
+    """
+    engine = create_engine(url, **engine_options(url, workers, fraction))
+    _prepare_engine(engine)
+    _engines.append(engine)
+    return engine
+
+
+def _prepare_engine(engine):
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _sqlite_pragmas):
+        event.listen(engine, 'connect', _sqlite_pragmas)
+
+
+_engines = []
+
+
+def configure_database(app, session_url=None):
+    """
+    Configure the app's database and bind ``db`` to it.
+
+    Args:
+        app: Flask app
+        session_url: URL of a separate session database; if it is on the
+            same server, the app engine leaves it its share of the budget
+
+    Returns:
+        The app's engine
+    """
+    url = database_url(app.instance_path)
+    fraction = 1.0
+    if session_url and same_server(url, session_url):
+        fraction = 1.0 - session_pool_fraction(url, session_url)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options(url, fraction=fraction),
+                                               **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    db.init_app(app)
+    with app.app_context():
+        engine = db.engine
+    _prepare_engine(engine)
+    if engine not in _engines:
+        _engines.append(engine)
+    logger.info(f"Database {engine.url.render_as_string(hide_password=True)}: {engine.pool.status()}")
+    return engine
+
+
+def dispose_after_fork():
+    """Drop connections inherited from the parent process without closing them."""
+    for engine in _engines:
+        engine.dispose(close=False)
+
+
+def pool_stats():
+    """
+    Pool settings, occupancy, checkout latency and saturation of every engine.
+
+    Returns:
+        Dictionary mapping each engine's URL (without password) to its statistics
+    """
+    stats = {}
+    for engine in _engines:
+        pool = engine.pool
+        entry = {'pool': type(pool).__name__, 'status': pool.status()}
+        if isinstance(pool, TimedQueuePool):
+            with pool.metrics_lock:
+                metrics = dict(pool.metrics)
+                latencies = sorted(pool.latencies)
+            checkouts = metrics['checkouts']
+            attempts = checkouts + metrics['timeouts']
+            entry.update(
+                pool_size=pool.size(),
+                max_overflow=pool._max_overflow,
+                capacity=pool.capacity(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+                checkouts=checkouts,
+                timeouts=metrics['timeouts'],
+                peak_checked_out=metrics['peak_checked_out'],
+                # Share of checkouts that found every connection in use
+                saturation_rate=round((metrics['saturated'] + metrics['timeouts']) / attempts, 3) if attempts else 0.0,
+                wait_ms={
+                    'mean': round(1000 * metrics['wait_seconds'] / checkouts, 3) if checkouts else 0.0,
+                    'p50': round(1000 * latencies[len(latencies) // 2], 3) if latencies else 0.0,
+                    'p95': round(1000 * latencies[int(len(latencies) * 0.95)], 3) if latencies else 0.0,
+                    'max': round(1000 * metrics['max_wait_seconds'], 3),
+                },
+            )
+        stats[engine.url.render_as_string(hide_password=True)] = entry
+    return stats
@@ -2,12 +2,13 @@ import json
 import os
 
 import requests
-from flask import Blueprint, redirect, request, url_for
+from flask import Blueprint, redirect, request, session, url_for
 from flask_login import login_user, logout_user, login_required
 from oauthlib.oauth2 import WebApplicationClient
 
 from app import db
 from models import User
+from utils.session_store import regenerate_session
 
 # Google OAuth client configuration
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_OAUTH_CLIENT_ID")
@@ -135,6 +136,7 @@ def callback():
             db.session.commit()
 
         # Log in the user
+        regenerate_session(session)
         login_user(user)
         flash(f'Welcome, {user_name}! You have successfully logged in with Google.', 'success')
         return redirect(url_for("profile"))
@@ -150,4 +152,5 @@ def callback():
 def logout():
     """Log out the current user"""
     logout_user()
+    regenerate_session(session)
     return redirect(url_for("index"))
\ No newline at end of file
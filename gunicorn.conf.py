@@ -0,0 +1,54 @@
+"""
+Gunicorn settings for MyGenetics.
+
+Each worker runs TensorFlow, OpenCV and MediaPipe, whose thread pools would
+otherwise each size themselves to every core on the node. The post_fork
+hook gives every worker its CPU budget (see utils/resource_governor.py)
+before the app and those libraries are imported in it. The master hands
+each worker a slot, the index of its core slice when WORKER_CPU_PIN=1, and
+takes it back when the worker exits.
+
+With PRELOAD_MODELS=1 the app and the heavy libraries are imported once in
+the master and shared copy-on-write by the workers (see
+utils/model_preload.py).
+"""
+
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Exported so the governor divides the node's cores by the worker count
+os.environ.setdefault('WEB_CONCURRENCY', str(workers))
+
+preload_app = os.environ.get('PRELOAD_MODELS', '0') == '1'
+
+
+def when_ready(server):
+    if preload_app:
+        from utils.model_preload import preload_models
+        preload_models()
+
+
+# Core-slice slots of the live workers, tracked in the master
+_used_slots = set()
+
+
+def pre_fork(server, worker):
+    # A replacement worker takes the lowest slot a dead worker left free, so
+    # the workers keep covering distinct core slices however often they restart
+    slot = 0
+    while slot in _used_slots:
+        slot += 1
+    _used_slots.add(slot)
+    worker.slot = slot
+
+
+def child_exit(server, worker):
+    _used_slots.discard(getattr(worker, 'slot', None))
+
+
+def post_fork(server, worker):
+    from utils.resource_governor import apply_resource_limits
+    if preload_app:
+        from utils.model_preload import reset_after_fork
+        reset_after_fork()
+    apply_resource_limits(worker_index=worker.slot, workers=workers)
@@ -78,6 +78,9 @@ class Analysis(db.Model):
     recommendations = db.Column(JSON)
     measurements = db.Column(JSON)
     
+    # History pages and latest-analysis lookups (see utils/history.py)
+    __table_args__ = (db.Index('ix_analyses_user_history', user_id, analysis_date.desc(), id.desc()),)
+    
     def __repr__(self):
         return f'<Analysis {self.id} for User {self.user_id}>'
 
@@ -108,10 +111,45 @@ class BodyScan3D(db.Model):
     analysis_id = db.Column(db.Integer, db.ForeignKey('analyses.id', ondelete='SET NULL'), nullable=True)
     analysis = db.relationship('Analysis', backref=db.backref('scan', uselist=False))
     
+    __table_args__ = (db.Index('ix_body_scans_user_history', user_id, scan_date.desc(), id.desc()),)
+    
+    def previous_scan(self):
+        """The same user's most recent scan taken before this one, if any."""
+        return (BodyScan3D.query
+                .filter(BodyScan3D.user_id == self.user_id, BodyScan3D.scan_date < self.scan_date,
+                        BodyScan3D.file_path.isnot(None))
+                .order_by(BodyScan3D.scan_date.desc())
+                .first())
+    
     def __repr__(self):
         return f'<BodyScan3D {self.id} for User {self.user_id}>'
 
 
+class ScanComparison(db.Model):
+    """Model caching the alignment and change map between two 3D scans."""
+    
+    __tablename__ = 'scan_comparisons'
+    __table_args__ = (db.UniqueConstraint('baseline_scan_id', 'scan_id', name='uq_scan_comparison_pair'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Earlier scan and the scan compared against it
+    baseline_scan_id = db.Column(db.Integer, db.ForeignKey('body_scans.id', ondelete='CASCADE'), nullable=False)
+    scan_id = db.Column(db.Integer, db.ForeignKey('body_scans.id', ondelete='CASCADE'), nullable=False)
+    baseline_scan = db.relationship('BodyScan3D', foreign_keys=[baseline_scan_id])
+    scan = db.relationship('BodyScan3D', foreign_keys=[scan_id],
+                           backref=db.backref('comparisons', lazy='dynamic', passive_deletes=True))
+    
+    # Cache key of the two scan files (see utils.scan_compare.comparison_key)
+    cache_key = db.Column(db.String(64), nullable=False)
+    results = db.Column(JSON)
+    
+    def __repr__(self):
+        return f'<ScanComparison {self.baseline_scan_id} -> {self.scan_id}>'
+
+
 class WorkoutPlan(db.Model):
     """Model for storing personalized workout plans."""
     
@@ -134,6 +172,12 @@ class WorkoutPlan(db.Model):
     # Relationships
     analysis = db.relationship('Analysis', backref=db.backref('workout_plan', uselist=False))
     
+    # A user's plans, and an analysis's plan versions newest first
+    __table_args__ = (
+        db.Index('ix_workout_plans_user_history', user_id, created_at.desc(), id.desc()),
+        db.Index('ix_workout_plans_analysis_history', analysis_id, created_at.desc(), id.desc()),
+    )
+    
     def __repr__(self):
         return f'<WorkoutPlan {self.id} for User {self.user_id}>'
 
@@ -161,6 +205,8 @@ class MeasurementLog(db.Model):
     # Performance metrics
     notes = db.Column(db.Text)
     
+    __table_args__ = (db.Index('ix_measurement_logs_user_history', user_id, log_date.desc(), id.desc()),)
+    
     def __repr__(self):
         return f'<MeasurementLog {self.id} for User {self.user_id}>'
 
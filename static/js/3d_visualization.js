@@ -101,17 +101,21 @@ function initZoomControls() {
 }
 
 /**
- * Initialize the model view based on view type (front, side, measurements)
+ * Initialize the model view based on view type (front, side, measurements, 3d)
  */
 function initModelView(viewType) {
     const modelVisualization = document.querySelector('.model-visualization');
     if (!modelVisualization) return;
     
     // Clear previous content
+    stopMeshView();
     modelVisualization.innerHTML = '';
     
     // Set background image based on view type
-    if (viewType === 'front') {
+    if (viewType === '3d' && modelVisualization.dataset.lodManifest) {
+        modelVisualization.style.backgroundImage = 'none';
+        initMeshView(modelVisualization, modelVisualization.dataset.lodManifest);
+    } else if (viewType === 'front') {
         modelVisualization.style.backgroundImage = "url('/static/images/body-model-outline.svg')";
         initFrontViewMeasurements();
     } else if (viewType === 'side') {
@@ -491,4 +495,289 @@ function resetHighlights() {
     document.querySelectorAll('.measurement-point.highlight, .measurement-line.highlight, tr.highlight').forEach(element => {
         element.classList.remove('highlight');
     });
-}
\ No newline at end of file
+}
+
+/**
+ * Active 3D mesh viewer state (one per page)
+ */
+let meshViewer = null;
+
+/**
+ * Stop the 3D mesh viewer and cancel any level still downloading
+ */
+function stopMeshView() {
+    if (!meshViewer) return;
+    meshViewer.stopped = true;
+    if (meshViewer.abort) {
+        meshViewer.abort.abort();
+    }
+    meshViewer = null;
+}
+
+/**
+ * Initialize the interactive 3D model, streaming levels of detail coarse to fine.
+ *
+ * The manifest lists encoded levels from coarsest to finest. Each level is
+ * drawn as soon as it arrives, so the body appears after the first few
+ * kilobytes and sharpens as finer levels stream in.
+ */
+function initMeshView(container, manifestUrl) {
+    const canvas = document.createElement('canvas');
+    canvas.className = 'mesh-canvas';
+    canvas.style.width = '100%';
+    canvas.style.height = '100%';
+    container.appendChild(canvas);
+
+    const status = document.createElement('div');
+    status.className = 'mesh-status small text-muted text-center';
+    container.appendChild(status);
+
+    const renderer = createMeshRenderer(canvas);
+    if (!renderer) {
+        status.textContent = '3D view is not supported by this browser.';
+        return;
+    }
+
+    const viewer = {
+        stopped: false,
+        abort: typeof AbortController !== 'undefined' ? new AbortController() : null,
+        renderer: renderer
+    };
+    meshViewer = viewer;
+    initMeshRotation(canvas, renderer);
+
+    const fetchOptions = viewer.abort ? { signal: viewer.abort.signal, credentials: 'same-origin' } : { credentials: 'same-origin' };
+
+    fetch(manifestUrl, fetchOptions)
+        .then(response => {
+            if (!response.ok) throw new Error(`Manifest request failed (${response.status})`);
+            return response.json();
+        })
+        .then(manifest => {
+            // Load levels one after another so the coarse model shows first
+            return manifest.levels.reduce((previous, level) => previous.then(() => {
+                if (viewer.stopped) return null;
+                status.textContent = `Loading detail level ${level.level + 1} of ${manifest.levels.length}...`;
+                return fetch(level.url, fetchOptions)
+                    .then(response => {
+                        if (!response.ok) throw new Error(`Level request failed (${response.status})`);
+                        return response.arrayBuffer();
+                    })
+                    .then(buffer => {
+                        if (viewer.stopped) return;
+                        renderer.setMesh(decodeMeshLod(buffer), manifest.bounds);
+                        status.textContent = `${level.faces.toLocaleString()} triangles`;
+                    });
+            }), Promise.resolve());
+        })
+        .catch(error => {
+            if (viewer.stopped) return;
+            console.error('Error loading 3D model:', error);
+            status.textContent = 'Could not load the 3D model.';
+        });
+}
+
+/**
+ * Decode one level of detail from the server's binary layout.
+ *
+ * Header: 'MGLD', uint16 version, uint16 level, uint32 vertex count,
+ * uint32 triangle count, uint32 index bytes, float32[3] origin,
+ * float32[3] scale; then int16 positions and zigzag varint index deltas.
+ */
+function decodeMeshLod(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== 'MGLD') {
+        throw new Error('Not a mesh level file');
+    }
+    const vertexCount = view.getUint32(8, true);
+    const triangleCount = view.getUint32(12, true);
+    const indexBytes = view.getUint32(16, true);
+    const origin = [view.getFloat32(20, true), view.getFloat32(24, true), view.getFloat32(28, true)];
+    const scale = [view.getFloat32(32, true), view.getFloat32(36, true), view.getFloat32(40, true)];
+    const headerSize = 44;
+
+    const quantized = new Int16Array(buffer, headerSize, vertexCount * 3);
+    const positions = new Float32Array(vertexCount * 3);
+    for (let i = 0; i < positions.length; i++) {
+        const axis = i % 3;
+        positions[i] = quantized[i] / 32767 * scale[axis] + origin[axis];
+    }
+
+    let offset = headerSize + vertexCount * 6;
+    offset += (4 - offset % 4) % 4;
+    const bytes = new Uint8Array(buffer, offset, indexBytes);
+    const indices = new Uint32Array(triangleCount * 3);
+    let position = 0;
+    let previous = 0;
+    for (let i = 0; i < indices.length; i++) {
+        let value = 0;
+        let shift = 0;
+        let byte;
+        do {
+            byte = bytes[position++];
+            value += (byte & 0x7f) * Math.pow(2, shift);
+            shift += 7;
+        } while (byte & 0x80);
+        const delta = (value % 2) ? -(value + 1) / 2 : value / 2;
+        previous += delta;
+        indices[i] = previous;
+    }
+
+    return { positions: positions, indices: indices, normals: computeVertexNormals(positions, indices) };
+}
+
+/**
+ * Area-weighted vertex normals for smooth shading
+ */
+function computeVertexNormals(positions, indices) {
+    const normals = new Float32Array(positions.length);
+    for (let i = 0; i < indices.length; i += 3) {
+        const a = indices[i] * 3;
+        const b = indices[i + 1] * 3;
+        const c = indices[i + 2] * 3;
+        const e1x = positions[b] - positions[a], e1y = positions[b + 1] - positions[a + 1], e1z = positions[b + 2] - positions[a + 2];
+        const e2x = positions[c] - positions[a], e2y = positions[c + 1] - positions[a + 1], e2z = positions[c + 2] - positions[a + 2];
+        const nx = e1y * e2z - e1z * e2y;
+        const ny = e1z * e2x - e1x * e2z;
+        const nz = e1x * e2y - e1y * e2x;
+        for (const v of [a, b, c]) {
+            normals[v] += nx;
+            normals[v + 1] += ny;
+            normals[v + 2] += nz;
+        }
+    }
+    for (let i = 0; i < normals.length; i += 3) {
+        const length = Math.hypot(normals[i], normals[i + 1], normals[i + 2]) || 1;
+        normals[i] /= length;
+        normals[i + 1] /= length;
+        normals[i + 2] /= length;
+    }
+    return normals;
+}
+
+/**
+ * Minimal WebGL renderer drawing one shaded mesh rotating about the vertical axis
+ */
+function createMeshRenderer(canvas) {
+    const gl = canvas.getContext('webgl2') || canvas.getContext('webgl');
+    if (!gl) return null;
+    const isWebGL2 = typeof WebGL2RenderingContext !== 'undefined' && gl instanceof WebGL2RenderingContext;
+    if (!isWebGL2 && !gl.getExtension('OES_element_index_uint')) return null;
+
+    const vertexSource = `
+        attribute vec3 position;
+        attribute vec3 normal;
+        uniform float angle;
+        uniform vec3 center;
+        uniform vec2 fit;
+        varying vec3 vNormal;
+        void main() {
+            float c = cos(angle);
+            float s = sin(angle);
+            vec3 p = position - center;
+            vec3 r = vec3(c * p.x + s * p.z, p.y, -s * p.x + c * p.z);
+            vNormal = vec3(c * normal.x + s * normal.z, normal.y, -s * normal.x + c * normal.z);
+            gl_Position = vec4(r.x * fit.x, r.y * fit.y, -r.z * fit.y * 0.5, 1.0);
+        }`;
+    const fragmentSource = `
+        precision mediump float;
+        varying vec3 vNormal;
+        void main() {
+            vec3 light = normalize(vec3(0.3, 0.6, 1.0));
+            float shade = 0.25 + 0.75 * max(dot(normalize(vNormal), light), 0.0);
+            gl_FragColor = vec4(vec3(0.16, 0.71, 0.96) * shade, 1.0);
+        }`;
+
+    function compile(type, source) {
+        const shader = gl.createShader(type);
+        gl.shaderSource(shader, source);
+        gl.compileShader(shader);
+        return shader;
+    }
+    const program = gl.createProgram();
+    gl.attachShader(program, compile(gl.VERTEX_SHADER, vertexSource));
+    gl.attachShader(program, compile(gl.FRAGMENT_SHADER, fragmentSource));
+    gl.linkProgram(program);
+    if (!gl.getProgramParameter(program, gl.LINK_STATUS)) return null;
+    gl.useProgram(program);
+
+    const buffers = {
+        position: gl.createBuffer(),
+        normal: gl.createBuffer(),
+        index: gl.createBuffer()
+    };
+    const uniforms = {
+        angle: gl.getUniformLocation(program, 'angle'),
+        center: gl.getUniformLocation(program, 'center'),
+        fit: gl.getUniformLocation(program, 'fit')
+    };
+    const state = { count: 0, angle: 0, center: [0, 0, 0], height: 1 };
+
+    function bindAttribute(name, buffer, data) {
+        const location = gl.getAttribLocation(program, name);
+        gl.bindBuffer(gl.ARRAY_BUFFER, buffer);
+        gl.bufferData(gl.ARRAY_BUFFER, data, gl.STATIC_DRAW);
+        gl.enableVertexAttribArray(location);
+        gl.vertexAttribPointer(location, 3, gl.FLOAT, false, 0, 0);
+    }
+
+    function draw() {
+        const width = canvas.clientWidth;
+        const height = canvas.clientHeight;
+        if (canvas.width !== width || canvas.height !== height) {
+            canvas.width = width;
+            canvas.height = height;
+        }
+        gl.viewport(0, 0, canvas.width, canvas.height);
+        gl.clearColor(0, 0, 0, 0);
+        gl.clear(gl.COLOR_BUFFER_BIT | gl.DEPTH_BUFFER_BIT);
+        if (!state.count) return;
+        gl.enable(gl.DEPTH_TEST);
+        const fitY = 1.9 / state.height;
+        gl.uniform1f(uniforms.angle, state.angle);
+        gl.uniform3fv(uniforms.center, state.center);
+        gl.uniform2f(uniforms.fit, fitY * canvas.height / Math.max(canvas.width, 1), fitY);
+        gl.drawElements(gl.TRIANGLES, state.count, gl.UNSIGNED_INT, 0);
+    }
+
+    return {
+        setMesh(mesh, bounds) {
+            bindAttribute('position', buffers.position, mesh.positions);
+            bindAttribute('normal', buffers.normal, mesh.normals);
+            gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, buffers.index);
+            gl.bufferData(gl.ELEMENT_ARRAY_BUFFER, mesh.indices, gl.STATIC_DRAW);
+            state.count = mesh.indices.length;
+            if (bounds) {
+                state.center = [0, 1, 2].map(axis => (bounds[0][axis] + bounds[1][axis]) / 2);
+                state.height = Math.max(bounds[1][1] - bounds[0][1], 1e-6);
+            }
+            draw();
+        },
+        rotate(delta) {
+            state.angle += delta;
+            draw();
+        },
+        draw: draw
+    };
+}
+
+/**
+ * Rotate the 3D model by dragging horizontally
+ */
+function initMeshRotation(canvas, renderer) {
+    let lastX = null;
+    canvas.addEventListener('pointerdown', event => {
+        lastX = event.clientX;
+        canvas.setPointerCapture(event.pointerId);
+    });
+    canvas.addEventListener('pointermove', event => {
+        if (lastX === null) return;
+        renderer.rotate((event.clientX - lastX) * 0.01);
+        lastX = event.clientX;
+    });
+    canvas.addEventListener('pointerup', () => {
+        lastX = null;
+    });
+    window.addEventListener('resize', () => renderer.draw());
+}
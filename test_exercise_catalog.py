@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+from itertools import product
+
+from utils.exercise_catalog import DIFFICULTY_LEVELS, get_exercise_catalog
+from utils.workout_planner import WorkoutPlanner
+
+WEAK_POINTS = ('arm_development', 'back_width', 'chest_development', 'fat_loss',
+               'leg_development', 'shoulder_width')
+
+
+def test_experience_masks_are_cumulative():
+    catalog = get_exercise_catalog()
+    previous = 0
+    for level in DIFFICULTY_LEVELS:
+        mask = catalog.mask(experience=level)
+        # Every easier exercise stays available, and this level adds its own
+        assert mask & previous == previous
+        assert {record.difficulty for record in catalog.records_in(mask)} == set(
+            DIFFICULTY_LEVELS[:DIFFICULTY_LEVELS.index(level) + 1])
+        previous = mask
+    assert previous == catalog.all
+    # Unknown experience levels do not filter
+    assert catalog.mask(experience='expert') == catalog.all
+    print(f"Experience masks are cumulative over {len(catalog)} exercises")
+
+
+def test_criteria_intersect():
+    catalog = get_exercise_catalog()
+    checked = 0
+    for experience, primary, equipment in product(
+            DIFFICULTY_LEVELS, catalog.values('primary'), (None, 'barbell', ('dumbbell', 'machine'))):
+        selected = catalog.select(experience=experience, primary=primary, equipment=equipment)
+        allowed = DIFFICULTY_LEVELS[:DIFFICULTY_LEVELS.index(experience) + 1]
+        equipments = (equipment,) if isinstance(equipment, str) else equipment
+        expected = tuple(record for record in catalog.records
+                         if record.difficulty in allowed and record.primary == primary
+                         and (equipments is None or record.equipment in equipments))
+        assert selected == expected
+        assert catalog.mask(experience=experience, primary=primary, equipment=equipment) == (
+            catalog.mask(experience=experience) & catalog.mask(primary=primary) & catalog.mask(equipment=equipment))
+        checked += 1
+    assert catalog.select(primary='chest', emphasis='leg_development') == ()
+    try:
+        catalog.mask(sets=3)
+        assert False, "Unindexed attributes must be rejected"
+    except KeyError:
+        pass
+    print(f"Criteria intersect for {checked} selections")
+
+
+def test_day_builders_get_candidates():
+    planner = WorkoutPlanner()
+    pools = []
+    candidates = planner._candidates
+
+    def recording(experience, specialization=None, **criteria):
+        pool = candidates(experience, specialization, **criteria)
+        pools.append(((experience, specialization, criteria), pool))
+        return pool
+
+    planner._candidates = recording
+    for experience, weak_point, high_body_fat in product(DIFFICULTY_LEVELS, WEAK_POINTS, (False, True)):
+        weak_points = [weak_point]
+        days = (planner.create_push_day(weak_points, experience, high_body_fat),
+                planner.create_pull_day(weak_points, experience, high_body_fat),
+                planner.create_leg_day(weak_points, experience, high_body_fat),
+                planner.create_leg_day(weak_points, experience, high_body_fat, posterior_chain_focus=True))
+        assert all(days)
+    empty = [selection for selection, pool in pools if not pool]
+    assert not empty, f"Empty candidate pools: {empty}"
+    print(f"Day builders got a non-empty pool for all {len(pools)} selections")
+
+
+if __name__ == "__main__":
+    test_experience_masks_are_cumulative()
+    test_criteria_intersect()
+    test_day_builders_get_candidates()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from utils.mesh_io import Mesh, MeshFormatError, load_mesh, sniff_mesh_header
+
+
+def box_mesh(width, height, depth):
+    """Closed, outward-wound box with its base centred on the origin."""
+    x, y, z = width / 2.0, height, depth / 2.0
+    vertices = np.array([[-x, 0, -z], [x, 0, -z], [x, y, -z], [-x, y, -z],
+                         [-x, 0, z], [x, 0, z], [x, y, z], [-x, y, z]], dtype=np.float32)
+    faces = np.array([[0, 2, 1], [0, 3, 2], [4, 5, 6], [4, 6, 7], [0, 1, 5], [0, 5, 4],
+                      [3, 7, 6], [3, 6, 2], [0, 4, 7], [0, 7, 3], [1, 2, 6], [1, 6, 5]])
+    return Mesh(vertices, faces)
+
+
+def cylinder_mesh(radius, height, segments=64):
+    """Closed, outward-wound upright cylinder (a prism over a regular polygon)."""
+    angles = 2 * np.pi * np.arange(segments) / segments
+    ring = np.stack([radius * np.cos(angles), np.zeros(segments), -radius * np.sin(angles)], axis=1)
+    top = ring + [0, height, 0]
+    vertices = np.vstack([ring, top, [[0, 0, 0], [0, height, 0]]])
+    i = np.arange(segments)
+    j = (i + 1) % segments
+    bottom_center, top_center = 2 * segments, 2 * segments + 1
+    faces = np.vstack([
+        np.stack([i, j, segments + j], axis=1),
+        np.stack([i, segments + j, segments + i], axis=1),
+        np.stack([np.full(segments, bottom_center), j, i], axis=1),
+        np.stack([np.full(segments, top_center), segments + i, segments + j], axis=1),
+    ])
+    return Mesh(vertices, faces)
+
+
+def polygon_perimeter(radius, segments):
+    return 2 * segments * radius * np.sin(np.pi / segments)
+
+
+def write_binary_stl(path, mesh):
+    corners = mesh.vertices[mesh.faces]
+    with open(path, 'wb') as handle:
+        handle.write(b'\0' * 80 + struct.pack('<I', mesh.face_count))
+        for triangle in corners:
+            handle.write(struct.pack('<12fH', 0, 0, 0, *triangle.ravel(), 0))
+
+
+def write_ascii_stl(path, mesh):
+    lines = ['solid test']
+    for triangle in mesh.vertices[mesh.faces]:
+        lines += ['facet normal 0 0 0', 'outer loop']
+        lines += [f'vertex {x} {y} {z}' for x, y, z in triangle]
+        lines += ['endloop', 'endfacet']
+    lines.append('endsolid test')
+    with open(path, 'w') as handle:
+        handle.write('\n'.join(lines) + '\n')
+
+
+def ply_header(mesh, file_format):
+    return (f"ply\nformat {file_format} 1.0\ncomment test\nelement vertex {mesh.vertex_count}\n"
+            "property float x\nproperty float y\nproperty float z\n"
+            f"element face {mesh.face_count}\nproperty list uchar int vertex_indices\nend_header\n").encode('ascii')
+
+
+def write_ply(path, mesh, file_format):
+    with open(path, 'wb') as handle:
+        handle.write(ply_header(mesh, file_format))
+        if file_format == 'ascii':
+            body = [' '.join(str(value) for value in vertex) for vertex in mesh.vertices.tolist()]
+            body += ['3 ' + ' '.join(str(index) for index in face) for face in mesh.faces.tolist()]
+            handle.write(('\n'.join(body) + '\n').encode('ascii'))
+        else:
+            order = '<' if file_format == 'binary_little_endian' else '>'
+            handle.write(mesh.vertices.astype(order + 'f4').tobytes())
+            records = np.zeros(mesh.face_count, dtype=[('n', 'u1'), ('indices', order + 'i4', (3,))])
+            records['n'] = 3
+            records['indices'] = mesh.faces
+            handle.write(records.tobytes())
+
+
+def same_triangles(a, b):
+    """Whether two meshes hold the same triangles, whatever the vertex numbering."""
+    def triangles(mesh):
+        corners = np.round(mesh.vertices[mesh.faces], 4)
+        return sorted(map(tuple, corners.reshape(len(corners), 9).tolist()))
+    return triangles(a) == triangles(b)
+
+
+def test_stl_and_ply_round_trips():
+    mesh = box_mesh(30, 170, 20)
+    with tempfile.TemporaryDirectory() as directory:
+        writers = {
+            'binary.stl': write_binary_stl,
+            'ascii.stl': write_ascii_stl,
+            'little.ply': lambda path, mesh: write_ply(path, mesh, 'binary_little_endian'),
+            'big.ply': lambda path, mesh: write_ply(path, mesh, 'binary_big_endian'),
+            'ascii.ply': lambda path, mesh: write_ply(path, mesh, 'ascii'),
+        }
+        for name, write in writers.items():
+            path = os.path.join(directory, name)
+            write(path, mesh)
+            loaded = load_mesh(path)
+            # STL is a triangle soup; welding must restore the 8 shared corners
+            assert loaded.vertex_count == 8 and loaded.face_count == 12, name
+            assert same_triangles(loaded, mesh), name
+            with open(path, 'rb') as handle:
+                head = handle.read()
+            sniff_mesh_header(head, len(head), os.path.splitext(name)[1])
+
+        # A binary STL whose size disagrees with its triangle count
+        path = os.path.join(directory, 'binary.stl')
+        with open(path, 'rb') as handle:
+            head = handle.read()
+        try:
+            sniff_mesh_header(head, len(head) - 1, '.stl')
+            assert False, "Truncated binary STL must be rejected"
+        except MeshFormatError:
+            pass
+    print(f"STL and PLY round trips preserve all {len(writers)} encodings")
+
+
+def test_malformed_ply_headers():
+    header = ply_header(box_mesh(1, 1, 1), 'binary_little_endian')
+    malformed = {
+        'unknown property type': header.replace(b'property float x', b'property float128 x'),
+        'non-numeric count': header.replace(b'element vertex 8', b'element vertex abc'),
+        'missing count': header.replace(b'element face 12', b'element face'),
+        'unknown list type': header.replace(b'list uchar int', b'list uchar int96'),
+        'no magic number': header[4:],
+        'unterminated': header.replace(b'end_header\n', b''),
+        'no faces': header[:header.index(b'element face')] + b'end_header\n',
+        'unknown format': header.replace(b'binary_little_endian', b'binary_middle_endian'),
+    }
+    for problem, head in malformed.items():
+        try:
+            sniff_mesh_header(head, 1000, '.ply')
+            assert False, f"PLY header with {problem} must be rejected"
+        except MeshFormatError:
+            pass
+    print(f"{len(malformed)} malformed PLY headers are rejected with MeshFormatError")
+
+
+if __name__ == "__main__":
+    test_stl_and_ply_round_trips()
+    test_malformed_ply_headers()
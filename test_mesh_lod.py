@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from test_mesh_geometry import cylinder_mesh
+from utils.mesh_lod import _decode_zigzag_varints, _zigzag_varints, decode_lod, encode_lod
+
+
+def test_lod_varints_and_levels():
+    values = np.array([0, 1, -1, 63, -64, 64, -65, 8191, -8192, 2 ** 20, -(2 ** 27), 2 ** 31 - 1, -(2 ** 31)])
+    encoded = _zigzag_varints(values)
+    # Zigzag keeps small magnitudes in one byte whatever their sign
+    assert list(encoded[:5]) == [0, 2, 1, 126, 127]
+    assert list(_zigzag_varints(np.array([64]))) == [0x80, 0x01]
+    assert np.array_equal(_decode_zigzag_varints(encoded.tobytes(), len(values)), values)
+
+    mesh = cylinder_mesh(15, 170, 48)
+    data = encode_lod(mesh.vertices, mesh.faces, level=2)
+    vertices, faces = decode_lod(data)
+    assert faces.shape == mesh.faces.shape
+    # Quantization error is at most half a step of the int16 grid
+    assert np.abs(vertices[faces] - mesh.vertices[mesh.faces]).max() <= 170 / 32767
+    try:
+        decode_lod(b'XXXX' + data[4:])
+        assert False, "Data without the LOD magic must be rejected"
+    except ValueError:
+        pass
+    print(f"LOD varints and levels decode ({len(data)} bytes for {len(faces)} triangles)")
+
+
+if __name__ == "__main__":
+    test_lod_varints_and_levels()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from test_mesh_geometry import box_mesh
+from utils.mesh_render import BACKGROUND_BGR, render_view
+
+
+def test_rendered_silhouette():
+    mesh = box_mesh(40, 100, 20)
+    width, height = 200, 400
+    # The body fills 90% of the image height: 3.6 pixels per centimeter
+    for view, expected_width in (('front', 40 * 3.6), ('side', 20 * 3.6)):
+        image = render_view(mesh, view, (width, height))
+        assert image.shape == (height, width, 3)
+        covered = np.any(image != BACKGROUND_BGR, axis=2)
+        rows, columns = np.nonzero(covered)
+        assert abs((columns.max() - columns.min() + 1) - expected_width) <= 2, view
+        assert abs((rows.max() - rows.min() + 1) - 360) <= 2, view
+        assert abs(covered.sum() - expected_width * 360) <= 0.02 * expected_width * 360, view
+    print("Rendered silhouettes match the box's projected size")
+
+
+if __name__ == "__main__":
+    test_rendered_silhouette()
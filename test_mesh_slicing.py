@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from test_mesh_geometry import cylinder_mesh, polygon_perimeter
+from utils.mesh_slicing import measure_circumferences, slice_mesh
+
+
+def test_cylinder_circumferences():
+    segments = 64
+    cylinder = cylinder_mesh(15, 170, segments)
+    expected = polygon_perimeter(15, segments)
+    contours = slice_mesh(cylinder, np.array([10.25, 85.25, 160.25]))
+    assert len(contours['plane']) == 3
+    assert np.allclose(contours['perimeter'], expected, atol=1e-3)
+    assert np.allclose(contours['centroid_x'], 0, atol=1e-3)
+    assert len(slice_mesh(cylinder, np.array([200.0]))['plane']) == 0
+
+    circumferences = measure_circumferences(cylinder)
+    for name in ('neck_circumference', 'chest_circumference', 'waist_circumference', 'hip_circumference'):
+        assert abs(circumferences[name]['value'] - expected) <= 0.1, (name, circumferences[name])
+    print(f"Cylinder circumferences match ({expected:.2f} cm)")
+
+
+if __name__ == "__main__":
+    test_cylinder_circumferences()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from test_mesh_geometry import box_mesh, cylinder_mesh
+from utils.mesh_io import Mesh
+from utils.mesh_volume import mesh_volume
+
+
+def test_volumes_of_known_solids():
+    assert abs(mesh_volume(box_mesh(30, 170, 20)) - 30 * 170 * 20 / 1000.0) < 1e-6
+    segments = 64
+    cylinder = cylinder_mesh(15, 170, segments)
+    # A prism over a regular polygon: (segments / 2) r^2 sin(2 pi / segments) h
+    expected = segments / 2 * 15 ** 2 * np.sin(2 * np.pi / segments) * 170 / 1000.0
+    assert abs(mesh_volume(cylinder) - expected) < 1e-3
+    # Winding does not change the magnitude
+    assert abs(mesh_volume(Mesh(cylinder.vertices, cylinder.faces[:, ::-1])) - expected) < 1e-3
+    assert mesh_volume(Mesh(np.zeros((0, 3)), np.zeros((0, 3)))) == 0.0
+    print(f"Box and cylinder volumes match ({expected:.2f} L)")
+
+
+if __name__ == "__main__":
+    test_volumes_of_known_solids()
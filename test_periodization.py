@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+from utils.periodization import (DELOAD_LOAD, DELOAD_VOLUME, LOADING_WEEKS, PROGRESSIONS, assess_week,
+                                 extend_deltas, log_progress, plan_mesocycle)
+
+
+def phases(deltas):
+    return ''.join(delta['phase'][0].upper() for delta in deltas)
+
+
+def test_deload_after_loading_weeks():
+    profile = PROGRESSIONS['muscle_gain']
+    for experience, expected in (('intermediate', 'LLLDLLLDLLLD'), ('beginner', 'LLLLLDLLLLLD')):
+        assert LOADING_WEEKS[experience] == expected.index('D')
+        deltas = extend_deltas([], 12, experience, 'muscle_gain')
+        assert [delta['week'] for delta in deltas] == list(range(1, 13))
+        assert phases(deltas) == expected, (experience, phases(deltas))
+
+        block = LOADING_WEEKS[experience]
+        for before, delta in zip(deltas, deltas[1:block]):
+            assert delta['load'] == before['load'] + profile['load_step']
+            assert delta['volume'] == min(profile['max_volume'], round(before['volume'] + profile['volume_step'], 2))
+        deload = deltas[block]
+        assert deload['volume'] == DELOAD_VOLUME and deload['load'] == round(deltas[block - 1]['load'] * DELOAD_LOAD, 1)
+        # The next block starts one step above the first
+        assert deltas[block + 1]['load'] == 100.0 + profile['block_step']
+    print("Deloads follow 3 intermediate and 5 beginner loading weeks")
+
+
+def test_missed_week_deloads_early():
+    assert assess_week({'rpe': 7.5}, 0.5) == 'deload'
+    assert assess_week({'rpe': 7.5}, 0.8) == 'hold'
+    assert assess_week({'rpe': 7.5}, 1.0, rpe=8.5) == 'hold'
+    assert assess_week({'rpe': 7.5}, 1.0, rpe=6.0) == 'push'
+    assert assess_week({'rpe': 7.5}, 0.95, rpe=7.5) is None
+
+    mesocycle = plan_mesocycle('intermediate', 'muscle_gain')
+    logged = log_progress(mesocycle, 2, completion=0.5)
+    assert logged['progress'] == [{'week': 2, 'completion': 0.5, 'adjustment': 'deload'}]
+    # Week 3 deloads instead of loading, and the cut-short block is repeated from its start
+    assert phases(logged['deltas']) == 'LLDLLLDL'
+    assert logged['deltas'][2]['load'] == round(mesocycle['deltas'][1]['load'] * DELOAD_LOAD, 1)
+    assert logged['deltas'][3]['load'] == mesocycle['deltas'][0]['load']
+    print("A missed week triggers an early deload and repeats the block")
+
+
+def test_only_later_weeks_are_regenerated():
+    mesocycle = plan_mesocycle('beginner', 'muscle_gain')
+    # A marker on an earlier week shows it is kept, not regenerated
+    mesocycle['deltas'][1] = dict(mesocycle['deltas'][1], load=101.0)
+    original = [dict(delta) for delta in mesocycle['deltas']]
+
+    pushed = log_progress(mesocycle, 4, completion=1.0, rpe=6.5)
+    assert pushed['progress'][0]['adjustment'] == 'push'
+    assert pushed['deltas'][:4] == original[:4]
+    assert pushed['deltas'][4]['load'] == original[3]['load'] + 2 * PROGRESSIONS['muscle_gain']['load_step']
+    assert pushed['deltas'][4:] != original[4:]
+    # The stored mesocycle is not modified
+    assert mesocycle['deltas'] == original and mesocycle['progress'] == []
+
+    # Logging the same week again replaces its entry
+    relogged = log_progress(pushed, 4, completion=1.0)
+    assert [entry['week'] for entry in relogged['progress']] == [4]
+    assert relogged['deltas'] == extend_deltas(original[:4], 8, 'beginner', 'muscle_gain')
+    try:
+        log_progress(mesocycle, 9, completion=1.0)
+        assert False, "Weeks outside the mesocycle must be rejected"
+    except ValueError:
+        pass
+    print("Logging a week regenerates only the weeks after it")
+
+
+if __name__ == "__main__":
+    test_deload_after_loading_weeks()
+    test_missed_week_deloads_early()
+    test_only_later_weeks_are_regenerated()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+from itertools import product
+
+from utils.bodybuilding_metrics import formulate_bodybuilding_recommendations
+from utils.recommendation_bundles import (
+    BODY_TYPES, BODYBUILDING_GOALS, EXPERIENCE_LEVELS, GENETIC_RATINGS, RATINGS, TRAITS,
+    bodybuilding_recommendations, recommendation_bundle, trait_focus, trait_strength,
+)
+from utils.recommendations import (
+    get_exercises_by_body_type, get_focus_for_trait, get_nutrition_tips,
+    get_strength_for_trait, get_training_split,
+)
+
+
+def live_bundle(body_type, traits, experience_level):
+    return {
+        'exercise_recommendations': get_exercises_by_body_type(body_type, traits, experience_level),
+        'training_split': get_training_split(body_type, experience_level),
+        'nutrition_tips': get_nutrition_tips(body_type),
+    }
+
+
+def test_recommendation_bundles_match_live_functions():
+    # Enumerated domain, plus inputs outside it that fall back to the live functions
+    body_types = BODY_TYPES + ('Unclassified',)
+    experience_levels = EXPERIENCE_LEVELS + ('expert',)
+    ratings = RATINGS + ('unrated',)
+    checked = 0
+    for body_type, experience, shoulder, arm in product(body_types, experience_levels, ratings, ratings):
+        traits = {'shoulder_width': {'rating': shoulder, 'value': 1.4}, 'arm_length': {'rating': arm}}
+        assert recommendation_bundle(body_type, traits, experience) == live_bundle(body_type, traits, experience)
+        checked += 1
+    assert recommendation_bundle('Mesomorph', {}, 'beginner') == live_bundle('Mesomorph', {}, 'beginner')
+
+    # Copies are independent of the table
+    bundle = recommendation_bundle('Mesomorph', {}, 'beginner')
+    bundle['nutrition_tips'].append('changed')
+    assert recommendation_bundle('Mesomorph', {}, 'beginner') == live_bundle('Mesomorph', {}, 'beginner')
+
+    for trait, rating in product(TRAITS + ('waist',), ratings):
+        assert trait_strength(trait, rating) == get_strength_for_trait(trait, rating)
+        assert trait_focus(trait, rating) == get_focus_for_trait(trait, rating)
+    print(f"Recommendation bundles match the live functions for {checked} inputs")
+
+
+def test_bodybuilding_bundles_match_live_functions():
+    weak_point_lists = (
+        None, [], ['arm development'], ['chest development', 'calf development'],
+        ['quad sweep', 'thigh', 'neck'], ['arm and chest'], 'arms', [['chest']],
+    )
+    body_fats = (None, 'n/a', 12, 25, 25.1, 31)
+    genetic_potentials = tuple({'rating': rating} for rating in GENETIC_RATINGS) + ({}, 'high', {'rating': 'elite'})
+    goals = BODYBUILDING_GOALS + ('general', None)
+    experiences = EXPERIENCE_LEVELS + ('expert',)
+    checked = 0
+    for weak_points, body_fat, genetic_potential, goal, experience in product(
+            weak_point_lists, body_fats, genetic_potentials, goals, experiences):
+        analysis = {'body_fat_percentage': body_fat, 'genetic_potential': genetic_potential,
+                    'muscle_balance': {'weak_points': weak_points}}
+        user_data = {'experience': experience, 'goal': goal}
+        assert (bodybuilding_recommendations(analysis, user_data)
+                == formulate_bodybuilding_recommendations(analysis, user_data))
+        checked += 1
+    for analysis, user_data in (({}, {}), (None, None), ('bad', []), ({'muscle_balance': 'bad'}, {'goal': 'fat_loss'})):
+        assert (bodybuilding_recommendations(analysis, user_data)
+                == formulate_bodybuilding_recommendations(analysis, user_data))
+    print(f"Bodybuilding bundles match the live function for {checked} inputs")
+
+
+if __name__ == "__main__":
+    test_recommendation_bundles_match_live_functions()
+    test_bodybuilding_bundles_match_live_functions()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import hashlib
+import io
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from utils import scan_upload
+from utils.scan_upload import UploadError, append_chunk, create_upload, get_upload
+
+PLY = (b"ply\nformat ascii 1.0\nelement vertex 3\nproperty float x\nproperty float y\nproperty float z\n"
+       b"element face 1\nproperty list uchar int vertex_indices\nend_header\n0 0 0\n1 0 0\n0 1 0\n3 0 1 2\n")
+
+
+@contextmanager
+def upload_dirs():
+    """Point the upload and scan storage directories at a temporary directory."""
+    directory = tempfile.mkdtemp()
+    saved = scan_upload.UPLOAD_DIR, scan_upload.SCAN_STORAGE_DIR
+    scan_upload.UPLOAD_DIR = directory + '/uploads'
+    scan_upload.SCAN_STORAGE_DIR = directory + '/scans'
+    try:
+        yield directory
+    finally:
+        scan_upload.UPLOAD_DIR, scan_upload.SCAN_STORAGE_DIR = saved
+        shutil.rmtree(directory)
+
+
+def send(upload_id, data, sizes, offset=0):
+    state = None
+    for size in sizes:
+        state = append_chunk(1, upload_id, offset, io.BytesIO(data[offset:offset + size]), size)
+        offset += size
+    return state
+
+
+def rejected(call, status):
+    try:
+        call()
+    except UploadError as e:
+        assert e.status == status, (e.status, str(e))
+        return e
+    assert False, f"Expected UploadError {status}"
+
+
+def test_header_split_across_chunks():
+    with upload_dirs():
+        state = create_upload(1, 'scan.ply', len(PLY), sha256=hashlib.sha256(PLY).hexdigest())
+        # The first chunks end before end_header, so the header is not judged yet
+        state = send(state['upload_id'], PLY, (10, 40))
+        assert state['status'] == 'uploading' and 'format' not in state
+        state = send(state['upload_id'], PLY, (len(PLY) - 50,), offset=50)
+        assert state['status'] == 'received' and state['format'] == 'ply_ascii'
+        with open(state['file_path'], 'rb') as handle:
+            assert handle.read() == PLY
+    print("PLY headers split across chunks are collected before sniffing")
+
+
+def test_malformed_headers_are_rejected():
+    with upload_dirs():
+        for bad in (PLY.replace(b'float x', b'float128 x'), PLY.replace(b'vertex 3', b'vertex abc')):
+            state = create_upload(1, 'scan.ply', len(bad))
+            # Rejected as soon as the header is complete, in whichever chunk
+            error = rejected(lambda: send(state['upload_id'], bad, (20, len(bad) - 20)), 422)
+            assert 'Invalid .ply file' in str(error)
+            rejected(lambda: get_upload(1, state['upload_id']), 404)
+    print("Malformed PLY headers are rejected with 422")
+
+
+def test_offsets_and_checksums():
+    with upload_dirs():
+        state = create_upload(1, 'scan.ply', len(PLY), sha256='0' * 64)
+        upload_id = state['upload_id']
+        send(upload_id, PLY, (100,))
+        # A chunk at the wrong offset reports where to resume
+        error = rejected(lambda: send(upload_id, PLY, (10,), offset=50), 409)
+        assert error.state['received'] == 100
+        rejected(lambda: send(upload_id, PLY, (len(PLY),), offset=100), 416)
+        # A checksum mismatch restarts the upload from the first byte
+        error = rejected(lambda: send(upload_id, PLY, (len(PLY) - 100,), offset=100), 422)
+        assert error.state['received'] == 0 and 'format' not in error.state
+        rejected(lambda: create_upload(1, 'scan.fbx', 10), 400)
+    print("Out-of-order chunks and checksum mismatches are reported for resync")
+
+
+def test_failed_registration_keeps_the_part_file():
+    with upload_dirs():
+        state = create_upload(1, 'scan.ply', len(PLY))
+        upload_id = state['upload_id']
+        send(upload_id, PLY, (100,))
+
+        def failing(file_path):
+            raise RuntimeError("database unavailable")
+
+        # The last chunk is discarded, and the upload can be finished by resending it
+        error = rejected(lambda: append_chunk(1, upload_id, 100, io.BytesIO(PLY[100:]), len(PLY) - 100,
+                                              on_complete=failing), 503)
+        assert error.state['received'] == 100 and error.state['status'] == 'uploading'
+        assert get_upload(1, upload_id)['received'] == 100
+        stored = []
+        state = append_chunk(1, upload_id, 100, io.BytesIO(PLY[100:]), len(PLY) - 100,
+                             on_complete=lambda file_path: stored.append(file_path) or {'scan_id': 7})
+        assert state['status'] == 'received' and state['scan_id'] == 7
+        assert stored == [state['file_path']]
+        with open(state['file_path'], 'rb') as handle:
+            assert handle.read() == PLY
+    print("A scan that cannot be registered keeps its part file for a resend")
+
+
+if __name__ == "__main__":
+    test_header_split_across_chunks()
+    test_malformed_headers_are_rejected()
+    test_offsets_and_checksums()
+    test_failed_registration_keeps_the_part_file()
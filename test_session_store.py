@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+from flask import Flask, session
+
+from utils.session_store import MemorySessionBackend, ServerSideSessionInterface, regenerate_session
+
+
+class RecordingBackend(MemorySessionBackend):
+    """Memory backend that records every write."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def set(self, sid, blob, expires):
+        self.writes.append(sid)
+        super().set(sid, blob, expires)
+
+
+def make_app():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    backend = RecordingBackend()
+    app.session_interface = ServerSideSessionInterface(backend)
+
+    @app.route('/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return 'ok'
+
+    @app.route('/read')
+    def read():
+        return session.get('value', 'missing')
+
+    @app.route('/touch')
+    def touch():
+        # Assigning the same nested data marks the session modified
+        session['value'] = session.get('value')
+        return 'ok'
+
+    @app.route('/bookkeeping')
+    def bookkeeping():
+        session.permanent = True
+        session['_fresh'] = True
+        return 'ok'
+
+    @app.route('/login')
+    def login():
+        regenerate_session(session)
+        session['user'] = 'alice'
+        return 'ok'
+
+    @app.route('/logout')
+    def logout():
+        session.pop('user', None)
+        regenerate_session(session)
+        return 'ok'
+
+    return app, backend
+
+
+def session_id(client):
+    cookie = client.get_cookie('session')
+    return cookie.value if cookie is not None else None
+
+
+def test_unchanged_session_is_not_rewritten():
+    app, backend = make_app()
+    client = app.test_client()
+    client.get('/set/a')
+    assert len(backend.writes) == 1
+    for path in ('/read', '/touch', '/read'):
+        assert client.get(path).status_code == 200
+    assert len(backend.writes) == 1
+    client.get('/set/b')
+    assert backend.writes == [session_id(client)] * 2
+    assert client.get('/read').get_data(as_text=True) == 'b'
+    print("Unchanged sessions are not written back")
+
+
+def test_old_id_stops_working_after_login_and_logout():
+    app, backend = make_app()
+    client = app.test_client()
+    client.get('/set/a')
+    anonymous = session_id(client)
+
+    client.get('/login')
+    signed_in = session_id(client)
+    assert signed_in not in (None, anonymous)
+    assert backend.get(anonymous) is None
+    assert client.get('/read').get_data(as_text=True) == 'a'
+
+    client.get('/logout')
+    signed_out = session_id(client)
+    assert signed_out not in (None, anonymous, signed_in)
+    assert backend.get(signed_in) is None
+
+    # A client replaying an old id gets an empty session
+    for sid in (anonymous, signed_in):
+        replay = app.test_client()
+        replay.set_cookie('session', sid)
+        assert replay.get('/read').get_data(as_text=True) == 'missing'
+    print("Signing in and out moves the session to a new id")
+
+
+def test_bookkeeping_only_session_stores_nothing():
+    app, backend = make_app()
+    client = app.test_client()
+    response = client.get('/bookkeeping')
+    assert response.status_code == 200
+    assert backend.writes == [] and backend.stats()['size'] == 0
+    assert session_id(client) is None
+
+    # Signing out leaves only bookkeeping keys: the stored session and its cookie go
+    client.get('/login')
+    assert backend.stats()['size'] == 1 and session_id(client) is not None
+    client.get('/bookkeeping')
+    client.get('/logout')
+    assert backend.stats()['size'] == 0 and session_id(client) is None
+    print("Sessions holding only bookkeeping keys are not stored")
+
+
+if __name__ == "__main__":
+    test_unchanged_session_is_not_rewritten()
+    test_old_id_stops_working_after_login_and_logout()
+    test_bookkeeping_only_session_stores_nothing()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from utils.spatial_index import VertexGrid
+
+
+def test_vertex_grid_matches_brute_force():
+    rng = np.random.default_rng(7)
+    points = rng.uniform(0, 100, size=(2000, 3))
+    queries = rng.uniform(-10, 110, size=(200, 3))
+    grid = VertexGrid(points)
+    distances, indices = grid.knn(queries, k=5)
+    brute = np.linalg.norm(queries[:, None, :] - points[None, :, :], axis=2)
+    assert np.allclose(distances, np.sort(brute, axis=1)[:, :5])
+    assert np.allclose(np.take_along_axis(brute, indices, axis=1), distances)
+
+    rows, hits = grid.radius(queries, 8.0)
+    assert sorted(zip(rows.tolist(), hits.tolist())) == sorted(zip(*np.nonzero(brute <= 8.0)))
+    lo, hi = [10, None, 40], [30, 50, 60]
+    inside = np.nonzero((points[:, 0] >= 10) & (points[:, 0] <= 30) & (points[:, 1] <= 50)
+                        & (points[:, 2] >= 40) & (points[:, 2] <= 60))[0]
+    assert sorted(grid.box(lo, hi).tolist()) == inside.tolist()
+    print("VertexGrid k-NN, radius and box queries match brute force")
+
+
+if __name__ == "__main__":
+    test_vertex_grid_matches_brute_force()
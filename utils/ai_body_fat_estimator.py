@@ -2,15 +2,23 @@ import os
 import cv2
 import numpy as np
 import logging
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
-from tensorflow.keras.models import Model
+
+from utils.embedding_index import EMBEDDING_DIM, content_hash, get_embedding_store
+from utils.resource_governor import inference_slot
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Trained weights of the body-fat regression head (Keras .weights.h5). Until
+# they exist the head is untrained and the CNN estimate is not used.
+BODY_FAT_HEAD_WEIGHTS = os.environ.get('BODY_FAT_HEAD_WEIGHTS', os.path.join(
+    os.path.dirname(__file__), 'models', 'body_fat_head.weights.h5'))
+
+
+def trained_head_available():
+    """Whether trained regression head weights are installed."""
+    return os.path.isfile(BODY_FAT_HEAD_WEIGHTS)
+
 class AIBodyFatEstimator:
     """
     AI-based body fat estimation using transfer learning with MobileNetV2.
@@ -27,12 +35,36 @@ class AIBodyFatEstimator:
     def __init__(self):
         """Initialize the AI Body Fat Estimator model"""
         self.model = None
+        self.backbone = None
+        self.head = None
+        self.is_fallback = False
+        self.head_trained = False
         self.target_size = (224, 224)  # MobileNetV2 expected input size
-        self._build_model()
+        self._model_built = False
+        
+    def get_model(self):
+        """
+        Build the MobileNetV2 model on first use
+        
+        The heuristic estimators never touch the network, so it is only
+        built when a caller actually needs it.
+        
+        Returns:
+            Keras model, or None if it could not be built
+        """
+        if not self._model_built:
+            self._model_built = True
+            self._build_model()
+        return self.model
         
     def _build_model(self):
         """Build the transfer learning model based on MobileNetV2"""
         try:
+            # TensorFlow is only needed for the network, not the heuristics
+            from tensorflow.keras.applications import MobileNetV2
+            from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Input
+            from tensorflow.keras.models import Model
+            
             # Load pre-trained MobileNetV2 model without the top classification layer
             base_model = MobileNetV2(
                 input_shape=(224, 224, 3),
@@ -43,19 +75,28 @@ class AIBodyFatEstimator:
             # Freeze the base model layers
             base_model.trainable = False
             
-            # Add custom layers for body fat estimation
-            x = base_model.output
-            x = GlobalAveragePooling2D()(x)
-            x = Dense(1024, activation='relu')(x)
+            # Backbone: pooled 1280-d features, cached per image as embeddings
+            pooled = GlobalAveragePooling2D()(base_model.output)
+            self.backbone = Model(inputs=base_model.input, outputs=pooled)
+            
+            # Head: custom layers for body fat estimation on the embedding
+            embedding = Input(shape=(EMBEDDING_DIM,))
+            x = Dense(1024, activation='relu')(embedding)
             x = Dropout(0.5)(x)
             x = Dense(512, activation='relu')(x)
             x = Dropout(0.3)(x)
             
             # Output layer - single neuron for body fat percentage regression
             predictions = Dense(1, activation='sigmoid')(x)
+            self.head = Model(inputs=embedding, outputs=predictions)
+            if trained_head_available():
+                self.head.load_weights(BODY_FAT_HEAD_WEIGHTS)
+                self.head_trained = True
+            else:
+                logger.info("No trained body fat head weights; CNN estimates disabled")
             
             # Create the complete model
-            self.model = Model(inputs=base_model.input, outputs=predictions)
+            self.model = Model(inputs=base_model.input, outputs=self.head(pooled))
             
             # Compile the model
             self.model.compile(
@@ -132,6 +173,66 @@ class AIBodyFatEstimator:
                 'method': 'fallback_due_to_error'
             }
     
+    def estimate_body_fat_cnn(self, image, landmarks=None):
+        """
+        Estimate body fat with the MobileNetV2 regression model
+        
+        The abdominal region is used when landmarks allow extracting it,
+        otherwise the whole image. Only used with trained head weights
+        (BODY_FAT_HEAD_WEIGHTS); a randomly initialized head would give
+        arbitrary, per-process estimates.
+        
+        Args:
+            image: OpenCV image (numpy array)
+            landmarks: Optional MediaPipe pose landmarks
+            
+        Returns:
+            Body fat estimation dictionary, or None if the model or its
+            trained head is unavailable
+        """
+        if self.get_model() is None or not self.head_trained:
+            return None
+        region = None
+        if landmarks and self._has_valid_torso_landmarks(landmarks):
+            region = self._extract_abdominal_roi(image, landmarks)
+        embedding = self.get_embedding(region if region is not None else image)
+        with inference_slot():
+            score = float(self.head.predict(embedding[None, :], verbose=0)[0][0])
+        return {
+            'body_fat_percentage': 4.0 + score * 36.0,  # sigmoid output mapped to 4-40%
+            'confidence': 0.5,
+            'method': 'mobilenet_regression'
+        }
+    
+    def get_embedding(self, image, owner_id=None):
+        """
+        Pooled MobileNetV2 features of an image, computed once per image
+        
+        Embeddings are stored keyed by a hash of the pixels, so analysing
+        the same photo again skips the backbone entirely.
+        
+        Args:
+            image: OpenCV image (numpy array)
+            owner_id: Optional id of the user the photo belongs to, making
+                it searchable for similar physiques
+            
+        Returns:
+            float32 embedding vector, or None if the model is unavailable
+        """
+        store = get_embedding_store()
+        key = content_hash(image)
+        embedding = store.get(key)
+        if embedding is not None:
+            if owner_id is not None:
+                store.add(key, embedding, owner=owner_id)
+            return embedding
+        if self.get_model() is None:
+            return None
+        with inference_slot():
+            embedding = self.backbone.predict(self.preprocess_image(image), verbose=0)[0]
+        store.add(key, embedding, owner=owner_id)
+        return store.get(key)
+    
     def _estimate_body_fat_advanced(self, image, landmarks=None, height_cm=0.0, weight_kg=0.0):
         """
         Advanced approach using computer vision and deep learning techniques
@@ -74,7 +74,10 @@ def analyze_body_traits(landmarks=None, original_image=None, height_cm=None, wei
         age: Age in years
         experience: User's fitness experience level (e.g., 'beginner', 'intermediate', 'advanced')
         is_back_view: Boolean indicating if the image is a back view
-        **kwargs: Additional keyword arguments for flexibility
+        **kwargs: Additional keyword arguments for flexibility, e.g.
+            'waist_cm'/'neck_cm'/'hip_cm' for the Navy formula, or a
+            'body_fat_estimate' the caller already got from
+            estimate_body_fat_cascade, which is then not run again
         
     Returns:
         dict: Dictionary of body traits and metrics
@@ -93,46 +96,45 @@ def analyze_body_traits(landmarks=None, original_image=None, height_cm=None, wei
         else:
             bmi = 22.0  # Default healthy BMI
             
-        # Calculate body fat percentage using Navy Method or BMI formula
-            
+        # Estimate body fat with the cheapest sufficient estimators: the
+        # image-based ones only run when the formulas are uncertain
+        sex_value = 1 if gender.lower() == 'male' else 0
         try:
-            from utils.navy_body_fat import calculate_body_fat_navy_derived
-            from utils.bodybuilding_metrics import calculate_body_fat_percentage
-            
-            # Get measurements from landmarks if available
-            waist_cm = None
-            neck_cm = None
-            hip_cm = None
+            from utils.body_fat_cascade import estimate_body_fat_cascade
             
-            # If we have measurements from landmarks, use them
-            if landmarks is not None:
-                # This would extract measurements from landmarks
-                # For now, we'll use default calculations
-                pass
-                
-            # Try to get body fat using Navy method first
-            if all(x is not None for x in [height_cm, weight_kg, waist_cm, neck_cm]):
-                if gender.lower() == 'female' and hip_cm is not None:
-                    body_fat, method = calculate_body_fat_navy_derived(
-                        gender, height_cm, weight_kg, waist_cm, neck_cm, hip_cm
-                    )
-                else:
-                    body_fat, method = calculate_body_fat_navy_derived(
-                        gender, height_cm, weight_kg, waist_cm, neck_cm
-                    )
-                logger.debug(f"Body fat calculated using {method}: {body_fat:.1f}%")
-            else:
-                # Fall back to BMI-based estimation
-                sex_value = 1 if gender.lower() == 'male' else 0
-                body_fat, lean_mass = calculate_body_composition(weight_kg, height_m, age, sex_value)
-                logger.debug(f"Body fat calculated using BMI method: {body_fat:.1f}%")
+            estimate = kwargs.get('body_fat_estimate')
+            if estimate is None:
+                estimate = estimate_body_fat_cascade({
+                    'weight_kg': weight_kg,
+                    'height_cm': height_cm,
+                    'age': age,
+                    'gender': gender,
+                    'waist_cm': kwargs.get('waist_cm'),
+                    'neck_cm': kwargs.get('neck_cm'),
+                    'hip_cm': kwargs.get('hip_cm'),
+                    'landmarks': landmarks,
+                    'image': original_image,
+                })
+            if estimate is None:
+                raise ValueError("No body fat estimator applies to these inputs")
+            body_fat = estimate['body_fat_percentage']
+            logger.debug(f"Body fat calculated using {estimate['method']}: {body_fat:.1f}% "
+                         f"(+/- {estimate['uncertainty']:.1f}, skipped {estimate['skipped']})")
                 
         except Exception as e:
             logger.error(f"Error calculating body fat: {str(e)}")
             # Use BMI-based method as fallback
-            sex_value = 1 if gender.lower() == 'male' else 0
             body_fat, lean_mass = calculate_body_composition(weight_kg, height_m, age, sex_value)
             
+        # Index the photo for similar-physique search; the embedding is
+        # cached, so re-analysing the same photo skips the backbone
+        if original_image is not None and kwargs.get('user_id') is not None:
+            try:
+                from utils.ai_body_fat_estimator import get_body_fat_estimator
+                get_body_fat_estimator().get_embedding(original_image, owner_id=kwargs['user_id'])
+            except Exception as e:
+                logger.warning(f"Could not store physique embedding: {str(e)}")
+            
         # Ensure body fat is within physiological ranges
         body_fat = max(3.0, min(45.0, body_fat))
         lean_mass = 100 - body_fat
@@ -0,0 +1,314 @@
+"""
+Cost-aware cascade over the body-fat estimators.
+
+The app can estimate body fat in several ways whose cost differs by four
+orders of magnitude: closed-form BMI and Navy formulas run in microseconds,
+the landmark heuristics in well under a millisecond, while the abdominal
+texture analysis and the MobileNetV2 model need the photo and tens to
+hundreds of milliseconds. Each estimator is registered here with its
+declared cost, its typical error (standard deviation in body-fat
+percentage points) and the inputs it needs.
+
+``estimate_body_fat_cascade`` runs the applicable estimators cheapest first
+and fuses their results with inverse-variance weights. It stops as soon as
+the fused uncertainty is below the target and the estimates so far agree,
+so image models only run when the cheap formulas are uncertain or disagree.
+
+Every run updates per-estimator counters (invocations, skips, time spent)
+and an estimate of the time saved by early exits, based on the measured
+mean run time of each skipped estimator.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Stop once the fused standard deviation is at or below this (% body fat)
+TARGET_UNCERTAINTY = 3.0
+
+# Estimates further apart than this are treated as disagreeing (% body fat)
+AGREEMENT_TOLERANCE = 4.0
+
+# Lowest confidence used when scaling an estimator's declared uncertainty
+MIN_CONFIDENCE = 0.25
+
+# Physiological bounds applied to every estimate
+BODY_FAT_RANGE = (3.0, 45.0)
+
+# Registered estimators keyed by name
+_ESTIMATORS = OrderedDict()
+_STATS_LOCK = threading.Lock()
+_cascade_stats = {'runs': 0, 'early_exits': 0, 'time_saved_seconds': 0.0}
+
+
+class RegisteredEstimator:
+    """
+    A body-fat estimator with its declared cost and accuracy.
+
+    Attributes:
+        name: Registry key
+        func: Callable taking the inputs dictionary and returning a body
+            fat percentage, a dict with 'body_fat_percentage' (and optionally
+            'confidence', 'uncertainty' and 'method'), or None when it cannot
+            produce an estimate for these inputs
+        cost_ms: Expected run time, used to order the cascade
+        uncertainty: Typical error as a standard deviation (% body fat)
+        requires: Input keys that must be present and truthy
+    """
+
+    def __init__(self, name, func, cost_ms, uncertainty, requires=()):
+        self.name = name
+        self.func = func
+        self.cost_ms = cost_ms
+        self.uncertainty = uncertainty
+        self.requires = tuple(requires)
+        self.available = True
+        self.invocations = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+
+    def applies_to(self, inputs):
+        return self.available and all(self._present(inputs.get(key)) for key in self.requires)
+
+    @staticmethod
+    def _present(value):
+        if value is None:
+            return False
+        if hasattr(value, 'size'):
+            # Images are arrays, whose truth value is ambiguous
+            return value.size > 0
+        return bool(value)
+
+    def mean_seconds(self):
+        """Measured mean run time, or the declared cost before the first run."""
+        if self.invocations:
+            return self.total_seconds / self.invocations
+        return self.cost_ms / 1000.0
+
+    def stats(self):
+        return {
+            'cost_ms': self.cost_ms,
+            'uncertainty': self.uncertainty,
+            'available': self.available,
+            'invocations': self.invocations,
+            'skipped': self.skipped,
+            'mean_ms': round(1000.0 * self.mean_seconds(), 3),
+            'total_seconds': round(self.total_seconds, 3),
+        }
+
+
+def register_estimator(name, cost_ms, uncertainty, requires=(), available=True):
+    """
+    Decorator registering a body-fat estimator with the cascade.
+
+    Args:
+        name: Unique estimator name
+        cost_ms: Expected run time in milliseconds
+        uncertainty: Typical error as a standard deviation (% body fat)
+        requires: Input keys the estimator needs (e.g. 'image', 'landmarks')
+        available: False registers the estimator without ever running it
+
+    Returns:
+        Decorator returning the function unchanged
+    """
+    def decorator(func):
+        estimator = RegisteredEstimator(name, func, cost_ms, uncertainty, requires)
+        estimator.available = available
+        _ESTIMATORS[name] = estimator
+        return func
+    return decorator
+
+
+def _fuse(estimates):
+    """Inverse-variance weighted mean and its standard deviation."""
+    weights = [1.0 / (entry['uncertainty'] ** 2) for entry in estimates]
+    total = sum(weights)
+    mean = sum(w * entry['body_fat_percentage'] for w, entry in zip(weights, estimates)) / total
+    return mean, total ** -0.5
+
+
+def _run(estimator, inputs):
+    """Run one estimator and normalize its result, or return None."""
+    start = time.perf_counter()
+    try:
+        result = estimator.func(inputs)
+    except ImportError as e:
+        # Optional dependency missing: never try this estimator again
+        logger.warning(f"Body fat estimator '{estimator.name}' unavailable: {str(e)}")
+        estimator.available = False
+        return None
+    except Exception as e:
+        logger.error(f"Body fat estimator '{estimator.name}' failed: {str(e)}")
+        result = None
+    elapsed = time.perf_counter() - start
+    with _STATS_LOCK:
+        estimator.invocations += 1
+        estimator.total_seconds += elapsed
+
+    if result is None:
+        return None
+    if not isinstance(result, dict):
+        result = {'body_fat_percentage': result}
+    value = result.get('body_fat_percentage')
+    if value is None:
+        return None
+    confidence = max(MIN_CONFIDENCE, min(1.0, float(result.get('confidence', 1.0))))
+    return {
+        'estimator': estimator.name,
+        'method': result.get('method', estimator.name),
+        'body_fat_percentage': max(BODY_FAT_RANGE[0], min(BODY_FAT_RANGE[1], float(value))),
+        'uncertainty': float(result.get('uncertainty', estimator.uncertainty)) / confidence,
+        'seconds': elapsed,
+    }
+
+
+def estimate_body_fat_cascade(inputs, target_uncertainty=TARGET_UNCERTAINTY,
+                              agreement_tolerance=AGREEMENT_TOLERANCE):
+    """
+    Estimate body fat with the cheapest sufficient set of estimators.
+
+    Args:
+        inputs: Dictionary with any of 'weight_kg', 'height_cm', 'age',
+            'gender', 'waist_cm', 'neck_cm', 'hip_cm', 'landmarks', 'image'
+        target_uncertainty: Fused standard deviation that ends the cascade
+        agreement_tolerance: Largest spread between estimates that still
+            counts as agreement
+
+    Returns:
+        Dictionary with the fused 'body_fat_percentage', its 'uncertainty',
+        the 'method' of the most trusted estimate, the individual
+        'estimates', the names of 'skipped' estimators and 'early_exit'; or
+        None if no estimator applies
+    """
+    applicable = sorted((estimator for estimator in _ESTIMATORS.values() if estimator.applies_to(inputs)),
+                        key=lambda estimator: estimator.cost_ms)
+    estimates = []
+    skipped = []
+    for position, estimator in enumerate(applicable):
+        entry = _run(estimator, inputs)
+        if entry is not None:
+            estimates.append(entry)
+
+        if estimates:
+            _, sd = _fuse(estimates)
+            values = [e['body_fat_percentage'] for e in estimates]
+            if sd <= target_uncertainty and max(values) - min(values) <= agreement_tolerance:
+                skipped = applicable[position + 1:]
+                break
+
+    with _STATS_LOCK:
+        _cascade_stats['runs'] += 1
+        if skipped:
+            _cascade_stats['early_exits'] += 1
+            _cascade_stats['time_saved_seconds'] += sum(estimator.mean_seconds() for estimator in skipped)
+        for estimator in skipped:
+            estimator.skipped += 1
+
+    if not estimates:
+        return None
+    mean, sd = _fuse(estimates)
+    return {
+        'body_fat_percentage': round(mean, 1),
+        'uncertainty': round(sd, 2),
+        'method': min(estimates, key=lambda e: e['uncertainty'])['method'],
+        'estimates': estimates,
+        'skipped': [estimator.name for estimator in skipped],
+        'early_exit': bool(skipped),
+    }
+
+
+def estimator_stats():
+    """
+    Invocation counts, timings and time saved for the cascade.
+
+    Returns:
+        Dictionary with cascade totals and per-estimator statistics
+    """
+    with _STATS_LOCK:
+        return {
+            'runs': _cascade_stats['runs'],
+            'early_exits': _cascade_stats['early_exits'],
+            'time_saved_seconds': round(_cascade_stats['time_saved_seconds'], 3),
+            'estimators': {name: estimator.stats() for name, estimator in _ESTIMATORS.items()},
+        }
+
+
+def reset_estimator_stats():
+    """Zero all cascade counters."""
+    with _STATS_LOCK:
+        _cascade_stats.update(runs=0, early_exits=0, time_saved_seconds=0.0)
+        for estimator in _ESTIMATORS.values():
+            estimator.invocations = 0
+            estimator.skipped = 0
+            estimator.total_seconds = 0.0
+
+
+# ---------------------------------------------------------------------------
+# Built-in estimators, cheapest first
+# ---------------------------------------------------------------------------
+
+def _gender(inputs):
+    return (inputs.get('gender') or 'male').lower()
+
+
+@register_estimator('bmi', cost_ms=0.02, uncertainty=5.0, requires=('weight_kg', 'height_cm'))
+def _bmi_estimator(inputs):
+    from utils.body_analysis import calculate_body_composition
+    sex = 1 if _gender(inputs) == 'male' else 0
+    body_fat, _ = calculate_body_composition(float(inputs['weight_kg']), inputs['height_cm'] / 100.0,
+                                             int(inputs.get('age') or 30), sex)
+    return {'body_fat_percentage': body_fat, 'method': 'bmi'}
+
+
+@register_estimator('navy', cost_ms=0.05, uncertainty=3.5, requires=('weight_kg', 'height_cm', 'waist_cm'))
+def _navy_estimator(inputs):
+    from utils.navy_body_fat import calculate_body_fat_navy_derived
+    body_fat, method = calculate_body_fat_navy_derived(
+        _gender(inputs), inputs['height_cm'], inputs['weight_kg'], inputs['waist_cm'],
+        inputs.get('neck_cm'), inputs.get('hip_cm'))
+    if method == 'bmi_based':
+        return None  # Same information as the BMI estimator
+    return {'body_fat_percentage': body_fat, 'method': method,
+            'uncertainty': 3.5 if method == 'full_navy' else 4.5}
+
+
+@register_estimator('landmark_proportions', cost_ms=0.2, uncertainty=5.5, requires=('landmarks',))
+def _landmark_estimator(inputs):
+    from utils.ai_body_fat_estimator import get_body_fat_estimator
+    return get_body_fat_estimator()._estimate_body_fat_basic(
+        inputs['landmarks'], inputs.get('height_cm') or 0.0, inputs.get('weight_kg') or 0.0)
+
+
+@register_estimator('abdominal_texture', cost_ms=25.0, uncertainty=5.0, requires=('image', 'landmarks'))
+def _texture_estimator(inputs):
+    from utils.ai_body_fat_estimator import get_body_fat_estimator
+    result = get_body_fat_estimator()._estimate_body_fat_advanced(
+        inputs['image'], inputs['landmarks'], inputs.get('height_cm') or 0.0, inputs.get('weight_kg') or 0.0)
+    # Without a usable abdominal ROI it falls back to the landmark estimate
+    return result if result.get('method') == 'advanced_visual_analysis' else None
+
+
+def _trained_head_available():
+    try:
+        from utils.ai_body_fat_estimator import trained_head_available
+    except ImportError:
+        return False
+    return trained_head_available()
+
+
+# Only runs once trained head weights are installed: an untrained head's
+# output is arbitrary and differs between processes
+@register_estimator('mobilenet', cost_ms=150.0, uncertainty=8.0, requires=('image',),
+                    available=_trained_head_available())
+def _mobilenet_estimator(inputs):
+    from utils.ai_body_fat_estimator import get_body_fat_estimator
+    estimator = get_body_fat_estimator()
+    if estimator.get_model() is None:
+        raise ImportError("MobileNetV2 model could not be built")
+    if not estimator.head_trained:
+        raise ImportError("No trained body fat head weights")
+    return estimator.estimate_body_fat_cnn(inputs['image'], inputs.get('landmarks'))
@@ -13,6 +13,14 @@ import logging
 import numpy as np
 import cv2
 from utils.body_analysis import analyze_body_traits
+from utils.mesh_io import load_mesh, sniff_mesh_header, MeshFormatError, SCAN_HEADER_SNIFF_BYTES
+from utils.mesh_slicing import SliceIndex, measure_circumferences, measure_shoulder_width
+from utils.mesh_volume import segment_volumes, estimate_composition_from_volume
+from utils.mesh_lod import build_lods
+from utils.mesh_render import get_rendered_view, VIEW_AXES
+from utils.spatial_index import VertexGrid
+from utils.scan_landmarks import detect_scan_landmarks, to_mediapipe_landmarks
+from utils.scan_compare import compare_meshes
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -30,11 +38,18 @@ class BodyScan3D:
     def __init__(self):
         """Initialize the 3D body scan processor."""
         self.scan_data = None
+        self.mesh = None
         self.measurements = {}
+        self.volumes = {}
+        self.volume_composition = None
+        self.rendered_views = {}
+        self.spatial_index = None
         self.landmarks = {}
+        self.scan_landmarks = {}
         self.processed_images = []
         self.height_cm = 0.0
         self.weight_kg = 0.0
+        self.user_id = None
         
     def load_scan(self, file_path, height_cm=0.0, weight_kg=0.0):
         """
@@ -59,16 +74,27 @@ class BodyScan3D:
             self.height_cm = height_cm
             self.weight_kg = weight_kg
             
-            # Here we would use a 3D model library to load the file
-            # For the prototype, we'll simulate loading a 3D model
+            # Load the mesh into compact float32/int32 arrays and bring it
+            # into the body frame (Y up, feet at 0, centimeters)
+            self.mesh = load_mesh(file_path).normalize_to_body_frame(height_cm)
+            self.rendered_views = {}
+            self.spatial_index = None
+            lo, hi = self.mesh.bounds()
+            
             self.scan_data = {
                 'file_path': file_path,
                 'format': file_ext,
+                'vertex_count': self.mesh.vertex_count,
+                'face_count': self.mesh.face_count,
+                'scan_height_cm': round(float(hi[1] - lo[1]), 1),
             }
             
             logger.info(f"Successfully loaded 3D scan from {file_path}")
             return True
             
+        except MeshFormatError as e:
+            logger.error(f"Invalid 3D scan file: {str(e)}")
+            return False
         except Exception as e:
             logger.error(f"Error loading 3D scan: {str(e)}")
             return False
@@ -85,24 +111,67 @@ class BodyScan3D:
             return None
             
         try:
-            # In a real implementation, we would render a front view of the 3D model
-            # For the prototype, we'll return a placeholder or process the file directly
-            
-            # If the scan data contains a reference to a 2D image
-            if os.path.exists(self.scan_data['file_path'].replace('.obj', '.jpg')):
-                image_path = self.scan_data['file_path'].replace('.obj', '.jpg')
+            # If the scanner exported a photo next to the model, prefer it
+            image_path = os.path.splitext(self.scan_data['file_path'])[0] + '.jpg'
+            if os.path.exists(image_path):
                 return cv2.imread(image_path)
                 
-            # Otherwise, create a synthetic front view (demonstration purposes)
-            logger.info("Creating synthetic front view from 3D data")
-            
-            # For now, just return None - in future we'd render an actual view
-            return None
+            # Otherwise render the front view from the mesh
+            return self.render_view('front')
             
         except Exception as e:
             logger.error(f"Error extracting front view: {str(e)}")
             return None
             
+    def render_view(self, view='front'):
+        """
+        Render a depth-shaded orthographic view of the loaded mesh.
+        
+        Args:
+            view: 'front', 'side' or 'back'
+            
+        Returns:
+            OpenCV image (numpy array) or None if no mesh is loaded
+        """
+        if self.mesh is None or self.mesh.face_count == 0:
+            return None
+        if view not in self.rendered_views:
+            logger.info(f"Rendering {view} view from 3D data")
+            self.rendered_views[view] = get_rendered_view(self.mesh, view)
+        return self.rendered_views[view]
+        
+    def get_spatial_index(self):
+        """
+        Spatial index over the scan vertices, built once per loaded scan.
+        
+        Returns:
+            VertexGrid or None if no mesh is loaded
+        """
+        if self.mesh is None or self.mesh.vertex_count == 0:
+            return None
+        if self.spatial_index is None:
+            self.spatial_index = VertexGrid(self.mesh.vertices)
+        return self.spatial_index
+        
+    def detect_landmarks(self):
+        """
+        Detect anatomical landmarks directly on the mesh.
+        
+        Populates self.scan_landmarks with 3D points in centimeters and
+        self.landmarks with the MediaPipe-indexed dictionary aligned with the
+        rendered front view.
+        
+        Returns:
+            MediaPipe-style landmarks dictionary (empty if no mesh is loaded)
+        """
+        index = self.get_spatial_index()
+        if index is None:
+            return {}
+        self.scan_landmarks = detect_scan_landmarks(self.mesh, index, self.volumes.get('cut_planes'))
+        self.landmarks = to_mediapipe_landmarks(self.mesh, self.scan_landmarks)
+        logger.info(f"Detected {len(self.landmarks)} landmarks on 3D scan")
+        return self.landmarks
+        
     def extract_measurements(self):
         """
         Extract precise body measurements from the 3D scan.
@@ -115,16 +184,28 @@ class BodyScan3D:
             return {}
             
         try:
-            # In a real implementation, we would analyze the 3D model to extract measurements
-            # For the prototype, we'll generate reasonable measurements based on height/weight
-            
             # Initialize measurements dictionary
             self.measurements = {}
+            self.volumes = {}
+            self.volume_composition = None
             
-            # If we have height and weight, generate realistic measurements
-            if self.height_cm > 0 and self.weight_kg > 0:
+            # Measure circumferences directly on the mesh by slicing it at every body level
+            scan_measurements = {}
+            if self.mesh is not None and self.mesh.face_count > 0:
+                index = SliceIndex(self.mesh.vertices, self.mesh.faces)
+                scan_measurements = measure_circumferences(self.mesh, index=index)
+                self.volumes = segment_volumes(self.mesh, index=index)
+                shoulder_width = measure_shoulder_width(self.mesh)
+                if shoulder_width:
+                    scan_measurements['shoulder_width'] = {'value': shoulder_width}
+                if self.height_cm <= 0:
+                    self.height_cm = self.scan_data.get('scan_height_cm', 0.0)
+                logger.info(f"Measured {len(scan_measurements)} values from 3D scan cross-sections")
+            
+            # Statistical estimates fill in anything the scan could not measure
+            if self.height_cm > 0 and (self.weight_kg > 0 or scan_measurements):
                 # Calculate BMI
-                bmi = self.weight_kg / ((self.height_cm / 100) ** 2)
+                bmi = self.weight_kg / ((self.height_cm / 100) ** 2) if self.weight_kg > 0 else 22.0
                 
                 # Determine if measurements are for male or female based on proportions
                 # For prototype, we'll assume male if height > 170cm
@@ -154,9 +235,36 @@ class BodyScan3D:
                 arm_circumference = 30.0 + (bmi - 22) * 1.1
                 wrist_circumference = 16.5 + (bmi - 22) * 0.3
                 
+                # Replace the statistical estimates with values measured on the mesh
+                measured = {key: data['value'] for key, data in scan_measurements.items()}
+                shoulder_width = measured.get('shoulder_width', shoulder_width)
+                chest_circumference = measured.get('chest_circumference', chest_circumference)
+                waist_circumference = measured.get('waist_circumference', waist_circumference)
+                hip_circumference = measured.get('hip_circumference', hip_circumference)
+                neck_circumference = measured.get('neck_circumference', neck_circumference)
+                thigh_circumference = measured.get('thigh_circumference', thigh_circumference)
+                calf_circumference = measured.get('calf_circumference', calf_circumference)
+                arm_circumference = measured.get('arm_circumference', arm_circumference)
+                
                 # Calculate body volumes
-                # Average density of human body is about 1.01 g/cm³
-                total_body_volume = self.weight_kg / 1.01  # Convert kg to liters
+                if self.volumes.get('total'):
+                    # Enclosed volume of the scan, split by segment
+                    total_body_volume = self.volumes['total']
+                    self.volume_composition = estimate_composition_from_volume(
+                        self.weight_kg, self.height_cm, self.volumes,
+                        gender='male' if is_male else 'female'
+                    )
+                else:
+                    # Average density of human body is about 1.01 g/cm³
+                    total_body_volume = self.weight_kg / 1.01  # Convert kg to liters
+                
+                if self.volume_composition:
+                    # Fat and fat-free tissue at 0.9007 and 1.100 kg/L
+                    fat_mass_volume = self.volume_composition['fat_mass_kg'] / 0.9007
+                    lean_mass_volume = self.volume_composition['lean_mass_kg'] / 1.1
+                else:
+                    lean_mass_volume = total_body_volume * 0.8  # Approximately 80% of total volume for avg person
+                    fat_mass_volume = total_body_volume * 0.2  # Approximately 20% of total volume for avg person
                 
                 # Create measurements dictionary with proper formatting
                 self.measurements = {
@@ -224,23 +332,48 @@ class BodyScan3D:
                         'display_value': f"{round(total_body_volume, 1)} L"
                     },
                     'lean_mass_volume': {
-                        'value': round(total_body_volume * 0.8, 1),  # Approximately 80% of total volume for avg person
+                        'value': round(lean_mass_volume, 1),
                         'unit': 'L',
-                        'display_value': f"{round(total_body_volume * 0.8, 1)} L"
+                        'display_value': f"{round(lean_mass_volume, 1)} L"
                     },
                     'fat_mass_volume': {
-                        'value': round(total_body_volume * 0.2, 1),  # Approximately 20% of total volume for avg person
+                        'value': round(fat_mass_volume, 1),
                         'unit': 'L',
-                        'display_value': f"{round(total_body_volume * 0.2, 1)} L"
+                        'display_value': f"{round(fat_mass_volume, 1)} L"
                     }
                 }
+                
+                # Per-segment volumes from the scan
+                for segment in ('trunk', 'arms', 'legs', 'head'):
+                    if self.volumes.get(segment):
+                        self.measurements[f'{segment}_volume'] = {
+                            'value': self.volumes[segment],
+                            'unit': 'L',
+                            'display_value': f"{self.volumes[segment]} L",
+                            'description': 'Measured from 3D scan volume'
+                        }
+                if self.volumes.get('total'):
+                    self.measurements['total_body_volume']['description'] = 'Measured from 3D scan volume'
+                
+                for key, data in scan_measurements.items():
+                    self.measurements[key]['description'] = 'Measured from 3D scan cross-section'
+                    if 'height_cm' in data:
+                        self.measurements[key]['level_height_cm'] = data['height_cm']
             
             # Front view extraction
             front_view = self.extract_front_view()
             if front_view is not None:
-                # Extract landmarks and analyze
-                from utils.image_processing import extract_body_landmarks
-                _, self.landmarks = extract_body_landmarks(front_view)
+                # Landmarks come from the mesh itself when there is one;
+                # otherwise run pose detection on the scanner's photo
+                if self.mesh is not None and self.mesh.face_count > 0:
+                    self.detect_landmarks()
+                else:
+                    try:
+                        from utils.image_processing import extract_body_landmarks
+                        _, landmarks, _ = extract_body_landmarks(front_view)
+                        self.landmarks = landmarks or {}
+                    except ImportError as e:
+                        logger.warning(f"Pose landmark detection not available: {str(e)}")
                 
                 # If we have valid landmarks, enhance our measurements
                 if self.landmarks:
@@ -251,7 +384,8 @@ class BodyScan3D:
                         self.landmarks, 
                         original_image=front_view,
                         height_cm=self.height_cm,
-                        weight_kg=self.weight_kg
+                        weight_kg=self.weight_kg,
+                        user_id=self.user_id
                     )
                     
                     # Combine 3D and 2D measurements for a comprehensive analysis
@@ -316,6 +450,10 @@ class BodyScan3D:
             description = 'Estimated from 3D volumetric analysis'
             confidence = 0.95
             
+            # Densitometry on the scan volume is the most direct estimate
+            if self.volume_composition:
+                return self._composition_from_volume()
+            
             # If we have actual measurements, use them for calculations
             if self.height_cm > 0 and self.weight_kg > 0:
                 if 'waist_circumference' in self.measurements and self.measurements['waist_circumference']['value'] > 0:
@@ -412,13 +550,83 @@ class BodyScan3D:
             logger.error(f"Error estimating body composition: {str(e)}")
             return {}
     
+    def _composition_from_volume(self):
+        """
+        Build the body composition dictionary from the scan's volumetric estimate.
+        
+        Returns:
+            Dictionary with body composition estimates
+        """
+        estimate = self.volume_composition
+        body_fat = estimate['body_fat_percentage']
+        lean_mass_percentage = 100.0 - body_fat
+        muscle_mass_percentage = 100.0 * estimate['skeletal_muscle_kg'] / self.weight_kg
+        # Bone mineral is roughly 6.8% of fat-free mass
+        bone_mass_percentage = lean_mass_percentage * 0.068
+        
+        return {
+            'body_fat_percentage': {
+                'value': body_fat,
+                'unit': '%',
+                'display_value': f"{body_fat}%",
+                'description': 'Calculated from 3D scan volume (body density, Siri equation)',
+                'confidence': 0.95
+            },
+            'muscle_mass_percentage': {
+                'value': round(muscle_mass_percentage, 1),
+                'unit': '%',
+                'display_value': f"{round(muscle_mass_percentage, 1)}%",
+                'description': 'Skeletal muscle estimated from limb lean volume'
+            },
+            'bone_mass_percentage': {
+                'value': round(bone_mass_percentage, 1),
+                'unit': '%',
+                'display_value': f"{round(bone_mass_percentage, 1)}%",
+                'description': 'Estimated from fat-free mass'
+            },
+            'lean_mass_percentage': {
+                'value': round(lean_mass_percentage, 1),
+                'unit': '%',
+                'display_value': f"{round(lean_mass_percentage, 1)}%",
+                'description': 'Total non-fat tissue including muscle, bone, and organs'
+            },
+            'body_density': {
+                'value': estimate['body_density'],
+                'unit': 'kg/L',
+                'display_value': f"{estimate['body_density']} kg/L",
+                'description': 'Scan weight divided by volume, corrected for lung and gut gas'
+            },
+            'segment_volume_share': {
+                'value': estimate['segment_volume_share'],
+                'unit': '%',
+                'display_value': ', '.join(f"{name} {share}%" for name, share in estimate['segment_volume_share'].items()),
+                'description': 'Share of total body volume by segment'
+            }
+        }
+    
+    def compare_with(self, baseline):
+        """
+        Measure how the body changed since an earlier scan.
+        
+        Args:
+            baseline: BodyScan3D with the earlier scan loaded
+            
+        Returns:
+            Comparison dictionary from utils.scan_compare.compare_meshes, or
+            None if either scan has no mesh
+        """
+        if self.mesh is None or baseline.mesh is None:
+            logger.error("Both scans must be loaded before comparing")
+            return None
+        return compare_meshes(baseline.mesh, self.mesh)
+        
     def generate_visualization(self, output_path, visualization_type='front'):
         """
         Generate visualization of the 3D scan analysis.
         
         Args:
-            output_path: Path to save the visualization
-            visualization_type: Type of visualization ('front', 'side', '3d', 'composition')
+            output_path: Path to save the visualization (a directory for '3d')
+            visualization_type: Type of visualization ('front', 'side', 'back', '3d', 'composition')
             
         Returns:
             Path to the generated visualization or None if generation fails
@@ -428,12 +636,23 @@ class BodyScan3D:
             return None
             
         try:
-            # In a real implementation, we would render the 3D model with measurements
-            # For the prototype, we'll generate a placeholder visualization
-            
-            # Generate a basic visualization showing the 3D model and key measurements
             logger.info(f"Generating {visualization_type} visualization")
             
+            # Orthographic renders of the mesh
+            if visualization_type in VIEW_AXES and self.mesh is not None and self.mesh.face_count > 0:
+                image = self.render_view(visualization_type)
+                if not cv2.imwrite(output_path, image):
+                    logger.error(f"Could not write visualization to {output_path}")
+                    return None
+                return output_path
+            
+            # Interactive model: decimated levels of detail for the web viewer,
+            # written to the output directory with their manifest
+            if visualization_type == '3d' and self.mesh is not None and self.mesh.face_count > 0:
+                scan_key = os.path.basename(os.path.normpath(output_path))
+                build_lods(self.mesh, scan_key, directory=output_path)
+                return os.path.join(output_path, 'manifest.json')
+            
             # In a real implementation, we would render the 3D model with annotations
             # For now, return the output path that would be used
             return output_path
@@ -469,13 +688,21 @@ class BodyScan3D:
             'scan_metadata': {
                 'file_format': self.scan_data.get('format', 'unknown'),
                 'file_path': self.scan_data.get('file_path', 'unknown'),
+                'vertex_count': self.scan_data.get('vertex_count', 0),
+                'face_count': self.scan_data.get('face_count', 0),
+                'scan_height_cm': self.scan_data.get('scan_height_cm', 0.0),
+                'segment_volumes': {name: value for name, value in self.volumes.items() if name != 'cut_planes'},
+                'landmarks_3d': {
+                    name: [round(float(c), 2) for c in value] if isinstance(value, (list, tuple, np.ndarray)) else value
+                    for name, value in self.scan_landmarks.items() if name != 'visibility'
+                },
             }
         }
         
         return analysis
 
 
-def process_3d_scan(file_path, height_cm=0.0, weight_kg=0.0):
+def process_3d_scan(file_path, height_cm=0.0, weight_kg=0.0, user_id=None):
     """
     Process a 3D body scan file and return comprehensive analysis.
     
@@ -483,11 +710,14 @@ def process_3d_scan(file_path, height_cm=0.0, weight_kg=0.0):
         file_path: Path to the 3D scan file
         height_cm: User's height in centimeters (float)
         weight_kg: User's weight in kilograms (float)
+        user_id: Optional owner, used to index the front view for
+            similar-physique search
         
     Returns:
         Dictionary with complete 3D scan analysis or empty dict if processing fails
     """
     scanner = BodyScan3D()
+    scanner.user_id = user_id
     
     # Load the scan
     if not scanner.load_scan(file_path, height_cm, weight_kg):
@@ -502,6 +732,9 @@ def is_valid_3d_scan_file(file_path):
     """
     Check if a file is a valid 3D scan format.
     
+    The extension must be supported and, for files that exist, the leading
+    bytes must look like that format (see utils.mesh_io.sniff_mesh_header).
+    
     Args:
         file_path: Path to the file
         
@@ -509,4 +742,15 @@ def is_valid_3d_scan_file(file_path):
         True if valid 3D scan format, False otherwise
     """
     file_ext = os.path.splitext(file_path)[1].lower()
-    return file_ext in BodyScan3D.SUPPORTED_FORMATS
\ No newline at end of file
+    if file_ext not in BodyScan3D.SUPPORTED_FORMATS:
+        return False
+    if not os.path.isfile(file_path):
+        return True
+    try:
+        with open(file_path, 'rb') as handle:
+            head = handle.read(SCAN_HEADER_SNIFF_BYTES)
+        sniff_mesh_header(head, os.path.getsize(file_path), file_ext)
+    except (OSError, MeshFormatError) as e:
+        logger.warning(f"Rejected 3D scan {file_path}: {str(e)}")
+        return False
+    return True
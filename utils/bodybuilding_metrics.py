@@ -8,6 +8,7 @@ focusing on physique proportions, symmetry, and body composition metrics.
 import math
 import logging
 from utils.navy_body_fat import calculate_navy_body_fat, calculate_body_fat_navy_derived
+from utils.formula_cache import quantized_lru_cache
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -229,7 +230,8 @@ def complete_bodybuilding_analysis(user_data):
         if genetic_potential is not None and 'genetic_potential' in genetic_potential:
             recommendation_data['genetic_potential'] = genetic_potential['genetic_potential']
             
-        recommendations = formulate_bodybuilding_recommendations(recommendation_data, user_data)
+        from utils.recommendation_bundles import bodybuilding_recommendations
+        recommendations = bodybuilding_recommendations(recommendation_data, user_data)
         
         # Organize results
         results = {
@@ -352,6 +354,7 @@ def calculate_fat_free_mass_index(lean_body_mass_kg, height_cm):
         logger.error(f"Error calculating FFMI: {e}")
         return None
 
+@quantized_lru_cache(maxsize=2048)
 def calculate_normalized_ffmi(ffmi, height_cm):
     """
     Calculate normalized FFMI, adjusted to a height of 1.83m (6ft).
@@ -608,6 +611,7 @@ def estimate_bodyfat_from_measurements(gender, waist_cm, neck_cm, height_cm, hip
         logger.error(f"Error estimating body fat from measurements: {e}")
         return None
 
+@quantized_lru_cache(maxsize=1024)
 def estimate_ideal_weight(height_cm, gender, body_fat_target=None, frame_size='medium'):
     """
     Estimate ideal weight based on height, gender, and target body composition.
@@ -702,6 +706,7 @@ def estimate_ideal_weight(height_cm, gender, body_fat_target=None, frame_size='m
         logger.error(f"Error estimating ideal weight: {e}")
         return None
 
+@quantized_lru_cache(maxsize=1024)
 def analyze_bodybuilding_potential(height_cm, wrist_cm, ankle_cm, gender):
     """
     Analyze genetic muscular potential based on frame size indicators.
@@ -0,0 +1,150 @@
+"""
+Bulk workout plan generation for cohorts of clients.
+
+After a program change a partner gym re-plans all of its clients at once.
+Many clients share the same normalized plan inputs (muscle categories,
+experience, goal), so ``bulk_generate`` groups them first and generates
+each distinct plan only once. The distinct plans are generated across a
+process pool. As each one completes, a row for every client in its group
+is queued, and rows are written in batched inserts, so memory stays
+bounded by one batch and rows land while generation is still running.
+
+A cohort's plans are seeded from the program name and the inputs, so
+re-running a program reproduces the same plans, served by the plan cache.
+"""
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.periodization import stored_plan
+from utils.plan_cache import plan_key, plan_seed
+from utils.resource_governor import usable_cpus
+from utils.workout_generator import analyze_muscle_development, generate_plan_for_muscles
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement
+DEFAULT_BATCH_SIZE = 500
+
+
+def plan_inputs(traits, experience, goal):
+    """
+    Normalized inputs of a client's plan.
+
+    Args:
+        traits: Analysis traits
+        experience: Normalized experience level
+        goal: Generator goal (muscle_gain, fat_loss, maintenance)
+
+    Returns:
+        Dictionary with 'muscles' (sorted categories), 'experience' and 'goal'
+    """
+    categories = analyze_muscle_development(traits or {})
+    return {
+        'muscles': {level: sorted(muscles) for level, muscles in categories.items()},
+        'experience': experience,
+        'goal': goal,
+    }
+
+
+def group_clients(clients, program):
+    """
+    Group clients whose plans would be identical.
+
+    Args:
+        clients: Iterable of dictionaries with at least 'traits',
+            'experience' and 'goal'
+        program: Name of the program the plans are generated for
+
+    Returns:
+        Dictionary mapping plan key to {'inputs', 'seed', 'members'}, in
+        order of first appearance
+    """
+    groups = {}
+    for client in clients:
+        inputs = plan_inputs(client.get('traits'), client['experience'], client['goal'])
+        key = plan_key('bulk_generate', program, **inputs)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'inputs': inputs, 'seed': plan_seed(f"{program}|{key}"), 'members': []}
+        group['members'].append(client)
+    return groups
+
+
+def _generate(key, inputs, seed):
+    """Generate one distinct plan, with its mesocycle, in a pool worker."""
+    plan = generate_plan_for_muscles(inputs['muscles'], inputs['experience'], inputs['goal'], seed=seed)
+    return key, stored_plan(plan, inputs['experience'], inputs['goal'])
+
+
+def bulk_generate(clients, program, build_row, write_rows, workers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Generate and store plans for many clients.
+
+    Args:
+        clients: Iterable of client dictionaries (see ``group_clients``)
+        program: Name of the program the plans are generated for
+        build_row: Callable (client, workout_schedule) returning the row to
+            insert for a client
+        write_rows: Callable inserting and committing a list of rows
+        workers: Processes generating plans (default: usable CPUs)
+        batch_size: Rows per insert
+
+    Returns:
+        Dictionary of counts and throughput figures
+    """
+    start = time.perf_counter()
+    groups = group_clients(clients, program)
+    clients_total = sum(len(group['members']) for group in groups.values())
+    grouped = time.perf_counter()
+    workers = max(1, min(workers or len(usable_cpus()), len(groups) or 1))
+
+    pending = []
+    stats = {'rows_written': 0, 'batches': 0, 'write_seconds': 0.0}
+
+    def flush():
+        write_start = time.perf_counter()
+        write_rows(pending)
+        stats['write_seconds'] += time.perf_counter() - write_start
+        stats['rows_written'] += len(pending)
+        stats['batches'] += 1
+        pending.clear()
+
+    def collect(key, schedule):
+        for client in groups[key]['members']:
+            pending.append(build_row(client, schedule))
+            if len(pending) >= batch_size:
+                flush()
+
+    tasks = [(key, group['inputs'], group['seed']) for key, group in groups.items()]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_generate, *task) for task in tasks]
+            for future in as_completed(futures):
+                collect(*future.result())
+    else:
+        for task in tasks:
+            collect(*_generate(*task))
+    if pending:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'program': program,
+        'clients': clients_total,
+        'distinct_plans': len(groups),
+        'plans_reused': clients_total - len(groups),
+        'workers': workers,
+        'batch_size': batch_size,
+        'rows_written': stats['rows_written'],
+        'batches': stats['batches'],
+        'grouping_seconds': round(grouped - start, 3),
+        'write_seconds': round(stats['write_seconds'], 3),
+        'total_seconds': round(elapsed, 3),
+        'plans_per_second': round(len(groups) / elapsed, 1) if elapsed else 0.0,
+        'clients_per_second': round(clients_total / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info(f"Bulk plan generation finished: {summary}")
+    return summary
@@ -0,0 +1,370 @@
+"""
+Persistent store and nearest-neighbour index for physique embeddings.
+
+Every analyzed photo is reduced to the pooled MobileNetV2 backbone feature
+vector (1280 values). Vectors are stored as float16 and keyed by a SHA-1
+of the image content, so re-analysing the same photo reuses the stored
+vector instead of running the backbone again.
+
+Storage is a directory of append-only flat files, memory-mapped for reads:
+
+    vectors.f16   float16 [rows, dim]      embeddings
+    keys.bin      bytes   [rows, 20]       SHA-1 content hashes
+    owners.i64    int64   [rows]           owning user id (-1 if unknown)
+    lsh.u16       uint16  [rows, tables]   random-projection signatures
+
+Rows are appended under an exclusive file lock and readers derive the row
+count from the shortest file, so a reader never sees a half-written row.
+
+Approximate search uses random-projection LSH: each of LSH_TABLES tables
+hashes a vector to LSH_BITS sign bits of random hyperplane projections.
+Buckets are kept as per-table sorted signature arrays, probed for the
+query's signature and every signature one bit away (multi-probe), and the
+candidates are re-ranked by exact cosine similarity against the
+memory-mapped vectors. Small stores are searched exhaustively.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where embeddings are stored, by default in the app's instance folder
+# (independent of the working directory)
+EMBEDDING_DIR = os.environ.get('EMBEDDING_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'embeddings'))
+
+# Pooled MobileNetV2 feature size
+EMBEDDING_DIM = 1280
+
+# LSH layout; changing any of these recomputes the stored signatures
+LSH_TABLES = 8
+LSH_BITS = 16
+LSH_SEED = 1729
+
+# Stores up to this many rows are searched exhaustively
+EXACT_SEARCH_ROWS = 5000
+
+# Rows appended since the last bucket rebuild that are scanned linearly
+# before the sorted buckets are rebuilt
+MAX_UNINDEXED_ROWS = 2000
+
+KEY_BYTES = 20
+
+
+def content_hash(image):
+    """
+    SHA-1 digest identifying an image by its pixels.
+
+    Args:
+        image: NumPy image array
+
+    Returns:
+        20-byte digest
+    """
+    image = np.ascontiguousarray(image)
+    digest = hashlib.sha1(f"{image.shape}|{image.dtype}".encode('ascii'))
+    digest.update(image.data)
+    return digest.digest()
+
+
+def _hyperplanes(dim):
+    rng = np.random.default_rng(LSH_SEED)
+    return rng.standard_normal((dim, LSH_TABLES * LSH_BITS)).astype(np.float32)
+
+
+def lsh_signatures(vectors, planes):
+    """
+    LSH signature of each vector in every table.
+
+    Returns:
+        uint16 array (rows, LSH_TABLES)
+    """
+    bits = (np.asarray(vectors, dtype=np.float32) @ planes) > 0
+    bits = bits.reshape(len(bits), LSH_TABLES, LSH_BITS)
+    weights = (1 << np.arange(LSH_BITS)).astype(np.uint32)
+    return (bits * weights).sum(axis=2).astype(np.uint16)
+
+
+class EmbeddingStore:
+    """
+    Append-only, memory-mapped embedding store with an LSH index.
+
+    Args:
+        directory: Storage directory
+        dim: Embedding size
+    """
+
+    FILES = ('vectors.f16', 'keys.bin', 'owners.i64', 'lsh.u16')
+
+    def __init__(self, directory=EMBEDDING_DIR, dim=EMBEDDING_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.planes = _hyperplanes(dim)
+        self._lock = threading.Lock()
+        self._rows = 0
+        self._sizes = None
+        self._key_rows = {}
+        self._vectors = self._owners = self._signatures = None
+        # Sorted buckets per table covering the first _indexed_rows rows
+        self._indexed_rows = 0
+        self._bucket_order = None
+        self._bucket_signatures = None
+        os.makedirs(directory, exist_ok=True)
+        self._check_layout()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _check_layout(self):
+        """Recompute signatures if the LSH layout changed since they were written."""
+        layout = {'dim': self.dim, 'tables': LSH_TABLES, 'bits': LSH_BITS, 'seed': LSH_SEED}
+        meta_path = self._path('meta.json')
+        with self._file_lock():
+            stored = None
+            if os.path.exists(meta_path):
+                with open(meta_path) as handle:
+                    stored = json.load(handle)
+            if stored == layout:
+                return
+            if stored and stored.get('dim') != self.dim:
+                raise ValueError(f"Embedding store {self.directory} holds {stored.get('dim')}-d vectors")
+            rows = self._row_count(self._file_sizes())
+            if rows:
+                logger.info(f"Recomputing LSH signatures for {rows} stored embeddings")
+                vectors = np.memmap(self._path('vectors.f16'), dtype=np.float16, mode='r', shape=(rows, self.dim))
+                signatures = np.concatenate([lsh_signatures(vectors[start:start + 65536], self.planes)
+                                             for start in range(0, rows, 65536)])
+                signatures.tofile(self._path('lsh.u16'))
+            with open(meta_path, 'w') as handle:
+                json.dump(layout, handle)
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process appending to this store."""
+        with open(self._path('.lock'), 'w') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def _file_sizes(self):
+        return tuple(os.path.getsize(self._path(name)) if os.path.exists(self._path(name)) else 0
+                     for name in self.FILES)
+
+    def _row_count(self, sizes):
+        row_bytes = (self.dim * 2, KEY_BYTES, 8, LSH_TABLES * 2)
+        return min(size // width for size, width in zip(sizes, row_bytes))
+
+    def refresh(self):
+        """Map rows appended by any process since the last call."""
+        with self._lock:
+            sizes = self._file_sizes()
+            if sizes == self._sizes:
+                return self._rows
+            rows = self._row_count(sizes)
+            self._sizes = sizes
+            if rows == 0:
+                self._rows = 0
+                return 0
+            self._vectors = np.memmap(self._path('vectors.f16'), dtype=np.float16, mode='r',
+                                      shape=(rows, self.dim))
+            self._owners = np.memmap(self._path('owners.i64'), dtype=np.int64, mode='r', shape=(rows,))
+            self._signatures = np.memmap(self._path('lsh.u16'), dtype=np.uint16, mode='r',
+                                         shape=(rows, LSH_TABLES))
+            # Only keys of new rows are read; a shrunken store is reloaded
+            start = self._rows if rows >= self._rows else 0
+            if start == 0:
+                self._key_rows = {}
+            keys = np.fromfile(self._path('keys.bin'), dtype=np.uint8, count=(rows - start) * KEY_BYTES,
+                               offset=start * KEY_BYTES).reshape(-1, KEY_BYTES)
+            for offset, key in enumerate(keys):
+                self._key_rows[key.tobytes()] = start + offset
+            self._rows = rows
+            if rows < self._indexed_rows:
+                self._indexed_rows = 0
+            return rows
+
+    def __len__(self):
+        return self.refresh()
+
+    def get(self, key):
+        """
+        Stored embedding for a content hash.
+
+        Returns:
+            float32 vector, or None if the key is unknown
+        """
+        self.refresh()
+        row = self._key_rows.get(key)
+        return None if row is None else np.asarray(self._vectors[row], dtype=np.float32)
+
+    def add(self, key, vector, owner=None):
+        """
+        Store an embedding unless its content hash is already present.
+
+        Args:
+            key: 20-byte content hash
+            vector: Embedding of length dim
+            owner: Optional user id
+
+        Returns:
+            Row index of the embedding
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        with self._file_lock():
+            self.refresh()
+            row = self._key_rows.get(key)
+            if row is not None:
+                if owner is not None and self._owners[row] < 0:
+                    # Photo embedded before its owner was known
+                    with open(self._path('owners.i64'), 'r+b') as handle:
+                        handle.seek(row * 8)
+                        handle.write(np.int64(owner).tobytes())
+                return row
+            # Bring every file to a whole number of rows before appending
+            rows = self._row_count(self._file_sizes())
+            records = (
+                vector.astype(np.float16).tobytes(),
+                bytes(key),
+                np.int64(-1 if owner is None else owner).tobytes(),
+                lsh_signatures(vector[None, :], self.planes).tobytes(),
+            )
+            for name, record in zip(self.FILES, records):
+                with open(self._path(name), 'r+b' if os.path.exists(self._path(name)) else 'wb') as handle:
+                    handle.truncate(rows * len(record))
+                    handle.seek(rows * len(record))
+                    handle.write(record)
+        self.refresh()
+        return rows
+
+    def owner_rows(self, owner):
+        """Rows stored for a user, oldest first."""
+        self.refresh()
+        if not self._rows:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(np.asarray(self._owners) == owner)
+
+    def vector(self, row):
+        self.refresh()
+        return np.asarray(self._vectors[row], dtype=np.float32)
+
+    def _rebuild_buckets(self):
+        signatures = np.asarray(self._signatures)
+        self._bucket_order = np.argsort(signatures, axis=0, kind='stable')
+        self._bucket_signatures = np.take_along_axis(signatures, self._bucket_order, axis=0)
+        self._indexed_rows = self._rows
+
+    def _candidates(self, signature):
+        """Rows sharing a bucket (or a bucket one bit away) with the query in any table."""
+        if self._rows - self._indexed_rows > max(MAX_UNINDEXED_ROWS, self._indexed_rows // 10):
+            self._rebuild_buckets()
+        flips = np.concatenate([[0], 1 << np.arange(LSH_BITS)]).astype(np.uint16)
+        probes = np.bitwise_xor(signature[:, None], flips[None, :])  # (tables, probes)
+
+        found = []
+        if self._indexed_rows:
+            for table in range(LSH_TABLES):
+                column = self._bucket_signatures[:, table]
+                starts = np.searchsorted(column, probes[table], side='left')
+                ends = np.searchsorted(column, probes[table], side='right')
+                for start, end in zip(starts, ends):
+                    if end > start:
+                        found.append(self._bucket_order[start:end, table])
+
+        # Rows appended after the last rebuild are checked directly
+        tail = np.asarray(self._signatures[self._indexed_rows:self._rows])
+        if len(tail):
+            near = (tail[:, :, None] == probes[None, :, :]).any(axis=(1, 2))
+            found.append(self._indexed_rows + np.flatnonzero(near))
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def search(self, vector, k=10, exclude_owner=None, owned_only=False):
+        """
+        Approximate k nearest stored embeddings by cosine similarity.
+
+        Args:
+            vector: Query embedding
+            k: Number of results
+            exclude_owner: Optional user id whose rows are left out
+            owned_only: Leave out rows without an owner
+
+        Returns:
+            Tuple of (rows int64, similarities float32), best first
+        """
+        rows = self.refresh()
+        if rows == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        vector = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+        with self._lock:
+            if rows <= EXACT_SEARCH_ROWS:
+                candidates = np.arange(rows)
+            else:
+                candidates = self._candidates(lsh_signatures(vector[None, :], self.planes)[0])
+            owners = self._owners[candidates]
+            keep = np.ones(len(candidates), dtype=bool)
+            if exclude_owner is not None:
+                keep &= owners != exclude_owner
+            if owned_only:
+                keep &= owners >= 0
+            candidates = candidates[keep]
+            if len(candidates) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            vectors = np.asarray(self._vectors[candidates], dtype=np.float32)
+            similarities = (vectors @ vector) / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+        best = np.argsort(-similarities, kind='stable')[:k]
+        return candidates[best], similarities[best]
+
+    def similar_owners(self, owner, k=10):
+        """
+        Users with the stored embeddings closest to this user's latest one.
+
+        Args:
+            owner: User id with at least one stored embedding
+            k: Number of users to return
+
+        Returns:
+            List of (user id, similarity) tuples, best first
+        """
+        own_rows = self.owner_rows(owner)
+        if len(own_rows) == 0:
+            return []
+        query = self.vector(own_rows[-1])
+        # Over-fetch: several rows may belong to one user
+        rows, similarities = self.search(query, k=8 * k, exclude_owner=owner, owned_only=True)
+        results = []
+        seen = set()
+        for user_id, similarity in zip(np.asarray(self._owners[rows]).tolist(), similarities.tolist()):
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            results.append((user_id, round(similarity, 4)))
+            if len(results) == k:
+                break
+        return results
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store():
+    """
+    Get or create the process-wide embedding store.
+
+    Returns:
+        EmbeddingStore instance
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore()
+    return _store
@@ -15,6 +15,9 @@ import numpy as np
 import cv2
 import mediapipe as mp
 
+from utils.model_preload import ProcessLocal
+from utils.resource_governor import inference_slot
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -34,20 +37,26 @@ class EnhancedMeasurementAnalyzer:
             self.mp_pose = mp.solutions.pose
             self.mp_drawing = mp.solutions.drawing_utils
             
-            # Initialize pose detection
-            self.pose = self.mp_pose.Pose(
+            # Initialize pose detection; MediaPipe graphs are not fork-safe,
+            # so a process forked after this builds its own on first use
+            self._pose = ProcessLocal(lambda: self.mp_pose.Pose(
                 static_image_mode=True,
                 model_complexity=2,
                 enable_segmentation=True,
                 min_detection_confidence=0.5
-            )
+            ))
+            self._pose.get()
             logger.debug("Enhanced Measurement Analyzer initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize MediaPipe: {str(e)}")
             # Initialize without MediaPipe - will use mock measurements
             self.mp_pose = None
             self.mp_drawing = None
-            self.pose = None
+            self._pose = None
+    
+    @property
+    def pose(self):
+        return self._pose.get() if self._pose is not None else None
     
     def analyze_photos(self, 
                       front_image: np.ndarray,
@@ -115,11 +124,12 @@ class EnhancedMeasurementAnalyzer:
             return self._generate_mock_measurements(height_cm, weight_kg, age, gender)
         
         try:
-            # Process front image with pose detection
-            front_results = self.pose.process(cv2.cvtColor(front_image, cv2.COLOR_BGR2RGB))
-            
-            # Process back image with pose detection
-            back_results = self.pose.process(cv2.cvtColor(back_image, cv2.COLOR_BGR2RGB))
+            with inference_slot():
+                # Process front image with pose detection
+                front_results = self.pose.process(cv2.cvtColor(front_image, cv2.COLOR_BGR2RGB))
+                
+                # Process back image with pose detection
+                back_results = self.pose.process(cv2.cvtColor(back_image, cv2.COLOR_BGR2RGB))
             
             # Extract landmarks
             front_landmarks = front_results.pose_landmarks.landmark if front_results and front_results.pose_landmarks else None
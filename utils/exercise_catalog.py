@@ -0,0 +1,311 @@
+"""
+The exercise catalog shared by every plan generator.
+
+Each exercise is one immutable record. Records are tagged with the muscles
+they work (primary muscle first), a difficulty, the equipment they need, a
+movement pattern and an emphasis: 'general' for staple exercises, or the
+weak point (e.g. 'chest_development', 'fat_loss') a specialization exercise
+is meant for.
+
+The catalog is built once per process. For every value of every attribute
+it keeps an inverted index: an integer whose bit i is set when record i
+has that value. Generators describe the candidates they want and get them
+by OR-ing the bitsets within an attribute and AND-ing across attributes:
+
+    catalog = get_exercise_catalog()
+    candidates = catalog.select(primary='quads', pattern='squat',
+                                equipment=('barbell', 'machine'),
+                                experience='intermediate')
+
+Records come back in catalog order, so a seeded generator drawing from
+them is reproducible.
+"""
+
+import threading
+from types import MappingProxyType
+from typing import NamedTuple, Tuple
+
+# Difficulty levels, easiest first; an experience level admits every
+# difficulty up to its own
+DIFFICULTY_LEVELS = ('beginner', 'intermediate', 'advanced')
+
+# Catalog rows: name, target, sets, reps, difficulty, muscles (primary first),
+# equipment, movement pattern, emphasis
+_EXERCISES = (
+    # Chest
+    ('Bench Press', 'overall chest development', 3, '8-10', 'intermediate', ('chest', 'triceps', 'shoulders'), 'barbell', 'horizontal_push', 'general'),
+    ('Incline Dumbbell Press', 'upper chest', 3, '8-10', 'intermediate', ('chest', 'shoulders'), 'dumbbell', 'horizontal_push', 'general'),
+    ('Cable Flyes', 'chest stretching and isolation', 3, '10-12', 'beginner', ('chest',), 'cable', 'fly', 'general'),
+    ('Decline Press', 'lower chest development', 3, '10-12', 'intermediate', ('chest', 'triceps'), 'barbell', 'horizontal_push', 'general'),
+    ('Push-Ups', 'chest, shoulders, and triceps', 3, '10-15', 'beginner', ('chest', 'shoulders', 'triceps'), 'bodyweight', 'horizontal_push', 'general'),
+    ('Dumbbell Press', 'chest development', 3, '8-12', 'beginner', ('chest', 'triceps'), 'dumbbell', 'horizontal_push', 'general'),
+    ('Dips', 'lower chest and triceps', 3, '8-12', 'intermediate', ('chest', 'triceps', 'shoulders'), 'bodyweight', 'dip', 'general'),
+    ('Cable Crossovers', 'inner chest', 3, '12-15', 'beginner', ('chest',), 'cable', 'fly', 'chest_development'),
+    ('Decline Push-Ups', 'lower chest', 3, '12-15', 'beginner', ('chest', 'shoulders', 'triceps'), 'bodyweight', 'horizontal_push', 'chest_development'),
+    ('Dumbbell Flyes', 'chest stretch', 3, '12-15', 'beginner', ('chest',), 'dumbbell', 'fly', 'chest_development'),
+    ('Incline Bench Press', 'upper chest', 3, '8-10', 'intermediate', ('chest', 'shoulders', 'triceps'), 'barbell', 'horizontal_push', 'chest_development'),
+    ('Pec Deck Machine', 'chest isolation', 3, '12-15', 'beginner', ('chest',), 'machine', 'fly', 'chest_development'),
+
+    # Back
+    ('Pull-ups/Lat Pulldowns', 'latissimus dorsi', 3, '8-10', 'intermediate', ('back', 'biceps'), 'bodyweight', 'vertical_pull', 'general'),
+    ('Bent-over Rows', 'middle back', 3, '8-10', 'intermediate', ('back', 'biceps'), 'barbell', 'horizontal_pull', 'general'),
+    ('Seated Cable Rows', 'overall back development', 3, '10-12', 'beginner', ('back', 'biceps'), 'cable', 'horizontal_pull', 'general'),
+    ('Barbell Rows', 'upper and middle back', 3, '8-12', 'intermediate', ('back', 'biceps'), 'barbell', 'horizontal_pull', 'general'),
+    ('Dumbbell Rows', 'back width and thickness', 3, '10-12', 'beginner', ('back', 'biceps'), 'dumbbell', 'horizontal_pull', 'general'),
+    ('Pull-Ups', 'lats and upper back', 3, '6-10', 'intermediate', ('back', 'biceps'), 'bodyweight', 'vertical_pull', 'general'),
+    ('Chin-Ups', 'lats and biceps', 3, '6-10', 'intermediate', ('back', 'biceps'), 'bodyweight', 'vertical_pull', 'general'),
+    ('Deadlifts', 'overall back and posterior chain', 3, '5-6', 'intermediate', ('back', 'hamstrings', 'glutes'), 'barbell', 'hinge', 'general'),
+    ('T-Bar Rows', 'mid-back thickness', 3, '8-10', 'intermediate', ('back', 'biceps'), 'barbell', 'horizontal_pull', 'general'),
+    ('Wide-Grip Pull-Ups', 'lats width', 3, '8-10', 'intermediate', ('back', 'biceps'), 'bodyweight', 'vertical_pull', 'back_width'),
+    ('Straight-Arm Pulldowns', 'lats', 3, '12-15', 'beginner', ('back',), 'cable', 'vertical_pull', 'back_width'),
+    ('Wide-Grip Seated Rows', 'back width', 3, '10-12', 'beginner', ('back', 'rear_delts'), 'cable', 'horizontal_pull', 'back_width'),
+    ('Lat Pulldowns', 'lats', 3, '10-12', 'beginner', ('back', 'biceps'), 'cable', 'vertical_pull', 'back_width'),
+    ('Single-Arm Dumbbell Rows', 'back thickness', 3, '10-12', 'beginner', ('back', 'biceps'), 'dumbbell', 'horizontal_pull', 'back_width'),
+
+    # Shoulders
+    ('Overhead Press', 'overall shoulder development', 3, '8-10', 'intermediate', ('shoulders', 'triceps'), 'barbell', 'vertical_push', 'general'),
+    ('Lateral Raises', 'lateral deltoids', 3, '10-15', 'beginner', ('shoulders',), 'dumbbell', 'raise', 'general'),
+    ('Front Raises', 'anterior deltoids', 3, '10-12', 'beginner', ('shoulders',), 'dumbbell', 'raise', 'general'),
+    ('Arnold Press', 'all deltoid heads', 3, '8-12', 'intermediate', ('shoulders', 'triceps'), 'dumbbell', 'vertical_push', 'general'),
+    ('Upright Rows', 'upper traps and deltoids', 3, '10-12', 'intermediate', ('shoulders', 'traps'), 'barbell', 'vertical_pull', 'general'),
+    ('Dumbbell Shoulder Press', 'front and side deltoids', 3, '8-12', 'beginner', ('shoulders', 'triceps'), 'dumbbell', 'vertical_push', 'general'),
+    ('Machine Shoulder Press', 'deltoids with a fixed path', 3, '10-12', 'beginner', ('shoulders', 'triceps'), 'machine', 'vertical_push', 'general'),
+    ('Pike Push-Ups', 'front deltoids', 3, '8-12', 'intermediate', ('shoulders', 'triceps'), 'bodyweight', 'vertical_push', 'general'),
+    ('Wide-Grip Upright Rows', 'lateral deltoids', 3, '10-12', 'intermediate', ('shoulders', 'traps'), 'barbell', 'vertical_pull', 'shoulder_width'),
+    ('Lateral Raises with Hold', 'side delts', 3, '12-15', 'beginner', ('shoulders',), 'dumbbell', 'raise', 'shoulder_width'),
+    ('Cable Lateral Raises', 'side delts', 3, '12-15', 'beginner', ('shoulders',), 'cable', 'raise', 'shoulder_width'),
+
+    # Rear delts
+    ('Face Pulls', 'rear deltoids and upper back', 3, '12-15', 'beginner', ('rear_delts', 'back', 'traps'), 'cable', 'horizontal_pull', 'general'),
+    ('Reverse Flyes', 'posterior deltoids', 3, '10-15', 'beginner', ('rear_delts',), 'dumbbell', 'fly', 'general'),
+    ('Reverse Pec Deck Flyes', 'posterior deltoids', 3, '12-15', 'beginner', ('rear_delts',), 'machine', 'fly', 'general'),
+    ('Cable Reverse Flyes', 'posterior deltoids', 3, '12-15', 'beginner', ('rear_delts',), 'cable', 'fly', 'general'),
+    ('Rear Delt Rows', 'rear deltoids and upper back', 3, '10-12', 'intermediate', ('rear_delts', 'back'), 'dumbbell', 'horizontal_pull', 'general'),
+    ('Seated Rear Delt Flyes', 'posterior deltoids', 3, '12-15', 'beginner', ('rear_delts',), 'dumbbell', 'fly', 'general'),
+    ('Face Pulls with External Rotation', 'rear delts and upper back', 3, '12-15', 'beginner', ('rear_delts', 'back', 'traps'), 'cable', 'horizontal_pull', 'shoulder_width'),
+
+    # Biceps
+    ('Barbell Curls', 'biceps', 3, '8-12', 'beginner', ('biceps',), 'barbell', 'curl', 'general'),
+    ('Hammer Curls', 'brachialis and forearms', 3, '10-12', 'beginner', ('biceps', 'forearms'), 'dumbbell', 'curl', 'general'),
+    ('Preacher Curls', 'biceps peak', 3, '10-12', 'intermediate', ('biceps',), 'barbell', 'curl', 'general'),
+    ('Cable Curls', 'continuous tension on biceps', 3, '12-15', 'beginner', ('biceps',), 'cable', 'curl', 'general'),
+    ('Incline Dumbbell Curls', 'biceps', 3, '10-12', 'beginner', ('biceps',), 'dumbbell', 'curl', 'arm_development'),
+    ('Concentration Curls', 'biceps peak', 3, '10-12', 'beginner', ('biceps',), 'dumbbell', 'curl', 'arm_development'),
+
+    # Triceps
+    ('Tricep Dips', 'triceps', 3, '8-12', 'beginner', ('triceps', 'chest'), 'bodyweight', 'dip', 'general'),
+    ('Tricep Pushdowns', 'triceps', 3, '10-12', 'beginner', ('triceps',), 'cable', 'extension', 'general'),
+    ('Skull Crushers', 'triceps long head', 3, '10-12', 'intermediate', ('triceps',), 'barbell', 'extension', 'general'),
+    ('Diamond Push-Ups', 'triceps and inner chest', 3, '8-12', 'intermediate', ('triceps', 'chest'), 'bodyweight', 'horizontal_push', 'general'),
+    ('Tricep Kickbacks', 'triceps lateral head', 3, '12-15', 'beginner', ('triceps',), 'dumbbell', 'extension', 'general'),
+    ('Close-Grip Bench Press', 'triceps', 3, '8-10', 'intermediate', ('triceps', 'chest'), 'barbell', 'horizontal_push', 'arm_development'),
+    ('Rope Pushdowns', 'triceps', 3, '12-15', 'beginner', ('triceps',), 'cable', 'extension', 'arm_development'),
+    ('Overhead Tricep Extensions', 'triceps long head', 3, '10-12', 'beginner', ('triceps',), 'dumbbell', 'extension', 'arm_development'),
+
+    # Quads
+    ('Squats', 'quadriceps and overall leg development', 3, '8-10', 'intermediate', ('quads', 'glutes', 'hamstrings'), 'barbell', 'squat', 'general'),
+    ('Leg Press', 'quadriceps', 3, '10-12', 'beginner', ('quads', 'glutes'), 'machine', 'squat', 'general'),
+    ('Bulgarian Split Squats', 'single-leg strength and balance', 3, '10-12 per leg', 'intermediate', ('quads', 'glutes'), 'dumbbell', 'lunge', 'general'),
+    ('Lunges', 'quads, glutes, and balance', 3, '10-12 per leg', 'beginner', ('quads', 'glutes'), 'dumbbell', 'lunge', 'general'),
+    ('Step-Ups', 'quads and glutes', 3, '10-12 per leg', 'beginner', ('quads', 'glutes'), 'dumbbell', 'lunge', 'general'),
+    ('Front Squats', 'quads', 3, '8-10', 'intermediate', ('quads', 'core'), 'barbell', 'squat', 'leg_development'),
+    ('Hack Squats', 'quads', 3, '10-12', 'intermediate', ('quads', 'glutes'), 'machine', 'squat', 'leg_development'),
+    ('Leg Extensions', 'quads isolation', 3, '12-15', 'beginner', ('quads',), 'machine', 'extension', 'leg_development'),
+
+    # Hamstrings
+    ('Romanian Deadlifts', 'hamstrings and glutes', 3, '8-10', 'intermediate', ('hamstrings', 'glutes', 'back'), 'barbell', 'hinge', 'general'),
+    ('Seated Leg Curls', 'hamstrings isolation', 3, '12-15', 'beginner', ('hamstrings',), 'machine', 'curl', 'general'),
+    ('Good Mornings', 'hamstrings and lower back', 3, '8-10', 'intermediate', ('hamstrings', 'back', 'glutes'), 'barbell', 'hinge', 'general'),
+    ('Stiff-Legged Deadlifts', 'hamstrings', 3, '8-10', 'intermediate', ('hamstrings', 'glutes', 'back'), 'barbell', 'hinge', 'general'),
+    ('Nordic Curls', 'eccentric hamstring strength', 3, '5-8', 'advanced', ('hamstrings',), 'bodyweight', 'curl', 'general'),
+    ('Leg Curls', 'hamstrings', 3, '10-12', 'beginner', ('hamstrings',), 'machine', 'curl', 'leg_development'),
+
+    # Glutes
+    ('Hip Thrusts', 'glutes', 3, '8-12', 'intermediate', ('glutes', 'hamstrings'), 'barbell', 'hip_extension', 'general'),
+    ('Glute Bridges', 'glute activation', 3, '12-15', 'beginner', ('glutes', 'hamstrings'), 'bodyweight', 'hip_extension', 'general'),
+    ('Glute Kickbacks', 'glute isolation', 3, '12-15 per leg', 'beginner', ('glutes',), 'cable', 'hip_extension', 'general'),
+    ('Cable Pull-Throughs', 'glutes and hamstrings', 3, '12-15', 'beginner', ('glutes', 'hamstrings'), 'cable', 'hinge', 'general'),
+    ('Sumo Deadlifts', 'glutes, adductors and hamstrings', 3, '6-8', 'intermediate', ('glutes', 'hamstrings', 'quads'), 'barbell', 'hinge', 'general'),
+
+    # Calves
+    ('Calf Raises', 'calf muscles', 3, '12-15', 'beginner', ('calves',), 'machine', 'calf_raise', 'general'),
+    ('Seated Calf Raises', 'soleus', 3, '15-20', 'beginner', ('calves',), 'machine', 'calf_raise', 'general'),
+    ('Calf Press', 'gastrocnemius', 3, '12-15', 'beginner', ('calves',), 'machine', 'calf_raise', 'general'),
+    ('Donkey Calf Raises', 'gastrocnemius stretch', 3, '12-15', 'intermediate', ('calves',), 'machine', 'calf_raise', 'general'),
+    ('Single-Leg Calf Raises', 'calf balance and strength', 3, '12-15 per leg', 'beginner', ('calves',), 'bodyweight', 'calf_raise', 'general'),
+
+    # Core
+    ('Russian Twists', 'obliques', 3, '10-15 per side', 'beginner', ('core',), 'bodyweight', 'core_rotation', 'general'),
+    ('Hanging Leg Raises', 'lower abs', 3, '10-15', 'intermediate', ('core',), 'bodyweight', 'core_flexion', 'general'),
+    ('Ab Wheel Rollouts', 'entire core', 3, '8-12', 'intermediate', ('core',), 'bodyweight', 'core_stability', 'general'),
+    ('Cable Crunches', 'upper and middle abs', 3, '12-15', 'beginner', ('core',), 'cable', 'core_flexion', 'general'),
+    ('Planks', 'core stability', 3, '30-60 seconds', 'beginner', ('core',), 'bodyweight', 'core_stability', 'general'),
+    ('Bicycle Crunches', 'obliques and abs', 3, '15-20', 'beginner', ('core',), 'bodyweight', 'core_rotation', 'general'),
+    ('Leg Raises', 'lower abs', 3, '12-15', 'beginner', ('core',), 'bodyweight', 'core_flexion', 'general'),
+    ('Mountain Climbers', 'core and conditioning', 3, '30-45 seconds', 'beginner', ('core', 'conditioning'), 'bodyweight', 'core_stability', 'general'),
+    ('Side Planks', 'obliques and lateral stability', 3, '30-45 seconds per side', 'beginner', ('core',), 'bodyweight', 'core_stability', 'general'),
+
+    # Conditioning
+    ('HIIT (High-Intensity Interval Training)', 'fat burning and cardiovascular health', 1, '20-30 min', 'intermediate', ('conditioning',), 'none', 'conditioning', 'general'),
+    ('Steady-State Cardio', 'endurance and fat burning', 1, '30-45 min', 'beginner', ('conditioning',), 'none', 'conditioning', 'general'),
+    ('Jump Rope', 'coordination and cardiovascular health', 1, '10-15 min', 'beginner', ('conditioning',), 'jump_rope', 'conditioning', 'general'),
+    ('Treadmill Intervals', 'fat burning and cardiovascular health', 1, '20-30 min', 'intermediate', ('conditioning',), 'machine', 'conditioning', 'general'),
+    ('Cycling', 'lower body and cardiovascular health', 1, '30-45 min', 'beginner', ('conditioning', 'quads'), 'machine', 'conditioning', 'general'),
+    ('Rowing', 'full body and cardiovascular health', 1, '20-30 min', 'intermediate', ('conditioning', 'back'), 'machine', 'conditioning', 'general'),
+    ('HIIT Circuit', 'fat burning and cardiovascular health', 1, '20-30 min', 'intermediate', ('conditioning',), 'none', 'conditioning', 'fat_loss'),
+    ('Tabata Training', 'metabolic conditioning', 1, '20 min', 'advanced', ('conditioning',), 'none', 'conditioning', 'fat_loss'),
+    ('Circuit Training', 'full body conditioning', 1, '30-45 min', 'intermediate', ('conditioning',), 'none', 'conditioning', 'fat_loss'),
+    ('Sprint Intervals', 'fat burning and power', 1, '15-20 min', 'intermediate', ('conditioning',), 'none', 'conditioning', 'fat_loss'),
+    ('Jump Rope Intervals', 'coordination and fat burning', 1, '15-20 min', 'beginner', ('conditioning',), 'jump_rope', 'conditioning', 'fat_loss'),
+)
+
+
+class Exercise(NamedTuple):
+    """One immutable catalog entry."""
+    id: int
+    name: str
+    target: str
+    sets: int
+    reps: str
+    difficulty: str
+    muscles: Tuple[str, ...]
+    equipment: str
+    pattern: str
+    emphasis: str
+
+    @property
+    def primary(self):
+        """The muscle the exercise mainly trains."""
+        return self.muscles[0]
+
+    def prescription(self):
+        """A new dictionary with the name, target, sets and reps."""
+        return {'name': self.name, 'target': self.target, 'sets': self.sets, 'reps': self.reps}
+
+
+class ExerciseCatalog:
+    """
+    Immutable exercise records with bitset indexes per attribute.
+
+    Args:
+        rows: Catalog rows in the layout of ``_EXERCISES``
+    """
+
+    # Attributes with an inverted index
+    INDEXED = ('primary', 'muscle', 'difficulty', 'equipment', 'pattern', 'emphasis')
+
+    def __init__(self, rows=_EXERCISES):
+        records = tuple(Exercise(index, *row) for index, row in enumerate(rows))
+        indexes = {attribute: {} for attribute in self.INDEXED}
+        by_name = {}
+        for record in records:
+            if record.difficulty not in DIFFICULTY_LEVELS:
+                raise ValueError(f"Unknown difficulty {record.difficulty!r} for {record.name}")
+            if record.name.lower() in by_name:
+                raise ValueError(f"Duplicate exercise {record.name}")
+            by_name[record.name.lower()] = record
+            bit = 1 << record.id
+            values = {
+                'primary': (record.primary,),
+                'muscle': record.muscles,
+                'difficulty': (record.difficulty,),
+                'equipment': (record.equipment,),
+                'pattern': (record.pattern,),
+                'emphasis': (record.emphasis,),
+            }
+            for attribute, keys in values.items():
+                for key in keys:
+                    indexes[attribute][key] = indexes[attribute].get(key, 0) | bit
+
+        # Experience levels admit every difficulty up to their own
+        experience = {}
+        allowed = 0
+        for level in DIFFICULTY_LEVELS:
+            allowed |= indexes['difficulty'].get(level, 0)
+            experience[level] = allowed
+
+        self.records = records
+        self.all = (1 << len(records)) - 1
+        self._by_name = MappingProxyType(by_name)
+        self._indexes = MappingProxyType({attribute: MappingProxyType(index)
+                                          for attribute, index in indexes.items()})
+        self._experience = MappingProxyType(experience)
+
+    def __len__(self):
+        return len(self.records)
+
+    def values(self, attribute):
+        """Indexed values of an attribute, sorted."""
+        return sorted(self._indexes[attribute])
+
+    def _any(self, attribute, keys):
+        """Union of the bitsets of one or more values of an attribute."""
+        if isinstance(keys, str):
+            keys = (keys,)
+        index = self._indexes[attribute]
+        mask = 0
+        for key in keys:
+            mask |= index.get(key, 0)
+        return mask
+
+    def mask(self, experience=None, **criteria):
+        """
+        Bitset of the exercises matching every criterion.
+
+        Args:
+            experience: Experience level; admits difficulties up to it
+            **criteria: Indexed attribute (see INDEXED) to a value or a
+                tuple of values, any of which may match
+
+        Returns:
+            Integer bitset over record ids
+        """
+        mask = self.all
+        if experience is not None:
+            mask &= self._experience.get(experience, self.all)
+        for attribute, keys in criteria.items():
+            if attribute not in self._indexes:
+                raise KeyError(f"Exercise attribute {attribute!r} is not indexed")
+            if keys is not None:
+                mask &= self._any(attribute, keys)
+        return mask
+
+    def records_in(self, mask):
+        """Records of a bitset, in catalog order."""
+        records = []
+        while mask:
+            low = mask & -mask
+            records.append(self.records[low.bit_length() - 1])
+            mask ^= low
+        return tuple(records)
+
+    def select(self, experience=None, **criteria):
+        """Records matching every criterion (see ``mask``), in catalog order."""
+        return self.records_in(self.mask(experience, **criteria))
+
+    def get(self, name):
+        """Record by name (case-insensitive), or None."""
+        return self._by_name.get(name.lower())
+
+    def matches(self, name, mask):
+        """Whether the named exercise is in a bitset; False for unknown names."""
+        record = self._by_name.get(name.lower())
+        return record is not None and bool(mask >> record.id & 1)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_exercise_catalog():
+    """
+    Get or create the process-wide exercise catalog.
+
+    Returns:
+        ExerciseCatalog instance
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ExerciseCatalog()
+    return _catalog
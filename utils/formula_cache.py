@@ -0,0 +1,330 @@
+"""
+Memoization layer for pure body-metric formulas.
+
+Formulas such as ideal weight, FFMI normalization and calorie targets are
+pure functions of a handful of numbers, but they are re-evaluated on every
+results render, nutrition page and workout API call. This module provides a
+decorator that caches their results in bounded per-function LRU caches.
+
+Inputs are normalized before lookup: floats are quantized to a per-argument
+step (e.g. 0.1 cm, 0.1 kg) and strings are lower-cased, so that values which
+only differ by measurement noise share one cache entry. The quantized values
+are also the ones passed to the wrapped function, so a cached result is
+always exactly what the function returns for its bucket.
+
+The formula version is part of every key and is shared between processes:
+it lives in a small JSON file (FORMULA_VERSION_FILE) together with a flush
+generation. Each lookup checks the file's identity with one ``stat`` and
+re-reads it when it was replaced, so a version change or flush made by one
+worker invalidates the caches of all of them, and survives a restart.
+"""
+
+import copy
+import functools
+import inspect
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bump when any cached formula changes so stale results are discarded. This
+# is the version used until one is set through set_formula_version.
+FORMULA_VERSION = os.environ.get('FORMULA_VERSION', '1')
+
+# Shared version and flush generation; must be on storage every worker sees
+FORMULA_VERSION_FILE = os.environ.get('FORMULA_VERSION_FILE', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'formula_version.json'))
+
+# Default quantization step for float arguments without an explicit step
+DEFAULT_QUANTUM = 0.1
+
+# Registry of every cache created through the decorator, keyed by qualified name
+_CACHE_REGISTRY = OrderedDict()
+_REGISTRY_LOCK = threading.Lock()
+
+# Last state read from FORMULA_VERSION_FILE and the file identity it came from
+_VERSION_LOCK = threading.Lock()
+_shared_version = {'identity': None, 'version': FORMULA_VERSION, 'generation': 0}
+
+
+def _quantize(value, step):
+    """
+    Snap a numeric value to the nearest multiple of ``step``.
+
+    Args:
+        value: Number to quantize
+        step: Quantization step (e.g. 0.1)
+
+    Returns:
+        Quantized float, or the value unchanged if it is not a real number
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not step:
+        return value
+    if value != value:  # NaN never compares equal, do not try to bucket it
+        return value
+    decimals = max(0, len(repr(float(step)).split('.')[-1].rstrip('0')))
+    quantized = round(round(value / step) * step, decimals)
+    return int(quantized) if isinstance(value, int) and float(quantized).is_integer() else quantized
+
+
+def _normalize(value, step):
+    """Normalize a single argument into a hashable, bucketed key component."""
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, (int, float)):
+        return _quantize(value, step)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v, step)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v, step) for v in value)
+    return value
+
+
+class FormulaCache:
+    """
+    Bounded LRU cache with hit/miss counters for a single formula.
+    """
+
+    def __init__(self, name, maxsize=1024):
+        self.name = name
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Look up a key, marking it as most recently used.
+
+        Returns:
+            Tuple of (found, value)
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return a dictionary of cache statistics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def register_cache(cache):
+    """
+    Add a cache to the registry so it is flushed and reported with the others.
+
+    Returns:
+        The cache
+    """
+    with _REGISTRY_LOCK:
+        _CACHE_REGISTRY[cache.name] = cache
+    return cache
+
+
+def quantized_lru_cache(maxsize=1024, quantize=None, ignore=('self',)):
+    """
+    Decorator caching a pure formula on quantized, normalized inputs.
+
+    Args:
+        maxsize: Maximum number of entries kept for this function
+        quantize: Optional mapping of argument name to quantization step.
+            Float arguments not listed use DEFAULT_QUANTUM.
+        ignore: Argument names excluded from the cache key (e.g. ``self``
+            for methods that do not depend on instance state)
+
+    Returns:
+        Decorator that wraps the function with a FormulaCache
+    """
+    quantize = dict(quantize or {})
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        cache = register_cache(FormulaCache(f"{func.__module__}.{func.__qualname__}", maxsize))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                bound = signature.bind(*args, **kwargs)
+            except TypeError:
+                return func(*args, **kwargs)
+            bound.apply_defaults()
+
+            key_parts = [current_formula_version()]
+            for name, value in bound.arguments.items():
+                if name in ignore:
+                    continue
+                step = quantize.get(name, DEFAULT_QUANTUM)
+                if isinstance(value, str) or (
+                        isinstance(value, (int, float)) and not isinstance(value, bool)):
+                    value = _normalize(value, step)
+                    bound.arguments[name] = value
+                key_parts.append((name, _normalize(value, step)))
+            key = tuple(key_parts)
+
+            try:
+                found, result = cache.get(key)
+            except TypeError:
+                # Unhashable argument - fall back to a direct call
+                return func(*bound.args, **bound.kwargs)
+            if not found:
+                result = func(*bound.args, **bound.kwargs)
+                cache.put(key, result)
+            # Results are often dicts that callers annotate in place
+            return copy.deepcopy(result)
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
+
+
+def clear_formula_caches():
+    """
+    Flush every registered formula cache.
+
+    Returns:
+        Number of cached entries that were discarded
+    """
+    discarded = 0
+    with _REGISTRY_LOCK:
+        caches = list(_CACHE_REGISTRY.values())
+    for cache in caches:
+        discarded += cache.stats()['size']
+        cache.clear()
+    logger.info(f"Flushed {len(caches)} formula caches ({discarded} entries)")
+    return discarded
+
+
+def _read_shared_version(identity):
+    """Load the shared version file, keeping the last state if it is unreadable."""
+    try:
+        with open(FORMULA_VERSION_FILE) as handle:
+            state = json.load(handle)
+        version, generation = str(state['version']), int(state['generation'])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Could not read formula version file: {str(e)}")
+        return
+    if (version, generation) != (_shared_version['version'], _shared_version['generation']):
+        logger.info(f"Formula version {version} (generation {generation}) set by another process")
+        clear_formula_caches()
+    _shared_version.update(identity=identity, version=version, generation=generation)
+
+
+def current_formula_version():
+    """
+    Return the shared formula version and flush generation.
+
+    Re-reads FORMULA_VERSION_FILE when it has been replaced since the last
+    call, flushing this process's caches if the state changed.
+
+    Returns:
+        Tuple of (version, generation), part of every cache key
+    """
+    try:
+        status = os.stat(FORMULA_VERSION_FILE)
+        identity = (status.st_ino, status.st_mtime_ns, status.st_size)
+    except OSError:
+        identity = None
+    with _VERSION_LOCK:
+        if identity is not None and identity != _shared_version['identity']:
+            _read_shared_version(identity)
+        return _shared_version['version'], _shared_version['generation']
+
+
+def invalidate_formula_caches(version=None):
+    """
+    Flush the formula caches of every process, optionally changing the version.
+
+    Writes a new generation (and version) to FORMULA_VERSION_FILE, so other
+    workers see it on their next lookup and after a restart.
+
+    Args:
+        version: New formula version identifier, or None to keep the current one
+
+    Returns:
+        True if the version changed
+    """
+    current, generation = current_formula_version()
+    version = current if version is None else str(version)
+    state = {'version': version, 'generation': generation + 1}
+    directory = os.path.dirname(FORMULA_VERSION_FILE)
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w') as output:
+            json.dump(state, output)
+        os.replace(temporary, FORMULA_VERSION_FILE)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    if version != current:
+        logger.info(f"Formula version changed from {current} to {version}")
+    # Picks up the new file and flushes this process's caches
+    current_formula_version()
+    return version != current
+
+
+def set_formula_version(version):
+    """
+    Set the active formula version for every process, flushing caches if it changed.
+
+    Args:
+        version: New formula version identifier
+
+    Returns:
+        True if the version changed and caches were flushed
+    """
+    if str(version) == current_formula_version()[0]:
+        return False
+    return invalidate_formula_caches(version)
+
+
+def formula_cache_stats():
+    """
+    Collect statistics for every registered formula cache.
+
+    Returns:
+        Dictionary with the formula version and per-function statistics
+    """
+    version, generation = current_formula_version()
+    with _REGISTRY_LOCK:
+        caches = list(_CACHE_REGISTRY.values())
+    return {
+        'formula_version': version,
+        'generation': generation,
+        'caches': {cache.name: cache.stats() for cache in caches}
+    }
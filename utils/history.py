@@ -0,0 +1,171 @@
+"""
+Per-user history of analyses, scans, workout plans and measurements.
+
+Each history table has a composite index on (user_id, date DESC, id DESC)
+(declared in models.py), so "latest" lookups and history pages read a
+short index range instead of scanning the table. Pages are keyset
+paginated: the cursor is the (date, id) of the last row returned, and the
+next page continues strictly after it, so deep pages cost the same as the
+first and rows inserted meanwhile neither repeat nor go missing. Only the
+listed columns are selected, never the JSON result blobs. Rows without a
+date are left out of history.
+
+``ensure_history_indexes`` is the migration for databases created before
+the indexes existed (``flask migrate-history-indexes``); new databases get
+them from create_all.
+"""
+
+import base64
+import binascii
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.schema import CreateIndex
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows per page by default, and at most
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+ORDERS = ('desc', 'asc')
+
+
+def history_tables():
+    """
+    The history kinds: model, date column and the columns listed.
+
+    Returns:
+        Dictionary of kind to (model, date attribute, column names)
+    """
+    import models
+    return {
+        'analyses': (models.Analysis, 'analysis_date',
+                     ('analysis_type', 'body_type', 'body_fat_percentage', 'muscle_building_potential')),
+        'scans': (models.BodyScan3D, 'scan_date', ('file_format', 'analysis_id')),
+        'workout_plans': (models.WorkoutPlan, 'created_at',
+                          ('goal', 'training_split', 'duration_weeks', 'analysis_id')),
+        'measurements': (models.MeasurementLog, 'log_date',
+                         ('weight_kg', 'body_fat_percentage', 'chest_cm', 'waist_cm', 'hips_cm',
+                          'arms_cm', 'thighs_cm', 'notes')),
+    }
+
+
+def encode_cursor(date, row_id):
+    """Opaque cursor for the row with this date and id."""
+    return base64.urlsafe_b64encode(f'{date.isoformat()},{row_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    (date, id) of a cursor from encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, row_id = text.rsplit(',', 1)
+        return datetime.fromisoformat(date), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def history_query(kind, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, order='desc'):
+    """
+    Select statement for one page of a user's history (plus one row, to
+    tell whether another page follows).
+
+    Args:
+        kind: A key of history_tables()
+        user_id: Owner of the rows
+        cursor: Cursor of the last row of the previous page
+        limit: Rows per page
+        order: 'desc' (newest first) or 'asc'
+
+    Raises:
+        ValueError: For an unknown kind or order, or a malformed cursor
+    """
+    tables = history_tables()
+    if kind not in tables:
+        raise ValueError(f"Unknown history: {kind}")
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order: {order}")
+    model, date_name, names = tables[kind]
+    date, row_id = getattr(model, date_name), model.id
+    key = tuple_(date, row_id)
+
+    query = (select(row_id, date, *(getattr(model, name) for name in names))
+             .where(model.user_id == user_id, date.isnot(None)))
+    if cursor:
+        after = decode_cursor(cursor)
+        query = query.where(key < tuple_(*after) if order == 'desc' else key > tuple_(*after))
+    ordering = (date.desc(), row_id.desc()) if order == 'desc' else (date.asc(), row_id.asc())
+    return query.order_by(*ordering).limit(limit + 1)
+
+
+def history_page(session, kind, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, order='desc'):
+    """
+    One page of a user's history.
+
+    Args:
+        session: Database session
+        kind: 'analyses', 'scans', 'workout_plans' or 'measurements'
+        user_id: Owner of the rows
+        cursor: 'next_cursor' of the previous page, None for the first
+        limit: Rows per page (at most MAX_PAGE_SIZE)
+        order: 'desc' (newest first) or 'asc' (for progress charts)
+
+    Returns:
+        Dictionary with 'items' (each with 'id', 'date' and the kind's
+        columns) and 'next_cursor' (None on the last page)
+
+    Raises:
+        ValueError: For an unknown kind or order, or a malformed cursor
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    rows = session.execute(history_query(kind, user_id, cursor, limit, order)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    names = ('id', 'date') + history_tables()[kind][2]
+    items = [dict(zip(names, row)) for row in rows]
+    for item in items:
+        item['date'] = item['date'].isoformat()
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(rows[-1][1], rows[-1][0]) if more else None,
+    }
+
+
+def ensure_history_indexes(engine):
+    """
+    Create the history indexes missing from an existing database.
+
+    On PostgreSQL the indexes are built CONCURRENTLY, so the tables stay
+    writable meanwhile.
+
+    Args:
+        engine: SQLAlchemy engine of the app database
+
+    Returns:
+        List of the index names checked
+    """
+    names = []
+    postgres = engine.dialect.name == 'postgresql'
+    options = {'isolation_level': 'AUTOCOMMIT'} if postgres else {}
+    with engine.connect().execution_options(**options) as connection:
+        for model, _, _ in history_tables().values():
+            for index in sorted(model.__table__.indexes, key=lambda index: index.name):
+                if not index.name.endswith('_history'):
+                    continue
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                if postgres:
+                    ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+                logger.info(ddl)
+                connection.exec_driver_sql(ddl)
+                names.append(index.name)
+        if not postgres:
+            connection.commit()
+    return names
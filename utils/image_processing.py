@@ -3,6 +3,7 @@ import numpy as np
 import mediapipe as mp
 import logging
 from .measurement_validator import MeasurementValidator
+from .resource_governor import inference_slot
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -83,7 +84,8 @@ def extract_body_landmarks(image, height_cm=0):
             min_tracking_confidence=0.5
         ) as pose:
             # Get pose landmarks
-            results = pose.process(image_rgb)
+            with inference_slot():
+                results = pose.process(image_rgb)
             
             if not results.pose_landmarks:
                 logger.warning("No pose landmarks detected")
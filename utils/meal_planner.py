@@ -0,0 +1,326 @@
+"""
+Meal plans built from a local food composition table.
+
+The food table (utils/food_composition.csv, or FOOD_TABLE_PATH) lists, per
+100 g, the calories and macros of each food, with its category (protein,
+carb, fat or vegetable), the meals it is eaten at, its portion bounds and
+step, and dietary flags. It is loaded once per process into NumPy arrays.
+
+A day is split into meals, each taking a share of the daily macro targets
+from calculate_calorie_recommendations. A meal is one protein, one carb
+and one fat food, plus a fixed portion of vegetables at lunch and dinner.
+For each meal every combination of candidate foods is solved at once:
+
+1. the unconstrained portions hitting the meal's protein, carbs and fat
+   (a batched 3x3 least-squares solve),
+2. a few passes of bounded coordinate descent, each portion clipped to
+   its bounds (the greedy correction of the relaxed solution),
+3. portions rounded to the food's step.
+
+Combinations are ranked by their deviation from the targets, and each day
+takes the best one after a penalty for every food eaten earlier that day
+or in the previous days. Plans are cached per bucket of targets (5 g of
+each macro) and dietary filter, so users with similar targets share one
+solution.
+"""
+
+import csv
+import logging
+import os
+import threading
+
+import numpy as np
+
+from utils.formula_cache import quantized_lru_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Food composition table location
+FOOD_TABLE_PATH = os.environ.get('FOOD_TABLE_PATH', os.path.join(os.path.dirname(__file__),
+                                                                  'food_composition.csv'))
+
+# Dietary filters, each a flag column of the food table
+DIETS = ('vegetarian', 'vegan', 'gluten_free', 'dairy_free')
+
+# Meals of a day: name, meal column of the food table, timing, share of the
+# daily targets, and whether vegetables are added
+MEALS = (
+    ('Breakfast', 'breakfast', '7:00 AM - 8:00 AM', 0.25, False),
+    ('Lunch', 'lunch', '12:00 PM - 1:00 PM', 0.3, True),
+    ('Snack', 'snack', '3:30 PM - 4:30 PM', 0.15, False),
+    ('Dinner', 'dinner', '7:00 PM - 8:00 PM', 0.3, True),
+)
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Macro targets are bucketed to this many grams for caching
+TARGET_BUCKET_G = 5
+
+# Calories per gram of protein, carbs and fat
+MACRO_KCAL = np.array([4.0, 4.0, 9.0])
+
+# Coordinate descent passes after the unconstrained solve
+REFINE_PASSES = 3
+
+# Best combinations per meal considered when choosing each day's
+CANDIDATE_COMBINATIONS = 200
+
+# Added to a combination's deviation per recently eaten food: a food eaten
+# earlier the same day or at the same meal the day before counts fully,
+# half as much for each day further back, and half for any meal yesterday
+REPEAT_PENALTY = 0.1
+
+
+class FoodTable:
+    """
+    The food composition table as NumPy arrays.
+
+    Args:
+        rows: Dictionaries with the CSV columns
+    """
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.names = tuple(row['name'] for row in rows)
+        self.categories = np.array([row['category'] for row in rows])
+        self.meals = tuple(frozenset(row['meals'].split('|')) for row in rows)
+        per_100g = np.array([[float(row[column]) for column in ('kcal', 'protein', 'carbs', 'fat')]
+                             for row in rows]).reshape(-1, 4) / 100
+        self.kcal = per_100g[:, 0]
+        self.macros = per_100g[:, 1:]
+        self.min_g, self.max_g, self.step_g = (np.array([float(row[column]) for row in rows])
+                                               for column in ('min_g', 'max_g', 'step_g'))
+        self.flags = {diet: np.array([row[diet] == '1' for row in rows], dtype=bool) for diet in DIETS}
+
+    def candidates(self, category, meal, diet=()):
+        """
+        Foods of a category eaten at a meal and allowed by every dietary filter.
+
+        Returns:
+            Array of row indices
+        """
+        allowed = (self.categories == category) & np.array([meal in meals for meals in self.meals], dtype=bool)
+        for name in diet:
+            allowed &= self.flags[name]
+        return np.flatnonzero(allowed)
+
+
+def load_food_table(path=FOOD_TABLE_PATH):
+    """Read a food composition CSV into a FoodTable."""
+    with open(path, newline='') as handle:
+        return FoodTable(csv.DictReader(handle))
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_food_table():
+    """
+    Get or load the process-wide food table.
+
+    Returns:
+        FoodTable instance
+    """
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = load_food_table()
+            logger.info(f"Loaded {len(_table.names)} foods from {FOOD_TABLE_PATH}")
+    return _table
+
+
+def normalize_diet(diet):
+    """
+    Canonical form of a dietary filter.
+
+    Args:
+        diet: None, a comma-separated string or an iterable of DIETS names
+
+    Returns:
+        Sorted, comma-separated string ('' for no filter)
+
+    Raises:
+        ValueError: If a name is not a known dietary filter
+    """
+    if not diet:
+        return ''
+    names = diet.split(',') if isinstance(diet, str) else diet
+    names = {name.strip().lower() for name in names if name and name.strip()}
+    unknown = names - set(DIETS)
+    if unknown:
+        raise ValueError(f"Unknown dietary filter: {', '.join(sorted(unknown))}")
+    return ','.join(sorted(names))
+
+
+def _solve_meal(table, meal, target, diet, with_vegetables):
+    """
+    Portions of every candidate combination for one meal.
+
+    Args:
+        table: FoodTable
+        meal: Meal column of the food table
+        target: Protein, carbs and fat in grams
+        diet: Tuple of dietary filters
+        with_vegetables: Whether the combinations include a vegetable
+
+    Returns:
+        Tuple of (foods, grams, error): food indices and portions (both
+        combinations x foods), and each combination's relative deviation,
+        best first
+    """
+    categories = ('protein', 'carb', 'fat') + (('vegetable',) if with_vegetables else ())
+    pools = [table.candidates(category, meal, diet) for category in categories]
+    for category, pool in zip(categories, pools):
+        if not len(pool):
+            raise ValueError(f"No {category} foods for {meal} with filter '{','.join(diet)}'")
+    foods = np.stack(np.meshgrid(*pools, indexing='ij'), axis=-1).reshape(-1, len(pools))
+
+    # Vegetables are a fixed portion; the other foods are solved for what is left
+    solved = foods[:, :3]
+    fixed = np.zeros(len(foods))
+    remaining = np.broadcast_to(target, (len(foods), 3))
+    if with_vegetables:
+        fixed = table.min_g[foods[:, 3]]
+        remaining = target - table.macros[foods[:, 3]] * fixed[:, None]
+
+    A = table.macros[solved].transpose(0, 2, 1)   # combinations x macros x foods
+    low, high, step = table.min_g[solved], table.max_g[solved], table.step_g[solved]
+    grams = np.einsum('nfm,nm->nf', np.linalg.pinv(A), remaining)
+    grams = np.clip(grams, low, high)
+    norms = np.einsum('nmf,nmf->nf', A, A)
+    for _ in range(REFINE_PASSES):
+        for food in range(3):
+            column = A[:, :, food]
+            others = np.einsum('nmf,nf->nm', A, grams) - column * grams[:, food, None]
+            best = np.einsum('nm,nm->n', remaining - others, column) / norms[:, food]
+            grams[:, food] = np.clip(best, low[:, food], high[:, food])
+    grams = np.clip(np.round(grams / step) * step, low, high)
+
+    if with_vegetables:
+        grams = np.column_stack([grams, fixed])
+    achieved = np.einsum('nfm,nf->nm', table.macros[foods], grams)
+    kcal = np.einsum('nf,nf->n', table.kcal[foods], grams)
+    target_kcal = target @ MACRO_KCAL
+    error = (np.abs(achieved - target) / np.maximum(target, 1.0)).sum(axis=1) \
+        + np.abs(kcal - target_kcal) / max(target_kcal, 1.0)
+
+    keep = min(CANDIDATE_COMBINATIONS, len(error))
+    best = np.argpartition(error, keep - 1)[:keep]
+    best = best[np.argsort(error[best], kind='stable')]
+    return foods[best], grams[best], error[best]
+
+
+def _repeats(size, history, slot, today):
+    """
+    Repeat weight of every food (see REPEAT_PENALTY).
+
+    Args:
+        size: Number of foods
+        history: Per meal, the foods chosen on each previous day
+        slot: Meal being chosen
+        today: Foods chosen earlier today
+    """
+    weights = np.zeros(size)
+    for days_ago, chosen in enumerate(reversed(history[slot]), start=1):
+        weights[chosen] += 0.5 ** (days_ago - 1)
+    for meal, days in enumerate(history):
+        if meal != slot and days:
+            weights[days[-1]] += 0.5
+    weights[list(today)] += 1.0
+    return weights
+
+
+def _meal(table, name, timing, foods, grams):
+    items = []
+    for food, amount in zip(foods.tolist(), grams.tolist()):
+        protein, carbs, fat = (table.macros[food] * amount).tolist()
+        items.append({'name': table.names[food], 'grams': int(round(amount)),
+                      'kcal': round(float(table.kcal[food] * amount)), 'protein': round(protein, 1),
+                      'carbs': round(carbs, 1), 'fat': round(fat, 1)})
+    return {
+        'name': name,
+        'timing': timing,
+        'foods': items,
+        'kcal': sum(item['kcal'] for item in items),
+        'protein': round(sum(item['protein'] for item in items)),
+        'carbs': round(sum(item['carbs'] for item in items)),
+        'fats': round(sum(item['fat'] for item in items)),
+    }
+
+
+@quantized_lru_cache(maxsize=512, quantize={'protein_g': TARGET_BUCKET_G, 'carbs_g': TARGET_BUCKET_G,
+                                             'fat_g': TARGET_BUCKET_G})
+def solve_meal_plan(protein_g, carbs_g, fat_g, diet='', days=7):
+    """
+    Meal plan for daily macro targets.
+
+    Targets are bucketed to TARGET_BUCKET_G grams before solving, and plans
+    are cached per bucket and dietary filter.
+
+    Args:
+        protein_g: Daily protein in grams
+        carbs_g: Daily carbohydrates in grams
+        fat_g: Daily fat in grams
+        diet: Dietary filter (see normalize_diet)
+        days: Days to plan
+
+    Returns:
+        Dictionary with 'targets', 'diet' and 'days'; each day has its
+        'meals' and 'totals'
+
+    Raises:
+        ValueError: If the filter is unknown or leaves a meal without foods
+    """
+    table = get_food_table()
+    diet = tuple(name for name in normalize_diet(diet).split(',') if name)
+    daily = np.array([protein_g, carbs_g, fat_g], dtype=float)
+
+    solutions = [_solve_meal(table, meal, daily * share, diet, with_vegetables)
+                 for _, meal, _, share, with_vegetables in MEALS]
+    history = [[] for _ in MEALS]
+    plan_days = []
+    for day in range(days):
+        eaten_today = set()
+        chosen = []
+        meals = []
+        for slot, (name, _, timing, _, _) in enumerate(MEALS):
+            foods, grams, error = solutions[slot]
+            weights = _repeats(len(table.names), history, slot, eaten_today)
+            index = int(np.argmin(error + REPEAT_PENALTY * weights[foods].sum(axis=1)))
+            chosen.append(foods[index].tolist())
+            eaten_today.update(chosen[-1])
+            meals.append(_meal(table, name, timing, foods[index], grams[index]))
+        # The day joins the history once all its meals are chosen
+        for slot, foods in enumerate(chosen):
+            history[slot].append(foods)
+        plan_days.append({
+            'day': WEEKDAYS[day % len(WEEKDAYS)],
+            'meals': meals,
+            'totals': {key: sum(meal[key] for meal in meals) for key in ('kcal', 'protein', 'carbs', 'fats')},
+        })
+
+    return {
+        'targets': {'kcal': round(float(daily @ MACRO_KCAL)), 'protein': round(protein_g),
+                    'carbs': round(carbs_g), 'fats': round(fat_g)},
+        'diet': list(diet),
+        'days': plan_days,
+    }
+
+
+def generate_meal_plan(calories, diet=None, days=7):
+    """
+    Meal plan for a calorie recommendation.
+
+    Args:
+        calories: Dictionary from calculate_calorie_recommendations (or a
+            calorie grid cell), with 'protein_g', 'carbs_g' and 'fat_g'
+        diet: Dietary filter (see normalize_diet)
+        days: Days to plan
+
+    Returns:
+        Dictionary as from solve_meal_plan
+    """
+    return solve_meal_plan(calories['protein_g'], calories['carbs_g'], calories['fat_g'],
+                           normalize_diet(diet), days)
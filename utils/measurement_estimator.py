@@ -14,6 +14,9 @@ import math
 from PIL import Image
 import mediapipe as mp
 from .measurement_validator import MeasurementValidator as ExternalMeasurementValidator
+from .formula_cache import quantized_lru_cache
+from .model_preload import ProcessLocal
+from .resource_governor import inference_slot
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -21,12 +24,17 @@ logger = logging.getLogger(__name__)
 class BodyLandmarkDetector:
     def __init__(self):
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
+        # MediaPipe graphs are not fork-safe: one is built per process on first use
+        self._pose = ProcessLocal(lambda: self.mp_pose.Pose(
             static_image_mode=True,
             model_complexity=2,
             enable_segmentation=True,
             min_detection_confidence=0.5
-        )
+        ))
+    
+    @property
+    def pose(self):
+        return self._pose.get()
     
     def detect_landmarks(self, image):
         """Detect body landmarks in an image"""
@@ -38,7 +46,8 @@ class BodyLandmarkDetector:
                 image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
             # Process image to find landmarks
-            results = self.pose.process(image_rgb)
+            with inference_slot():
+                results = self.pose.process(image_rgb)
             
             if not results.pose_landmarks:
                 logger.warning("No pose landmarks detected in image")
@@ -825,6 +834,7 @@ class BodyMeasurementEstimator:
         
         return measurements
     
+    @quantized_lru_cache(maxsize=512, quantize={'bmi': 0.01})
     def _calculate_bmi_adjustment(self, bmi, gender):
         """
         Calculate BMI-based adjustment factor using a sigmoid-like function that provides
@@ -0,0 +1,601 @@
+"""
+Mesh ingestion for 3D body scans.
+
+Consumer body scanners produce 50-300MB STL, PLY or OBJ files. This module
+loads them into compact arrays without holding the raw file in memory:
+
+- Binary STL and binary PLY are memory-mapped and their records are viewed
+  with ``np.frombuffer`` using structured dtypes, so only the coordinate
+  columns that are actually needed get copied into the result arrays.
+- ASCII STL, ASCII PLY and OBJ are parsed in fixed-size chunks of lines so
+  that peak memory stays proportional to the chunk size, not the file size.
+
+Every loader returns a Mesh with float32 vertices of shape (N, 3) and int32
+triangle indices of shape (M, 3).
+"""
+
+import io
+import logging
+import mmap
+import os
+import re
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of bytes of text read per chunk when parsing ASCII formats
+ASCII_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Binary STL: 80-byte header, uint32 triangle count, then 50-byte records
+STL_HEADER_BYTES = 84
+STL_RECORD_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attributes', '<u2'),
+])
+
+# Leading bytes needed to validate a file's format (covers any PLY header)
+SCAN_HEADER_SNIFF_BYTES = 64 * 1024
+
+# OBJ statements accepted at the start of a file when sniffing headers
+OBJ_KEYWORDS = {'#', 'v', 'vn', 'vt', 'vp', 'f', 'o', 'g', 's', 'l', 'mtllib', 'usemtl'}
+
+# Texture/normal references ("12/4/7") stripped from OBJ face tokens
+_OBJ_FACE_SUFFIX = re.compile(r'/\S*')
+
+# PLY scalar type names mapped to NumPy type codes
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1',
+    'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2',
+    'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4',
+    'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4',
+    'double': 'f8', 'float64': 'f8',
+}
+
+
+class MeshFormatError(ValueError):
+    """Raised when a scan file is malformed or uses an unsupported layout."""
+
+
+class Mesh:
+    """
+    Indexed triangle mesh stored as compact NumPy arrays.
+
+    Attributes:
+        vertices: float32 array of shape (N, 3)
+        faces: int32 array of shape (M, 3) indexing into vertices
+        source_path: Path of the file the mesh was loaded from
+        file_format: File extension of the source ('.stl', '.ply', '.obj')
+    """
+
+    def __init__(self, vertices, faces, source_path=None, file_format=None):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32).reshape(-1, 3)
+        self.source_path = source_path
+        self.file_format = file_format
+
+    @property
+    def vertex_count(self):
+        return int(self.vertices.shape[0])
+
+    @property
+    def face_count(self):
+        return int(self.faces.shape[0])
+
+    @property
+    def nbytes(self):
+        """Memory held by the vertex and face arrays in bytes."""
+        return int(self.vertices.nbytes + self.faces.nbytes)
+
+    def bounds(self):
+        """
+        Get the axis-aligned bounding box of the mesh.
+
+        Returns:
+            Tuple of (min_xyz, max_xyz) float32 arrays
+        """
+        if self.vertex_count == 0:
+            zeros = np.zeros(3, dtype=np.float32)
+            return zeros, zeros
+        return self.vertices.min(axis=0), self.vertices.max(axis=0)
+
+    def normalize_to_body_frame(self, height_cm=0.0):
+        """
+        Reorient and rescale the mesh into the body frame used for analysis.
+
+        After normalization the Y axis is vertical with the feet at y=0, the
+        X axis is the wider horizontal axis (left-right) and the Z axis is
+        depth (front-back). Units are converted to centimeters: scanners
+        export in meters or millimeters, which is detected from the body
+        height. When the user's height is known and the extent is ambiguous
+        it is used to pick the scale.
+
+        Args:
+            height_cm: User's height in centimeters, or 0 if unknown
+
+        Returns:
+            The mesh itself, for chaining
+        """
+        if self.vertex_count == 0:
+            return self
+
+        lo, hi = self.bounds()
+        extent = hi - lo
+        up_axis = int(np.argmax(extent))
+        horizontal = [axis for axis in range(3) if axis != up_axis]
+        horizontal.sort(key=lambda axis: -extent[axis])
+        order = [horizontal[0], up_axis, horizontal[1]]
+        if order != [0, 1, 2]:
+            self.vertices = np.ascontiguousarray(self.vertices[:, order])
+            # An odd axis permutation mirrors the mesh; flip depth to keep
+            # the winding (and therefore signed volumes) outward-facing
+            if order in ([1, 0, 2], [0, 2, 1], [2, 1, 0]):
+                self.vertices[:, 2] *= -1
+
+        body_extent = float(extent[up_axis])
+        if height_cm and body_extent > 0 and not 50.0 <= body_extent <= 250.0:
+            scale = height_cm / body_extent
+        elif body_extent < 3.0:
+            scale = 100.0  # meters
+        elif body_extent > 300.0:
+            scale = 0.1  # millimeters
+        else:
+            scale = 1.0
+
+        center = (self.vertices.min(axis=0) + self.vertices.max(axis=0)) / 2.0
+        offset = np.array([center[0], self.vertices[:, 1].min(), center[2]], dtype=np.float32)
+        self.vertices -= offset
+        if scale != 1.0:
+            self.vertices *= np.float32(scale)
+        return self
+
+
+def _weld_vertices(corners):
+    """
+    Merge identical corner positions of a triangle soup into shared vertices.
+
+    Args:
+        corners: float32 array of shape (M * 3, 3)
+
+    Returns:
+        Tuple of (vertices, faces)
+    """
+    corners = np.ascontiguousarray(corners, dtype=np.float32)
+    corners += np.float32(0.0)  # fold -0.0 into 0.0 so they compare bytewise equal
+    keys = corners.view(np.dtype((np.void, corners.dtype.itemsize * 3))).ravel()
+    _, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    vertices = corners[first_index]
+    faces = inverse.astype(np.int32).reshape(-1, 3)
+    return vertices, faces
+
+
+def _iter_line_chunks(handle):
+    """Yield lists of text lines, roughly ASCII_CHUNK_BYTES at a time."""
+    while True:
+        lines = handle.readlines(ASCII_CHUNK_BYTES)
+        if not lines:
+            return
+        yield lines
+
+
+def _is_binary_stl(path):
+    """Detect binary STL by checking the record count against the file size."""
+    size = os.path.getsize(path)
+    if size < STL_HEADER_BYTES:
+        return False
+    with open(path, 'rb') as handle:
+        header = handle.read(STL_HEADER_BYTES)
+    count = int(np.frombuffer(header, dtype='<u4', count=1, offset=80)[0])
+    if size == STL_HEADER_BYTES + count * STL_RECORD_DTYPE.itemsize:
+        return True
+    # Some exporters write "solid" into binary headers, so only trust the
+    # keyword when the size check fails
+    return not header.lstrip().lower().startswith(b'solid')
+
+
+def load_stl(path, weld=True):
+    """
+    Load a binary or ASCII STL file.
+
+    Binary files are memory-mapped and viewed as a structured record array,
+    so the 50-byte records are never copied as a whole.
+
+    Args:
+        path: Path to the STL file
+        weld: Merge duplicate triangle corners into shared vertices
+
+    Returns:
+        Mesh
+    """
+    if _is_binary_stl(path):
+        with open(path, 'rb') as handle:
+            if os.path.getsize(path) == STL_HEADER_BYTES:
+                corners = np.zeros((0, 3), dtype=np.float32)
+            else:
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    count = int(np.frombuffer(buffer, dtype='<u4', count=1, offset=80)[0])
+                    available = (len(buffer) - STL_HEADER_BYTES) // STL_RECORD_DTYPE.itemsize
+                    if count > available:
+                        raise MeshFormatError(f"STL declares {count} triangles but holds {available}")
+                    records = np.frombuffer(buffer, dtype=STL_RECORD_DTYPE,
+                                            count=count, offset=STL_HEADER_BYTES)
+                    # Copy only the 36 bytes of corner coordinates per record
+                    corners = np.array(records['vertices'], dtype=np.float32).reshape(-1, 3)
+                    del records
+    else:
+        parts = []
+        with open(path, 'r', errors='replace') as handle:
+            for lines in _iter_line_chunks(handle):
+                text = ' '.join(line.split(None, 1)[1] for line in lines
+                                if line.lstrip().startswith('vertex'))
+                if text:
+                    parts.append(np.array(text.split(), dtype=np.float32))
+        corners = np.concatenate(parts).reshape(-1, 3) if parts else np.zeros((0, 3), dtype=np.float32)
+        if corners.shape[0] % 3:
+            raise MeshFormatError("ASCII STL has an incomplete facet")
+
+    if weld:
+        vertices, faces = _weld_vertices(corners)
+    else:
+        vertices = corners
+        faces = np.arange(corners.shape[0], dtype=np.int32).reshape(-1, 3)
+    return Mesh(vertices, faces, source_path=path, file_format='.stl')
+
+
+def _parse_ply_header(handle):
+    """
+    Parse a PLY header.
+
+    Returns:
+        Tuple of (format, elements, header_bytes) where elements is a list of
+        dicts with 'name', 'count' and 'properties' (name, type, list types)
+
+    Raises:
+        MeshFormatError: If the header is missing, unterminated or malformed
+    """
+    if handle.readline().strip() != b'ply':
+        raise MeshFormatError("Missing PLY magic number")
+    file_format = None
+    elements = []
+    while True:
+        line = handle.readline()
+        if not line:
+            raise MeshFormatError("Unterminated PLY header")
+        tokens = line.decode('ascii', errors='replace').split()
+        if not tokens or tokens[0] in ('comment', 'obj_info'):
+            continue
+        try:
+            if tokens[0] == 'format':
+                file_format = tokens[1]
+            elif tokens[0] == 'element':
+                elements.append({'name': tokens[1], 'count': int(tokens[2]), 'properties': []})
+            elif tokens[0] == 'property':
+                if not elements:
+                    raise MeshFormatError("PLY property before any element")
+                if tokens[1] == 'list':
+                    elements[-1]['properties'].append((tokens[4], PLY_TYPES[tokens[3]], PLY_TYPES[tokens[2]]))
+                else:
+                    elements[-1]['properties'].append((tokens[2], PLY_TYPES[tokens[1]], None))
+            elif tokens[0] == 'end_header':
+                return file_format, elements, handle.tell()
+        except (IndexError, KeyError, ValueError) as e:
+            # Missing tokens, unknown property types and non-numeric counts
+            raise MeshFormatError(f"Malformed PLY header line: {line.strip().decode('ascii', errors='replace')}") from e
+
+
+def _ply_fixed_dtype(element, byte_order):
+    """Structured dtype for an element with only scalar properties, else None."""
+    if any(count_type for _, _, count_type in element['properties']):
+        return None
+    return np.dtype([(name, byte_order + code) for name, code, _ in element['properties']])
+
+
+def _triangulate_polygons(polygons):
+    """Fan-triangulate a list of index sequences into an (M, 3) array."""
+    triangles = []
+    for polygon in polygons:
+        for i in range(1, len(polygon) - 1):
+            triangles.append((polygon[0], polygon[i], polygon[i + 1]))
+    return np.array(triangles, dtype=np.int32).reshape(-1, 3)
+
+
+def _read_binary_ply_faces(buffer, offset, element, byte_order):
+    """
+    Read a binary PLY face element.
+
+    The common case of an all-triangle face list with no other properties is
+    viewed as a fixed-size record array. Anything else falls back to a
+    sequential scan that fan-triangulates polygons.
+
+    Returns:
+        Tuple of (faces, bytes_consumed)
+    """
+    count = element['count']
+    properties = element['properties']
+    if len(properties) == 1 and properties[0][2]:
+        _, index_code, count_code = properties[0]
+        triangle_dtype = np.dtype([('n', byte_order + count_code),
+                                   ('indices', byte_order + index_code, (3,))])
+        if offset + count * triangle_dtype.itemsize <= len(buffer):
+            records = np.frombuffer(buffer, dtype=triangle_dtype, count=count, offset=offset)
+            if count == 0 or np.all(records['n'] == 3):
+                faces = np.array(records['indices'], dtype=np.int32)
+                return faces, count * triangle_dtype.itemsize
+
+    logger.info("PLY faces are not a uniform triangle list, using sequential parser")
+    position = offset
+    polygons = []
+    for _ in range(count):
+        polygon = None
+        for _, code, count_code in properties:
+            if count_code:
+                size_dtype = np.dtype(byte_order + count_code)
+                length = int(np.frombuffer(buffer, dtype=size_dtype, count=1, offset=position)[0])
+                position += size_dtype.itemsize
+                item_dtype = np.dtype(byte_order + code)
+                values = np.frombuffer(buffer, dtype=item_dtype, count=length, offset=position)
+                position += length * item_dtype.itemsize
+                if polygon is None:
+                    polygon = values.astype(np.int64).tolist()
+            else:
+                position += np.dtype(code).itemsize
+        polygons.append(polygon or [])
+    return _triangulate_polygons(polygons), position - offset
+
+
+def _load_binary_ply(path, file_format, elements, header_bytes):
+    """Load a binary PLY by memory-mapping it and viewing element records."""
+    byte_order = '<' if file_format == 'binary_little_endian' else '>'
+    vertices = np.zeros((0, 3), dtype=np.float32)
+    faces = np.zeros((0, 3), dtype=np.int32)
+    with open(path, 'rb') as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            offset = header_bytes
+            for element in elements:
+                fixed_dtype = _ply_fixed_dtype(element, byte_order)
+                if element['name'] == 'vertex':
+                    if fixed_dtype is None:
+                        raise MeshFormatError("PLY vertex element with list properties is not supported")
+                    records = np.frombuffer(buffer, dtype=fixed_dtype,
+                                            count=element['count'], offset=offset)
+                    vertices = np.empty((element['count'], 3), dtype=np.float32)
+                    for column, axis in enumerate(('x', 'y', 'z')):
+                        vertices[:, column] = records[axis]
+                    del records
+                    offset += element['count'] * fixed_dtype.itemsize
+                elif element['name'] == 'face':
+                    faces, consumed = _read_binary_ply_faces(buffer, offset, element, byte_order)
+                    offset += consumed
+                elif fixed_dtype is not None:
+                    offset += element['count'] * fixed_dtype.itemsize
+                else:
+                    # Variable-size trailing elements (e.g. edges) are not needed
+                    break
+    return vertices, faces
+
+
+def _load_ascii_ply(path, elements, header_bytes):
+    """Load an ASCII PLY, parsing vertex and face lines in chunks."""
+    vertices = np.zeros((0, 3), dtype=np.float32)
+    faces = np.zeros((0, 3), dtype=np.int32)
+    with open(path, 'rb') as handle:
+        handle.seek(header_bytes)
+        pending = []
+        for element in elements:
+            remaining = element['count']
+            names = [name for name, _, _ in element['properties']]
+            vertex_parts = []
+            face_parts = []
+            polygons = []
+            while remaining > 0:
+                if not pending:
+                    pending = handle.readlines(ASCII_CHUNK_BYTES)
+                    if not pending:
+                        raise MeshFormatError(f"PLY ended inside element '{element['name']}'")
+                take = pending[:remaining]
+                pending = pending[remaining:]
+                remaining -= len(take)
+                if element['name'] == 'vertex':
+                    rows = np.array(b' '.join(take).split(), dtype=np.float32)
+                    rows = rows.reshape(len(take), len(names))
+                    vertex_parts.append(rows[:, [names.index(axis) for axis in ('x', 'y', 'z')]])
+                elif element['name'] == 'face':
+                    split_lines = [line.split() for line in take]
+                    if all(len(tokens) == 4 and tokens[0] == b'3' for tokens in split_lines):
+                        face_parts.append(np.array(split_lines, dtype=np.int32)[:, 1:])
+                    else:
+                        polygons.extend([int(value) for value in tokens[1:1 + int(tokens[0])]]
+                                        for tokens in split_lines)
+            if element['name'] == 'vertex' and vertex_parts:
+                vertices = np.concatenate(vertex_parts)
+            elif element['name'] == 'face':
+                if polygons:
+                    face_parts.append(_triangulate_polygons(polygons))
+                if face_parts:
+                    faces = np.concatenate(face_parts)
+                break
+    return vertices, faces
+
+
+def load_ply(path):
+    """
+    Load a binary (little/big endian) or ASCII PLY file.
+
+    Args:
+        path: Path to the PLY file
+
+    Returns:
+        Mesh
+    """
+    with open(path, 'rb') as handle:
+        file_format, elements, header_bytes = _parse_ply_header(handle)
+    if file_format in ('binary_little_endian', 'binary_big_endian'):
+        vertices, faces = _load_binary_ply(path, file_format, elements, header_bytes)
+    elif file_format == 'ascii':
+        vertices, faces = _load_ascii_ply(path, elements, header_bytes)
+    else:
+        raise MeshFormatError(f"Unsupported PLY format: {file_format}")
+    return Mesh(vertices, faces, source_path=path, file_format='.ply')
+
+
+def _parse_obj_polygons(lines, vertex_total):
+    """
+    Parse OBJ faces line by line, resolving relative indices and polygons.
+
+    Args:
+        lines: Chunk of OBJ lines in file order
+        vertex_total: Number of vertices defined before this chunk
+
+    Returns:
+        int32 array of triangles
+    """
+    polygons = []
+    base = vertex_total
+    for line in lines:
+        if line.startswith('v '):
+            base += 1
+        elif line.startswith('f '):
+            polygon = []
+            for token in line[2:].split():
+                index = int(token.split('/', 1)[0])
+                polygon.append(index - 1 if index > 0 else base + index)
+            polygons.append(polygon)
+    return _triangulate_polygons(polygons)
+
+
+def load_obj(path):
+    """
+    Load a Wavefront OBJ file, parsing it in chunks of lines.
+
+    Only vertex positions and faces are read; texture coordinates, normals
+    and materials are ignored. Polygons are fan-triangulated and negative
+    (relative) indices are resolved.
+
+    Args:
+        path: Path to the OBJ file
+
+    Returns:
+        Mesh
+    """
+    vertex_parts = []
+    face_parts = []
+    vertex_total = 0
+    with open(path, 'r', errors='replace') as handle:
+        for lines in _iter_line_chunks(handle):
+            coordinates = [line[2:] for line in lines if line.startswith('v ')]
+            face_lines = [line[2:] for line in lines if line.startswith('f ')]
+
+            if coordinates:
+                tokens = ' '.join(coordinates).split()
+                if len(tokens) == 3 * len(coordinates):
+                    rows = np.array(tokens, dtype=np.float32).reshape(-1, 3)
+                else:
+                    # Some exporters append a w component or vertex colors
+                    rows = np.array([row.split()[:3] for row in coordinates], dtype=np.float32)
+                vertex_parts.append(rows)
+
+            if face_lines:
+                text = _OBJ_FACE_SUFFIX.sub('', ' '.join(face_lines))
+                tokens = text.split()
+                if '-' not in text and len(tokens) == 3 * len(face_lines):
+                    face_parts.append(np.array(tokens, dtype=np.int32).reshape(-1, 3) - 1)
+                else:
+                    face_parts.append(_parse_obj_polygons(lines, vertex_total))
+            vertex_total += len(coordinates)
+
+    vertices = np.concatenate(vertex_parts) if vertex_parts else np.zeros((0, 3), dtype=np.float32)
+    faces = np.concatenate(face_parts) if face_parts else np.zeros((0, 3), dtype=np.int32)
+    return Mesh(vertices, faces, source_path=path, file_format='.obj')
+
+
+def sniff_mesh_header(head, file_size, extension):
+    """
+    Validate the first bytes of a scan file before the rest has arrived.
+
+    Lets uploads be rejected on their first chunk instead of after hundreds
+    of megabytes have been written. Binary STL is checked against the
+    declared file size; PLY headers must be complete and declare vertices
+    and faces; STL/OBJ text must start with a recognised statement.
+
+    Args:
+        head: Leading bytes of the file (at least the whole PLY header)
+        file_size: Total size of the file in bytes
+        extension: File extension including the dot
+
+    Returns:
+        Format description string, e.g. 'binary_stl' or 'ply_binary_little_endian'
+
+    Raises:
+        MeshFormatError: If the bytes cannot start a valid file of this type
+    """
+    extension = extension.lower()
+    if extension == '.stl':
+        if head[:5].lower() == b'solid' and b'facet' in head[:4096].lower():
+            return 'ascii_stl'
+        if len(head) < STL_HEADER_BYTES:
+            raise MeshFormatError("STL header is truncated")
+        count = int(np.frombuffer(head, dtype='<u4', count=1, offset=80)[0])
+        if file_size != STL_HEADER_BYTES + count * STL_RECORD_DTYPE.itemsize:
+            raise MeshFormatError(f"Binary STL declares {count} triangles but the file is {file_size} bytes")
+        return 'binary_stl'
+
+    if extension == '.ply':
+        file_format, elements, _ = _parse_ply_header(io.BytesIO(head))
+        if file_format not in ('ascii', 'binary_little_endian', 'binary_big_endian'):
+            raise MeshFormatError(f"Unsupported PLY format: {file_format}")
+        names = {element['name'] for element in elements}
+        if not {'vertex', 'face'} <= names:
+            raise MeshFormatError("PLY file must declare vertex and face elements")
+        return f'ply_{file_format}'
+
+    if extension == '.obj':
+        if b'\0' in head:
+            raise MeshFormatError("OBJ files must be text")
+        for line in head.decode('utf-8', errors='replace').splitlines()[:-1]:
+            tokens = line.split(None, 1)
+            if not tokens:
+                continue
+            keyword = '#' if tokens[0].startswith('#') else tokens[0]
+            if keyword not in OBJ_KEYWORDS:
+                raise MeshFormatError(f"Unexpected OBJ statement: {tokens[0][:20]}")
+            return 'obj'
+        raise MeshFormatError("No OBJ statements in the first chunk")
+
+    raise MeshFormatError(f"Unsupported scan format: {extension}")
+
+
+MESH_LOADERS = {
+    '.stl': load_stl,
+    '.ply': load_ply,
+    '.obj': load_obj,
+}
+
+
+def load_mesh(path):
+    """
+    Load a 3D scan mesh, dispatching on the file extension.
+
+    Args:
+        path: Path to an STL, PLY or OBJ file
+
+    Returns:
+        Mesh with float32 vertices and int32 faces
+
+    Raises:
+        MeshFormatError: If the format is unsupported or the file is malformed
+    """
+    file_ext = os.path.splitext(path)[1].lower()
+    loader = MESH_LOADERS.get(file_ext)
+    if loader is None:
+        raise MeshFormatError(f"Unsupported mesh format: {file_ext}")
+    mesh = loader(path)
+    if mesh.face_count and (mesh.faces.min() < 0 or mesh.faces.max() >= mesh.vertex_count):
+        raise MeshFormatError("Face indices reference missing vertices")
+    logger.info(f"Loaded {file_ext} mesh with {mesh.vertex_count} vertices and "
+                f"{mesh.face_count} faces ({mesh.nbytes / 1e6:.1f} MB) from {path}")
+    return mesh
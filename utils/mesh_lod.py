@@ -0,0 +1,375 @@
+"""
+Level-of-detail pipeline for streaming 3D body scans to the browser.
+
+A raw scan can be hundreds of megabytes, far too much to ship to the 3D
+viewer. This module decimates a scan to a few target face counts and encodes
+each level in a compact binary layout that the viewer decodes directly into
+WebGL buffers:
+
+- Decimation uses quadric vertex clustering: vertices are bucketed on a
+  uniform grid and each occupied cell is collapsed to the point minimizing
+  the summed plane quadrics of the faces around it, which keeps the body
+  silhouette sharp where plain averaging would shrink it.
+- Vertex positions are quantized to int16 inside the level's bounding box.
+- Vertices are reordered by first use so triangle indices mostly increase;
+  indices are delta-encoded, zigzag-mapped and written as LEB128 varints,
+  which brings them to 1-2 bytes each.
+
+Encoded levels are cached on disk per scan together with a JSON manifest and
+served as static files, so HTTP range requests work out of the box.
+
+Binary layout (little-endian):
+    magic 'MGLD', uint16 version, uint16 level, uint32 vertex_count,
+    uint32 triangle_count, uint32 index_bytes, float32[3] origin,
+    float32[3] scale, int16[vertex_count * 3] positions (padded to 4 bytes),
+    varint[triangle_count * 3] index deltas
+"""
+
+import json
+import logging
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Target face counts per level, coarsest first
+LOD_FACE_TARGETS = (5000, 40000, 200000)
+
+# Where encoded levels are cached (one directory per scan)
+LOD_CACHE_DIR = os.environ.get('MESH_LOD_CACHE_DIR', os.path.join('instance', 'mesh_lod'))
+
+LOD_MAGIC = b'MGLD'
+LOD_VERSION = 1
+LOD_HEADER = struct.Struct('<4sHHIII3f3f')
+
+# Largest int16 magnitude used for quantized coordinates
+QUANT_RANGE = 32767
+
+# Clustering passes used to home in on a target face count
+CLUSTER_ITERATIONS = 6
+
+
+def _face_quadrics(vertices, faces):
+    """
+    Area-weighted plane quadric of every face.
+
+    Returns:
+        float64 array (M, 10) holding the upper triangle of each 4x4 quadric
+        in the order aa, ab, ac, ad, bb, bc, bd, cc, cd, dd
+    """
+    v0 = vertices[faces[:, 0]].astype(np.float64)
+    normals = np.cross(vertices[faces[:, 1]] - v0, vertices[faces[:, 2]] - v0)
+    double_area = np.linalg.norm(normals, axis=1)
+    valid = double_area > 0
+    normals[valid] /= double_area[valid, None]
+    weight = 0.5 * double_area
+    a, b, c = normals.T
+    d = -np.einsum('ij,ij->i', normals, v0)
+    return np.stack([a * a, a * b, a * c, a * d, b * b, b * c, b * d, c * c, c * d, d * d], axis=1) * weight[:, None]
+
+
+def cluster_decimate(vertices, faces, cell_size, quadrics=None):
+    """
+    Decimate a mesh by quadric vertex clustering on a uniform grid.
+
+    Args:
+        vertices: float array (N, 3)
+        faces: int array (M, 3)
+        cell_size: Grid cell edge length in mesh units
+        quadrics: Optional per-vertex quadrics (N, 10) to reuse across calls
+
+    Returns:
+        Tuple of (vertices float32 (K, 3), faces int32 (L, 3))
+    """
+    if quadrics is None:
+        quadrics = vertex_quadrics(vertices, faces)
+
+    lo = vertices.min(axis=0)
+    cells = np.floor((vertices - lo) / cell_size).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, cluster = np.unique(keys, return_inverse=True)
+    cluster = cluster.ravel()
+    n_clusters = int(cluster.max()) + 1
+
+    counts = np.bincount(cluster, minlength=n_clusters).astype(np.float64)
+    mean = np.stack([np.bincount(cluster, weights=vertices[:, axis], minlength=n_clusters)
+                     for axis in range(3)], axis=1) / counts[:, None]
+    q = np.stack([np.bincount(cluster, weights=quadrics[:, k], minlength=n_clusters)
+                  for k in range(10)], axis=1)
+
+    # Minimize v^T A v + 2 b^T v + c per cluster; flat or degenerate cells
+    # (ill-conditioned A) keep the vertex mean
+    A = q[:, [0, 1, 2, 1, 4, 5, 2, 5, 7]].reshape(-1, 3, 3)
+    rhs = -q[:, [3, 6, 8]]
+    positions = mean.copy()
+    det = np.linalg.det(A)
+    scale = np.maximum(np.abs(A).max(axis=(1, 2)), 1e-30) ** 3
+    solvable = np.abs(det) > 1e-6 * scale
+    if solvable.any():
+        solved = np.linalg.solve(A[solvable], rhs[solvable][..., None])[..., 0]
+        # Reject solutions that leave the neighbourhood of the cell
+        near = np.abs(solved - mean[solvable]).max(axis=1) <= cell_size
+        rows = np.nonzero(solvable)[0][near]
+        positions[rows] = solved[near]
+
+    new_faces = cluster[faces]
+    keep = ((new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2])
+            & (new_faces[:, 0] != new_faces[:, 2]))
+    new_faces = new_faces[keep]
+    # Drop duplicate triangles produced by collapsing, keeping their winding
+    _, first = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+    new_faces = new_faces[np.sort(first)]
+
+    # Compact away clusters no longer referenced by any face
+    used, remap = np.unique(new_faces, return_inverse=True)
+    return positions[used].astype(np.float32), remap.reshape(-1, 3).astype(np.int32)
+
+
+def vertex_quadrics(vertices, faces):
+    """Sum each face's plane quadric onto its three vertices."""
+    face_q = _face_quadrics(vertices, faces)
+    flat = faces.ravel()
+    return np.stack([np.bincount(flat, weights=np.repeat(face_q[:, k], 3), minlength=len(vertices))
+                     for k in range(10)], axis=1)
+
+
+def decimate_to_target(vertices, faces, target_faces, quadrics=None):
+    """
+    Decimate a mesh to approximately ``target_faces`` triangles.
+
+    The grid cell size is first estimated from the surface area and then
+    corrected a few times from the face count each pass actually produced.
+
+    Returns:
+        Tuple of (vertices, faces)
+    """
+    if len(faces) <= target_faces:
+        return vertices, faces
+    if quadrics is None:
+        quadrics = vertex_quadrics(vertices, faces)
+
+    v0 = vertices[faces[:, 0]]
+    area = 0.5 * np.linalg.norm(np.cross(vertices[faces[:, 1]] - v0, vertices[faces[:, 2]] - v0), axis=1).sum()
+    cell = float(np.sqrt(2.0 * area / target_faces)) or 1.0
+
+    best = None
+    for _ in range(CLUSTER_ITERATIONS):
+        result = cluster_decimate(vertices, faces, cell, quadrics)
+        produced = len(result[1])
+        if best is None or abs(produced - target_faces) < abs(len(best[1]) - target_faces):
+            best = result
+        if produced == 0 or abs(produced - target_faces) <= 0.1 * target_faces:
+            break
+        cell *= float(np.sqrt(produced / target_faces)) if produced else 0.5
+    return best
+
+
+def _zigzag_varints(values):
+    """Encode signed integers as zigzag LEB128 varints (vectorized)."""
+    values = values.astype(np.int64)
+    unsigned = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+    lengths = np.ones(len(unsigned), dtype=np.int64)
+    for shift in (7, 14, 21, 28):
+        lengths += unsigned >= (1 << shift)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    out = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    for k in range(5):
+        rows = lengths > k
+        if not rows.any():
+            break
+        byte = (unsigned[rows] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (lengths[rows] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[offsets[rows] + k] = (byte | more).astype(np.uint8)
+    return out
+
+
+def _decode_zigzag_varints(data, count):
+    """Inverse of _zigzag_varints, used to verify encoded levels."""
+    data = np.frombuffer(data, dtype=np.uint8)
+    ends = np.nonzero(data < 0x80)[0][:count]
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    unsigned = np.zeros(count, dtype=np.int64)
+    for k in range(5):
+        rows = starts + k <= ends
+        if not rows.any():
+            break
+        unsigned[rows] |= (data[starts[rows] + k].astype(np.int64) & 0x7F) << (7 * k)
+    return (unsigned >> 1) ^ -(unsigned & 1)
+
+
+def encode_lod(vertices, faces, level=0):
+    """
+    Encode a mesh level in the compact binary layout described above.
+
+    Args:
+        vertices: float array (N, 3)
+        faces: int array (M, 3)
+        level: Level number stored in the header
+
+    Returns:
+        bytes
+    """
+    flat = faces.ravel()
+    # Renumber vertices in order of first use so index deltas stay small
+    used, first = np.unique(flat, return_index=True)
+    order = used[np.argsort(first)]
+    renumber = np.empty(len(vertices), dtype=np.int64)
+    renumber[order] = np.arange(len(order))
+    flat = renumber[flat]
+    vertices = vertices[order].astype(np.float64)
+
+    lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+    origin = (lo + hi) / 2.0
+    scale = np.maximum((hi - lo) / 2.0, 1e-6)
+    quantized = np.round((vertices - origin) / scale * QUANT_RANGE).astype('<i2')
+
+    deltas = np.diff(flat, prepend=0)
+    indices = _zigzag_varints(deltas)
+
+    positions = quantized.tobytes()
+    padding = b'\0' * (-len(positions) % 4)
+    header = LOD_HEADER.pack(LOD_MAGIC, LOD_VERSION, level, len(order), len(faces), len(indices),
+                             *origin.astype(np.float32), *scale.astype(np.float32))
+    return header + positions + padding + indices.tobytes()
+
+
+def decode_lod(data):
+    """
+    Decode a level produced by encode_lod.
+
+    Returns:
+        Tuple of (vertices float32 (N, 3), faces int32 (M, 3))
+    """
+    fields = LOD_HEADER.unpack_from(data)
+    if fields[0] != LOD_MAGIC or fields[1] != LOD_VERSION:
+        raise ValueError("Not a mesh LOD file")
+    vertex_count, triangle_count, index_bytes = fields[3:6]
+    origin = np.array(fields[6:9], dtype=np.float32)
+    scale = np.array(fields[9:12], dtype=np.float32)
+    offset = LOD_HEADER.size
+    quantized = np.frombuffer(data, dtype='<i2', count=vertex_count * 3, offset=offset).reshape(-1, 3)
+    offset += vertex_count * 6
+    offset += -offset % 4
+    deltas = _decode_zigzag_varints(data[offset:offset + index_bytes], triangle_count * 3)
+    vertices = quantized.astype(np.float32) / QUANT_RANGE * scale + origin
+    return vertices, np.cumsum(deltas).reshape(-1, 3).astype(np.int32)
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def lod_cache_dir(scan_id):
+    """Directory holding the cached levels of one scan."""
+    return os.path.join(LOD_CACHE_DIR, f'scan_{scan_id}')
+
+
+def lod_file_path(scan_id, level):
+    """Path of an encoded level in the cache."""
+    return os.path.join(lod_cache_dir(scan_id), f'lod{level}.bin')
+
+
+def load_lod_manifest(scan_id, source_path=None):
+    """
+    Read a cached manifest, or None if missing or stale for ``source_path``.
+    """
+    path = os.path.join(lod_cache_dir(scan_id), 'manifest.json')
+    try:
+        with open(path) as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != LOD_VERSION:
+        return None
+    if source_path and manifest.get('source') != _source_signature(source_path):
+        return None
+    return manifest
+
+
+def _write_atomic(path, data):
+    """Write bytes under a unique temporary name and rename it into place."""
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            output.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def build_lods(mesh, scan_id, targets=LOD_FACE_TARGETS, directory=None):
+    """
+    Decimate a scan to every target face count and cache the encoded levels.
+
+    Each level is decimated from the full-resolution mesh (not from the
+    previous level) so errors do not accumulate. Files are written to a
+    unique temporary name and renamed, so concurrent readers never see
+    partial data and concurrent builders never share a temporary file.
+
+    Args:
+        mesh: Mesh in the body frame
+        scan_id: Identifier used for the cache directory
+        targets: Face counts, coarsest first
+        directory: Output directory (defaults to the scan's cache directory)
+
+    Returns:
+        Manifest dictionary describing the cached levels
+    """
+    start = time.perf_counter()
+    directory = directory or lod_cache_dir(scan_id)
+    os.makedirs(directory, exist_ok=True)
+    quadrics = vertex_quadrics(mesh.vertices, mesh.faces)
+
+    levels = []
+    for level, target in enumerate(sorted(set(targets))):
+        vertices, faces = decimate_to_target(mesh.vertices, mesh.faces, target, quadrics)
+        data = encode_lod(vertices, faces, level)
+        _write_atomic(os.path.join(directory, f'lod{level}.bin'), data)
+        levels.append({'level': level, 'faces': int(len(faces)), 'vertices': int(len(vertices)),
+                       'bytes': len(data)})
+        if len(faces) >= mesh.face_count:
+            break
+
+    lo, hi = mesh.bounds()
+    manifest = {
+        'version': LOD_VERSION,
+        'scan_id': scan_id,
+        'source': _source_signature(mesh.source_path) if mesh.source_path else None,
+        'source_faces': mesh.face_count,
+        'bounds': [lo.tolist(), hi.tolist()],
+        'levels': levels,
+    }
+    _write_atomic(os.path.join(directory, 'manifest.json'), json.dumps(manifest).encode('utf-8'))
+
+    logger.info(f"Built {len(levels)} LODs for scan {scan_id} from {mesh.face_count} faces "
+                f"in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+
+def get_lod_manifest(scan_id, source_path, height_cm=0.0):
+    """
+    Return the cached LOD manifest for a scan, building it on first use.
+
+    Args:
+        scan_id: Scan identifier
+        source_path: Path of the raw scan file
+        height_cm: User's height, used when normalizing units
+
+    Returns:
+        Manifest dictionary
+    """
+    manifest = load_lod_manifest(scan_id, source_path)
+    if manifest is not None:
+        return manifest
+    from utils.mesh_io import load_mesh
+    mesh = load_mesh(source_path).normalize_to_body_frame(height_cm)
+    return build_lods(mesh, scan_id)
@@ -0,0 +1,233 @@
+"""
+Headless orthographic rendering of 3D body scans.
+
+The 2D pipeline (pose landmarks, ``analyze_body_traits``) works on photos.
+For scan-only uploads this module produces equivalent images straight from
+the mesh arrays: a NumPy z-buffer rasterizer draws depth-shaded front, side
+and back views without a GPU or display.
+
+Rasterization is vectorized over triangles. Every triangle is expanded into
+the pixel centres of its screen-space bounding box, barycentric coordinates
+reject the centres outside it, and the nearest fragment per pixel is kept by
+sorting fragments on depth. Triangles are processed in batches bounded by
+their total bounding-box area, so memory stays flat for million-face scans.
+
+Renders are cached on disk per scan file, view and resolution.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where rendered views are cached
+RENDER_CACHE_DIR = os.environ.get('SCAN_RENDER_CACHE_DIR', os.path.join('instance', 'scan_renders'))
+
+# Default output size (portrait, like the photo uploads)
+DEFAULT_RENDER_SIZE = (512, 1024)
+
+# Fraction of the image height occupied by the body
+BODY_FILL = 0.9
+
+# Maximum candidate pixels examined per rasterization batch
+RASTER_BATCH_PIXELS = 4_000_000
+
+# Screen axes for each view in the body frame (Y up, X left-right, Z depth,
+# +Z facing the camera in the front view): (horizontal axis, sign, depth
+# axis, sign) with larger depth meaning closer to the camera
+VIEW_AXES = {
+    'front': (0, 1.0, 2, 1.0),
+    'back': (0, -1.0, 2, -1.0),
+    'side': (2, -1.0, 0, 1.0),
+}
+
+# Background colour of rendered views (BGR)
+BACKGROUND_BGR = (255, 255, 255)
+
+
+def project_view(vertices, view, width, height):
+    """
+    Project body-frame vertices to pixel coordinates for an orthographic view.
+
+    Returns:
+        Tuple of (px, py, depth) float64 arrays
+    """
+    if view not in VIEW_AXES:
+        raise ValueError(f"Unknown view '{view}', expected one of {sorted(VIEW_AXES)}")
+    axis, sign, depth_axis, depth_sign = VIEW_AXES[view]
+    u = vertices[:, axis].astype(np.float64) * sign
+    y = vertices[:, 1].astype(np.float64)
+    depth = vertices[:, depth_axis].astype(np.float64) * depth_sign
+
+    lo_y, hi_y = y.min(), y.max()
+    scale = BODY_FILL * height / max(hi_y - lo_y, 1e-6)
+    u_center = (u.min() + u.max()) / 2.0
+    px = (u - u_center) * scale + width / 2.0
+    py = (hi_y - y) * scale + (1.0 - BODY_FILL) / 2.0 * height
+    return px, py, depth
+
+
+def rasterize_depth(px, py, depth, faces, width, height):
+    """
+    Z-buffer rasterization of projected triangles.
+
+    Args:
+        px, py: Pixel coordinates of the vertices
+        depth: Depth of the vertices (larger is closer)
+        faces: int array (M, 3)
+        width, height: Output size in pixels
+
+    Returns:
+        Tuple of (depth buffer float32 (H, W) with -inf for background,
+        face index buffer int32 (H, W) with -1 for background)
+    """
+    zbuffer = np.full(height * width, -np.inf, dtype=np.float64)
+    face_buffer = np.full(height * width, -1, dtype=np.int64)
+
+    x = px[faces]
+    y = py[faces]
+    z = depth[faces]
+    x0 = np.clip(np.ceil(x.min(axis=1) - 0.5), 0, width).astype(np.int64)
+    x1 = np.clip(np.floor(x.max(axis=1) - 0.5), -1, width - 1).astype(np.int64)
+    y0 = np.clip(np.ceil(y.min(axis=1) - 0.5), 0, height).astype(np.int64)
+    y1 = np.clip(np.floor(y.max(axis=1) - 0.5), -1, height - 1).astype(np.int64)
+    box_w = np.maximum(x1 - x0 + 1, 0)
+    box_h = np.maximum(y1 - y0 + 1, 0)
+    area = box_w * box_h
+
+    # Edge-function denominator; degenerate (edge-on) triangles cover nothing
+    denom = (y[:, 1] - y[:, 2]) * (x[:, 0] - x[:, 2]) + (x[:, 2] - x[:, 1]) * (y[:, 0] - y[:, 2])
+    visible = np.nonzero((area > 0) & (np.abs(denom) > 1e-12))[0]
+    if len(visible) == 0:
+        return zbuffer.reshape(height, width).astype(np.float32), face_buffer.reshape(height, width).astype(np.int32)
+
+    cumulative = np.cumsum(area[visible])
+    batch_edges = np.searchsorted(cumulative, np.arange(RASTER_BATCH_PIXELS, cumulative[-1], RASTER_BATCH_PIXELS))
+    for batch in np.split(visible, batch_edges):
+        if len(batch) == 0:
+            continue
+        counts = area[batch]
+        tri = np.repeat(batch, counts)
+        # Position of each candidate pixel inside its triangle's bounding box
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = x0[tri] + local % box_w[tri]
+        cy = y0[tri] + local // box_w[tri]
+        sx = cx + 0.5
+        sy = cy + 0.5
+
+        tx, ty, tz = x[tri], y[tri], z[tri]
+        d = denom[tri]
+        w0 = ((ty[:, 1] - ty[:, 2]) * (sx - tx[:, 2]) + (tx[:, 2] - tx[:, 1]) * (sy - ty[:, 2])) / d
+        w1 = ((ty[:, 2] - ty[:, 0]) * (sx - tx[:, 2]) + (tx[:, 0] - tx[:, 2]) * (sy - ty[:, 2])) / d
+        w2 = 1.0 - w0 - w1
+        inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+        if not inside.any():
+            continue
+
+        pixel = (cy * width + cx)[inside]
+        frag_depth = (w0 * tz[:, 0] + w1 * tz[:, 1] + w2 * tz[:, 2])[inside]
+        frag_face = tri[inside]
+
+        # Nearest fragment per pixel in this batch, then merge with the buffer
+        order = np.lexsort((-frag_depth, pixel))
+        pixel, frag_depth, frag_face = pixel[order], frag_depth[order], frag_face[order]
+        first = np.concatenate([[True], pixel[1:] != pixel[:-1]])
+        pixel, frag_depth, frag_face = pixel[first], frag_depth[first], frag_face[first]
+        closer = frag_depth > zbuffer[pixel]
+        zbuffer[pixel[closer]] = frag_depth[closer]
+        face_buffer[pixel[closer]] = frag_face[closer]
+
+    return zbuffer.reshape(height, width).astype(np.float32), face_buffer.reshape(height, width).astype(np.int32)
+
+
+def shade_depth(zbuffer, face_buffer, face_normals, view):
+    """
+    Convert a depth buffer to a BGR image.
+
+    Surfaces are lit from the camera direction (Lambert) and darkened with
+    depth, giving a clay-like render the pose model reads as a person.
+    """
+    axis, sign, depth_axis, depth_sign = VIEW_AXES[view]
+    covered = face_buffer >= 0
+    image = np.empty(zbuffer.shape + (3,), dtype=np.uint8)
+    image[:] = BACKGROUND_BGR
+    if not covered.any():
+        return image
+
+    depth = zbuffer[covered]
+    near, far = depth.max(), depth.min()
+    depth_factor = 1.0 - 0.35 * (near - depth) / max(near - far, 1e-6)
+    facing = np.abs(face_normals[face_buffer[covered], depth_axis])
+    intensity = np.clip((0.25 + 0.75 * facing) * depth_factor, 0.0, 1.0)
+
+    base = np.array([150, 170, 200], dtype=np.float64)  # skin-like tone (BGR)
+    image[covered] = (intensity[:, None] * base + 30).clip(0, 255).astype(np.uint8)
+    return image
+
+
+def _face_normals(vertices, faces):
+    v0 = vertices[faces[:, 0]].astype(np.float64)
+    normals = np.cross(vertices[faces[:, 1]] - v0, vertices[faces[:, 2]] - v0)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.maximum(lengths, 1e-12)
+
+
+def render_view(mesh, view='front', size=DEFAULT_RENDER_SIZE):
+    """
+    Render a depth-shaded orthographic view of a scan.
+
+    Args:
+        mesh: Mesh in the body frame
+        view: 'front', 'side' or 'back'
+        size: (width, height) of the output in pixels
+
+    Returns:
+        BGR uint8 image (OpenCV convention)
+    """
+    width, height = size
+    px, py, depth = project_view(mesh.vertices, view, width, height)
+    zbuffer, face_buffer = rasterize_depth(px, py, depth, mesh.faces, width, height)
+    return shade_depth(zbuffer, face_buffer, _face_normals(mesh.vertices, mesh.faces), view)
+
+
+def _render_cache_path(source_path, view, size):
+    stat = os.stat(source_path)
+    key = f"{os.path.abspath(source_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(RENDER_CACHE_DIR, digest, f"{view}_{size[0]}x{size[1]}.png")
+
+
+def get_rendered_view(mesh, view='front', size=DEFAULT_RENDER_SIZE):
+    """
+    Return a rendered view, reusing the on-disk cache for the scan file.
+
+    Meshes without a source file are rendered every time.
+
+    Returns:
+        BGR uint8 image
+    """
+    cache_path = None
+    if mesh.source_path and os.path.exists(mesh.source_path):
+        cache_path = _render_cache_path(mesh.source_path, view, size)
+        cached = cv2.imread(cache_path) if os.path.exists(cache_path) else None
+        if cached is not None:
+            return cached
+
+    image = render_view(mesh, view, size)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write under a unique temporary name so concurrent readers never see
+        # a partial file and concurrent writers never share one
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.png')
+        os.close(handle)
+        if cv2.imwrite(temp_path, image):
+            os.replace(temp_path, cache_path)
+        else:
+            os.remove(temp_path)
+    return image
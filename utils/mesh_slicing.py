@@ -0,0 +1,362 @@
+"""
+Cross-section slicing of 3D body scans.
+
+Extracts circumferences from a triangle mesh by intersecting it with many
+horizontal planes at once. The pipeline is fully vectorized:
+
+1. A height-bucket index (CSR layout) maps each horizontal band to the
+   triangles overlapping it, so each plane only touches triangles that can
+   span it.
+2. Every (triangle, plane) pair is intersected in one NumPy pass, giving one
+   line segment per pair whose end points are keyed by the mesh edge they
+   lie on.
+3. Segments sharing an edge point are chained into closed contours with a
+   vectorized union-find, and each contour's perimeter and centroid are
+   accumulated with bincount.
+4. For every body level the relevant contour (torso, leg or arm) is picked
+   within an anatomical search window and its convex hull perimeter is
+   reported, which matches how a tape measure wraps the body.
+
+Meshes are expected in the body frame produced by
+Mesh.normalize_to_body_frame (Y up, feet at 0, centimeters).
+"""
+
+import logging
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Default distance between slicing planes in centimeters
+DEFAULT_SLICE_STEP_CM = 0.5
+
+# Body levels measured from a scan. Each level has a search window as a
+# fraction of stature, the contour to use and whether the circumference is
+# the maximum or minimum within the window.
+BODY_LEVELS = {
+    'neck_circumference': {'window': (0.80, 0.86), 'region': 'torso', 'mode': 'min'},
+    'chest_circumference': {'window': (0.68, 0.76), 'region': 'torso', 'mode': 'max'},
+    'waist_circumference': {'window': (0.56, 0.66), 'region': 'torso', 'mode': 'min'},
+    'hip_circumference': {'window': (0.46, 0.54), 'region': 'torso', 'mode': 'max'},
+    'thigh_circumference': {'window': (0.38, 0.46), 'region': 'legs', 'mode': 'max'},
+    'calf_circumference': {'window': (0.18, 0.26), 'region': 'legs', 'mode': 'max'},
+    'arm_circumference': {'window': (0.62, 0.70), 'region': 'arms', 'mode': 'max'},
+}
+
+# Contours whose centroid lies within this fraction of the scan's half-width
+# from the midline are treated as the torso
+TORSO_MIDLINE_FRACTION = 0.25
+
+
+class SliceIndex:
+    """
+    Height-bucket index over mesh triangles.
+
+    Triangles are assigned to every bucket their vertical extent overlaps and
+    stored in CSR form (``offsets`` into ``triangles``), so candidate lookup
+    for a batch of planes is a pair of gathers.
+    """
+
+    def __init__(self, vertices, faces, bucket_height=2.0):
+        self.vertices = vertices
+        self.faces = faces
+        self.bucket_height = float(bucket_height)
+
+        y = vertices[:, 1][faces]
+        self.tri_min = y.min(axis=1)
+        self.tri_max = y.max(axis=1)
+        self.origin = float(self.tri_min.min()) if len(faces) else 0.0
+
+        first = self._bucket(self.tri_min)
+        last = self._bucket(self.tri_max)
+        self.bucket_count = int(last.max()) + 1 if len(faces) else 0
+
+        spans = last - first + 1
+        tri_ids = np.repeat(np.arange(len(faces), dtype=np.int32), spans)
+        starts = np.repeat(np.cumsum(spans) - spans, spans)
+        buckets = np.repeat(first, spans) + (np.arange(len(tri_ids)) - starts)
+
+        order = np.argsort(buckets, kind='stable')
+        self.triangles = tri_ids[order]
+        counts = np.bincount(buckets, minlength=self.bucket_count)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def _bucket(self, y):
+        return np.floor((y - self.origin) / self.bucket_height).astype(np.int64)
+
+    def spanning_pairs(self, heights):
+        """
+        Find every (triangle, plane) pair where the triangle spans the plane.
+
+        Args:
+            heights: 1-D array of plane heights
+
+        Returns:
+            Tuple of (triangle_ids, plane_ids) int arrays of equal length
+        """
+        heights = np.asarray(heights, dtype=np.float32)
+        buckets = self._bucket(heights)
+        valid = (buckets >= 0) & (buckets < self.bucket_count)
+        plane_ids = np.nonzero(valid)[0]
+        buckets = buckets[valid]
+
+        starts = self.offsets[buckets]
+        counts = self.offsets[buckets + 1] - starts
+        pair_planes = np.repeat(plane_ids, counts)
+        position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_tris = self.triangles[np.repeat(starts, counts) + position]
+
+        h = heights[pair_planes]
+        spans = (self.tri_min[pair_tris] <= h) & (self.tri_max[pair_tris] > h)
+        return pair_tris[spans], pair_planes[spans]
+
+
+def _connected_components(node_count, a, b):
+    """
+    Label connected components of an undirected graph given as edge arrays.
+
+    Uses min-label hooking with pointer jumping, which converges in a
+    logarithmic number of vectorized rounds for chain-like contours.
+
+    Returns:
+        int array of component labels (the smallest node id in each component)
+    """
+    parent = np.arange(node_count)
+    while True:
+        pa = parent[a]
+        pb = parent[b]
+        changed = pa != pb
+        if not changed.any():
+            return parent
+        low = np.minimum(pa[changed], pb[changed])
+        high = np.maximum(pa[changed], pb[changed])
+        np.minimum.at(parent, high, low)
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+
+def slice_mesh(mesh, heights, index=None):
+    """
+    Intersect a mesh with horizontal planes and group segments into contours.
+
+    Args:
+        mesh: Mesh in the body frame
+        heights: 1-D array of plane heights in centimeters
+        index: Optional prebuilt SliceIndex for the mesh
+
+    Returns:
+        Dictionary of per-contour arrays: 'plane', 'perimeter', 'centroid_x',
+        'centroid_z', plus 'segments' (K, 2, 2) XZ end points and
+        'segment_contour' mapping each segment to its contour row
+    """
+    heights = np.asarray(heights, dtype=np.float32)
+    if index is None:
+        index = SliceIndex(mesh.vertices, mesh.faces)
+    tri_ids, plane_ids = index.spanning_pairs(heights)
+
+    empty = {
+        'plane': np.zeros(0, dtype=np.int64),
+        'perimeter': np.zeros(0, dtype=np.float64),
+        'centroid_x': np.zeros(0, dtype=np.float64),
+        'centroid_z': np.zeros(0, dtype=np.float64),
+        'segments': np.zeros((0, 2, 2), dtype=np.float32),
+        'segment_contour': np.zeros(0, dtype=np.int64),
+    }
+    if len(tri_ids) == 0:
+        return empty
+
+    corners = mesh.faces[tri_ids]                       # (P, 3) vertex ids
+    points = mesh.vertices[corners]                     # (P, 3, 3)
+    above = points[:, :, 1] >= heights[plane_ids][:, None]
+
+    # Each spanning triangle has exactly two edges crossing the plane
+    edge_start = np.array([0, 1, 2])
+    edge_end = np.array([1, 2, 0])
+    crossing = above[:, edge_start] != above[:, edge_end]
+    keep = crossing.sum(axis=1) == 2
+    corners, points, crossing, plane_ids = corners[keep], points[keep], crossing[keep], plane_ids[keep]
+    if len(plane_ids) == 0:
+        return empty
+
+    edge_slot = np.argsort(~crossing, axis=1, kind='stable')[:, :2]    # (P, 2)
+    i0 = edge_start[edge_slot]
+    i1 = edge_end[edge_slot]
+    rows = np.arange(len(plane_ids))[:, None]
+    p0 = points[rows, i0]
+    p1 = points[rows, i1]
+    h = heights[plane_ids][:, None]
+    t = (h - p0[:, :, 1]) / (p1[:, :, 1] - p0[:, :, 1])
+    xz = (p0 + (p1 - p0) * t[:, :, None])[:, :, [0, 2]]                # (P, 2, 2)
+
+    # Key segment end points by (plane, mesh edge) so neighbours chain up
+    v0 = corners[rows, i0].astype(np.int64)
+    v1 = corners[rows, i1].astype(np.int64)
+    edge_key = np.minimum(v0, v1) * mesh.vertex_count + np.maximum(v0, v1)
+    node_key = plane_ids[:, None].astype(np.int64) * (mesh.vertex_count ** 2) + edge_key
+    unique_keys, node_ids = np.unique(node_key.ravel(), return_inverse=True)
+    node_ids = node_ids.reshape(-1, 2)
+
+    labels = _connected_components(len(unique_keys), node_ids[:, 0], node_ids[:, 1])
+    segment_label = labels[node_ids[:, 0]]
+    contour_ids, segment_contour = np.unique(segment_label, return_inverse=True)
+
+    lengths = np.linalg.norm(xz[:, 1] - xz[:, 0], axis=1).astype(np.float64)
+    midpoints = xz.mean(axis=1).astype(np.float64)
+    contour_count = len(contour_ids)
+    perimeter = np.bincount(segment_contour, weights=lengths, minlength=contour_count)
+    weight = np.where(perimeter > 0, perimeter, 1.0)
+    centroid_x = np.bincount(segment_contour, weights=lengths * midpoints[:, 0],
+                             minlength=contour_count) / weight
+    centroid_z = np.bincount(segment_contour, weights=lengths * midpoints[:, 1],
+                             minlength=contour_count) / weight
+    contour_plane = np.zeros(contour_count, dtype=np.int64)
+    contour_plane[segment_contour] = plane_ids
+
+    return {
+        'plane': contour_plane,
+        'perimeter': perimeter,
+        'centroid_x': centroid_x,
+        'centroid_z': centroid_z,
+        'segments': xz.astype(np.float32),
+        'segment_contour': segment_contour,
+    }
+
+
+def convex_hull_perimeter(points):
+    """
+    Perimeter of the 2-D convex hull of a point set (monotone chain).
+
+    Args:
+        points: Array of shape (N, 2)
+
+    Returns:
+        Hull perimeter as float
+    """
+    points = np.unique(np.asarray(points, dtype=np.float64), axis=0)
+    if len(points) < 3:
+        if len(points) == 2:
+            return float(2 * np.linalg.norm(points[1] - points[0]))
+        return 0.0
+
+    def half_hull(sequence):
+        hull = []
+        for point in sequence:
+            while len(hull) >= 2:
+                (ax, az), (bx, bz) = hull[-2], hull[-1]
+                if (bx - ax) * (point[1] - az) - (bz - az) * (point[0] - ax) > 0:
+                    break
+                hull.pop()
+            hull.append((point[0], point[1]))
+        return hull
+
+    lower = half_hull(points)
+    upper = half_hull(points[::-1])
+    hull = np.array(lower[:-1] + upper[:-1])
+    return float(np.linalg.norm(hull - np.roll(hull, -1, axis=0), axis=1).sum())
+
+
+def _region_mask(contours, region, half_width):
+    """Select contours belonging to the torso, legs or arms."""
+    offset = np.abs(contours['centroid_x'])
+    midline = offset <= TORSO_MIDLINE_FRACTION * half_width
+    if region == 'torso':
+        return midline
+    return ~midline
+
+
+def measure_circumferences(mesh, levels=None, step_cm=DEFAULT_SLICE_STEP_CM, index=None):
+    """
+    Measure body circumferences from a scan at every body level in one pass.
+
+    Args:
+        mesh: Mesh in the body frame (Y up, centimeters)
+        levels: Optional subset of BODY_LEVELS to measure
+        step_cm: Distance between slicing planes
+        index: Optional prebuilt SliceIndex for the mesh
+
+    Returns:
+        Dictionary mapping level name to a dict with 'value' (convex hull
+        circumference in cm), 'contour_perimeter' and 'height_cm'.
+        Levels whose contour could not be found are omitted.
+    """
+    levels = levels or BODY_LEVELS
+    if mesh.face_count == 0:
+        return {}
+
+    lo, hi = mesh.bounds()
+    stature = float(hi[1] - lo[1])
+    half_width = float(max(abs(lo[0]), abs(hi[0]))) or 1.0
+
+    # One set of planes covering every level window
+    windows = np.array([levels[name]['window'] for name in levels]) * stature + lo[1]
+    heights = np.arange(windows[:, 0].min(), windows[:, 1].max() + step_cm, step_cm, dtype=np.float32)
+    contours = slice_mesh(mesh, heights, index=index)
+    if len(contours['plane']) == 0:
+        return {}
+    contour_height = heights[contours['plane']]
+
+    results = {}
+    for name, level in levels.items():
+        low, high = np.array(level['window']) * stature + lo[1]
+        mask = ((contour_height >= low) & (contour_height <= high)
+                & _region_mask(contours, level['region'], half_width))
+        candidates = np.nonzero(mask)[0]
+        if len(candidates) == 0:
+            continue
+
+        perimeters = contours['perimeter'][candidates]
+        if level['region'] == 'torso':
+            # Keep only the largest midline contour per plane
+            plane = contours['plane'][candidates]
+            order = np.lexsort((-perimeters, plane))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = plane[order][1:] != plane[order][:-1]
+            candidates = candidates[order[first]]
+            perimeters = contours['perimeter'][candidates]
+
+        pick = candidates[np.argmax(perimeters) if level['mode'] == 'max' else np.argmin(perimeters)]
+        segments = contours['segments'][contours['segment_contour'] == pick]
+        hull = convex_hull_perimeter(segments.reshape(-1, 2))
+
+        # Average left and right limbs measured on the same plane
+        if level['region'] != 'torso':
+            same_plane = np.nonzero(mask & (contours['plane'] == contours['plane'][pick]))[0]
+            opposite = same_plane[np.sign(contours['centroid_x'][same_plane])
+                                  != np.sign(contours['centroid_x'][pick])]
+            if len(opposite):
+                partner = opposite[np.argmax(contours['perimeter'][opposite])]
+                partner_segments = contours['segments'][contours['segment_contour'] == partner]
+                hull = (hull + convex_hull_perimeter(partner_segments.reshape(-1, 2))) / 2
+
+        results[name] = {
+            'value': round(hull, 1),
+            'contour_perimeter': round(float(contours['perimeter'][pick]), 1),
+            'height_cm': round(float(contour_height[pick] - lo[1]), 1),
+        }
+
+    return results
+
+
+def measure_shoulder_width(mesh, band=(0.78, 0.83)):
+    """
+    Measure biacromial shoulder width as the lateral extent at shoulder height.
+
+    Args:
+        mesh: Mesh in the body frame
+        band: Vertical band as a fraction of stature
+
+    Returns:
+        Shoulder width in cm, or None if the band holds no vertices
+    """
+    lo, hi = mesh.bounds()
+    stature = float(hi[1] - lo[1])
+    y = mesh.vertices[:, 1]
+    in_band = (y >= lo[1] + band[0] * stature) & (y <= lo[1] + band[1] * stature)
+    if not in_band.any():
+        return None
+    x = mesh.vertices[in_band, 0]
+    return round(float(x.max() - x.min()), 1)
@@ -0,0 +1,313 @@
+"""
+Volumetric analysis of 3D body scans.
+
+Whole-body volume is the sum of signed tetrahedron volumes formed by each
+face and a reference point, which is exact for a closed, consistently wound
+mesh. Body segments (head, arms, legs, trunk) are separated by cutting
+planes derived from the scan itself: the neck, crotch and armpit levels and
+the lateral boundary of the torso.
+
+For a segment whose open boundary lies on a single cutting plane, placing
+the tetrahedron apex on that plane makes the missing cap contribute zero
+volume, so each limb is again a plain signed-tetrahedron sum over its faces.
+The trunk is the remainder. Everything is computed over face arrays in a
+handful of NumPy passes, which keeps a 1M-face scan well inside a request.
+
+Volumes are converted to body density and then to body fat with the Siri
+equation after subtracting an estimate of residual lung volume.
+"""
+
+import logging
+
+import numpy as np
+
+from utils.mesh_slicing import SliceIndex, slice_mesh, measure_circumferences, TORSO_MIDLINE_FRACTION
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Centimeters cubed per liter
+CM3_PER_LITER = 1000.0
+
+# Fixed gastrointestinal gas volume used in densitometry (liters)
+GI_GAS_LITERS = 0.1
+
+# Search windows for cutting planes as fractions of stature
+CROTCH_WINDOW = (0.38, 0.56)
+ARMPIT_WINDOW = (0.62, 0.80)
+KNEE_FRACTION = 0.28
+
+# Slicing resolution used to locate the cutting planes (cm)
+CUT_PLANE_STEP_CM = 1.0
+
+# Body segments, in label order (see classify_segments)
+SEGMENT_NAMES = ('trunk', 'head', 'left_arm', 'right_arm', 'left_leg', 'right_leg')
+
+
+def signed_face_volumes(vertices, faces, apex=None):
+    """
+    Signed volume of the tetrahedron formed by each face and an apex point.
+
+    Args:
+        vertices: float array (N, 3)
+        faces: int array (M, 3)
+        apex: Reference point (defaults to the origin)
+
+    Returns:
+        float64 array (M,) of signed volumes in cubic mesh units
+    """
+    v0 = vertices[faces[:, 0]].astype(np.float64)
+    v1 = vertices[faces[:, 1]].astype(np.float64)
+    v2 = vertices[faces[:, 2]].astype(np.float64)
+    if apex is not None:
+        apex = np.asarray(apex, dtype=np.float64)
+        v0 -= apex
+        v1 -= apex
+        v2 -= apex
+    return np.einsum('ij,ij->i', v0, np.cross(v1, v2)) / 6.0
+
+
+def mesh_volume(mesh):
+    """
+    Enclosed volume of a closed mesh in liters (mesh units are centimeters).
+
+    The sign is dropped so inward-wound meshes still give a positive volume.
+    """
+    if mesh.face_count == 0:
+        return 0.0
+    return abs(float(signed_face_volumes(mesh.vertices, mesh.faces).sum())) / CM3_PER_LITER
+
+
+def detect_cut_planes(mesh, index=None):
+    """
+    Locate the segmentation landmarks on a scan.
+
+    Args:
+        mesh: Mesh in the body frame (Y up, feet at 0, centimeters)
+        index: Optional prebuilt SliceIndex
+
+    Returns:
+        Dictionary with 'neck_y', 'crotch_y', 'armpit_y', 'knee_y', 'arm_x'
+        (lateral boundary between torso and arms) and 'leg_x' (lateral
+        extent of the thighs), in centimeters
+    """
+    lo, hi = mesh.bounds()
+    stature = float(hi[1] - lo[1])
+    half_width = float(max(abs(lo[0]), abs(hi[0]))) or 1.0
+    index = index or SliceIndex(mesh.vertices, mesh.faces)
+
+    heights = np.arange(lo[1] + CROTCH_WINDOW[0] * stature, lo[1] + ARMPIT_WINDOW[1] * stature,
+                        CUT_PLANE_STEP_CM, dtype=np.float32)
+    contours = slice_mesh(mesh, heights, index=index)
+    contour_y = heights[contours['plane']]
+    midline = np.abs(contours['centroid_x']) <= TORSO_MIDLINE_FRACTION * half_width
+
+    # Crotch: highest plane in the window where the legs are still separate
+    # (no midline contour at all)
+    planes_with_midline = np.unique(contours['plane'][midline])
+    crotch_y = lo[1] + 0.47 * stature
+    in_window = (heights <= lo[1] + CROTCH_WINDOW[1] * stature)
+    split_planes = np.setdiff1d(np.nonzero(in_window)[0], planes_with_midline)
+    top_split = None
+    if len(split_planes):
+        top_split = split_planes.max()
+        crotch_y = float(heights[top_split]) + CUT_PLANE_STEP_CM / 2
+
+    # Armpit: highest plane where separate arm contours sit beside the torso
+    armpit_y = lo[1] + 0.72 * stature
+    arm_planes = np.unique(contours['plane'][~midline & (contour_y >= lo[1] + ARMPIT_WINDOW[0] * stature)])
+    if len(arm_planes):
+        armpit_y = float(heights[arm_planes.max()])
+
+    # Lateral torso boundary at the armpit, from the torso contour's segments
+    arm_x = 0.5 * half_width
+    plane_at_armpit = np.argmin(np.abs(heights - armpit_y))
+    torso_rows = np.nonzero(midline & (contours['plane'] == plane_at_armpit))[0]
+    if len(torso_rows):
+        torso = torso_rows[np.argmax(contours['perimeter'][torso_rows])]
+        points = contours['segments'][contours['segment_contour'] == torso].reshape(-1, 2)
+        arm_x = float(np.abs(points[:, 0]).max())
+
+    # Lateral extent of the thighs just below the crotch; hands hanging
+    # beside the legs are the contours centred outside the torso boundary
+    leg_x = arm_x
+    if top_split is not None:
+        leg_rows = np.nonzero((contours['plane'] == top_split) & (np.abs(contours['centroid_x']) <= arm_x))[0]
+        leg_points = contours['segments'][np.isin(contours['segment_contour'], leg_rows)].reshape(-1, 2)
+        if len(leg_points):
+            leg_x = float(np.abs(leg_points[:, 0]).max())
+
+    neck = measure_circumferences(mesh, levels={
+        'neck_circumference': {'window': (0.80, 0.86), 'region': 'torso', 'mode': 'min'}
+    }, index=index).get('neck_circumference')
+    neck_y = lo[1] + (neck['height_cm'] if neck else 0.83 * stature)
+
+    return {
+        'neck_y': round(float(neck_y), 1),
+        'crotch_y': round(float(crotch_y), 1),
+        'armpit_y': round(float(armpit_y), 1),
+        'knee_y': round(float(lo[1] + KNEE_FRACTION * stature), 1),
+        'arm_x': round(float(arm_x), 1),
+        'leg_x': round(float(leg_x), 1),
+    }
+
+
+def classify_segments(points, cut_planes):
+    """
+    Assign body-frame points to segments.
+
+    Args:
+        points: float array (N, 3), e.g. face centroids or vertices
+        cut_planes: Output of detect_cut_planes
+
+    Returns:
+        int array (N,) of indices into SEGMENT_NAMES
+    """
+    x, y = points[:, 0], points[:, 1]
+    arm_x = cut_planes['arm_x']
+
+    is_head = y >= cut_planes['neck_y']
+    below_crotch = y < cut_planes['crotch_y']
+    lateral_limit = np.where(below_crotch, max(arm_x, cut_planes.get('leg_x', arm_x)), arm_x)
+    is_arm = (np.abs(x) > lateral_limit) & (y > cut_planes['knee_y']) & ~is_head
+    is_leg = below_crotch & ~is_arm
+
+    labels = np.zeros(len(points), dtype=np.int8)  # trunk
+    labels[is_head] = SEGMENT_NAMES.index('head')
+    labels[is_arm] = np.where(x[is_arm] < 0, SEGMENT_NAMES.index('left_arm'), SEGMENT_NAMES.index('right_arm'))
+    labels[is_leg] = np.where(x[is_leg] < 0, SEGMENT_NAMES.index('left_leg'), SEGMENT_NAMES.index('right_leg'))
+    return labels
+
+
+def segment_volumes(mesh, cut_planes=None, index=None):
+    """
+    Compute whole-body and per-segment volumes of a scan.
+
+    Faces are assigned to segments by their centroid. Each limb and the head
+    is summed with its tetrahedron apex on its own cutting plane so the open
+    cap adds no volume; the trunk is what remains of the whole body.
+
+    Args:
+        mesh: Mesh in the body frame
+        cut_planes: Optional output of detect_cut_planes
+        index: Optional prebuilt SliceIndex
+
+    Returns:
+        Dictionary with volumes in liters ('total', 'trunk', 'head',
+        'left_arm', 'right_arm', 'left_leg', 'right_leg', 'arms', 'legs')
+        and the cut planes used
+    """
+    if mesh.face_count == 0:
+        return {}
+    cut_planes = cut_planes or detect_cut_planes(mesh, index=index)
+
+    tetra = signed_face_volumes(mesh.vertices, mesh.faces)
+    total = float(tetra.sum())
+    orientation = 1.0 if total >= 0 else -1.0
+
+    centroids = mesh.vertices[mesh.faces].mean(axis=1)
+    labels = classify_segments(centroids, cut_planes)
+    arm_x = cut_planes['arm_x']
+    apexes = {
+        'head': (0.0, cut_planes['neck_y'], 0.0),
+        'left_arm': (-arm_x, cut_planes['armpit_y'], 0.0),
+        'right_arm': (arm_x, cut_planes['armpit_y'], 0.0),
+        'left_leg': (0.0, cut_planes['crotch_y'], 0.0),
+        'right_leg': (0.0, cut_planes['crotch_y'], 0.0),
+    }
+
+    volumes = {'total': abs(total) / CM3_PER_LITER}
+    for name, apex in apexes.items():
+        mask = labels == SEGMENT_NAMES.index(name)
+        if not mask.any():
+            volumes[name] = 0.0
+            continue
+        signed = signed_face_volumes(mesh.vertices, mesh.faces[mask], apex=apex).sum()
+        volumes[name] = max(0.0, float(signed) * orientation) / CM3_PER_LITER
+
+    volumes['arms'] = volumes['left_arm'] + volumes['right_arm']
+    volumes['legs'] = volumes['left_leg'] + volumes['right_leg']
+    volumes['trunk'] = max(0.0, volumes['total'] - volumes['arms'] - volumes['legs'] - volumes['head'])
+    volumes = {name: round(value, 2) for name, value in volumes.items()}
+    volumes['cut_planes'] = cut_planes
+    return volumes
+
+
+def estimate_residual_lung_volume(height_cm, gender='male', age=30):
+    """
+    Predicted residual lung volume in liters (ECSC reference equations).
+
+    Args:
+        height_cm: Height in centimeters
+        gender: 'male' or 'female'
+        age: Age in years
+
+    Returns:
+        Residual volume in liters
+    """
+    height_m = height_cm / 100.0
+    if gender.lower() == 'male':
+        return max(0.5, 1.31 * height_m + 0.022 * age - 1.23)
+    return max(0.5, 1.81 * height_m + 0.016 * age - 2.00)
+
+
+def body_fat_from_density(density):
+    """
+    Convert body density (kg/L) to body fat percentage with the Siri equation.
+    """
+    return 495.0 / density - 450.0
+
+
+def estimate_composition_from_volume(weight_kg, height_cm, volumes, gender='male', age=30):
+    """
+    Estimate body composition from scan volumes by densitometry.
+
+    Args:
+        weight_kg: Body weight in kilograms
+        height_cm: Height in centimeters
+        volumes: Output of segment_volumes
+        gender: 'male' or 'female'
+        age: Age in years
+
+    Returns:
+        Dictionary with body density, fat percentage, fat/lean mass, segment
+        volume shares and an appendicular skeletal muscle estimate, or None
+        if the volume is implausible for the given weight
+    """
+    total = volumes.get('total', 0.0)
+    if weight_kg <= 0 or total <= 0:
+        return None
+
+    residual = estimate_residual_lung_volume(height_cm, gender, age)
+    body_volume = total - residual - GI_GAS_LITERS
+    if body_volume <= 0:
+        return None
+    density = weight_kg / body_volume
+    body_fat = body_fat_from_density(density)
+    if not 2.0 <= body_fat <= 60.0:
+        logger.warning(f"Scan density {density:.3f} kg/L gives implausible body fat {body_fat:.1f}%")
+        return None
+
+    fat_mass = weight_kg * body_fat / 100.0
+    lean_mass = weight_kg - fat_mass
+
+    # Appendicular lean soft tissue from limb volumes, assuming limbs carry
+    # the whole-body fat fraction; skeletal muscle via Kim et al. (2002)
+    limb_volume = volumes.get('arms', 0.0) + volumes.get('legs', 0.0)
+    appendicular_lean = limb_volume * density * (1 - body_fat / 100.0)
+    skeletal_muscle = max(0.0, 1.19 * appendicular_lean - 1.65)
+
+    shares = {}
+    for name in ('trunk', 'arms', 'legs', 'head'):
+        shares[name] = round(100.0 * volumes.get(name, 0.0) / total, 1)
+
+    return {
+        'body_density': round(density, 4),
+        'body_fat_percentage': round(body_fat, 1),
+        'fat_mass_kg': round(fat_mass, 1),
+        'lean_mass_kg': round(lean_mass, 1),
+        'appendicular_lean_kg': round(appendicular_lean, 1),
+        'skeletal_muscle_kg': round(skeletal_muscle, 1),
+        'residual_lung_volume_l': round(residual, 2),
+        'segment_volume_share': shares,
+    }
@@ -0,0 +1,248 @@
+"""
+Copy-on-write model preloading for gunicorn workers.
+
+Without preloading every worker imports TensorFlow, Keras, OpenCV and
+MediaPipe itself and builds its MediaPipe graphs on its first request:
+N copies of the imported code and N cold starts.
+
+With PRELOAD_MODELS=1 (see gunicorn.conf.py) the master process, before
+forking, runs ``preload_models``, which:
+
+- imports the heavy Python packages and the app's reference-table modules,
+  so their code objects and constant tables are inherited by every worker;
+- calls ``gc.freeze()``, moving everything loaded so far into the permanent
+  generation, so the cyclic collector in the workers does not write to
+  (and thereby copy) those objects' pages.
+
+Nothing that owns threads or native graph state is created in the master:
+TensorFlow models and MediaPipe graphs are not fork-safe. They are built
+lazily in each worker (``ProcessLocal``), so each worker that runs the
+MobileNetV2 model holds its own copy of its weights. ``reset_after_fork``
+discards any such object a worker inherited anyway.
+
+``memory_report`` gives the unique (USS), proportional (PSS) and shared RSS
+of the master and every worker from /proc. Running
+``python -m utils.model_preload --workers 4`` forks simulated workers with
+and without preloading and prints their unique RSS side by side.
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Modules imported by the master before forking. Packages that are not
+# installed are skipped.
+PRELOAD_MODULES = (
+    'numpy', 'cv2', 'mediapipe', 'tensorflow', 'tensorflow.keras.applications',
+    'utils.body_analysis', 'utils.body_fat_cascade', 'utils.bodybuilding_metrics',
+    'utils.exercise_catalog', 'utils.recommendations', 'utils.recommendation_bundles',
+    'utils.workout_generator', 'utils.workout_planner', 'utils.meal_planner',
+    'utils.image_processing', 'utils.measurement_estimator', 'utils.enhanced_measurements',
+    'utils.ai_body_fat_estimator', 'utils.body_scan_3d',
+)
+
+_preloaded = False
+_memory_at_fork = None
+
+
+class ProcessLocal:
+    """
+    An object built lazily once per process.
+
+    Use for anything that is not fork-safe (MediaPipe graphs, TensorFlow
+    models): a worker forked from a process that already built it builds
+    its own on first use.
+
+    Args:
+        factory: Callable creating the object
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._pid = None
+        self._value = None
+
+    def get(self):
+        if self._pid != os.getpid():
+            self._value = self.factory()
+            self._pid = os.getpid()
+        return self._value
+
+
+def preload_models():
+    """
+    Load read-only models and tables in the gunicorn master before forking.
+
+    Returns:
+        Dictionary describing what was preloaded
+    """
+    global _preloaded
+    start = time.perf_counter()
+    modules = []
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+            modules.append(name)
+        except ImportError as e:
+            logger.info(f"Not preloading {name}: {str(e)}")
+
+    # Keep the collector from writing to the inherited objects' pages
+    gc.collect()
+    gc.freeze()
+    _preloaded = True
+    summary = {
+        'modules': modules,
+        'frozen_objects': gc.get_freeze_count(),
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"Preloaded models before fork: {summary}")
+    return summary
+
+
+def reset_after_fork():
+    """
+    Drop fork-unsafe state inherited from the master.
+
+    Called from gunicorn's post_fork hook. Objects holding native threads or
+    graphs are rebuilt lazily in the worker.
+    """
+    global _memory_at_fork
+    database_module = sys.modules.get('database')
+    if database_module is not None:
+        # Connections opened in the master must not be shared
+        database_module.dispose_after_fork()
+    estimator_module = sys.modules.get('utils.ai_body_fat_estimator')
+    if estimator_module is not None and estimator_module._body_fat_estimator is not None:
+        if estimator_module._body_fat_estimator._model_built:
+            estimator_module._body_fat_estimator = None
+    index_module = sys.modules.get('utils.embedding_index')
+    if index_module is not None:
+        # Reopen memory maps and file locks in the worker
+        index_module._store = None
+    _memory_at_fork = memory_usage()
+
+
+def memory_usage(pid='self'):
+    """
+    Resident memory of a process split by sharing, in MiB.
+
+    Returns:
+        Dictionary with 'rss', 'pss', 'uss' (unique) and 'shared', or an
+        empty dictionary if /proc is unavailable
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as handle:
+            for line in handle:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return {}
+    mib = 1024.0
+    unique = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return {
+        'rss': round(fields.get('Rss', 0) / mib, 1),
+        'pss': round(fields.get('Pss', 0) / mib, 1),
+        'uss': round(unique / mib, 1),
+        'shared': round((fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)) / mib, 1),
+    }
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as handle:
+            return [int(child) for child in handle.read().split()]
+    except OSError:
+        return []
+
+
+def memory_report():
+    """
+    Memory of the gunicorn master and all its workers.
+
+    Returns:
+        Dictionary with 'preloaded', this worker's usage right after fork,
+        and per-process usage for the master and every worker
+    """
+    master = os.getppid()
+    workers = {pid: memory_usage(pid) for pid in _children(master)}
+    return {
+        'preloaded': _preloaded,
+        'pid': os.getpid(),
+        'at_fork': _memory_at_fork,
+        'now': memory_usage(),
+        'master': {'pid': master, **memory_usage(master)},
+        'workers': workers,
+        'total_uss': round(sum(usage.get('uss', 0.0) for usage in workers.values()), 1),
+    }
+
+
+def warm_worker():
+    """Build the models a worker needs on its first analysis request."""
+    from utils.ai_body_fat_estimator import get_body_fat_estimator
+    get_body_fat_estimator().get_model()
+    try:
+        from utils.image_processing import extract_body_landmarks
+        extract_body_landmarks(np.zeros((256, 256, 3), dtype=np.uint8))
+    except ImportError:
+        pass
+
+
+def _fork_workers(count):
+    """Fork simulated workers that warm up and report their memory."""
+    readers = []
+    for _ in range(count):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            reset_after_fork()
+            before = memory_usage()
+            warm_worker()
+            gc.collect()
+            with os.fdopen(write_fd, 'w') as pipe:
+                json.dump({'at_fork': before, 'warm': memory_usage()}, pipe)
+            os._exit(0)
+        os.close(write_fd)
+        readers.append((pid, read_fd))
+    results = []
+    for pid, read_fd in readers:
+        with os.fdopen(read_fd) as pipe:
+            results.append(json.load(pipe))
+        os.waitpid(pid, 0)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare worker memory with and without model preloading")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--preload', choices=('yes', 'no', 'both'), default='both')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    report = {}
+    if args.preload in ('no', 'both'):
+        report['without_preload'] = _fork_workers(args.workers)
+    if args.preload in ('yes', 'both'):
+        report['preload'] = preload_models()
+        report['with_preload'] = _fork_workers(args.workers)
+    for mode in ('without_preload', 'with_preload'):
+        if mode in report:
+            unique = [worker['warm'].get('uss', 0.0) for worker in report[mode]]
+            print(f"{mode:16s} unique RSS per worker (MiB): {unique}  total {round(sum(unique), 1)}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
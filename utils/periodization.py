@@ -0,0 +1,233 @@
+"""
+Multi-week periodization of generated workout plans.
+
+A mesocycle is the generated base week plus one compact delta per week.
+The exercise selection never changes between weeks, so a delta only says
+how the base week is loaded that week:
+
+    {'week': 3, 'phase': 'loading', 'volume': 1.2, 'load': 105.0, 'rpe': 8.0}
+
+- volume: multiplier on every exercise's base sets
+- load:   working weight as a percentage of week 1
+- rpe:    target effort (rate of perceived exertion) for working sets
+
+Loading weeks add volume, load and effort step by step; every
+LOADING_WEEKS[experience] loading weeks are followed by a deload week, and
+the next block starts a step above the previous one. Step sizes depend on
+the goal.
+
+When a user logs a week's progress (share of prescribed sets completed and
+reported effort), the weeks up to it are kept as they were and only the
+remaining weeks are regenerated from it: a missed week holds the load or
+triggers an early deload, an easy week progresses faster.
+"""
+
+import logging
+
+from utils.plan_cache import PLAN_VERSION
+from utils.workout_generator import schedule_by_weekday
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Default mesocycle length in weeks
+DEFAULT_WEEKS = 8
+
+# Loading weeks before each deload, by experience
+LOADING_WEEKS = {'beginner': 5, 'intermediate': 3, 'advanced': 3}
+
+# Weekly progression while loading, by generator goal
+PROGRESSIONS = {
+    'muscle_gain': {'volume_step': 0.1, 'max_volume': 1.4, 'load_step': 2.5, 'block_step': 2.5,
+                    'rpe_start': 7.0, 'rpe_step': 0.5, 'rpe_max': 9.0},
+    'fat_loss': {'volume_step': 0.05, 'max_volume': 1.2, 'load_step': 1.5, 'block_step': 1.5,
+                 'rpe_start': 7.0, 'rpe_step': 0.5, 'rpe_max': 8.5},
+    'maintenance': {'volume_step': 0.0, 'max_volume': 1.0, 'load_step': 1.0, 'block_step': 1.0,
+                    'rpe_start': 7.0, 'rpe_step': 0.25, 'rpe_max': 8.0},
+}
+
+# Deload week: share of base sets, share of the last week's load, and effort
+DELOAD_VOLUME = 0.6
+DELOAD_LOAD = 0.9
+DELOAD_RPE = 6.0
+
+
+def _delta(week, phase, volume, load, rpe):
+    return {'week': week, 'phase': phase, 'volume': round(volume, 2), 'load': round(load, 1),
+            'rpe': round(rpe, 2)}
+
+
+def _block_start(deltas):
+    """First week of the block that ends with the last delta."""
+    start = len(deltas) - 1
+    while start > 0 and deltas[start - 1]['phase'] != 'deload':
+        start -= 1
+    return deltas[start]
+
+
+def extend_deltas(deltas, weeks, experience, goal, adjustment=None):
+    """
+    Extend a mesocycle's week deltas to the given length.
+
+    Args:
+        deltas: Deltas of the weeks already planned (kept unchanged)
+        weeks: Mesocycle length
+        experience: Experience level, sets the weeks between deloads
+        goal: Generator goal, sets the step sizes
+        adjustment: How the week after the given ones is adjusted:
+            None (progress normally), 'push' (a double step), 'hold'
+            (repeat the last week) or 'deload' (deload now)
+
+    Returns:
+        New list of deltas
+    """
+    profile = PROGRESSIONS.get(goal, PROGRESSIONS['muscle_gain'])
+    block_length = LOADING_WEEKS.get(experience, LOADING_WEEKS['intermediate'])
+    deltas = list(deltas)
+    while len(deltas) < weeks:
+        week = len(deltas) + 1
+        if not deltas:
+            deltas.append(_delta(week, 'loading', 1.0, 100.0, profile['rpe_start']))
+        elif deltas[-1]['phase'] == 'deload':
+            # A new block starts a step above the previous block's start,
+            # or at the same place if a missed week cut that block short
+            start = _block_start(deltas[:-1])
+            completed = deltas[-1]['week'] - start['week'] >= block_length
+            step = profile['block_step'] if completed else 0.0
+            deltas.append(_delta(week, 'loading', 1.0, start['load'] + step, profile['rpe_start']))
+        else:
+            last = deltas[-1]
+            loading_weeks = week - _block_start(deltas)['week']
+            if adjustment == 'deload' or loading_weeks >= block_length:
+                deltas.append(_delta(week, 'deload', DELOAD_VOLUME, last['load'] * DELOAD_LOAD, DELOAD_RPE))
+            elif adjustment == 'hold':
+                deltas.append(_delta(week, 'loading', last['volume'], last['load'], last['rpe']))
+            else:
+                steps = 2 if adjustment == 'push' else 1
+                deltas.append(_delta(week, 'loading',
+                                     min(profile['max_volume'], last['volume'] + steps * profile['volume_step']),
+                                     last['load'] + steps * profile['load_step'],
+                                     min(profile['rpe_max'], last['rpe'] + profile['rpe_step'])))
+        # Only the week right after the logged one is adjusted
+        adjustment = None
+    return deltas
+
+
+def plan_mesocycle(experience, goal, weeks=DEFAULT_WEEKS):
+    """
+    A new mesocycle.
+
+    Returns:
+        Dictionary with 'weeks', 'experience', 'goal', 'deltas' and 'progress'
+    """
+    return {
+        'weeks': weeks,
+        'experience': experience,
+        'goal': goal,
+        'deltas': extend_deltas([], weeks, experience, goal),
+        'progress': [],
+    }
+
+
+def assess_week(delta, completion, rpe=None):
+    """
+    Adjustment for the week after a logged one.
+
+    Args:
+        delta: Delta of the logged week
+        completion: Share of the prescribed sets completed (0-1)
+        rpe: Reported average effort, if any
+
+    Returns:
+        None, 'push', 'hold' or 'deload' (see ``extend_deltas``)
+    """
+    if completion < 0.7:
+        return 'deload'
+    if completion < 0.9 or (rpe is not None and rpe >= delta['rpe'] + 1):
+        return 'hold'
+    if completion >= 1.0 and rpe is not None and rpe <= delta['rpe'] - 1.5:
+        return 'push'
+    return None
+
+
+def log_progress(mesocycle, week, completion, rpe=None):
+    """
+    Record a week's progress and regenerate the weeks after it.
+
+    Args:
+        mesocycle: Stored mesocycle
+        week: Week the progress is for (1-based)
+        completion: Share of the prescribed sets completed (0-1)
+        rpe: Reported average effort, if any
+
+    Returns:
+        New mesocycle dictionary; the input is not modified
+
+    Raises:
+        ValueError: If the week is outside the mesocycle
+    """
+    if not 1 <= week <= mesocycle['weeks']:
+        raise ValueError(f"Week {week} is outside the {mesocycle['weeks']}-week mesocycle")
+    completion = min(1.0, max(0.0, float(completion)))
+    entry = {'week': week, 'completion': round(completion, 2)}
+    if rpe is not None:
+        entry['rpe'] = round(float(rpe), 1)
+    adjustment = assess_week(mesocycle['deltas'][week - 1], completion, entry.get('rpe'))
+    progress = [item for item in mesocycle['progress'] if item['week'] != week] + [dict(entry, adjustment=adjustment)]
+    deltas = extend_deltas(mesocycle['deltas'][:week], mesocycle['weeks'], mesocycle['experience'],
+                           mesocycle['goal'], adjustment)
+    return dict(mesocycle, deltas=deltas, progress=sorted(progress, key=lambda item: item['week']))
+
+
+def materialize_week(days, delta):
+    """
+    The full schedule of one week.
+
+    Args:
+        days: Base week (weekday to day, as from schedule_by_weekday)
+        delta: The week's delta
+
+    Returns:
+        New weekday dictionary; training exercises carry the week's sets,
+        load percentage and target effort
+    """
+    week = {}
+    for weekday, day in days.items():
+        day = dict(day, phase=delta['phase'])
+        if day['type'] != 'Rest':
+            exercises = []
+            for exercise in day['exercises']:
+                base_sets = int(exercise['sets'])
+                exercises.append(dict(exercise, sets=str(max(1, round(base_sets * delta['volume']))),
+                                      load_pct=delta['load'], rpe=delta['rpe']))
+            day['exercises'] = exercises
+        week[weekday] = day
+    return week
+
+
+def stored_plan(workout_plan, experience, goal, weeks=DEFAULT_WEEKS):
+    """
+    The stored form of a generated plan: the base week and its mesocycle.
+
+    Args:
+        workout_plan: Plan from generate_complete_workout_plan
+        experience: Experience level the plan was generated for
+        goal: Generator goal the plan was generated for
+        weeks: Mesocycle length
+
+    Returns:
+        Dictionary with 'plan_version', 'generated_date', 'training_split',
+        'days' and 'mesocycle'
+    """
+    return {
+        'plan_version': PLAN_VERSION,
+        'generated_date': workout_plan['generated_date'],
+        'training_split': workout_plan['training_split'],
+        'days': schedule_by_weekday(workout_plan),
+        'mesocycle': plan_mesocycle(experience, goal, weeks),
+    }
+
+
+def mesocycle_of(schedule, experience='intermediate', goal='muscle_gain', weeks=DEFAULT_WEEKS):
+    """Mesocycle of a stored plan; plans stored before periodization get a new one."""
+    return schedule.get('mesocycle') or plan_mesocycle(experience, goal, weeks)
@@ -0,0 +1,236 @@
+"""
+Seeds and a shared cache for generated workout plans.
+
+Plan generators draw exercises at random. They take an explicit seed,
+derived here from the analysis id and the plan version, so the same
+analysis always yields the same plan. Plans generated from the same
+normalized inputs (muscle categories, experience, goal, seed) are then
+interchangeable and are cached.
+
+The cache has two levels: a per-process LRU (a FormulaCache, so it shows
+up with the formula caches' statistics) and a directory of JSON files
+shared by every worker on the node. Files are written to a temporary name
+and renamed into place, so readers never see a partial plan.
+
+The directory is bounded: a file's modification time is refreshed when it
+is read, and every PRUNE_EVERY_WRITES writes the process deletes files
+older than PLAN_CACHE_MAX_AGE and then the least recently used ones beyond
+PLAN_CACHE_MAX_ENTRIES. Session-only analyses get a new seed each time, so
+without this every anonymous plan would stay on disk for good.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from utils.formula_cache import FormulaCache, register_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bump when plan generation changes so new seeds and cache keys are used
+PLAN_VERSION = 2
+
+# Shared on-disk cache location, by default in the app's instance folder
+# (independent of the working directory)
+PLAN_CACHE_DIR = os.environ.get('PLAN_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'plan_cache'))
+
+# Bounds of the shared directory: entries kept, and seconds since last use
+PLAN_CACHE_MAX_ENTRIES = int(os.environ.get('PLAN_CACHE_MAX_ENTRIES', 5000))
+PLAN_CACHE_MAX_AGE = float(os.environ.get('PLAN_CACHE_MAX_AGE', 7 * 24 * 3600))
+
+# The directory is pruned on the first write of a process and every this
+# many writes after it
+PRUNE_EVERY_WRITES = 50
+
+# Starts full so that the first write of a process prunes
+_writes_since_prune = [PRUNE_EVERY_WRITES - 1]
+
+_memory = register_cache(FormulaCache('utils.plan_cache.plans', maxsize=512))
+_disk_stats = {'hits': 0, 'misses': 0, 'writes': 0, 'pruned': 0}
+
+
+def plan_seed(analysis_id, version=PLAN_VERSION):
+    """
+    Seed for generating the plan of an analysis.
+
+    Args:
+        analysis_id: Analysis the plan belongs to
+        version: Plan version
+
+    Returns:
+        Non-negative 63-bit integer
+    """
+    digest = hashlib.sha256(f"plan|{analysis_id}|{version}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+def _canonical(value):
+    """Order-independent form of the inputs for hashing."""
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_canonical(item) for item in value]
+        return sorted(items, key=repr) if isinstance(value, (set, frozenset)) else items
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def plan_key(generator, seed, **inputs):
+    """
+    Cache key for a plan.
+
+    Args:
+        generator: Name of the generating function
+        seed: Seed the plan is generated with
+        **inputs: Normalized generator inputs
+
+    Returns:
+        Hex digest string
+    """
+    payload = json.dumps([PLAN_VERSION, generator, seed, _canonical(inputs)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _path(key):
+    return os.path.join(PLAN_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def get_plan(key):
+    """
+    Cached plan for a key.
+
+    Returns:
+        A copy of the plan the caller may modify, or None
+    """
+    found, plan = _memory.get(key)
+    if not found:
+        try:
+            path = _path(key)
+            with open(path) as handle:
+                plan = json.load(handle)
+            _disk_stats['hits'] += 1
+            # Recently used entries survive pruning
+            os.utime(path)
+        except (OSError, ValueError):
+            _disk_stats['misses'] += 1
+            return None
+        _memory.put(key, plan)
+    return copy.deepcopy(plan)
+
+
+def put_plan(key, plan):
+    """
+    Store a plan in the process cache and the shared directory.
+
+    Returns:
+        The plan as stored (JSON types only)
+    """
+    plan = json.loads(json.dumps(plan, default=str))
+    _memory.put(key, plan)
+    path = _path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(handle, 'w') as output:
+            json.dump(plan, output)
+        os.replace(temporary, path)
+        _disk_stats['writes'] += 1
+    except OSError as e:
+        logger.warning(f"Could not write plan cache entry {key}: {str(e)}")
+    _writes_since_prune[0] += 1
+    if _writes_since_prune[0] >= PRUNE_EVERY_WRITES:
+        _writes_since_prune[0] = 0
+        prune_plan_cache()
+    return plan
+
+
+def prune_plan_cache(max_entries=None, max_age=None):
+    """
+    Delete expired and least recently used files from the shared directory.
+
+    Args:
+        max_entries: Files kept (default PLAN_CACHE_MAX_ENTRIES)
+        max_age: Seconds since last use before a file expires
+            (default PLAN_CACHE_MAX_AGE)
+
+    Returns:
+        Number of files deleted
+    """
+    max_entries = PLAN_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    max_age = PLAN_CACHE_MAX_AGE if max_age is None else max_age
+    entries = []
+    try:
+        shards = os.listdir(PLAN_CACHE_DIR)
+    except OSError:
+        return 0
+    for shard in shards:
+        try:
+            with os.scandir(os.path.join(PLAN_CACHE_DIR, shard)) as files:
+                for entry in files:
+                    if entry.name.endswith('.json'):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            pass
+        except OSError:
+            continue
+
+    entries.sort(reverse=True)
+    cutoff = time.time() - max_age
+    stale = [path for rank, (mtime, path) in enumerate(entries) if rank >= max_entries or mtime < cutoff]
+    removed = 0
+    for path in stale:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            # Another worker pruned it first
+            pass
+    _disk_stats['pruned'] += removed
+    return removed
+
+
+def cached_plan(generator, seed, build, **inputs):
+    """
+    Return the cached plan for these inputs, building it on a miss.
+
+    Plans without a seed are random and never cached.
+
+    Args:
+        generator: Name of the generating function
+        seed: Seed, or None
+        build: Callable producing the plan
+        **inputs: Normalized generator inputs
+
+    Returns:
+        Plan dictionary
+    """
+    if seed is None:
+        return build()
+    key = plan_key(generator, seed, **inputs)
+    plan = get_plan(key)
+    if plan is None:
+        # Return the stored form so hits and misses look identical
+        plan = copy.deepcopy(put_plan(key, build()))
+    return plan
+
+
+def plan_cache_stats():
+    """
+    Statistics for both cache levels.
+
+    Returns:
+        Dictionary with the plan version, memory and disk statistics
+    """
+    return {
+        'plan_version': PLAN_VERSION,
+        'memory': _memory.stats(),
+        'disk': dict(_disk_stats, max_entries=PLAN_CACHE_MAX_ENTRIES, max_age=PLAN_CACHE_MAX_AGE),
+    }
@@ -0,0 +1,242 @@
+"""
+Precomputed recommendation bundles.
+
+The text recommendations depend on only a few discrete inputs: body type,
+experience level, a handful of trait ratings and, for the bodybuilding
+recommendations, the goal, the genetic potential rating and whether body
+fat is above the fat loss threshold. Rather than running the branchy
+builders with fresh literals on every request, this module enumerates that
+domain once at import (the preloader imports it before workers fork) and
+stores every bundle, frozen, in a lookup table keyed by the discrete tuple:
+
+    bundle = recommendation_bundle('Mesomorph', traits, 'intermediate')
+
+The tables are built by calling the live functions, so they cannot drift
+from them; test_recommendation_bundles.py checks this. Lookups return
+fresh copies that callers may modify, and inputs outside the enumerated
+domain fall back to the live functions.
+"""
+
+import logging
+from itertools import product
+from types import MappingProxyType
+
+from utils.bodybuilding_metrics import formulate_bodybuilding_recommendations
+from utils.recommendations import (
+    get_exercises_by_body_type,
+    get_focus_for_trait,
+    get_nutrition_tips,
+    get_strength_for_trait,
+    get_training_split,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Enumerated domain
+BODY_TYPES = ('Ectomorph', 'Mesomorph', 'Endomorph', 'Mesomorph-Ectomorph', 'Hybrid', 'unknown')
+EXPERIENCE_LEVELS = ('beginner', 'intermediate', 'advanced')
+RATINGS = ('excellent', 'good', 'average', 'below_average', None)
+TRAITS = ('shoulder_width', 'shoulder_hip_ratio', 'arm_length', 'leg_length', 'arm_torso_ratio', 'torso_length')
+BODYBUILDING_GOALS = ('build_muscle', 'strength', 'fat_loss', 'maintenance')
+GENETIC_RATINGS = ('excellent', 'good', 'average', 'below_average')
+
+# Weak point keywords, in the order formulate_bodybuilding_recommendations
+# matches them, and the weak points that select the push/pull/legs schedule
+WEAK_POINT_AREAS = ('chest', 'arm', 'calf', 'quad', 'thigh')
+SPLIT_WEAK_POINTS = ('arm development', 'chest development')
+
+# Body fat percentage above which fat loss takes the larger deficit
+HIGH_BODY_FAT = 25
+
+
+def freeze(value):
+    """Immutable copy of a JSON-like value (dicts to mapping proxies, lists to tuples)."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Mutable copy of a frozen value."""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _trait_ratings(traits):
+    """Ratings read by get_exercises_by_body_type."""
+    return traits.get('shoulder_width', {}).get('rating'), traits.get('arm_length', {}).get('rating')
+
+
+def _compile_recommendations():
+    """Exercise, split and nutrition bundles by (body type, experience, shoulder rating, arm rating)."""
+    table = {}
+    for body_type, experience, shoulder, arm in product(BODY_TYPES, EXPERIENCE_LEVELS, RATINGS, RATINGS):
+        traits = {'shoulder_width': {'rating': shoulder}, 'arm_length': {'rating': arm}}
+        table[(body_type, experience, shoulder, arm)] = freeze({
+            'exercise_recommendations': get_exercises_by_body_type(body_type, traits, experience),
+            'training_split': get_training_split(body_type, experience),
+            'nutrition_tips': get_nutrition_tips(body_type),
+        })
+    return MappingProxyType(table)
+
+
+def _compile_phrases(describe):
+    """Trait phrases by (trait, rating), for ratings that have one."""
+    phrases = {}
+    for trait, rating in product(TRAITS, RATINGS):
+        phrase = describe(trait, rating)
+        if phrase:
+            phrases[(trait, rating)] = phrase
+    return MappingProxyType(phrases)
+
+
+def _compile_bodybuilding():
+    """
+    Bodybuilding bundles without weak points, by (experience, goal, genetic
+    rating, high body fat, split weak point), and the focus entry and
+    approach added for each weak point keyword.
+    """
+    table = {}
+    for experience, goal, genetic_rating, high_body_fat, split_weak_point in product(
+            EXPERIENCE_LEVELS, BODYBUILDING_GOALS, GENETIC_RATINGS, (False, True), (False, True)):
+        analysis = {
+            'body_fat_percentage': HIGH_BODY_FAT + 5 if high_body_fat else HIGH_BODY_FAT - 5,
+            'genetic_potential': {'rating': genetic_rating},
+            'muscle_balance': {'weak_points': [SPLIT_WEAK_POINTS[0]] if split_weak_point else []},
+        }
+        result = formulate_bodybuilding_recommendations(analysis, {'experience': experience, 'goal': goal})
+        result.pop('weak_points', None)
+        table[(experience, goal, genetic_rating, high_body_fat, split_weak_point)] = freeze(result)
+
+    focus = {}
+    approach = None
+    for area in WEAK_POINT_AREAS:
+        result = formulate_bodybuilding_recommendations({'muscle_balance': {'weak_points': [area]}},
+                                                       {'experience': 'beginner'})
+        focus[area] = freeze(result['weak_points']['focus_exercises'][0])
+        approach = result['weak_points']['approach']
+    return MappingProxyType(table), MappingProxyType(focus), approach
+
+
+RECOMMENDATIONS = _compile_recommendations()
+STRENGTHS = _compile_phrases(get_strength_for_trait)
+FOCUS_AREAS = _compile_phrases(get_focus_for_trait)
+BODYBUILDING, WEAK_POINT_FOCUS, WEAK_POINT_APPROACH = _compile_bodybuilding()
+
+
+def recommendation_bundle(body_type, traits, experience_level):
+    """
+    Exercise recommendations, training split and nutrition tips.
+
+    Args:
+        body_type: Body type from the analysis
+        traits: Dictionary of body traits from analysis
+        experience_level: User's fitness experience level
+
+    Returns:
+        Dictionary with 'exercise_recommendations', 'training_split' and
+        'nutrition_tips'
+    """
+    shoulder, arm = _trait_ratings(traits)
+    try:
+        bundle = RECOMMENDATIONS.get((body_type, experience_level, shoulder, arm))
+    except TypeError:
+        bundle = None
+    if bundle is not None:
+        return thaw(bundle)
+    return {
+        'exercise_recommendations': get_exercises_by_body_type(body_type, traits, experience_level),
+        'training_split': get_training_split(body_type, experience_level),
+        'nutrition_tips': get_nutrition_tips(body_type),
+    }
+
+
+def trait_strength(trait, rating):
+    """Strength description for a highly-rated trait, or None."""
+    return STRENGTHS.get((trait, rating))
+
+
+def trait_focus(trait, rating):
+    """Focus area description for a lower-rated trait, or None."""
+    return FOCUS_AREAS.get((trait, rating))
+
+
+def _weak_point_area(weak_point):
+    for area in WEAK_POINT_AREAS:
+        if area in weak_point:
+            return area
+    return None
+
+
+def _bodybuilding_key(analysis_results, user_data):
+    """
+    Discrete key of formulate_bodybuilding_recommendations' inputs.
+
+    Returns:
+        Tuple of (key, weak points), or None if the inputs are outside the
+        enumerated domain
+    """
+    if not analysis_results or not isinstance(analysis_results, dict):
+        analysis_results = {}
+    if not user_data or not isinstance(user_data, dict):
+        user_data = {}
+
+    body_fat = analysis_results.get('body_fat_percentage', 18)
+    try:
+        body_fat = float(body_fat) if body_fat is not None else 18.0
+    except (ValueError, TypeError):
+        body_fat = 18.0
+
+    genetic_potential = analysis_results.get('genetic_potential', {})
+    if not isinstance(genetic_potential, dict):
+        genetic_potential = {}
+    muscle_balance = analysis_results.get('muscle_balance', {})
+    if not isinstance(muscle_balance, dict):
+        muscle_balance = {}
+    weak_points = muscle_balance.get('weak_points', [])
+    if not isinstance(weak_points, list):
+        weak_points = []
+    if not all(isinstance(point, str) for point in weak_points):
+        return None
+
+    key = (user_data.get('experience', 'beginner'), user_data.get('goal', 'build_muscle'),
+           genetic_potential.get('rating', 'average'), body_fat > HIGH_BODY_FAT,
+           any(point in SPLIT_WEAK_POINTS for point in weak_points))
+    try:
+        if key not in BODYBUILDING:
+            return None
+    except TypeError:
+        return None
+    return key, weak_points
+
+
+def bodybuilding_recommendations(analysis_results, user_data):
+    """
+    Bodybuilding recommendations, as from formulate_bodybuilding_recommendations.
+
+    Args:
+        analysis_results: Dictionary containing all analysis results
+        user_data: Dictionary with user information like experience level, goals, etc.
+
+    Returns:
+        Dictionary with structured recommendations
+    """
+    found = _bodybuilding_key(analysis_results, user_data)
+    if found is None:
+        return formulate_bodybuilding_recommendations(analysis_results, user_data)
+    key, weak_points = found
+    recommendations = thaw(BODYBUILDING[key])
+    if weak_points:
+        areas = (_weak_point_area(point) for point in weak_points)
+        recommendations['weak_points'] = {
+            'areas': weak_points,
+            'focus_exercises': [thaw(WEAK_POINT_FOCUS[area]) for area in areas if area],
+            'approach': WEAK_POINT_APPROACH,
+        }
+    return recommendations
@@ -1,8 +1,37 @@
 import logging
 
+import numpy as np
+
+from utils.exercise_catalog import get_exercise_catalog
+from utils.formula_cache import quantized_lru_cache
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Activity multipliers applied to the basal metabolic rate
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,      # Desk job, little or no exercise
+    'light': 1.375,        # Light exercise 1-3 days/week
+    'moderate': 1.55,      # Moderate exercise 3-5 days/week
+    'very_active': 1.725,  # Heavy exercise 6-7 days/week
+    'extra_active': 1.9    # Very heavy exercise, physical job or twice daily training
+}
+
+# Per-goal factors of calculate_calorie_recommendations, as used by the grid:
+# calories (target, training day, rest day) as multiples of maintenance, then
+# the macro shares of target calories (protein, carbs, fat), of training-day
+# calories (carbs, fat) and of rest-day calories (carbs, fat)
+CALORIE_GOALS = {
+    'maintain': (1.0, 1.0, 1.0, 0.3, 0.4, 0.3, 0.4, 0.3, 0.4, 0.3),
+    'lose_fat': (0.8, 0.8, 0.8, 0.35, 0.3, 0.35, 0.3, 0.35, 0.3, 0.35),
+    'gain_muscle': (1.1, 1.1, 1.1, 0.25, 0.5, 0.25, 0.5, 0.25, 0.5, 0.25),
+    'recomp': (1.0, 1.05, 0.9, 0.3, 0.45, 0.3, 0.45, 1 - 0.3 - 0.45, 0.35, 1 - 0.3 - 0.35),
+}
+
+# Values in each cell of a calorie grid
+CALORIE_FIELDS = ('maintenance', 'target', 'training_day', 'rest_day', 'protein_g', 'carbs_g', 'fat_g',
+                  'carbs_training_day', 'carbs_rest_day', 'fat_training_day', 'fat_rest_day')
+
 def generate_recommendations(traits, experience_level='beginner'):
     """
     Generate fitness recommendations based on body traits
@@ -42,13 +71,15 @@ def generate_recommendations(traits, experience_level='beginner'):
             }
         }
         
+        from utils.recommendation_bundles import recommendation_bundle, trait_focus, trait_strength
+
         # Add strengths based on traits
         for trait, data in traits.items():
             if trait in ['body_type', 'description'] or not isinstance(data, dict):
                 continue
                 
             if data.get('rating') in ['excellent', 'good']:
-                strength = get_strength_for_trait(trait, data.get('rating'))
+                strength = trait_strength(trait, data.get('rating'))
                 if strength:
                     recommendations['strengths'].append(strength)
         
@@ -58,25 +89,13 @@ def generate_recommendations(traits, experience_level='beginner'):
                 continue
                 
             if data.get('rating') in ['average', 'below_average']:
-                focus = get_focus_for_trait(trait, data.get('rating'))
+                focus = trait_focus(trait, data.get('rating'))
                 if focus:
                     recommendations['focus_areas'].append(focus)
         
-        # Generate exercise recommendations based on body type and traits
-        recommendations['exercise_recommendations'] = get_exercises_by_body_type(
-            body_type, 
-            traits, 
-            experience_level
-        )
-        
-        # Generate training split recommendation
-        recommendations['training_split'] = get_training_split(
-            body_type, 
-            experience_level
-        )
-        
-        # Generate nutrition tips
-        recommendations['nutrition_tips'] = get_nutrition_tips(body_type)
+        # Exercise recommendations, training split and nutrition tips from
+        # the precomputed bundle for the body type, experience and traits
+        recommendations.update(recommendation_bundle(body_type, traits, experience_level))
         
         # Determine appropriate goal based on body composition
         goal = 'maintain'  # Default goal
@@ -552,46 +571,11 @@ def generate_detailed_workout_plan(body_type, experience_level, traits, goal):
     """
     workout_plan = {}
     
-    # Base exercises for each body part
-    base_exercises = {
-        'chest': [
-            {'name': 'Bench Press', 'target': 'overall chest development', 'sets': 3, 'reps': '8-10'},
-            {'name': 'Incline Dumbbell Press', 'target': 'upper chest', 'sets': 3, 'reps': '8-10'},
-            {'name': 'Cable Flyes', 'target': 'chest stretching and isolation', 'sets': 3, 'reps': '10-12'},
-            {'name': 'Decline Press', 'target': 'lower chest development', 'sets': 3, 'reps': '10-12'}
-        ],
-        'back': [
-            {'name': 'Pull-ups/Lat Pulldowns', 'target': 'latissimus dorsi', 'sets': 3, 'reps': '8-10'},
-            {'name': 'Bent-over Rows', 'target': 'middle back', 'sets': 3, 'reps': '8-10'},
-            {'name': 'Seated Cable Rows', 'target': 'overall back development', 'sets': 3, 'reps': '10-12'},
-            {'name': 'Face Pulls', 'target': 'rear deltoids and upper back', 'sets': 3, 'reps': '12-15'}
-        ],
-        'shoulders': [
-            {'name': 'Overhead Press', 'target': 'overall shoulder development', 'sets': 3, 'reps': '8-10'},
-            {'name': 'Lateral Raises', 'target': 'lateral deltoids', 'sets': 3, 'reps': '10-15'},
-            {'name': 'Front Raises', 'target': 'anterior deltoids', 'sets': 3, 'reps': '10-12'},
-            {'name': 'Reverse Flyes', 'target': 'posterior deltoids', 'sets': 3, 'reps': '10-15'}
-        ],
-        'arms': [
-            {'name': 'Barbell Curls', 'target': 'biceps', 'sets': 3, 'reps': '8-12'},
-            {'name': 'Tricep Dips', 'target': 'triceps', 'sets': 3, 'reps': '8-12'},
-            {'name': 'Hammer Curls', 'target': 'brachialis and forearms', 'sets': 3, 'reps': '10-12'},
-            {'name': 'Tricep Pushdowns', 'target': 'triceps', 'sets': 3, 'reps': '10-12'}
-        ],
-        'legs': [
-            {'name': 'Squats', 'target': 'quadriceps and overall leg development', 'sets': 3, 'reps': '8-10'},
-            {'name': 'Romanian Deadlifts', 'target': 'hamstrings and glutes', 'sets': 3, 'reps': '8-10'},
-            {'name': 'Leg Press', 'target': 'quadriceps', 'sets': 3, 'reps': '10-12'},
-            {'name': 'Bulgarian Split Squats', 'target': 'single-leg strength and balance', 'sets': 3, 'reps': '10-12 per leg'},
-            {'name': 'Calf Raises', 'target': 'calf muscles', 'sets': 3, 'reps': '12-15'}
-        ],
-        'core': [
-            {'name': 'Russian Twists', 'target': 'obliques', 'sets': 3, 'reps': '10-15 per side'},
-            {'name': 'Hanging Leg Raises', 'target': 'lower abs', 'sets': 3, 'reps': '10-15'},
-            {'name': 'Ab Wheel Rollouts', 'target': 'entire core', 'sets': 3, 'reps': '8-12'},
-            {'name': 'Cable Crunches', 'target': 'upper and middle abs', 'sets': 3, 'reps': '12-15'}
-        ]
-    }
+    # Staple exercises come from the shared catalog
+    catalog = get_exercise_catalog()
+    
+    def exercise(name):
+        return catalog.get(name).prescription()
     
     # Adjust training parameters based on goal
     if goal == 'lose_fat':
@@ -761,11 +745,11 @@ def generate_detailed_workout_plan(body_type, experience_level, traits, goal):
             'name': 'Push (Chest, Shoulders, Triceps)',
             'focus': 'Upper body pushing muscles',
             'exercises': [
-                base_exercises['chest'][0],  # Bench Press
-                base_exercises['chest'][1],  # Incline Dumbbell Press
-                base_exercises['shoulders'][0],  # Overhead Press
-                base_exercises['shoulders'][1],  # Lateral Raises
-                base_exercises['arms'][3]    # Tricep Pushdowns
+                exercise('Bench Press'),
+                exercise('Incline Dumbbell Press'),
+                exercise('Overhead Press'),
+                exercise('Lateral Raises'),
+                exercise('Tricep Pushdowns')
             ]
         }
         
@@ -774,11 +758,11 @@ def generate_detailed_workout_plan(body_type, experience_level, traits, goal):
             'name': 'Pull (Back, Biceps)',
             'focus': 'Upper body pulling muscles',
             'exercises': [
-                base_exercises['back'][0],   # Pull-ups/Lat Pulldowns
-                base_exercises['back'][1],   # Bent-over Rows
-                base_exercises['back'][3],   # Face Pulls
-                base_exercises['arms'][0],   # Barbell Curls
-                base_exercises['arms'][2]    # Hammer Curls
+                exercise('Pull-ups/Lat Pulldowns'),
+                exercise('Bent-over Rows'),
+                exercise('Face Pulls'),
+                exercise('Barbell Curls'),
+                exercise('Hammer Curls')
             ]
         }
         
@@ -787,13 +771,13 @@ def generate_detailed_workout_plan(body_type, experience_level, traits, goal):
             'name': 'Legs & Core',
             'focus': 'Lower body development',
             'exercises': [
-                base_exercises['legs'][0],   # Squats
-                base_exercises['legs'][1],   # Romanian Deadlifts
-                base_exercises['legs'][2],   # Leg Press
-                base_exercises['legs'][3],   # Bulgarian Split Squats
-                base_exercises['legs'][4],   # Calf Raises
-                base_exercises['core'][0],   # Russian Twists
-                base_exercises['core'][1]    # Hanging Leg Raises
+                exercise('Squats'),
+                exercise('Romanian Deadlifts'),
+                exercise('Leg Press'),
+                exercise('Bulgarian Split Squats'),
+                exercise('Calf Raises'),
+                exercise('Russian Twists'),
+                exercise('Hanging Leg Raises')
             ]
         }
         
@@ -807,13 +791,13 @@ def generate_detailed_workout_plan(body_type, experience_level, traits, goal):
             'name': 'Push (Chest, Shoulders, Triceps)',
             'focus': 'Upper body pushing muscles with intensity techniques',
             'exercises': [
-                base_exercises['chest'][0],  # Bench Press
+                exercise('Bench Press'),
                 {'name': 'Incline Bench Press', 'target': 'upper chest', 'sets': '4', 'reps': '6-8'},
                 {'name': 'Dumbbell Flyes', 'target': 'chest stretching', 'sets': '3', 'reps': '10-12'},
                 {'name': 'Arnold Press', 'target': 'shoulders with rotation', 'sets': '3', 'reps': '8-10'},
-                base_exercises['shoulders'][1],  # Lateral Raises
+                exercise('Lateral Raises'),
                 {'name': 'Skull Crushers', 'target': 'triceps long head', 'sets': '3', 'reps': '8-10'},
-                base_exercises['arms'][3]    # Tricep Pushdowns
+                exercise('Tricep Pushdowns')
             ],
             'advanced_techniques': [
                 'Drop sets on final set of lateral raises',
@@ -828,11 +812,11 @@ def generate_detailed_workout_plan(body_type, experience_level, traits, goal):
             'focus': 'Upper body pulling muscles with mind-muscle connection',
             'exercises': [
                 {'name': 'Deadlifts', 'target': 'overall back and posterior chain', 'sets': '4', 'reps': '5-6'},
-                base_exercises['back'][0],   # Pull-ups/Lat Pulldowns
+                exercise('Pull-ups/Lat Pulldowns'),
                 {'name': 'Meadows Rows', 'target': 'lats and mid-back', 'sets': '3', 'reps': '8-10'},
-                base_exercises['back'][3],   # Face Pulls
+                exercise('Face Pulls'),
                 {'name': 'Incline Dumbbell Curls', 'target': 'biceps peak', 'sets': '3', 'reps': '8-10'},
-                base_exercises['arms'][2],   # Hammer Curls
+                exercise('Hammer Curls'),
                 {'name': 'Cable Curls', 'target': 'continuous tension on biceps', 'sets': '3', 'reps': '12-15'}
             ],
             'advanced_techniques': [
@@ -849,7 +833,7 @@ def generate_detailed_workout_plan(body_type, experience_level, traits, goal):
             'exercises': [
                 {'name': 'Back Squats', 'target': 'quadriceps and overall development', 'sets': '4', 'reps': '6-8'},
                 {'name': 'Bulgarian Split Squats', 'target': 'unilateral leg development', 'sets': '3', 'reps': '8-10 per leg'},
-                base_exercises['legs'][1],   # Romanian Deadlifts
+                exercise('Romanian Deadlifts'),
                 {'name': 'Leg Extensions', 'target': 'quadriceps isolation', 'sets': '3', 'reps': '12-15'},
                 {'name': 'Seated Leg Curl', 'target': 'hamstrings isolation', 'sets': '3', 'reps': '12-15'},
                 {'name': 'Standing Calf Raises', 'target': 'gastrocnemius', 'sets': '4', 'reps': '12-15'},
@@ -912,6 +896,7 @@ def generate_detailed_workout_plan(body_type, experience_level, traits, goal):
     
     return workout_plan
 
+@quantized_lru_cache(maxsize=2048)
 def calculate_calorie_recommendations(weight_kg, height_cm, body_fat, activity_level, goal):
     """
     Calculate calorie recommendations based on body metrics and goals
@@ -931,15 +916,7 @@ def calculate_calorie_recommendations(weight_kg, height_cm, body_fat, activity_l
     bmr = 370 + (21.6 * lean_mass)
     
     # Apply activity multiplier
-    activity_multipliers = {
-        'sedentary': 1.2,      # Desk job, little or no exercise
-        'light': 1.375,        # Light exercise 1-3 days/week
-        'moderate': 1.55,      # Moderate exercise 3-5 days/week
-        'very_active': 1.725,  # Heavy exercise 6-7 days/week
-        'extra_active': 1.9    # Very heavy exercise, physical job or twice daily training
-    }
-    
-    multiplier = activity_multipliers.get(activity_level, 1.55)  # Default to moderate
+    multiplier = ACTIVITY_MULTIPLIERS.get(activity_level, 1.55)  # Default to moderate
     maintenance_calories = bmr * multiplier
     
     # Adjust based on goal
@@ -1016,3 +993,59 @@ def calculate_calorie_recommendations(weight_kg, height_cm, body_fat, activity_l
         'fat_training_day': fat_g,
         'fat_rest_day': fat_g
     }
+
+def calculate_calorie_grid(weight_kg, height_cm, body_fat):
+    """
+    Calculate calorie recommendations for every activity level and goal at once
+
+    Gives the same values as calculate_calorie_recommendations for each
+    (activity level, goal) pair, computed as one array operation.
+
+    Args:
+        weight_kg: Weight in kilograms
+        height_cm: Height in centimeters
+        body_fat: Body fat percentage
+
+    Returns:
+        Dictionary with 'activity_levels', 'goals', 'fields' and 'values',
+        where values[goal][activity_level] lists the fields in order; read
+        cells with calorie_cell
+    """
+    lean_mass = weight_kg * (1 - (body_fat / 100))
+    bmr = 370 + (21.6 * lean_mass)
+    maintenance = bmr * np.array(list(ACTIVITY_MULTIPLIERS.values()))
+
+    # One row per goal: calorie factors (goals x 3) and macro shares (goals x 7)
+    factors = np.array(list(CALORIE_GOALS.values()))
+    calories = maintenance[None, :, None] * factors[:, None, :3]
+    target, training, rest = calories[..., 0], calories[..., 1], calories[..., 2]
+    protein, carbs, fat, carbs_training, fat_training, carbs_rest, fat_rest = (
+        factors[:, None, i] for i in range(3, 10))
+
+    values = np.stack([
+        np.broadcast_to(maintenance, target.shape), target, training, rest,
+        target * protein / 4, target * carbs / 4, target * fat / 9,
+        training * carbs_training / 4, rest * carbs_rest / 4,
+        training * fat_training / 9, rest * fat_rest / 9,
+    ], axis=-1)
+    return {
+        'activity_levels': list(ACTIVITY_MULTIPLIERS),
+        'goals': list(CALORIE_GOALS),
+        'fields': list(CALORIE_FIELDS),
+        'values': np.rint(values).astype(int).tolist(),
+    }
+
+def calorie_cell(grid, goal, activity_level):
+    """
+    Get one (goal, activity level) cell of a calorie grid
+
+    Unknown goals and activity levels fall back to maintenance and moderate
+    activity, as in calculate_calorie_recommendations.
+
+    Returns:
+        Dictionary with the same keys as calculate_calorie_recommendations
+    """
+    goals, activity_levels = grid['goals'], grid['activity_levels']
+    row = grid['values'][goals.index(goal if goal in goals else 'maintain')]
+    cell = row[activity_levels.index(activity_level if activity_level in activity_levels else 'moderate')]
+    return dict(zip(grid['fields'], cell))
@@ -0,0 +1,272 @@
+"""
+Per-worker CPU budget for the native libraries behind image analysis.
+
+TensorFlow sizes its intra- and inter-op pools to every core on the node,
+OpenCV keeps its own pool of the same size and MediaPipe runs its graphs on
+its own executors. With several gunicorn workers per node that multiplies
+into far more runnable threads than cores during upload bursts.
+
+``apply_resource_limits`` gives each worker a core budget (WORKER_CPU_BUDGET,
+or the usable cores divided by WEB_CONCURRENCY) and:
+
+- exports the OpenMP/BLAS/TensorFlow thread variables, which libraries read
+  when they initialize, so it must run before they are imported;
+- sets TensorFlow's intra/inter-op parallelism if TensorFlow is already
+  loaded and not yet initialized;
+- calls ``cv2.setNumThreads``;
+- optionally pins the worker to its own slice of cores (WORKER_CPU_PIN=1),
+  which also confines MediaPipe's executors, whose Python API has no
+  thread setting;
+- bounds concurrent MediaPipe/TensorFlow inference in the worker through
+  ``inference_slot``.
+
+``resource_stats`` reports the effective settings together with run-queue
+statistics from /proc for the diagnostics endpoint.
+"""
+
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Environment variables read by OpenMP, BLAS and TensorFlow at load time
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'TF_NUM_INTRAOP_THREADS')
+INTEROP_ENV_VAR = 'TF_NUM_INTEROP_THREADS'
+
+_settings = {}
+_configured_pid = None
+_inference_gate = None
+_gate_stats = {'acquired': 0, 'waited': 0, 'wait_seconds': 0.0}
+_lock = threading.Lock()
+
+
+def _env_int(name, default=None):
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def usable_cpus():
+    """CPUs this process may run on (honours affinity and cgroup cpusets)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_cpu_budget(workers=None):
+    """
+    Cores each worker may keep busy.
+
+    Args:
+        workers: Worker processes sharing the node (default WEB_CONCURRENCY)
+
+    Returns:
+        Positive integer core count
+    """
+    budget = _env_int('WORKER_CPU_BUDGET')
+    if budget:
+        return max(1, budget)
+    workers = workers or _env_int('WEB_CONCURRENCY', 1)
+    return max(1, len(usable_cpus()) // max(1, workers))
+
+
+def _configure_tensorflow(intra, inter):
+    """Apply thread settings to an already imported TensorFlow."""
+    tf = sys.modules.get('tensorflow')
+    if tf is None:
+        return 'environment'
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra)
+        tf.config.threading.set_inter_op_parallelism_threads(inter)
+        return 'configured'
+    except (RuntimeError, AttributeError) as e:
+        # The runtime is already initialized; the environment values apply
+        logger.warning(f"TensorFlow thread pools already initialized: {str(e)}")
+        return 'already_initialized'
+
+
+def apply_resource_limits(worker_index=None, workers=None, pin=None):
+    """
+    Size the native thread pools of this process to its CPU budget.
+
+    Runs once per process; later calls return the existing settings. Call it
+    before TensorFlow, NumPy and OpenCV are imported (app.py does so at the
+    top, gunicorn's post_fork hook does so with the worker index).
+
+    Args:
+        worker_index: Index of this worker, used to choose its cores when pinning
+        workers: Worker processes sharing the node (default WEB_CONCURRENCY)
+        pin: Pin to a core slice (default WORKER_CPU_PIN)
+
+    Returns:
+        Dictionary of the effective settings
+    """
+    global _configured_pid, _inference_gate
+    with _lock:
+        if _configured_pid == os.getpid():
+            return dict(_settings)
+
+        cpus = usable_cpus()
+        budget = worker_cpu_budget(workers)
+        intra = budget
+        inter = max(1, min(2, budget // 2))
+        for name in THREAD_ENV_VARS:
+            os.environ.setdefault(name, str(intra))
+        os.environ.setdefault(INTEROP_ENV_VAR, str(inter))
+        # Explicit settings from the environment win over the budget
+        intra = _env_int('TF_NUM_INTRAOP_THREADS', intra)
+        inter = _env_int(INTEROP_ENV_VAR, inter)
+
+        affinity = None
+        if pin is None:
+            pin = os.environ.get('WORKER_CPU_PIN', '0') == '1'
+        if pin and worker_index is not None and hasattr(os, 'sched_setaffinity'):
+            start = (worker_index * budget) % len(cpus)
+            affinity = [cpus[(start + offset) % len(cpus)] for offset in range(min(budget, len(cpus)))]
+            try:
+                os.sched_setaffinity(0, affinity)
+            except OSError as e:
+                logger.warning(f"Could not pin worker to CPUs {affinity}: {str(e)}")
+                affinity = None
+
+        opencv_threads = None
+        try:
+            import cv2
+            cv2.setNumThreads(budget)
+            opencv_threads = cv2.getNumThreads()
+        except ImportError:
+            pass
+
+        concurrency = max(1, _env_int('INFERENCE_CONCURRENCY', max(1, budget // intra)))
+        _inference_gate = threading.BoundedSemaphore(concurrency)
+
+        _settings.clear()
+        _settings.update({
+            'pid': os.getpid(),
+            'worker_index': worker_index,
+            'cpu_budget': budget,
+            'usable_cpus': len(cpus),
+            'pinned_cpus': affinity,
+            'tensorflow_intra_op_threads': intra,
+            'tensorflow_inter_op_threads': inter,
+            'tensorflow_status': _configure_tensorflow(intra, inter),
+            'opencv_threads': opencv_threads,
+            'inference_concurrency': concurrency,
+            'environment': {name: os.environ.get(name) for name in THREAD_ENV_VARS + (INTEROP_ENV_VAR,)},
+        })
+        _configured_pid = os.getpid()
+        logger.info(f"CPU budget {budget} core(s) for process {os.getpid()}"
+                    + (f", pinned to {affinity}" if affinity else ""))
+        return dict(_settings)
+
+
+@contextlib.contextmanager
+def inference_slot():
+    """
+    Hold one of the worker's inference slots while running a model.
+
+    Wrap MediaPipe graph runs and TensorFlow predictions so request threads
+    and background executors in one worker do not run more of them at once
+    than its CPU budget allows.
+    """
+    gate = _inference_gate
+    if gate is None:
+        apply_resource_limits()
+        gate = _inference_gate
+    waited = not gate.acquire(blocking=False)
+    if waited:
+        start = time.perf_counter()
+        gate.acquire()
+        elapsed = time.perf_counter() - start
+    try:
+        with _lock:
+            _gate_stats['acquired'] += 1
+            if waited:
+                _gate_stats['waited'] += 1
+                _gate_stats['wait_seconds'] += elapsed
+        yield
+    finally:
+        gate.release()
+
+
+def _read_proc(path):
+    try:
+        with open(path) as handle:
+            return handle.read()
+    except OSError:
+        return None
+
+
+def _run_queue_stats():
+    """Node-wide run-queue figures from /proc (Linux only)."""
+    stats = {}
+    if hasattr(os, 'getloadavg'):
+        stats['load_average'] = [round(value, 2) for value in os.getloadavg()]
+    proc_stat = _read_proc('/proc/stat')
+    if proc_stat:
+        for line in proc_stat.splitlines():
+            if line.startswith(('procs_running', 'procs_blocked')):
+                name, value = line.split()
+                stats[name] = int(value)
+    return stats
+
+
+def _process_sched_stats():
+    """Time this process's threads ran and waited on a run queue."""
+    run_ns = wait_ns = slices = threads = 0
+    task_dir = '/proc/self/task'
+    if not os.path.isdir(task_dir):
+        return {'threads': threading.active_count()}
+    for task in os.listdir(task_dir):
+        schedstat = _read_proc(os.path.join(task_dir, task, 'schedstat'))
+        if not schedstat:
+            continue
+        run, wait, count = (int(value) for value in schedstat.split()[:3])
+        run_ns += run
+        wait_ns += wait
+        slices += count
+        threads += 1
+    return {
+        'threads': threads,
+        'cpu_seconds': round(run_ns / 1e9, 3),
+        'runqueue_wait_seconds': round(wait_ns / 1e9, 3),
+        'timeslices': slices,
+        # Waiting for a CPU as a share of wanting one; high means oversubscribed
+        'runqueue_wait_fraction': round(wait_ns / (run_ns + wait_ns), 3) if run_ns + wait_ns else 0.0,
+    }
+
+
+def resource_stats():
+    """
+    Effective thread settings and CPU contention for this worker.
+
+    Returns:
+        Dictionary with 'settings', 'inference_gate', 'process' and 'node'
+    """
+    with _lock:
+        settings = dict(_settings)
+        gate = dict(_gate_stats, wait_seconds=round(_gate_stats['wait_seconds'], 3))
+    if 'tensorflow' in sys.modules:
+        try:
+            threading_config = sys.modules['tensorflow'].config.threading
+            settings['tensorflow_effective'] = {
+                'intra_op': threading_config.get_intra_op_parallelism_threads(),
+                'inter_op': threading_config.get_inter_op_parallelism_threads(),
+            }
+        except AttributeError:
+            pass
+    if hasattr(os, 'sched_getaffinity'):
+        settings['current_affinity'] = sorted(os.sched_getaffinity(0))
+    return {
+        'settings': settings,
+        'inference_gate': gate,
+        'process': _process_sched_stats(),
+        'node': _run_queue_stats(),
+    }
@@ -0,0 +1,279 @@
+"""
+Scan-to-scan comparison for progress tracking.
+
+Two scans of the same person are compared in four steps:
+
+1. Both meshes are voxel-downsampled: vertices are bucketed on a uniform
+   grid and each occupied voxel is replaced by the centroid (and the
+   averaged area-weighted normal) of its vertices. A 500k-vertex scan
+   becomes roughly 10k evenly spaced surface samples.
+2. The newer scan is aligned to the baseline with point-to-plane ICP.
+   Correspondences come from a ``VertexGrid`` over the baseline samples and
+   every iteration solves one linearized 6x6 least-squares system for the
+   whole point set, so no Python code runs per point.
+3. Each aligned sample is matched to its closest baseline sample and the
+   offset is projected on the baseline normal, giving a signed distance:
+   positive where the body grew outwards, negative where it shrank.
+4. Samples are grouped into body segments with the baseline's cutting
+   planes, and per-segment volumes of the baseline and the aligned newer
+   scan, cut with those same planes, are differenced.
+
+Results are plain JSON so callers can cache them per scan pair.
+"""
+
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+from utils.mesh_io import Mesh
+from utils.mesh_volume import SEGMENT_NAMES, classify_segments, detect_cut_planes, segment_volumes
+from utils.spatial_index import VertexGrid
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bump when the comparison output changes so cached results are recomputed
+COMPARE_VERSION = 1
+
+# Voxel edge used to downsample scans before alignment (cm)
+COMPARE_VOXEL_CM = 1.5
+
+# ICP stopping criteria
+ICP_MAX_ITERATIONS = 30
+ICP_TOLERANCE_CM = 0.005
+
+# Correspondences farther than this multiple of the median distance (and
+# at least ICP_MIN_REJECT_CM) are ignored during alignment
+ICP_REJECT_FACTOR = 3.0
+ICP_MIN_REJECT_CM = 2.0
+
+# Signed distances beyond this are treated as noise or mismatched geometry
+# (e.g. a different arm pose) and left out of the regional statistics (cm)
+MAX_CHANGE_CM = 8.0
+
+# Surface displacement counted as real change rather than scanner noise (cm)
+CHANGE_THRESHOLD_CM = 0.3
+
+
+def vertex_normals(vertices, faces):
+    """
+    Area-weighted unit vertex normals.
+
+    Returns:
+        float64 array (N, 3); isolated vertices get a zero normal
+    """
+    v0 = vertices[faces[:, 0]].astype(np.float64)
+    face_normals = np.cross(vertices[faces[:, 1]] - v0, vertices[faces[:, 2]] - v0)
+    normals = np.empty((len(vertices), 3))
+    flat = faces.ravel()
+    for axis in range(3):
+        normals[:, axis] = np.bincount(flat, weights=np.repeat(face_normals[:, axis], 3), minlength=len(vertices))
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.maximum(lengths, 1e-12)
+
+
+def voxel_downsample(points, voxel_size=COMPARE_VOXEL_CM, normals=None):
+    """
+    Replace the points in each occupied voxel by their centroid.
+
+    Args:
+        points: float array (N, 3)
+        voxel_size: Voxel edge length
+        normals: Optional per-point normals, averaged per voxel
+
+    Returns:
+        Tuple of (centroids (M, 3), unit normals (M, 3) or None)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) == 0:
+        return points.reshape(0, 3), None if normals is None else np.empty((0, 3))
+    cells = np.floor((points - points.min(axis=0)) / voxel_size).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, voxel, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    voxel = voxel.ravel()
+
+    def voxel_sum(values):
+        return np.stack([np.bincount(voxel, weights=values[:, axis], minlength=len(counts))
+                         for axis in range(3)], axis=1)
+
+    centroids = voxel_sum(points) / counts[:, None]
+    if normals is None:
+        return centroids, None
+    summed = voxel_sum(np.asarray(normals, dtype=np.float64))
+    return centroids, summed / np.maximum(np.linalg.norm(summed, axis=1, keepdims=True), 1e-12)
+
+
+def _rotation_from_vector(rotvec):
+    """Rotation matrix for an axis-angle vector (Rodrigues' formula)."""
+    angle = np.linalg.norm(rotvec)
+    if angle < 1e-12:
+        return np.eye(3)
+    x, y, z = rotvec / angle
+    cross = np.array([[0.0, -z, y], [z, 0.0, -x], [-y, x, 0.0]])
+    return np.eye(3) + np.sin(angle) * cross + (1.0 - np.cos(angle)) * cross @ cross
+
+
+def align_icp(source, target_index, target_normals, max_iterations=ICP_MAX_ITERATIONS,
+              tolerance=ICP_TOLERANCE_CM):
+    """
+    Rigidly align source points to an indexed target with point-to-plane ICP.
+
+    Args:
+        source: float array (N, 3) of points to move
+        target_index: VertexGrid over the target points
+        target_normals: Unit normals of the target points
+        max_iterations: Iteration cap
+        tolerance: Stop once the RMS error improves by less than this
+
+    Returns:
+        Dictionary with 'rotation' (3x3), 'translation' (3,), 'rms' (cm),
+        'inlier_fraction' and 'iterations'
+    """
+    rotation = np.eye(3)
+    translation = np.zeros(3)
+    moved = np.asarray(source, dtype=np.float64)
+    target = target_index.points
+    previous_rms = np.inf
+    rms = np.inf
+    inliers = np.zeros(len(moved), dtype=bool)
+
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        distances, matches = target_index.nearest(moved)
+        limit = max(ICP_REJECT_FACTOR * float(np.median(distances)), ICP_MIN_REJECT_CM)
+        inliers = distances <= limit
+        if inliers.sum() < 6:
+            break
+
+        p = moved[inliers]
+        q = target[matches[inliers]]
+        n = target_normals[matches[inliers]]
+        residual = np.einsum('ij,ij->i', q - p, n)
+        rms = float(np.sqrt(np.mean(residual ** 2)))
+        if previous_rms - rms < tolerance:
+            break
+        previous_rms = rms
+
+        # Linearized point-to-plane step: [p x n, n] . [rotvec, t] = residual
+        A = np.hstack([np.cross(p, n), n])
+        step, *_ = np.linalg.lstsq(A.T @ A, A.T @ residual, rcond=None)
+        step_rotation = _rotation_from_vector(step[:3])
+        moved = moved @ step_rotation.T + step[3:]
+        rotation = step_rotation @ rotation
+        translation = step_rotation @ translation + step[3:]
+
+    return {
+        'rotation': rotation,
+        'translation': translation,
+        'rms': rms,
+        'inlier_fraction': float(inliers.mean()) if len(inliers) else 0.0,
+        'iterations': iteration,
+    }
+
+
+def _distance_summary(values):
+    """Summary statistics of signed surface distances (cm)."""
+    if len(values) == 0:
+        return {'samples': 0}
+    low, median, high = np.percentile(values, [10, 50, 90])
+    return {
+        'mean_cm': round(float(values.mean()), 3),
+        'median_cm': round(float(median), 3),
+        'p10_cm': round(float(low), 3),
+        'p90_cm': round(float(high), 3),
+        'grew_fraction': round(float(np.mean(values > CHANGE_THRESHOLD_CM)), 3),
+        'shrank_fraction': round(float(np.mean(values < -CHANGE_THRESHOLD_CM)), 3),
+        'samples': int(len(values)),
+    }
+
+
+def _volume_delta(before, after):
+    return {
+        'volume_before_l': before,
+        'volume_after_l': after,
+        'volume_delta_l': round(after - before, 2),
+        'volume_delta_percent': round(100.0 * (after - before) / before, 1) if before else 0.0,
+    }
+
+
+def compare_meshes(baseline, current, voxel_size=COMPARE_VOXEL_CM):
+    """
+    Align a newer scan to a baseline scan and measure regional change.
+
+    Both meshes must already be in the body frame (see
+    Mesh.normalize_to_body_frame), which also serves as ICP's initial guess.
+
+    Args:
+        baseline: Earlier Mesh
+        current: Later Mesh
+        voxel_size: Downsampling voxel edge in centimeters
+
+    Returns:
+        Dictionary with 'alignment', 'overall' and per-segment 'regions'
+        (signed distance statistics in cm plus volume deltas in liters)
+    """
+    if baseline.face_count == 0 or current.face_count == 0:
+        raise ValueError("Both scans need faces to be compared")
+
+    baseline_points, baseline_normals = voxel_downsample(
+        baseline.vertices, voxel_size, vertex_normals(baseline.vertices, baseline.faces))
+    current_points, _ = voxel_downsample(current.vertices, voxel_size)
+    # Downsampled points are about one per voxel, so voxel-sized cells keep
+    # the candidate count per query small
+    baseline_index = VertexGrid(baseline_points, cell_size=voxel_size, axis_index=False)
+
+    alignment = align_icp(current_points, baseline_index, baseline_normals)
+    aligned = current_points @ alignment['rotation'].T + alignment['translation']
+
+    # Signed distance of each aligned sample along the baseline normal
+    distances, matches = baseline_index.nearest(aligned)
+    signed = np.einsum('ij,ij->i', aligned - baseline_points[matches], baseline_normals[matches])
+    valid = distances <= MAX_CHANGE_CM
+
+    baseline_planes = detect_cut_planes(baseline)
+    labels = classify_segments(baseline_points[matches], baseline_planes)
+    # Segment both scans with the same planes, the newer one in its aligned
+    # pose, so a boundary shift never shows up as a volume change
+    aligned_current = Mesh(current.vertices @ alignment['rotation'].T.astype(np.float32)
+                           + alignment['translation'].astype(np.float32), current.faces)
+    baseline_volumes = segment_volumes(baseline, cut_planes=baseline_planes)
+    current_volumes = segment_volumes(aligned_current, cut_planes=baseline_planes)
+
+    regions = {}
+    for label, name in enumerate(SEGMENT_NAMES):
+        regions[name] = _distance_summary(signed[valid & (labels == label)])
+        regions[name].update(_volume_delta(baseline_volumes.get(name, 0.0), current_volumes.get(name, 0.0)))
+    overall = _distance_summary(signed[valid])
+    overall.update(_volume_delta(baseline_volumes.get('total', 0.0), current_volumes.get('total', 0.0)))
+
+    return {
+        'version': COMPARE_VERSION,
+        'alignment': {
+            'rotation': np.round(alignment['rotation'], 6).tolist(),
+            'translation_cm': np.round(alignment['translation'], 3).tolist(),
+            'rms_cm': round(alignment['rms'], 3),
+            'inlier_fraction': round(alignment['inlier_fraction'], 3),
+            'iterations': alignment['iterations'],
+        },
+        'overall': overall,
+        'regions': regions,
+        'samples': {'baseline': int(len(baseline_points)), 'current': int(len(current_points)),
+                    'matched': int(valid.sum())},
+    }
+
+
+def comparison_key(baseline_path, current_path):
+    """
+    Cache key for a scan pair, changing whenever either file does.
+
+    Returns:
+        Hex digest string
+    """
+    parts = [str(COMPARE_VERSION)]
+    for path in (baseline_path, current_path):
+        stat = os.stat(path)
+        parts.append(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}")
+    return hashlib.sha1('||'.join(parts).encode('utf-8')).hexdigest()
@@ -0,0 +1,289 @@
+"""
+Automatic anatomical landmarks on 3D body scans.
+
+Landmarks are located with slab and nearest-neighbour queries against a
+VertexGrid built once per scan. Body levels (neck, armpits, crotch, knees)
+come from the cutting planes used for segment volumes; joint centres are
+taken as the centroids of limb cross-sections at those levels, and surface
+points (nose, heels, toes) are found with extremal and k-NN queries.
+
+The result is keyed by MediaPipe Pose landmark index with normalized 'x',
+'y', 'z' and 'visibility' values, projected like the rendered front view,
+so the 2D analysis code can consume scan landmarks unchanged. The 3D
+positions in centimeters are returned alongside under descriptive names.
+
+Scans are assumed to be in a standing A-pose with the arms hanging beside
+the body, which is what consumer body scanners capture.
+"""
+
+import logging
+
+import numpy as np
+
+from utils.mesh_render import project_view, BODY_FILL, DEFAULT_RENDER_SIZE
+from utils.mesh_volume import detect_cut_planes
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# MediaPipe Pose landmark indices
+NOSE = 0
+LEFT_EYE_INNER, LEFT_EYE, LEFT_EYE_OUTER = 1, 2, 3
+RIGHT_EYE_INNER, RIGHT_EYE, RIGHT_EYE_OUTER = 4, 5, 6
+LEFT_EAR, RIGHT_EAR = 7, 8
+MOUTH_LEFT, MOUTH_RIGHT = 9, 10
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_PINKY, RIGHT_PINKY = 17, 18
+LEFT_INDEX, RIGHT_INDEX = 19, 20
+LEFT_THUMB, RIGHT_THUMB = 21, 22
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+LEFT_HEEL, RIGHT_HEEL = 29, 30
+LEFT_FOOT_INDEX, RIGHT_FOOT_INDEX = 31, 32
+
+# Visibility reported for measured and for proportion-derived landmarks
+MEASURED_VISIBILITY = 0.99
+DERIVED_VISIBILITY = 0.6
+
+# Half-thickness of the horizontal slabs used for cross-sections (cm)
+SLAB_HALF_CM = 0.75
+
+# Body proportions as fractions of stature (Drillis & Contini)
+ANKLE_FRACTION = 0.039
+HAND_FRACTION = 0.108
+HEAD_FRACTION = 0.13
+WAIST_WINDOW = (0.56, 0.66)
+
+
+def _slab(index, y, half=SLAB_HALF_CM):
+    """Vertices in a horizontal slab around height y."""
+    return index.points[index.slab(1, y - half, y + half)]
+
+
+def _side_centroid(points, side, x_min=0.0, x_max=np.inf):
+    """
+    Centroid of the slab vertices on one side of the body.
+
+    Args:
+        points: Slab vertices (N, 3)
+        side: +1 for the subject's left (+X), -1 for the right
+        x_min, x_max: Range of |x| that belongs to the limb
+
+    Returns:
+        float array (3,) or None if no vertices fall in range
+    """
+    lateral = points[:, 0] * side
+    mask = (lateral >= x_min) & (lateral <= x_max)
+    if not mask.any():
+        return None
+    return points[mask].mean(axis=0)
+
+
+def find_waist(index, cut_planes, stature, floor_y):
+    """
+    Height of the narrowest torso section between crotch and armpits.
+
+    Returns:
+        Tuple of (height, width) in centimeters
+    """
+    arm_x = cut_planes['arm_x']
+    best_y, best_width = None, np.inf
+    for fraction in np.arange(WAIST_WINDOW[0], WAIST_WINDOW[1], 0.005):
+        y = floor_y + fraction * stature
+        torso = _slab(index, y)
+        torso = torso[np.abs(torso[:, 0]) <= arm_x]
+        if len(torso) < 8:
+            continue
+        width = float(torso[:, 0].max() - torso[:, 0].min())
+        if width < best_width:
+            best_y, best_width = float(y), width
+    return best_y, best_width
+
+
+def detect_scan_landmarks(mesh, index, cut_planes=None):
+    """
+    Locate anatomical landmarks on a scan.
+
+    Args:
+        mesh: Mesh in the body frame (Y up, +X subject's left, +Z front)
+        index: VertexGrid over the mesh vertices
+        cut_planes: Optional output of detect_cut_planes
+
+    Returns:
+        Dictionary of named 3D points in centimeters (float arrays (3,)),
+        plus 'visibility' mapping names to confidence
+    """
+    cut_planes = cut_planes or detect_cut_planes(mesh)
+    lo, hi = mesh.bounds()
+    floor_y, top_y = float(lo[1]), float(hi[1])
+    stature = top_y - floor_y
+    arm_x, leg_x = cut_planes['arm_x'], cut_planes.get('leg_x', cut_planes['arm_x'])
+    points = {}
+    visibility = {}
+
+    def put(name, value, confidence=MEASURED_VISIBILITY):
+        if value is not None:
+            points[name] = np.asarray(value, dtype=np.float64)
+            visibility[name] = confidence
+
+    put('neck', [0.0, cut_planes['neck_y'], float(_slab(index, cut_planes['neck_y'])[:, 2].mean())])
+    put('crotch', [0.0, cut_planes['crotch_y'], float(_slab(index, cut_planes['crotch_y'])[:, 2].mean())])
+    waist_y, waist_width = find_waist(index, cut_planes, stature, floor_y)
+    if waist_y is not None:
+        put('waist', [0.0, waist_y, float(_slab(index, waist_y)[:, 2].mean())])
+        points['waist_width'] = waist_width
+
+    for side, prefix in ((1, 'left'), (-1, 'right')):
+        # Armpit: innermost arm/torso junction at the armpit level
+        put(f'{prefix}_armpit', [side * arm_x, cut_planes['armpit_y'],
+                                 float(_slab(index, cut_planes['armpit_y'])[:, 2].mean())])
+
+        # Arm axis just below the armpit, where the arm is a separate section
+        arm_top_y = cut_planes['armpit_y'] - 0.02 * stature
+        arm_axis = _side_centroid(_slab(index, arm_top_y), side, x_min=arm_x)
+
+        # Hands hang beside the thighs; the fingertips are the lowest arm vertices
+        arm_region = index.box([None, cut_planes['knee_y'], None], [None, cut_planes['armpit_y'], None])
+        arm_vertices = index.points[arm_region]
+        arm_vertices = arm_vertices[arm_vertices[:, 0] * side > max(arm_x, leg_x)]
+        if len(arm_vertices):
+            lowest = arm_vertices[:, 1].min()
+            fingertip = arm_vertices[arm_vertices[:, 1] <= lowest + 2 * SLAB_HALF_CM].mean(axis=0)
+            wrist_y = fingertip[1] + HAND_FRACTION * stature
+            wrist = _side_centroid(_slab(index, wrist_y), side, x_min=max(arm_x, leg_x))
+        else:
+            fingertip = wrist = None
+
+        shoulder_y = cut_planes['armpit_y'] + 0.6 * (cut_planes['neck_y'] - cut_planes['armpit_y'])
+        if arm_axis is not None:
+            put(f'{prefix}_shoulder', [arm_axis[0], shoulder_y, arm_axis[2]])
+        if arm_axis is not None and wrist is not None:
+            elbow_y = (shoulder_y + wrist[1]) / 2.0
+            elbow = _side_centroid(_slab(index, elbow_y), side, x_min=arm_x)
+            put(f'{prefix}_elbow', elbow)
+        put(f'{prefix}_wrist', wrist)
+        if fingertip is not None:
+            put(f'{prefix}_index', fingertip)
+            put(f'{prefix}_pinky', fingertip + [side * 0.012 * stature, 0.01 * stature, -0.01 * stature], DERIVED_VISIBILITY)
+            put(f'{prefix}_thumb', fingertip + [0.0, 0.035 * stature, 0.02 * stature], DERIVED_VISIBILITY)
+
+        # Legs: centroids of the thigh, knee and ankle sections on this side
+        hip_y = cut_planes['crotch_y'] + 0.04 * stature
+        hip_section = _slab(index, hip_y)
+        hip_section = hip_section[np.abs(hip_section[:, 0]) <= arm_x]
+        if len(hip_section):
+            half_width = np.abs(hip_section[:, 0]).max()
+            put(f'{prefix}_hip', [side * 0.5 * half_width, hip_y, float(hip_section[:, 2].mean())])
+        put(f'{prefix}_knee', _side_centroid(_slab(index, cut_planes['knee_y']), side, x_max=leg_x))
+        ankle_y = floor_y + ANKLE_FRACTION * stature
+        put(f'{prefix}_ankle', _side_centroid(_slab(index, ankle_y), side))
+
+        # Feet: rear-most and front-most vertices near the floor
+        foot = index.points[index.box([None, floor_y, None], [None, floor_y + 0.03 * stature, None])]
+        foot = foot[foot[:, 0] * side > 0]
+        if len(foot):
+            put(f'{prefix}_heel', foot[np.argmin(foot[:, 2])])
+            put(f'{prefix}_foot_index', foot[np.argmax(foot[:, 2])])
+
+    # Head: the nose is the surface point closest to a probe in front of the
+    # face; eyes, ears and mouth are placed by proportion and snapped onto
+    # the surface with nearest-neighbour queries
+    head_height = HEAD_FRACTION * stature
+    nose_y = top_y - 0.55 * head_height
+    head = _slab(index, nose_y, half=0.02 * stature)
+    head = head[np.abs(head[:, 0]) <= 0.1 * stature]
+    if len(head):
+        front_z = float(head[:, 2].max())
+        _, nearest = index.nearest([[0.0, nose_y, front_z + 5.0]])
+        put('nose', index.points[nearest[0]])
+        # Offsets from the nose as fractions of stature (x, y)
+        probes = {
+            'left_eye': [0.018, 0.022], 'right_eye': [-0.018, 0.022],
+            'left_eye_inner': [0.010, 0.022], 'right_eye_inner': [-0.010, 0.022],
+            'left_eye_outer': [0.026, 0.022], 'right_eye_outer': [-0.026, 0.022],
+            'mouth_left': [0.014, -0.020], 'mouth_right': [-0.014, -0.020],
+        }
+        names = list(probes)
+        queries = np.array([[dx * stature, nose_y + dy * stature, front_z + 5.0]
+                            for dx, dy in probes.values()])
+        _, nearest = index.nearest(queries)
+        for name, vertex in zip(names, nearest):
+            put(name, index.points[vertex], DERIVED_VISIBILITY)
+        ear_section = head[np.abs(head[:, 2] - head[:, 2].mean()) <= 0.01 * stature]
+        if len(ear_section):
+            for side, prefix in ((1, 'left'), (-1, 'right')):
+                put(f'{prefix}_ear', ear_section[np.argmax(ear_section[:, 0] * side)], DERIVED_VISIBILITY)
+
+    points['visibility'] = visibility
+    return points
+
+
+# Named landmarks in MediaPipe index order
+MEDIAPIPE_NAMES = {
+    NOSE: 'nose',
+    LEFT_EYE_INNER: 'left_eye_inner', LEFT_EYE: 'left_eye', LEFT_EYE_OUTER: 'left_eye_outer',
+    RIGHT_EYE_INNER: 'right_eye_inner', RIGHT_EYE: 'right_eye', RIGHT_EYE_OUTER: 'right_eye_outer',
+    LEFT_EAR: 'left_ear', RIGHT_EAR: 'right_ear',
+    MOUTH_LEFT: 'mouth_left', MOUTH_RIGHT: 'mouth_right',
+    LEFT_SHOULDER: 'left_shoulder', RIGHT_SHOULDER: 'right_shoulder',
+    LEFT_ELBOW: 'left_elbow', RIGHT_ELBOW: 'right_elbow',
+    LEFT_WRIST: 'left_wrist', RIGHT_WRIST: 'right_wrist',
+    LEFT_PINKY: 'left_pinky', RIGHT_PINKY: 'right_pinky',
+    LEFT_INDEX: 'left_index', RIGHT_INDEX: 'right_index',
+    LEFT_THUMB: 'left_thumb', RIGHT_THUMB: 'right_thumb',
+    LEFT_HIP: 'left_hip', RIGHT_HIP: 'right_hip',
+    LEFT_KNEE: 'left_knee', RIGHT_KNEE: 'right_knee',
+    LEFT_ANKLE: 'left_ankle', RIGHT_ANKLE: 'right_ankle',
+    LEFT_HEEL: 'left_heel', RIGHT_HEEL: 'right_heel',
+    LEFT_FOOT_INDEX: 'left_foot_index', RIGHT_FOOT_INDEX: 'right_foot_index',
+}
+
+
+def to_mediapipe_landmarks(mesh, scan_points, size=DEFAULT_RENDER_SIZE):
+    """
+    Convert named 3D landmarks to the MediaPipe Pose dictionary format.
+
+    Coordinates are normalized to the rendered front view of the same size:
+    'x' and 'y' in [0, 1] with y pointing down, 'z' in the same scale as x
+    with smaller values closer to the camera, relative to the hip midpoint.
+
+    Args:
+        mesh: Mesh the landmarks were detected on
+        scan_points: Output of detect_scan_landmarks
+        size: (width, height) of the front view the coordinates refer to
+
+    Returns:
+        Dictionary {index: {'x', 'y', 'z', 'visibility'}}
+    """
+    width, height = size
+    names = [name for name in MEDIAPIPE_NAMES.values() if name in scan_points]
+    if not names:
+        return {}
+
+    # project_view fits its input to the image, so the mesh bounding corners
+    # are projected along with the landmarks to reproduce the render transform
+    lo, hi = mesh.bounds()
+    stacked = np.vstack([[lo, hi], [scan_points[name] for name in names]]).astype(np.float64)
+    px, py, depth = project_view(stacked, 'front', width, height)
+    px, py, depth = px[2:], py[2:], depth[2:]
+
+    hips = [i for i, name in enumerate(names) if name in ('left_hip', 'right_hip')]
+    depth_origin = depth[hips].mean() if hips else depth.mean()
+    pixels_per_cm = BODY_FILL * height / max(float(hi[1] - lo[1]), 1e-6)
+
+    visibility = scan_points.get('visibility', {})
+    landmarks = {}
+    for index, name in MEDIAPIPE_NAMES.items():
+        if name not in scan_points:
+            continue
+        i = names.index(name)
+        landmarks[index] = {
+            'x': float(px[i] / width),
+            'y': float(py[i] / height),
+            'z': float(-(depth[i] - depth_origin) * pixels_per_cm / width),
+            'visibility': float(visibility.get(name, MEASURED_VISIBILITY)),
+        }
+    return landmarks
@@ -0,0 +1,408 @@
+"""
+Resumable, chunked uploads of 3D scan files.
+
+A scan can be several hundred megabytes, so it is never posted as one form
+upload. The client opens an upload session declaring the file name and
+size, then sends the bytes in order as raw request bodies of at most
+MAX_CHUNK_BYTES. Each chunk is streamed from the request straight into a
+``.part`` file in fixed-size blocks, so a worker holds one block in memory
+regardless of the chunk or file size.
+
+- The header is checked with ``sniff_mesh_header`` before anything past it
+  is written, so a file with the wrong format is rejected immediately. Small
+  chunks are collected until the header is complete (a PLY ``end_header``
+  or SCAN_HEADER_SNIFF_BYTES bytes).
+- A SHA-256 of the received bytes is updated block by block. Hash states
+  cannot be persisted, so a worker that has not seen the previous chunks
+  (another process, or a restart) rebuilds it once from the ``.part`` file.
+- Session state lives in a small JSON file next to the ``.part`` file and
+  records how many bytes have been committed. A client that lost its
+  connection asks for the session and resumes from that offset.
+- Per-user quotas count stored scans plus the declared size of every open
+  session, so concurrent uploads cannot overrun them.
+
+When the last byte lands the file is moved to the user's scan storage and
+the caller starts processing.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from utils.mesh_io import sniff_mesh_header, MeshFormatError, SCAN_HEADER_SNIFF_BYTES
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where in-progress uploads and finished scan files are kept
+UPLOAD_DIR = os.environ.get('SCAN_UPLOAD_DIR', os.path.join('instance', 'scan_uploads'))
+SCAN_STORAGE_DIR = os.environ.get('SCAN_STORAGE_DIR', os.path.join('instance', 'scans'))
+
+# Chunk size suggested to clients and the largest chunk accepted
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+MAX_CHUNK_BYTES = 32 * 1024 * 1024
+
+# Bytes copied from the request to disk per read
+STREAM_BLOCK_BYTES = 256 * 1024
+
+# Limits per file and per user
+MAX_SCAN_BYTES = int(os.environ.get('SCAN_MAX_BYTES', 1024 * 1024 * 1024))
+USER_QUOTA_BYTES = int(os.environ.get('SCAN_USER_QUOTA_BYTES', 3 * 1024 * 1024 * 1024))
+MAX_OPEN_UPLOADS = 3
+
+# Unfinished sessions untouched for this long are deleted
+UPLOAD_EXPIRY_SECONDS = 24 * 60 * 60
+
+SUPPORTED_EXTENSIONS = ('.obj', '.stl', '.ply')
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Running hash per upload for chunks handled by this process:
+# {upload_id: (bytes hashed, hashlib object)}
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """
+    Raised when an upload request cannot be accepted.
+
+    Attributes:
+        status: HTTP status code to report
+        state: Current session state, when the client should resync
+    """
+
+    def __init__(self, message, status=400, state=None):
+        super().__init__(message)
+        self.status = status
+        self.state = state
+
+
+def _user_dir(root, user_id):
+    return os.path.join(root, str(int(user_id)))
+
+
+def _session_paths(user_id, upload_id):
+    if not _UPLOAD_ID.match(upload_id or ''):
+        raise UploadError("Upload not found", status=404)
+    base = os.path.join(_user_dir(UPLOAD_DIR, user_id), upload_id)
+    return base + '.json', base + '.part'
+
+
+def _write_state(path, state):
+    # Write under a temporary name so readers never see a partial file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as handle:
+        json.dump(state, handle)
+    os.replace(temp_path, path)
+
+
+def _read_state(user_id, upload_id):
+    state_path, _ = _session_paths(user_id, upload_id)
+    try:
+        with open(state_path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        raise UploadError("Upload not found", status=404)
+
+
+def public_state(state):
+    """Session fields safe to return to the client."""
+    fields = ('upload_id', 'filename', 'size', 'received', 'status', 'chunk_size', 'scan_id', 'sha256', 'error')
+    return {field: state.get(field) for field in fields if field in state}
+
+
+def _open_sessions(user_id):
+    """States of the user's unfinished uploads, removing expired ones."""
+    directory = _user_dir(UPLOAD_DIR, user_id)
+    if not os.path.isdir(directory):
+        return []
+    sessions = []
+    now = time.time()
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            state = _read_state(user_id, name[:-5])
+        except UploadError:
+            continue
+        if now - state['updated_at'] > UPLOAD_EXPIRY_SECONDS:
+            if state['status'] == 'uploading':
+                logger.info(f"Expiring stale scan upload {state['upload_id']} for user {user_id}")
+            delete_upload(user_id, state['upload_id'])
+        elif state['status'] == 'uploading':
+            sessions.append(state)
+    return sessions
+
+
+def user_storage_bytes(user_id):
+    """
+    Bytes counted against a user's quota.
+
+    Returns:
+        Size of stored scan files plus the declared size of open uploads
+    """
+    total = sum(state['size'] for state in _open_sessions(user_id))
+    directory = _user_dir(SCAN_STORAGE_DIR, user_id)
+    if os.path.isdir(directory):
+        with os.scandir(directory) as entries:
+            total += sum(entry.stat().st_size for entry in entries if entry.is_file())
+    return total
+
+
+def create_upload(user_id, filename, size, sha256=None, metadata=None):
+    """
+    Open an upload session after checking format and quota limits.
+
+    Args:
+        user_id: Owner of the upload
+        filename: Original file name (only its extension is used)
+        size: Total file size in bytes
+        sha256: Optional expected hex digest, verified on completion
+        metadata: Optional JSON-serializable data kept with the session
+
+    Returns:
+        Session state dictionary
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise UploadError(f"Unsupported scan format, expected one of {', '.join(SUPPORTED_EXTENSIONS)}")
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("File size must be a positive integer")
+    if size > MAX_SCAN_BYTES:
+        raise UploadError(f"Scan files are limited to {MAX_SCAN_BYTES // (1024 * 1024)} MB", status=413)
+    if sha256 is not None and not re.match(r'^[0-9a-fA-F]{64}$', sha256):
+        raise UploadError("sha256 must be a hex digest")
+
+    directory = _user_dir(UPLOAD_DIR, user_id)
+    os.makedirs(directory, exist_ok=True)
+    # Serialize session creation per user so parallel requests cannot both
+    # pass the quota check
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if len(_open_sessions(user_id)) >= MAX_OPEN_UPLOADS:
+            raise UploadError("Too many uploads in progress", status=429)
+        if user_storage_bytes(user_id) + size > USER_QUOTA_BYTES:
+            raise UploadError("Scan storage quota exceeded", status=413)
+        state = _new_session(user_id, filename, extension, size, sha256, metadata)
+    return state
+
+
+def _new_session(user_id, filename, extension, size, sha256, metadata):
+    upload_id = uuid.uuid4().hex
+    state_path, part_path = _session_paths(user_id, upload_id)
+    open(part_path, 'wb').close()
+    state = {
+        'upload_id': upload_id,
+        'user_id': int(user_id),
+        'filename': os.path.basename(filename),
+        'extension': extension,
+        'size': size,
+        'received': 0,
+        'expected_sha256': sha256.lower() if sha256 else None,
+        'chunk_size': UPLOAD_CHUNK_BYTES,
+        'status': 'uploading',
+        'metadata': metadata or {},
+        'created_at': time.time(),
+        'updated_at': time.time(),
+    }
+    _write_state(state_path, state)
+    return state
+
+
+def get_upload(user_id, upload_id):
+    """Return the session state (raises UploadError if unknown)."""
+    return _read_state(user_id, upload_id)
+
+
+def update_upload(user_id, upload_id, **fields):
+    """Merge fields into a session's state, e.g. processing status."""
+    state = _read_state(user_id, upload_id)
+    state.update(fields, updated_at=time.time())
+    _write_state(_session_paths(user_id, upload_id)[0], state)
+    return state
+
+
+def _read_exact(stream, size):
+    """Read up to `size` bytes, stopping early only at end of stream."""
+    parts = []
+    while size > 0:
+        block = stream.read(size)
+        if not block:
+            break
+        parts.append(block)
+        size -= len(block)
+    return b''.join(parts)
+
+
+def _header_complete(head, state):
+    """Whether the leading bytes of an upload hold its whole header."""
+    if len(head) >= min(SCAN_HEADER_SNIFF_BYTES, state['size']):
+        return True
+    return state['extension'] == '.ply' and b'end_header' in head
+
+
+def _hasher_at(upload_id, part_path, received):
+    """SHA-256 state covering the first `received` bytes of the part file."""
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(upload_id, (0, None))
+    if hasher is None or hashed != received:
+        hasher = hashlib.sha256()
+        with open(part_path, 'rb') as handle:
+            remaining = received
+            while remaining:
+                block = handle.read(min(STREAM_BLOCK_BYTES * 16, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def append_chunk(user_id, upload_id, offset, stream, length, on_complete=None):
+    """
+    Stream one chunk from a request body into the session's part file.
+
+    Args:
+        user_id: Owner of the upload
+        upload_id: Session id
+        offset: Byte offset of the chunk; must equal the bytes received so far
+        stream: File-like object to read the chunk from
+        length: Chunk length in bytes (the request's Content-Length)
+        on_complete: Optional callable run with the stored file path before
+            the last chunk is committed, e.g. to create the scan's database
+            row; a dict it returns is merged into the state. If it raises,
+            the last chunk is discarded and the part file kept, so the client
+            can resend it.
+
+    Returns:
+        Updated session state; status is 'received' once the file is complete
+        and 'file_path' then points at the stored scan
+    """
+    state = _read_state(user_id, upload_id)
+    state_path, part_path = _session_paths(user_id, upload_id)
+    if state['status'] != 'uploading':
+        raise UploadError("Upload is already complete", status=409, state=state)
+    if length is None or length <= 0 or length > MAX_CHUNK_BYTES:
+        raise UploadError(f"Chunks must be between 1 byte and {MAX_CHUNK_BYTES} bytes", status=413)
+    if offset + length > state['size']:
+        raise UploadError("Chunk extends past the declared file size", status=416, state=state)
+
+    try:
+        handle = open(part_path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError("Upload is already complete", status=409, state=_read_state(user_id, upload_id))
+
+    with handle:
+        # One writer per session; a concurrent retry of the same chunk does
+        # not wait but resyncs from the returned state instead
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk for this upload is in progress", status=409, state=state)
+
+        # Re-read under the lock: another request may have just committed
+        state = _read_state(user_id, upload_id)
+        if state['status'] != 'uploading':
+            raise UploadError("Upload is already complete", status=409, state=state)
+        if offset != state['received']:
+            raise UploadError(f"Expected offset {state['received']}", status=409, state=state)
+
+        hasher = _hasher_at(upload_id, part_path, offset)
+        handle.seek(offset)
+        handle.truncate()
+
+        written = 0
+        if offset < SCAN_HEADER_SNIFF_BYTES and not state.get('format'):
+            # The header may span chunks: check what arrived so far with the
+            # start of this one
+            handle.seek(0)
+            prefix = handle.read(offset)
+            handle.seek(offset)
+            head = _read_exact(stream, min(SCAN_HEADER_SNIFF_BYTES - offset, length))
+            if _header_complete(prefix + head, state):
+                try:
+                    state['format'] = sniff_mesh_header(prefix + head, state['size'], state['extension'])
+                except MeshFormatError as e:
+                    # The file can never become valid; free its quota right away
+                    delete_upload(user_id, upload_id)
+                    raise UploadError(f"Invalid {state['extension']} file: {str(e)}", status=422)
+            handle.write(head)
+            hasher.update(head)
+            written = len(head)
+
+        while written < length:
+            block = stream.read(min(STREAM_BLOCK_BYTES, length - written))
+            if not block:
+                break
+            handle.write(block)
+            hasher.update(block)
+            written += len(block)
+        handle.flush()
+
+        if written < length:
+            # Keep only whole chunks so the client resumes at a clean offset
+            handle.truncate(offset)
+            logger.warning(f"Scan upload {upload_id} chunk at {offset} ended after {written} of {length} bytes")
+            raise UploadError("Chunk was incomplete", status=400, state=state)
+
+        state['received'] = offset + length
+        state['updated_at'] = time.time()
+        if state['received'] == state['size']:
+            digest = hasher.hexdigest()
+            if state['expected_sha256'] and digest != state['expected_sha256']:
+                # The bytes on disk do not match what the client hashed
+                handle.truncate(0)
+                state['received'] = 0
+                # The resent file's header is checked again
+                state.pop('format', None)
+                _write_state(state_path, state)
+                raise UploadError("Checksum mismatch, upload restarted", status=422, state=state)
+            if on_complete is not None:
+                try:
+                    state.update(on_complete(_stored_path(state)) or {})
+                except Exception as e:
+                    handle.truncate(offset)
+                    state['received'] = offset
+                    logger.error(f"Scan upload {upload_id} could not be registered: {str(e)}")
+                    raise UploadError("The scan could not be stored, resend the last chunk", status=503, state=state)
+            state = _complete(state, part_path, digest)
+        else:
+            with _hashers_lock:
+                _hashers[upload_id] = (state['received'], hasher)
+        _write_state(state_path, state)
+    return state
+
+
+def _stored_path(state):
+    """Where a finished upload is kept in the user's scan storage."""
+    return os.path.join(_user_dir(SCAN_STORAGE_DIR, state['user_id']), state['upload_id'] + state['extension'])
+
+
+def _complete(state, part_path, digest):
+    """Move a finished file into the user's scan storage."""
+    file_path = _stored_path(state)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    os.replace(part_path, file_path)
+
+    state.update(status='received', sha256=digest, file_path=file_path)
+    logger.info(f"Scan upload {state['upload_id']} complete: {state['size']} bytes")
+    return state
+
+
+def delete_upload(user_id, upload_id):
+    """Remove a session and its partial data (a stored scan file is kept)."""
+    state_path, part_path = _session_paths(user_id, upload_id)
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    for path in (part_path, state_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
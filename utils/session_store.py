@@ -0,0 +1,370 @@
+"""
+Server-side sessions.
+
+Flask's default session is the whole session dictionary, serialized and
+signed into the cookie. Ours carries the analysis results, so every
+response that touched the session re-sent several kilobytes. Here the
+cookie only holds a random session id and the data is kept server-side by
+a pluggable backend:
+
+- MemorySessionBackend: a per-process LRU, for development and tests
+- SQLSessionBackend: a 'sessions' table in any SQLAlchemy database
+  (the app's database, or e.g. a SQLite file)
+
+Session data is serialized with Flask's tagged JSON serializer and
+zlib-compressed when that makes it smaller. A session is only written back
+when its serialized form differs from what was loaded (nested changes are
+caught too, without relying on session.modified), or when more than half
+of its lifetime has passed, which also refreshes the cookie's expiry.
+Sessions holding only bookkeeping keys (the permanent flag, Flask-Login's
+freshness) are not stored, so anonymous page views cost no write.
+
+Signing in or out calls ``regenerate_session``: the session keeps its data
+under a new id and the old one is deleted, so an id planted before login
+(session fixation) is worthless afterwards.
+"""
+
+import hashlib
+import logging
+import secrets
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface, SessionInterface
+from sqlalchemy import Column, Float, Index, LargeBinary, MetaData, String, Table, delete, insert, select, update
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Payloads at least this long are compressed when that makes them smaller
+COMPRESS_MIN_BYTES = 256
+
+# Random bytes in a session id
+SESSION_ID_BYTES = 32
+
+# Default number of sessions kept by the in-process backend
+DEFAULT_MEMORY_SESSIONS = 10000
+
+# Expired sessions are purged from the database every this many writes
+PURGE_EVERY_WRITES = 1000
+
+# Bookkeeping keys (Flask's permanent flag, Flask-Login's freshness) that
+# alone do not make a session worth storing
+BOOKKEEPING_KEYS = frozenset({'_permanent', '_fresh'})
+
+_serializer = TaggedJSONSerializer()
+_stats = {'loads': 0, 'load_misses': 0, 'bytes_read': 0, 'writes': 0, 'bytes_written': 0,
+          'unchanged': 0, 'deletes': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(**amounts):
+    with _stats_lock:
+        for name, amount in amounts.items():
+            _stats[name] += amount
+
+
+def dumps(data):
+    """Serialize session data: a one-byte format marker, then JSON or zlib-compressed JSON."""
+    payload = _serializer.dumps(dict(data)).encode('utf-8')
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            return b'z' + compressed
+    return b'j' + payload
+
+
+def loads(blob):
+    """Deserialize session data written by dumps."""
+    payload = zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:]
+    return _serializer.loads(payload.decode('utf-8'))
+
+
+def _digest(blob):
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+class MemorySessionBackend:
+    """
+    Sessions in a per-process LRU.
+
+    Args:
+        maxsize: Sessions kept; the least recently used are dropped
+    """
+
+    name = 'memory'
+
+    def __init__(self, maxsize=DEFAULT_MEMORY_SESSIONS):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        """Stored (blob, expires) for a session id, or None."""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return entry
+
+    def set(self, sid, blob, expires):
+        with self._lock:
+            self._entries[sid] = (blob, expires)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': self.name, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+_metadata = MetaData()
+sessions_table = Table(
+    'sessions', _metadata,
+    Column('id', String(64), primary_key=True),
+    Column('data', LargeBinary, nullable=False),
+    Column('expires', Float, nullable=False),
+    Index('ix_sessions_expires', 'expires'),
+)
+
+
+class SQLSessionBackend:
+    """
+    Sessions in a 'sessions' table, created on first use.
+
+    Args:
+        engine: SQLAlchemy engine, or a callable returning one (e.g. the
+            app's engine, resolved inside the app context)
+    """
+
+    name = 'sql'
+
+    def __init__(self, engine):
+        self._engine = engine
+        self._ready = set()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def engine(self):
+        engine = self._engine() if callable(self._engine) else self._engine
+        if id(engine) not in self._ready:
+            with self._lock:
+                sessions_table.create(engine, checkfirst=True)
+                self._ready.add(id(engine))
+        return engine
+
+    def get(self, sid):
+        """Stored (blob, expires) for a session id, or None."""
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(sessions_table.c.data, sessions_table.c.expires)
+                .where(sessions_table.c.id == sid, sessions_table.c.expires > time.time())).first()
+        return (bytes(row[0]), row[1]) if row is not None else None
+
+    def set(self, sid, blob, expires):
+        with self.engine.begin() as connection:
+            updated = connection.execute(update(sessions_table).where(sessions_table.c.id == sid)
+                                         .values(data=blob, expires=expires))
+            if not updated.rowcount:
+                connection.execute(insert(sessions_table).values(id=sid, data=blob, expires=expires))
+            self._writes += 1
+            if self._writes % PURGE_EVERY_WRITES == 0:
+                connection.execute(delete(sessions_table).where(sessions_table.c.expires <= time.time()))
+
+    def delete(self, sid):
+        with self.engine.begin() as connection:
+            connection.execute(delete(sessions_table).where(sessions_table.c.id == sid))
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class ServerSideSession(SecureCookieSession):
+    """
+    Session whose data is kept by a backend.
+
+    Args:
+        initial: Loaded session data
+        sid: Session id, None for a new session
+        digest: Digest of the stored serialized data
+        expires: When the stored session expires (Unix time)
+    """
+
+    def __init__(self, initial=None, sid=None, digest=None, expires=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.digest = digest
+        self.expires = expires
+        self.previous_sid = None
+
+    @property
+    def new(self):
+        return self.sid is None
+
+    def regenerate(self):
+        """Store the data under a new id when saved, deleting the current one."""
+        if self.sid is not None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.digest = None
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Session interface keeping only the session id in the cookie.
+
+    Args:
+        backend: MemorySessionBackend, SQLSessionBackend or another object
+            with get, set, delete and stats
+    """
+
+    session_class = ServerSideSession
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            try:
+                stored = self.backend.get(sid)
+            except Exception as e:
+                logger.error(f"Could not load session: {str(e)}")
+                stored = None
+            if stored is not None:
+                blob, expires = stored
+                try:
+                    data = loads(blob)
+                except (ValueError, zlib.error):
+                    data = None
+                if data is not None:
+                    _count(loads=1, bytes_read=len(blob))
+                    return self.session_class(data, sid=sid, digest=_digest(blob), expires=expires)
+            _count(load_misses=1)
+        return self.session_class()
+
+    def _delete(self, sid):
+        try:
+            self.backend.delete(sid)
+            _count(deletes=1)
+        except Exception as e:
+            logger.error(f"Could not delete session: {str(e)}")
+
+    def _cookie_options(self, app):
+        return {
+            'domain': self.get_cookie_domain(app),
+            'path': self.get_cookie_path(app),
+            'secure': self.get_cookie_secure(app),
+            'samesite': self.get_cookie_samesite(app),
+            'httponly': self.get_cookie_httponly(app),
+        }
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.accessed and not session.modified:
+            return
+
+        name = self.get_cookie_name(app)
+        if session.previous_sid is not None:
+            # The id was regenerated: the old one must stop working
+            self._delete(session.previous_sid)
+        if not set(session) - BOOKKEEPING_KEYS:
+            # Nothing worth keeping: forget a stored session, store nothing new
+            if session.sid is not None:
+                self._delete(session.sid)
+            if session.sid is not None or session.previous_sid is not None:
+                response.delete_cookie(name, **self._cookie_options(app))
+            return
+
+        blob = dumps(session)
+        digest = _digest(blob)
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        stale = session.expires is not None and session.expires - now < lifetime / 2
+        if session.sid is not None and digest == session.digest and not stale:
+            _count(unchanged=1)
+            return
+
+        sid = session.sid or secrets.token_urlsafe(SESSION_ID_BYTES)
+        try:
+            self.backend.set(sid, blob, now + lifetime)
+        except Exception as e:
+            logger.error(f"Could not store session: {str(e)}")
+            return
+        _count(writes=1, bytes_written=len(blob))
+        if sid != session.sid or stale:
+            response.set_cookie(name, sid, expires=self.get_expiration_time(app, session),
+                                **self._cookie_options(app))
+
+
+def create_session_interface(backend, engine=None, memory_size=DEFAULT_MEMORY_SESSIONS):
+    """
+    Session interface for a configured backend.
+
+    Args:
+        backend: 'memory', 'sql' or 'cookie' (Flask's signed-cookie sessions)
+        engine: Engine (or callable returning one) for the 'sql' backend
+        memory_size: Sessions kept by the 'memory' backend
+
+    Returns:
+        SessionInterface instance
+
+    Raises:
+        ValueError: For an unknown backend, or 'sql' without an engine
+    """
+    if backend == 'cookie':
+        return SecureCookieSessionInterface()
+    if backend == 'memory':
+        return ServerSideSessionInterface(MemorySessionBackend(memory_size))
+    if backend == 'sql':
+        if engine is None:
+            raise ValueError("The 'sql' session backend needs a database engine")
+        return ServerSideSessionInterface(SQLSessionBackend(engine))
+    raise ValueError(f"Unknown session backend: {backend}")
+
+
+def regenerate_session(session):
+    """
+    Move the session to a new id, e.g. when the user signs in or out.
+
+    Signed-cookie sessions have no server-side id and are left as they are.
+
+    Args:
+        session: The current session
+    """
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
+
+
+def session_store_stats(interface):
+    """
+    Session read and write counters.
+
+    Args:
+        interface: The app's session interface
+
+    Returns:
+        Dictionary of counters, with the backend's own statistics
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    saves = stats['writes'] + stats['unchanged']
+    stats['write_rate'] = round(stats['writes'] / saves, 3) if saves else 0.0
+    backend = getattr(interface, 'backend', None)
+    stats['backend'] = backend.stats() if backend is not None else {'backend': 'cookie'}
+    return stats
@@ -0,0 +1,295 @@
+"""
+Spatial index over 3D scan vertices.
+
+Landmark detection and scan comparison issue many nearest-neighbour and
+range queries against hundreds of thousands of vertices. ``VertexGrid``
+buckets the vertices on a uniform grid once, stored as CSR-style arrays
+(vertices sorted by cell key plus a sorted key table), and answers queries
+for whole batches of points at a time with NumPy:
+
+- k-nearest-neighbour: candidates are gathered from the grid cells that
+  intersect a ball around each query and the k closest are selected per
+  query. Balls grow only for queries whose k-th distance is not yet
+  guaranteed, and wide searches move to coarser grids so a pass inspects a
+  bounded number of cells.
+- Radius queries use the same cell gathering with a fixed reach.
+- Slab and box queries use per-axis sorted orders, so an axis-aligned band
+  costs two binary searches.
+"""
+
+import logging
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Target number of vertices per occupied grid cell
+DEFAULT_POINTS_PER_CELL = 8
+
+# Upper bound on grid cells inspected per k-NN batch
+QUERY_BATCH_CELLS = 2_000_000
+
+# Upper bound on candidate points compared per k-NN chunk
+QUERY_BATCH_CANDIDATES = 4_000_000
+
+# Largest cube half-width (in cells) searched on one grid level; wider
+# searches move to a coarser level
+MAX_RING = 4
+
+
+class VertexGrid:
+    """
+    Uniform grid index over a point cloud.
+
+    Attributes:
+        points: float64 array (N, 3) of indexed points
+        cell_size: Edge length of a grid cell
+
+    Args:
+        points: Points to index
+        cell_size: Optional cell edge length (defaults from point density)
+        axis_index: Whether to build the per-axis orders used by slab()
+            and box(); coarse k-NN levels skip them
+    """
+
+    def __init__(self, points, cell_size=None, axis_index=True):
+        self.points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        n = len(self.points)
+        self.origin = self.points.min(axis=0) if n else np.zeros(3)
+        extent = (self.points.max(axis=0) - self.origin) if n else np.ones(3)
+
+        if cell_size is None:
+            # Cells sized so a surface sampled by n points puts a few in each;
+            # scan vertices lie on a 2D surface, hence the square root
+            area = 2.0 * (extent[0] * extent[1] + extent[1] * extent[2] + extent[0] * extent[2])
+            cell_size = np.sqrt(max(area, 1e-12) * DEFAULT_POINTS_PER_CELL / max(n, 1))
+        self.cell_size = float(max(cell_size, 1e-9))
+        self.dims = np.floor(extent / self.cell_size).astype(np.int64) + 1
+
+        keys = self._cell_keys(self._cells(self.points))
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        self.cell_keys, self.cell_start, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+        self.cell_end = self.cell_start + counts
+
+        # Coarser grid used for wide k-NN searches, built on demand
+        self._coarser = None
+
+        # Per-axis sorted orders for slab and box queries
+        if axis_index:
+            self.axis_order = [np.argsort(self.points[:, axis], kind='stable') for axis in range(3)]
+            self.axis_sorted = [self.points[order, axis] for axis, order in enumerate(self.axis_order)]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cells(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _cell_keys(self, cells):
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def _gather(self, query_cells, ring, queries=None, radius=None):
+        """
+        Find the occupied cells in the cube of cells around each query.
+
+        Args:
+            query_cells: int array (Q, 3) of query cell coordinates
+            ring: Half-width of the cube in cells
+            queries: Optional query points (Q, 3); with ``radius`` set, cells
+                farther than the radius from their query are skipped
+            radius: Optional per-query search radius (Q,)
+
+        Returns:
+            Tuple of (query row, first sorted point, point count) per
+            occupied cell, ordered by query row
+        """
+        span = np.arange(-ring, ring + 1)
+        offsets = np.stack(np.meshgrid(span, span, span, indexing='ij'), axis=-1).reshape(-1, 3)
+        cells = query_cells[:, None, :] + offsets[None, :, :]
+        in_grid = np.all((cells >= 0) & (cells < self.dims), axis=2)
+        rows, slots = np.nonzero(in_grid)
+        cells = cells[rows, slots]
+
+        if radius is not None:
+            # Keep only cells whose box intersects the query ball
+            cell_lo = self.origin + cells * self.cell_size
+            gap = np.maximum(np.maximum(cell_lo - queries[rows], queries[rows] - cell_lo - self.cell_size), 0.0)
+            near = np.einsum('ij,ij->i', gap, gap) <= radius[rows] ** 2
+            rows, cells = rows[near], cells[near]
+
+        keys = self._cell_keys(cells)
+        position = np.searchsorted(self.cell_keys, keys)
+        position = np.minimum(position, len(self.cell_keys) - 1)
+        occupied = self.cell_keys[position] == keys
+        rows, position = rows[occupied], position[occupied]
+        starts = self.cell_start[position]
+        return rows, starts, self.cell_end[position] - starts
+
+    def _expand(self, rows, starts, counts):
+        """Turn (row, cell start, cell count) runs into per-candidate arrays."""
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        local = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = self.order[np.repeat(starts, counts) + local]
+        return np.repeat(rows, counts), candidates
+
+    def _level(self, level):
+        """Grid over the same points with cells 2**level times larger (cached)."""
+        grid = self
+        for _ in range(level):
+            if grid._coarser is None:
+                grid._coarser = VertexGrid(grid.points, 2.0 * grid.cell_size, axis_index=False)
+            grid = grid._coarser
+        return grid
+
+    def knn(self, queries, k=1):
+        """
+        Find the k nearest indexed points for each query point.
+
+        Every pass searches a ball around each query, gathering only the grid
+        cells that intersect it. A query is final once k points lie inside
+        its ball. Otherwise the ball grows to the k-th distance found so far
+        (an upper bound on the true one, so the next pass is final) or
+        doubles when nothing was found. Large balls are searched on coarser
+        grids so each pass inspects a bounded number of cells per query.
+
+        Args:
+            queries: float array (Q, 3)
+            k: Number of neighbours
+
+        Returns:
+            Tuple of (distances float64 (Q, k), indices int64 (Q, k)); rows
+            are padded with inf / -1 when fewer than k points exist
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 3)
+        q = len(queries)
+        distances = np.full((q, k), np.inf)
+        indices = np.full((q, k), -1, dtype=np.int64)
+        if q == 0 or len(self.points) == 0:
+            return distances, indices
+
+        upper = self.origin + self.dims * self.cell_size
+        outside = np.linalg.norm(queries - np.clip(queries, self.origin, upper), axis=1)
+        search_radius = outside + self.cell_size
+        pending = np.arange(q)
+        while len(pending):
+            reach = search_radius[pending] + outside[pending]
+            levels = np.maximum(0, np.ceil(np.log2(reach / (MAX_RING * self.cell_size)))).astype(np.int64)
+            finished = np.zeros(len(pending), dtype=bool)
+            for level in np.unique(levels):
+                grid = self._level(int(level))
+                members = np.nonzero(levels == level)[0]
+                group = pending[members]
+                rings = np.ceil(reach[members] / grid.cell_size).astype(np.int64) + (outside[group] > 0)
+                covers_grid = rings >= grid.dims.max()
+                rings = np.minimum(rings, grid.dims.max())
+                query_cells = np.clip(grid._cells(queries[group]), 0, grid.dims - 1)
+
+                for ring in np.unique(rings):
+                    in_ring = np.nonzero(rings == ring)[0]
+                    # Bound the number of inspected cells per batch
+                    batch_size = max(1, QUERY_BATCH_CELLS // (2 * int(ring) + 1) ** 3)
+                    for batch in np.array_split(in_ring, int(np.ceil(len(in_ring) / batch_size))):
+                        radius = np.where(covers_grid[batch], np.inf, search_radius[group[batch]])
+                        grid._knn_batch(queries, query_cells[batch], group[batch], int(ring), k,
+                                        distances, indices, radius)
+
+                kth = distances[group, k - 1]
+                finished[members] = (kth <= search_radius[group]) | covers_grid
+                search_radius[group] = np.where(np.isfinite(kth), kth, 2.0 * search_radius[group])
+            pending = pending[~finished]
+
+        return distances, indices
+
+    def _knn_batch(self, queries, query_cells, batch, ring, k, distances, indices, radius):
+        """Fill the k nearest candidates within each query's ball for a batch."""
+        distances[batch] = np.inf
+        indices[batch] = -1
+        cell_rows, cell_starts, cell_counts = self._gather(query_cells, ring, queries[batch], radius)
+        if not len(cell_rows):
+            return
+
+        # Split the batch so no chunk compares more than a bounded number of
+        # candidate points (a single dense query still goes through alone)
+        per_query = np.bincount(cell_rows, weights=cell_counts, minlength=len(batch))
+        chunk_of_query = (np.cumsum(per_query) - per_query) // QUERY_BATCH_CANDIDATES
+        chunk_edges = np.searchsorted(chunk_of_query[cell_rows], np.unique(chunk_of_query[cell_rows])[1:])
+        for rows, starts, counts in zip(np.split(cell_rows, chunk_edges), np.split(cell_starts, chunk_edges),
+                                        np.split(cell_counts, chunk_edges)):
+            rows, candidates = self._expand(rows, starts, counts)
+            if not len(candidates):
+                continue
+            d = np.linalg.norm(self.points[candidates] - queries[batch[rows]], axis=1)
+            if k == 1:
+                # Candidates are grouped by query row: a segmented minimum
+                # avoids sorting them
+                run_start = np.flatnonzero(np.concatenate([[True], rows[1:] != rows[:-1]]))
+                closest = np.minimum.reduceat(d, run_start)
+                run = np.repeat(np.arange(len(run_start)), np.diff(np.append(run_start, len(rows))))
+                hit = np.flatnonzero(d == closest[run])
+                hit = hit[np.concatenate([[True], run[hit][1:] != run[hit][:-1]])]
+                distances[batch[rows[hit]], 0] = d[hit]
+                indices[batch[rows[hit]], 0] = candidates[hit]
+                continue
+            order = np.lexsort((d, rows))
+            rows, candidates, d = rows[order], candidates[order], d[order]
+            first = np.concatenate([[True], rows[1:] != rows[:-1]])
+            run_start = np.maximum.accumulate(np.where(first, np.arange(len(rows)), 0))
+            rank = np.arange(len(rows)) - run_start
+            keep = rank < k
+            distances[batch[rows[keep]], rank[keep]] = d[keep]
+            indices[batch[rows[keep]], rank[keep]] = candidates[keep]
+
+    def nearest(self, queries):
+        """Index of and distance to the closest indexed point for each query."""
+        distances, indices = self.knn(queries, k=1)
+        return distances[:, 0], indices[:, 0]
+
+    def radius(self, queries, r):
+        """
+        Find every indexed point within distance r of each query.
+
+        Returns:
+            Tuple of (query row per hit, point index per hit), grouped by query
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 3)
+        if len(queries) == 0 or len(self.points) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        grid = self._level(max(0, int(np.ceil(np.log2(max(r, 1e-12) / (MAX_RING * self.cell_size))))))
+        ring = int(np.ceil(r / grid.cell_size))
+        radius = np.full(len(queries), float(r))
+        rows, candidates = grid._expand(*grid._gather(grid._cells(queries), ring, queries, radius))
+        d = np.linalg.norm(self.points[candidates] - queries[rows], axis=1)
+        hit = d <= r
+        return rows[hit], candidates[hit]
+
+    def slab(self, axis, lo, hi):
+        """
+        Indices of points whose coordinate on ``axis`` lies in [lo, hi].
+        """
+        values = self.axis_sorted[axis]
+        start, end = np.searchsorted(values, lo, side='left'), np.searchsorted(values, hi, side='right')
+        return self.axis_order[axis][start:end]
+
+    def box(self, lo, hi):
+        """
+        Indices of points inside an axis-aligned box.
+
+        The slab along the most selective axis is looked up first and the
+        other two bounds are applied to that subset.
+
+        Args:
+            lo, hi: Sequences of 3 bounds; None entries leave an axis open
+        """
+        lo = [-np.inf if value is None else value for value in lo]
+        hi = [np.inf if value is None else value for value in hi]
+        sizes = [np.searchsorted(self.axis_sorted[a], hi[a], side='right')
+                 - np.searchsorted(self.axis_sorted[a], lo[a], side='left') for a in range(3)]
+        axis = int(np.argmin(sizes))
+        subset = self.slab(axis, lo[axis], hi[axis])
+        points = self.points[subset]
+        inside = np.all((points >= lo) & (points <= hi), axis=1)
+        return subset[inside]
@@ -0,0 +1,200 @@
+"""
+Short-lived cache of logged-in users.
+
+Flask-Login calls the user loader on every authenticated request, which
+cost a primary-key query each time. The loader now returns a read-only
+snapshot of the user's columns, cached per user id for USER_CACHE_TTL
+seconds in a size-bounded LRU. The cache is registered with the formula
+caches, so its hits (queries saved) and misses show up and are flushed
+with theirs.
+
+Snapshots are invalidated through SQLAlchemy events when a user row is
+updated or deleted, once when the change is flushed and again when it is
+committed. Invalidation is per process: other workers see the change when
+their entry expires, at most USER_CACHE_TTL seconds later.
+
+Snapshots are detached from any database session and carry no password
+hash; code that changes a user loads the row itself (see ``row``).
+"""
+
+import logging
+import os
+import time
+from types import MappingProxyType
+
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from utils.formula_cache import FormulaCache, register_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds a user snapshot is served without asking the database
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+
+# Users kept
+USER_CACHE_SIZE = 4096
+
+# Columns never copied into snapshots
+EXCLUDED_COLUMNS = frozenset({'password_hash'})
+
+
+class UserSnapshot(UserMixin):
+    """
+    Read-only copy of a user's column values.
+
+    Args:
+        model: The user model class
+        values: Column name to value
+    """
+
+    def __init__(self, model, values):
+        object.__setattr__(self, '_model', model)
+        object.__setattr__(self, '_values', MappingProxyType(dict(values)))
+
+    @classmethod
+    def of(cls, user):
+        """Snapshot of a loaded user row."""
+        columns = inspect(type(user)).columns
+        return cls(type(user), {column.key: getattr(user, column.key) for column in columns
+                                if column.key not in EXCLUDED_COLUMNS})
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(f"{type(self).__name__} has no attribute '{name}'") from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only; load the row to change it")
+
+    def row(self):
+        """The user's row in the current database session."""
+        return self._model.query.get(self._values['id'])
+
+    def __repr__(self):
+        return f"<UserSnapshot {self._values.get('username')}>"
+
+
+class UserCache(FormulaCache):
+    """
+    LRU of user snapshots whose entries expire after a TTL.
+
+    Args:
+        name: Cache name in the registry
+        maxsize: Users kept
+        ttl: Seconds an entry is served
+    """
+
+    def __init__(self, name, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        super().__init__(name, maxsize)
+        self.ttl = ttl
+        self.expired = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        found, entry = super().get(key)
+        if not found:
+            return False, None
+        value, expires = entry
+        if expires <= time.monotonic():
+            with self._lock:
+                self._entries.pop(key, None)
+                # Counted as a miss: the database is asked after all
+                self.hits -= 1
+                self.misses += 1
+                self.expired += 1
+            return False, None
+        return True, value
+
+    def put(self, key, value):
+        super().put(key, (value, time.monotonic() + self.ttl))
+
+    def invalidate(self, key):
+        """Drop a user's entry."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self.expired = 0
+            self.invalidations = 0
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(ttl=self.ttl, expired=self.expired, invalidations=self.invalidations,
+                         queries_saved=self.hits)
+        return stats
+
+
+_cache = register_cache(UserCache('utils.user_cache.users'))
+
+
+def cached_user(user_id, load):
+    """
+    Snapshot of a user, from the cache or loaded.
+
+    Args:
+        user_id: User id
+        load: Callable loading the user row for an id (None if missing)
+
+    Returns:
+        UserSnapshot, or None if there is no such user
+    """
+    found, snapshot = _cache.get(user_id)
+    if not found:
+        user = load(user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot.of(user)
+        _cache.put(user_id, snapshot)
+    return snapshot
+
+
+def invalidate_user(user_id):
+    """Drop a user's cached snapshot."""
+    _cache.invalidate(user_id)
+
+
+_PENDING_KEY = 'user_cache_invalidate'
+
+
+def _changed(mapper, connection, target):
+    invalidate_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+def _committed(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate_user(user_id)
+
+
+def _rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def watch_user_model(model):
+    """
+    Invalidate cached users when rows of the user model change.
+
+    Args:
+        model: The user model class
+    """
+    if event.contains(model, 'after_update', _changed):
+        return
+    event.listen(model, 'after_update', _changed)
+    event.listen(model, 'after_delete', _changed)
+    event.listen(Session, 'after_commit', _committed)
+    event.listen(Session, 'after_rollback', _rolled_back)
+
+
+def user_cache_stats():
+    """Statistics of the user cache."""
+    return _cache.stats()
@@ -8,65 +8,33 @@ import json
 import random
 from datetime import datetime, timedelta
 
-# Exercise mapping based on PPL (Push/Pull/Legs) split
-EXERCISE_MAPPING = {
-    # Push day exercises
-    "Chest": [
-        "Bench Press", "Incline DB Press", "Push-Up", "Cable Crossover",
-        "Decline Push-Ups", "Pec Deck Fly", "Dips", "Chest Fly"
-    ],
-    "Shoulders": [
-        "Overhead Press", "Lateral Raise", "Arnold Press", "Front Raise",
-        "Upright Row", "Pike Push-Up", "DB Shoulder Press", "Machine Shoulder Press"
-    ],
-    "Triceps": [
-        "Skullcrusher", "Dips", "Triceps Pushdown", "Overhead Extension",
-        "Diamond Push-Ups", "Triceps Kickback", "Close-Grip Bench Press"
-    ],
-    
-    # Pull day exercises
-    "Back": [
-        "Pull-Up", "Barbell Row", "Seated Cable Row", "Lat Pulldown",
-        "Deadlift", "Chin-Ups", "T-Bar Row", "Single-Arm DB Row"
-    ],
-    "Biceps": [
-        "Bicep Curl", "Incline Curl", "Hammer Curl", "Concentration Curl",
-        "Cable Curl", "Preacher Curl", "Chin-Ups"
-    ],
-    "Rear Delts": [
-        "Face Pull", "Reverse Pec Deck Fly", "Bent-Over Reverse Fly",
-        "Cable Reverse Fly", "Rear Delt Row", "Seated Rear Delt Fly"
-    ],
-    
-    # Legs day exercises
-    "Quads": [
-        "Squat", "Leg Press", "Lunges", "Leg Extension",
-        "Bulgarian Split Squats", "Hack Squat", "Step-Ups"
-    ],
-    "Hamstrings": [
-        "Romanian Deadlift", "Lying Curl", "Seated Leg Curl",
-        "Good Morning", "Stiff-Legged Deadlift", "Nordic Curl"
-    ],
-    "Glutes": [
-        "Hip Thrust", "Glute Kickbacks", "Cable Pull-Through",
-        "Bulgarian Split Squats", "Glute Bridge", "Sumo Deadlift"
-    ],
-    "Calves": [
-        "Seated Calf Raise", "Standing Calf Raise", "Calf Press",
-        "Donkey Calf Raise", "Single-Leg Calf Raise"
-    ],
+from utils.exercise_catalog import get_exercise_catalog
+from utils.plan_cache import cached_plan
+
+# Catalog muscles behind each muscle group of the PPL (Push/Pull/Legs) split.
+# Exercises come from the shared catalog by primary muscle.
+MUSCLE_GROUPS = {
+    # Push day muscles
+    "Chest": ("chest",),
+    "Shoulders": ("shoulders",),
+    "Triceps": ("triceps",),
+    
+    # Pull day muscles
+    "Back": ("back",),
+    "Biceps": ("biceps",),
+    "Rear Delts": ("rear_delts",),
+    
+    # Legs day muscles
+    "Quads": ("quads",),
+    "Hamstrings": ("hamstrings",),
+    "Glutes": ("glutes",),
+    "Calves": ("calves",),
     
     # For core workouts that can be added to any day
-    "Core": [
-        "Planks", "Leg Raises", "Russian Twists", "Cable Crunches",
-        "Ab Rollout", "Hanging Leg Raise", "Mountain Climbers", "Side Planks"
-    ],
+    "Core": ("core",),
     
     # For compatibility with older code that might use "Arms"
-    "Arms": [
-        "Bicep Curl", "Triceps Pushdown", "Hammer Curl", "Overhead Extension", 
-        "Cable Curl", "Skullcrusher", "Concentration Curl", "Diamond Push-Ups"
-    ]
+    "Arms": ("biceps", "triceps")
 }
 
 # Weekly split templates based on training experience
@@ -92,6 +60,13 @@ DEFAULT_SET_REP_SCHEMES = {
     "Well Developed": {"sets": 2, "reps": "8-10", "rest": "45-60s"}
 }
 
+# Active recovery shown on rest days
+REST_DAY_ACTIVITIES = [
+    {"name": "Light Walking", "focus": "Active Recovery", "sets": "1", "reps": "20-30 min", "rest": "N/A"},
+    {"name": "Stretching", "focus": "Flexibility", "sets": "1", "reps": "15-20 min", "rest": "N/A"},
+    {"name": "Foam Rolling", "focus": "Recovery", "sets": "1", "reps": "10-15 min", "rest": "N/A"}
+]
+
 def analyze_muscle_development(bodybuilding_analysis):
     """
     Analyze muscle development from bodybuilding analysis data.
@@ -221,6 +196,14 @@ def determine_training_split(experience_level, categorized_muscles, goal="muscle
     
     return split_template
 
+def split_name(split_template):
+    """
+    Short name of a split template, e.g. "push_pull_legs_5_day".
+    """
+    day_types = [day for day in split_template if day != "Rest"]
+    kinds = "_".join(dict.fromkeys(day.lower().replace(" ", "_") for day in day_types))
+    return f"{kinds}_{len(day_types)}_day"
+
 def customize_muscle_group_order(split_template, categorized_muscles):
     """
     Customize the ordered muscle groups for each day based on priority.
@@ -275,12 +258,18 @@ def customize_muscle_group_order(split_template, categorized_muscles):
     
     return customized_split
 
-def generate_exercises_for_day(day_plan, categorized_muscles, day_number=None):
+def generate_exercises_for_day(day_plan, categorized_muscles, day_number=None, rng=None, experience=None):
     """
     Generate specific exercises for each muscle group in a day's workout.
     Adjust volume (sets, reps) based on the muscle's development level.
     Enforce a hard limit of 8 exercises per day.
+    
+    Exercises are drawn with ``rng`` (a seeded random.Random for
+    reproducible plans), or the global random module if it is None, from
+    the catalog exercises within the ``experience`` level.
     """
+    rng = rng or random
+    catalog = get_exercise_catalog()
     if day_plan["focus"] == "Rest":
         return {
             "focus": "Rest Day",
@@ -337,39 +326,42 @@ def generate_exercises_for_day(day_plan, categorized_muscles, day_number=None):
         
         # Select exercises for this muscle group
         muscle_exercises = []
-        if lookup_muscle in EXERCISE_MAPPING:
+        if lookup_muscle in MUSCLE_GROUPS:
             # Get all exercises for this muscle
-            available_exercises = EXERCISE_MAPPING[lookup_muscle]
+            primary = MUSCLE_GROUPS[lookup_muscle]
+            available_exercises = [ex.name for ex in catalog.select(experience=experience, primary=primary)]
             
             # For Sunday leg day, use different exercise selection pattern
             if is_sunday_leg_day:
                 # Specific emphasis for Sunday leg day based on muscle
                 if lookup_muscle == "Quads":
-                    # For Sunday, prioritize compound movements for quads
-                    compound_exercises = ["Squat", "Leg Press", "Hack Squat"]
-                    compound_available = [ex for ex in available_exercises if ex in compound_exercises]
+                    # For Sunday, prioritize loaded squat patterns for quads
+                    compound_available = [ex.name for ex in catalog.select(
+                        experience=experience, primary=primary, pattern="squat", equipment=("barbell", "machine"))]
                     if compound_available:
-                        muscle_exercises = [random.choice(compound_available)]
+                        muscle_exercises = [rng.choice(compound_available)]
                         # Add isolation if needed
                         if exercise_count > 1 and len(available_exercises) > len(compound_available):
                             isolation = [ex for ex in available_exercises if ex not in compound_available]
-                            muscle_exercises.extend(random.sample(isolation, min(exercise_count-1, len(isolation))))
+                            muscle_exercises.extend(rng.sample(isolation, min(exercise_count-1, len(isolation))))
                 elif lookup_muscle == "Hamstrings":
-                    # For Sunday, prioritize Romanian Deadlift for hamstrings if available
-                    if "Romanian Deadlift" in available_exercises:
-                        muscle_exercises = ["Romanian Deadlift"]
-                        remaining = [ex for ex in available_exercises if ex != "Romanian Deadlift"]
+                    # For Sunday, prioritize a barbell hinge for hamstrings if available
+                    hinges = [ex.name for ex in catalog.select(
+                        experience=experience, primary=primary, pattern="hinge", equipment="barbell")]
+                    if hinges:
+                        muscle_exercises = [rng.choice(hinges)]
+                        remaining = [ex for ex in available_exercises if ex != muscle_exercises[0]]
                         if exercise_count > 1 and remaining:
-                            muscle_exercises.extend(random.sample(remaining, min(exercise_count-1, len(remaining))))
+                            muscle_exercises.extend(rng.sample(remaining, min(exercise_count-1, len(remaining))))
                     else:
-                        muscle_exercises = random.sample(available_exercises, min(exercise_count, len(available_exercises)))
+                        muscle_exercises = rng.sample(available_exercises, min(exercise_count, len(available_exercises)))
                 else:
                     # For other leg muscles on Sunday, use standard random selection
-                    muscle_exercises = random.sample(available_exercises, min(exercise_count, len(available_exercises)))
+                    muscle_exercises = rng.sample(available_exercises, min(exercise_count, len(available_exercises)))
             else:
                 # Standard exercise selection for non-Sunday workouts
                 if len(available_exercises) >= exercise_count:
-                    muscle_exercises = random.sample(available_exercises, exercise_count)
+                    muscle_exercises = rng.sample(available_exercises, exercise_count)
                 else:
                     muscle_exercises = available_exercises
         
@@ -426,12 +418,13 @@ def generate_exercises_for_day(day_plan, categorized_muscles, day_number=None):
     # Create the complete day workout
     if is_sunday_leg_day:
         notes = "Sunday Leg Day focuses on compound strength movements like Squats and Romanian Deadlifts. "
-        weak_muscles = set([e["muscle"] for e in final_exercises if e["priority"] == "Needs Growth"])
+        # dict.fromkeys keeps first-seen order, so seeded plans match exactly
+        weak_muscles = dict.fromkeys(e["muscle"] for e in final_exercises if e["priority"] == "Needs Growth")
         if weak_muscles:
             notes += f"Prioritize these weak areas: {', '.join(weak_muscles)}."
     else:
         notes = f"Focus on {'the weakest ' if final_exercises else ''}muscle groups: " + \
-                ", ".join(set([e["muscle"] for e in final_exercises if e["priority"] == "Needs Growth"]))
+                ", ".join(dict.fromkeys(e["muscle"] for e in final_exercises if e["priority"] == "Needs Growth"))
     
     workout = {
         "focus": day_plan["focus"],
@@ -441,7 +434,7 @@ def generate_exercises_for_day(day_plan, categorized_muscles, day_number=None):
     
     return workout
 
-def generate_complete_workout_plan(bodybuilding_analysis, experience="intermediate", goal="muscle_gain"):
+def generate_complete_workout_plan(bodybuilding_analysis, experience="intermediate", goal="muscle_gain", seed=None):
     """
     Generate a complete 7-day workout plan based on bodybuilding analysis.
     
@@ -449,27 +442,51 @@ def generate_complete_workout_plan(bodybuilding_analysis, experience="intermedia
         bodybuilding_analysis: Analysis data containing muscle development info
         experience: User's training experience level (beginner, intermediate, advanced)
         goal: Training goal (muscle_gain, fat_loss, maintenance)
+        seed: Optional seed (see utils.plan_cache.plan_seed); seeded plans
+            are reproducible and cached across workers
         
     Returns:
         A dictionary with the complete workout plan.
     """
     # Analyze muscle development
     categorized_muscles = analyze_muscle_development(bodybuilding_analysis)
+    return generate_plan_for_muscles(categorized_muscles, experience, goal, seed)
+
+def generate_plan_for_muscles(categorized_muscles, experience="intermediate", goal="muscle_gain", seed=None):
+    """
+    Generate a complete 7-day workout plan from categorized muscle groups.
     
+    Args:
+        categorized_muscles: Output of analyze_muscle_development
+        experience: User's training experience level (beginner, intermediate, advanced)
+        goal: Training goal (muscle_gain, fat_loss, maintenance)
+        seed: Optional seed; seeded plans are reproducible and cached
+        
+    Returns:
+        A dictionary with the complete workout plan.
+    """
     # Determine appropriate training split
     split_template = determine_training_split(experience, categorized_muscles, goal)
     
-    # Create customized muscle group order
-    customized_split = customize_muscle_group_order(split_template, categorized_muscles)
-    
-    # Generate exercises for each day
-    workout_days = []
-    for day_index, day_plan in enumerate(customized_split):
-        day_number = day_index + 1  # 1-based day number (7 = Sunday)
-        day_workout = generate_exercises_for_day(day_plan, categorized_muscles, day_number)
-        day_workout["day"] = day_number
-        day_workout["weekday"] = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"][day_index]
-        workout_days.append(day_workout)
+    def build_schedule():
+        rng = random.Random(seed) if seed is not None else random
+        
+        # Create customized muscle group order
+        customized_split = customize_muscle_group_order(split_template, categorized_muscles)
+        
+        # Generate exercises for each day
+        workout_days = []
+        for day_index, day_plan in enumerate(customized_split):
+            day_number = day_index + 1  # 1-based day number (7 = Sunday)
+            day_workout = generate_exercises_for_day(day_plan, categorized_muscles, day_number, rng=rng,
+                                                    experience=experience)
+            day_workout["day"] = day_number
+            day_workout["weekday"] = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"][day_index]
+            workout_days.append(day_workout)
+        return {"workout_schedule": workout_days}
+    
+    schedule = cached_plan("generate_complete_workout_plan", seed, build_schedule,
+                           muscles=categorized_muscles, experience=experience, goal=goal)
     
     # Create date-based recommendations
     today = datetime.now()
@@ -484,12 +501,46 @@ def generate_complete_workout_plan(bodybuilding_analysis, experience="intermedia
         "start_date": start_date.strftime("%Y-%m-%d"),
         "experience_level": experience,
         "goal": goal,
+        "training_split": split_name(split_template),
         "muscle_focus": {
             "primary": categorized_muscles["Needs Growth"],
             "secondary": categorized_muscles["Average"],
             "maintenance": categorized_muscles["Well Developed"]
         },
-        "workout_schedule": workout_days
+        "workout_schedule": schedule["workout_schedule"]
     }
     
-    return workout_plan
\ No newline at end of file
+    return workout_plan
+
+def schedule_by_weekday(workout_plan):
+    """
+    Reshape a generated plan into the per-day format of the workout API.
+    
+    Args:
+        workout_plan: Plan from generate_complete_workout_plan
+        
+    Returns:
+        Dictionary mapping weekday name to {'type', 'focus', 'notes',
+        'exercises'}, exercises carrying name, focus, sets, reps, rest and
+        their development priority
+    """
+    days = {}
+    for day in workout_plan["workout_schedule"]:
+        # "Legs (Strength Focus)" is still a Legs day; "Rest Day" is Rest
+        day_type = day["focus"].split(" ")[0] if day["exercises"] else "Rest"
+        exercises = [{
+            "name": exercise["name"],
+            "focus": exercise["muscle"],
+            "sets": str(exercise["sets"]),
+            "reps": exercise["reps"],
+            "rest": exercise["rest"],
+            "development_status": exercise["priority"],
+            "isPriority": exercise["priority"] == "Needs Growth"
+        } for exercise in day["exercises"]]
+        days[day["weekday"]] = {
+            "type": day_type,
+            "focus": day["focus"],
+            "notes": day["notes"],
+            "exercises": exercises or [dict(activity) for activity in REST_DAY_ACTIVITIES]
+        }
+    return days
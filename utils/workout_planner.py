@@ -1,119 +1,29 @@
 import logging
+import random
 from typing import Dict, List, Any, Optional
 import math
 
+from utils.exercise_catalog import get_exercise_catalog
+from utils.plan_cache import cached_plan
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Catalog muscles prioritized on each training day when an assessed area needs growth
+PRIORITY_MUSCLES = {
+    'push': {'chest': ('chest',), 'shoulder_width': ('shoulders', 'rear_delts')},
+    'pull': {'back': ('back', 'traps'), 'arm': ('biceps',)},
+    'legs': {'legs': ('quads', 'hamstrings', 'glutes'), 'calves': ('calves',)},
+}
+
 class WorkoutPlanner:
     """
     A class to handle workout plan generation based on user metrics and goals.
     """
     
     def __init__(self):
-        self.base_exercises = {
-            'chest': [
-                {'name': 'Bench Press', 'target': 'overall chest development', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Incline Dumbbell Press', 'target': 'upper chest', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Cable Flyes', 'target': 'chest stretching and isolation', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Decline Press', 'target': 'lower chest development', 'sets': 3, 'reps': '10-12', 'difficulty': 'intermediate'},
-                {'name': 'Push-Ups', 'target': 'chest, shoulders, and triceps', 'sets': 3, 'reps': '10-15', 'difficulty': 'beginner'},
-                {'name': 'Dumbbell Press', 'target': 'chest development', 'sets': 3, 'reps': '8-12', 'difficulty': 'beginner'}
-            ],
-            'back': [
-                {'name': 'Pull-ups/Lat Pulldowns', 'target': 'latissimus dorsi', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Bent-over Rows', 'target': 'middle back', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Seated Cable Rows', 'target': 'overall back development', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Face Pulls', 'target': 'rear deltoids and upper back', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Barbell Rows', 'target': 'upper and middle back', 'sets': 3, 'reps': '8-12', 'difficulty': 'intermediate'},
-                {'name': 'Dumbbell Rows', 'target': 'back width and thickness', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'}
-            ],
-            'shoulders': [
-                {'name': 'Overhead Press', 'target': 'overall shoulder development', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Lateral Raises', 'target': 'lateral deltoids', 'sets': 3, 'reps': '10-15', 'difficulty': 'beginner'},
-                {'name': 'Front Raises', 'target': 'anterior deltoids', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Reverse Flyes', 'target': 'posterior deltoids', 'sets': 3, 'reps': '10-15', 'difficulty': 'beginner'},
-                {'name': 'Arnold Press', 'target': 'all deltoid heads', 'sets': 3, 'reps': '8-12', 'difficulty': 'intermediate'},
-                {'name': 'Upright Rows', 'target': 'upper traps and deltoids', 'sets': 3, 'reps': '10-12', 'difficulty': 'intermediate'}
-            ],
-            'arms': [
-                {'name': 'Barbell Curls', 'target': 'biceps', 'sets': 3, 'reps': '8-12', 'difficulty': 'beginner'},
-                {'name': 'Tricep Dips', 'target': 'triceps', 'sets': 3, 'reps': '8-12', 'difficulty': 'beginner'},
-                {'name': 'Hammer Curls', 'target': 'brachialis and forearms', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Tricep Pushdowns', 'target': 'triceps', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Preacher Curls', 'target': 'biceps peak', 'sets': 3, 'reps': '10-12', 'difficulty': 'intermediate'},
-                {'name': 'Skull Crushers', 'target': 'triceps long head', 'sets': 3, 'reps': '10-12', 'difficulty': 'intermediate'}
-            ],
-            'legs': [
-                {'name': 'Squats', 'target': 'quadriceps and overall leg development', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Romanian Deadlifts', 'target': 'hamstrings and glutes', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Leg Press', 'target': 'quadriceps', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Bulgarian Split Squats', 'target': 'single-leg strength and balance', 'sets': 3, 'reps': '10-12 per leg', 'difficulty': 'intermediate'},
-                {'name': 'Calf Raises', 'target': 'calf muscles', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Lunges', 'target': 'quads, glutes, and balance', 'sets': 3, 'reps': '10-12 per leg', 'difficulty': 'beginner'}
-            ],
-            'core': [
-                {'name': 'Russian Twists', 'target': 'obliques', 'sets': 3, 'reps': '10-15 per side', 'difficulty': 'beginner'},
-                {'name': 'Hanging Leg Raises', 'target': 'lower abs', 'sets': 3, 'reps': '10-15', 'difficulty': 'intermediate'},
-                {'name': 'Ab Wheel Rollouts', 'target': 'entire core', 'sets': 3, 'reps': '8-12', 'difficulty': 'intermediate'},
-                {'name': 'Cable Crunches', 'target': 'upper and middle abs', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Planks', 'target': 'core stability', 'sets': 3, 'reps': '30-60 seconds', 'difficulty': 'beginner'},
-                {'name': 'Bicycle Crunches', 'target': 'obliques and abs', 'sets': 3, 'reps': '15-20', 'difficulty': 'beginner'}
-            ],
-            'cardio': [
-                {'name': 'HIIT (High-Intensity Interval Training)', 'target': 'fat burning and cardiovascular health', 'sets': 1, 'reps': '20-30 min', 'difficulty': 'intermediate'},
-                {'name': 'Steady-State Cardio', 'target': 'endurance and fat burning', 'sets': 1, 'reps': '30-45 min', 'difficulty': 'beginner'},
-                {'name': 'Jump Rope', 'target': 'coordination and cardiovascular health', 'sets': 1, 'reps': '10-15 min', 'difficulty': 'beginner'},
-                {'name': 'Treadmill Intervals', 'target': 'fat burning and cardiovascular health', 'sets': 1, 'reps': '20-30 min', 'difficulty': 'intermediate'},
-                {'name': 'Cycling', 'target': 'lower body and cardiovascular health', 'sets': 1, 'reps': '30-45 min', 'difficulty': 'beginner'},
-                {'name': 'Rowing', 'target': 'full body and cardiovascular health', 'sets': 1, 'reps': '20-30 min', 'difficulty': 'intermediate'}
-            ]
-        }
-        
-        self.specialized_exercises = {
-            'shoulder_width': [
-                {'name': 'Wide-Grip Upright Rows', 'target': 'lateral deltoids', 'sets': 3, 'reps': '10-12', 'difficulty': 'intermediate'},
-                {'name': 'Lateral Raises with Hold', 'target': 'side delts', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Cable Lateral Raises', 'target': 'side delts', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Face Pulls with External Rotation', 'target': 'rear delts and upper back', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Dumbbell Front Raises', 'target': 'anterior deltoids', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'}
-            ],
-            'arm_development': [
-                {'name': 'Close-Grip Bench Press', 'target': 'triceps', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Incline Dumbbell Curls', 'target': 'biceps', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Rope Pushdowns', 'target': 'triceps', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Concentration Curls', 'target': 'biceps peak', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Overhead Tricep Extensions', 'target': 'triceps long head', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'}
-            ],
-            'chest_development': [
-                {'name': 'Cable Crossovers', 'target': 'inner chest', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Decline Push-Ups', 'target': 'lower chest', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Dumbbell Flyes', 'target': 'chest stretch', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Incline Bench Press', 'target': 'upper chest', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Pec Deck Machine', 'target': 'chest isolation', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'}
-            ],
-            'back_width': [
-                {'name': 'Wide-Grip Pull-Ups', 'target': 'lats width', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Straight-Arm Pulldowns', 'target': 'lats', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Wide-Grip Seated Rows', 'target': 'back width', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Lat Pulldowns', 'target': 'lats', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'},
-                {'name': 'Single-Arm Dumbbell Rows', 'target': 'back thickness', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'}
-            ],
-            'leg_development': [
-                {'name': 'Front Squats', 'target': 'quads', 'sets': 3, 'reps': '8-10', 'difficulty': 'intermediate'},
-                {'name': 'Bulgarian Split Squats', 'target': 'unilateral legs', 'sets': 3, 'reps': '10-12 per leg', 'difficulty': 'intermediate'},
-                {'name': 'Hack Squats', 'target': 'quads', 'sets': 3, 'reps': '10-12', 'difficulty': 'intermediate'},
-                {'name': 'Leg Extensions', 'target': 'quads isolation', 'sets': 3, 'reps': '12-15', 'difficulty': 'beginner'},
-                {'name': 'Leg Curls', 'target': 'hamstrings', 'sets': 3, 'reps': '10-12', 'difficulty': 'beginner'}
-            ],
-            'fat_loss': [
-                {'name': 'HIIT Circuit', 'target': 'fat burning and cardiovascular health', 'sets': 1, 'reps': '20-30 min', 'difficulty': 'intermediate'},
-                {'name': 'Tabata Training', 'target': 'metabolic conditioning', 'sets': 1, 'reps': '20 min', 'difficulty': 'advanced'},
-                {'name': 'Circuit Training', 'target': 'full body conditioning', 'sets': 1, 'reps': '30-45 min', 'difficulty': 'intermediate'},
-                {'name': 'Sprint Intervals', 'target': 'fat burning and power', 'sets': 1, 'reps': '15-20 min', 'difficulty': 'intermediate'},
-                {'name': 'Jump Rope Intervals', 'target': 'coordination and fat burning', 'sets': 1, 'reps': '15-20 min', 'difficulty': 'beginner'}
-            ]
-        }
+        self._rng = random
+        self.catalog = get_exercise_catalog()
         
         # Define baseline measurements for different body types and heights
         self.baseline_measurements = {
@@ -361,15 +271,12 @@ class WorkoutPlanner:
         specialized_exercises = {}
         
         for weak_point in weak_points:
-            if weak_point in self.specialized_exercises:
-                # Filter exercises based on experience
-                exercises = [ex for ex in self.specialized_exercises[weak_point] 
-                            if (experience == 'beginner' and ex['difficulty'] == 'beginner') or
-                               (experience == 'intermediate' and ex['difficulty'] in ['beginner', 'intermediate']) or
-                               (experience == 'advanced')]
-                
-                if exercises:
-                    specialized_exercises[weak_point] = exercises
+            # Specialization exercises for the weak point within the experience level
+            exercises = [dict(ex.prescription(), difficulty=ex.difficulty)
+                         for ex in self.catalog.select(experience=experience, emphasis=weak_point)]
+            
+            if exercises:
+                specialized_exercises[weak_point] = exercises
         
         return specialized_exercises
     
@@ -378,19 +285,18 @@ class WorkoutPlanner:
         exercises = []
         
         # Add main chest exercise
-        chest_exercises = self.base_exercises['chest']
+        chest_specialization = None
         chest_development_status = "Normal"
         chest_priority = "normal"
         
         if 'chest_development' in weak_points or 'chest' in weak_points:
             # Add more chest exercises if it's a weak point
-            chest_specific = self.specialized_exercises.get('chest_development', [])
-            chest_exercises = chest_specific + chest_exercises
+            chest_specialization = 'chest_development'
             chest_development_status = "Needs Growth"
             chest_priority = "high"
         
-        # Filter by experience level
-        chest_exercises = self._filter_by_experience(chest_exercises, experience)
+        # Candidates for the experience level
+        chest_exercises = self._candidates(experience, chest_specialization, primary='chest')
         
         # Add 2-3 chest exercises
         chest_selection = self._select_random_exercises(chest_exercises, 2)
@@ -401,19 +307,18 @@ class WorkoutPlanner:
         exercises.extend(chest_selection)
         
         # Add shoulder exercises
-        shoulder_exercises = self.base_exercises['shoulders']
+        shoulder_specialization = None
         shoulder_development_status = "Normal"
         shoulder_priority = "normal"
         
         if 'shoulder_width' in weak_points:
             # Add more shoulder exercises if it's a weak point
-            shoulder_specific = self.specialized_exercises.get('shoulder_width', [])
-            shoulder_exercises = shoulder_specific + shoulder_exercises
+            shoulder_specialization = 'shoulder_width'
             shoulder_development_status = "Needs Growth"
             shoulder_priority = "high"
         
-        # Filter by experience level
-        shoulder_exercises = self._filter_by_experience(shoulder_exercises, experience)
+        # Candidates for the experience level
+        shoulder_exercises = self._candidates(experience, shoulder_specialization, primary='shoulders')
         
         # Add 1-2 shoulder exercises
         shoulder_selection = self._select_random_exercises(shoulder_exercises, 2)
@@ -424,20 +329,18 @@ class WorkoutPlanner:
         exercises.extend(shoulder_selection)
         
         # Add triceps exercises
-        triceps_exercises = [ex for ex in self.base_exercises['arms'] if 'triceps' in ex['target'].lower()]
+        arm_specialization = None
         arm_development_status = "Normal"
         arm_priority = "normal"
         
         if 'arm_development' in weak_points or 'arm' in weak_points:
             # Add more triceps exercises if arms are a weak point
-            arm_specific = [ex for ex in self.specialized_exercises.get('arm_development', []) 
-                           if 'triceps' in ex['target'].lower()]
-            triceps_exercises = arm_specific + triceps_exercises
+            arm_specialization = 'arm_development'
             arm_development_status = "Needs Growth"
             arm_priority = "high"
         
-        # Filter by experience level
-        triceps_exercises = self._filter_by_experience(triceps_exercises, experience)
+        # Candidates for the experience level
+        triceps_exercises = self._candidates(experience, arm_specialization, primary='triceps')
         
         # Add 1-2 triceps exercises
         triceps_selection = self._select_random_exercises(triceps_exercises, 2)
@@ -449,12 +352,8 @@ class WorkoutPlanner:
         
         # Add cardio if high body fat
         if high_body_fat:
-            cardio_exercises = self.base_exercises['cardio']
-            cardio_specific = self.specialized_exercises.get('fat_loss', [])
-            cardio_exercises = cardio_specific + cardio_exercises
-            
-            # Filter by experience level
-            cardio_exercises = self._filter_by_experience(cardio_exercises, experience)
+            # Conditioning, including the fat loss specializations
+            cardio_exercises = self._candidates(experience, 'fat_loss', primary='conditioning')
             
             # Add 1 cardio exercise
             cardio_selection = self._select_random_exercises(cardio_exercises, 1)
@@ -486,19 +385,18 @@ class WorkoutPlanner:
         exercises = []
         
         # Add main back exercises
-        back_exercises = self.base_exercises['back']
+        back_specialization = None
         back_development_status = "Normal"
         back_priority = "normal"
         
         if 'back_width' in weak_points or 'back' in weak_points:
             # Add more back exercises if it's a weak point
-            back_specific = self.specialized_exercises.get('back_width', [])
-            back_exercises = back_specific + back_exercises
+            back_specialization = 'back_width'
             back_development_status = "Needs Growth"
             back_priority = "high"
         
-        # Filter by experience level
-        back_exercises = self._filter_by_experience(back_exercises, experience)
+        # Candidates for the experience level
+        back_exercises = self._candidates(experience, back_specialization, primary='back')
         
         # Add 2-3 back exercises
         back_selection = self._select_random_exercises(back_exercises, 3)
@@ -509,20 +407,18 @@ class WorkoutPlanner:
         exercises.extend(back_selection)
         
         # Add biceps exercises
-        biceps_exercises = [ex for ex in self.base_exercises['arms'] if 'biceps' in ex['target'].lower()]
+        arm_specialization = None
         arm_development_status = "Normal"
         arm_priority = "normal"
         
         if 'arm_development' in weak_points or 'arm' in weak_points:
             # Add more biceps exercises if arms are a weak point
-            arm_specific = [ex for ex in self.specialized_exercises.get('arm_development', []) 
-                           if 'biceps' in ex['target'].lower()]
-            biceps_exercises = arm_specific + biceps_exercises
+            arm_specialization = 'arm_development'
             arm_development_status = "Needs Growth"
             arm_priority = "high"
         
-        # Filter by experience level
-        biceps_exercises = self._filter_by_experience(biceps_exercises, experience)
+        # Candidates for the experience level
+        biceps_exercises = self._candidates(experience, arm_specialization, primary='biceps')
         
         # Add 2 biceps exercises
         biceps_selection = self._select_random_exercises(biceps_exercises, 2)
@@ -533,11 +429,8 @@ class WorkoutPlanner:
         exercises.extend(biceps_selection)
         
         # Add rear shoulder exercise
-        rear_delt_exercises = [ex for ex in self.base_exercises['shoulders'] 
-                              if 'posterior' in ex['target'].lower() or 'rear' in ex['target'].lower()]
-        
-        # Filter by experience level
-        rear_delt_exercises = self._filter_by_experience(rear_delt_exercises, experience)
+        rear_delt_specialization = 'shoulder_width' if 'shoulder_width' in weak_points else None
+        rear_delt_exercises = self._candidates(experience, rear_delt_specialization, primary='rear_delts')
         
         # Add 1 rear delt exercise if available
         if rear_delt_exercises:
@@ -555,12 +448,8 @@ class WorkoutPlanner:
         
         # Add cardio if high body fat
         if high_body_fat:
-            cardio_exercises = self.base_exercises['cardio']
-            cardio_specific = self.specialized_exercises.get('fat_loss', [])
-            cardio_exercises = cardio_specific + cardio_exercises
-            
-            # Filter by experience level
-            cardio_exercises = self._filter_by_experience(cardio_exercises, experience)
+            # Conditioning, including the fat loss specializations
+            cardio_exercises = self._candidates(experience, 'fat_loss', primary='conditioning')
             
             # Add 1 cardio exercise
             cardio_selection = self._select_random_exercises(cardio_exercises, 1)
@@ -592,24 +481,22 @@ class WorkoutPlanner:
         exercises = []
         
         # Add main leg exercises
-        leg_exercises = self.base_exercises['legs']
+        leg_specialization = None
         leg_development_status = "Normal"
         leg_priority = "normal"
         
         if 'leg_development' in weak_points or 'legs' in weak_points:
             # Add more leg exercises if it's a weak point
-            leg_specific = self.specialized_exercises.get('leg_development', [])
-            leg_exercises = leg_specific + leg_exercises
+            leg_specialization = 'leg_development'
             leg_development_status = "Needs Growth"
             leg_priority = "high"
         
-        # Filter by experience level
-        leg_exercises = self._filter_by_experience(leg_exercises, experience)
+        def leg_exercises(*muscles):
+            return self._candidates(experience, leg_specialization, primary=muscles)
         
         if posterior_chain_focus:
             # Focus on hamstrings, glutes, and calves
-            hamstring_exercises = [ex for ex in leg_exercises 
-                                 if 'hamstring' in ex['target'].lower() or 'glute' in ex['target'].lower()]
+            hamstring_exercises = leg_exercises('hamstrings', 'glutes')
             
             # Add 2-3 hamstring/glute exercises
             hamstring_selection = self._select_random_exercises(hamstring_exercises, 2)
@@ -621,7 +508,7 @@ class WorkoutPlanner:
             exercises.extend(hamstring_selection)
             
             # Add 1-2 quad exercises for balance
-            quad_exercises = [ex for ex in leg_exercises if 'quad' in ex['target'].lower()]
+            quad_exercises = leg_exercises('quads')
             quad_selection = self._select_random_exercises(quad_exercises, 1)
             for ex in quad_selection:
                 ex['development_status'] = leg_development_status
@@ -630,7 +517,7 @@ class WorkoutPlanner:
             exercises.extend(quad_selection)
         else:
             # Standard leg day with emphasis on quads
-            quad_exercises = [ex for ex in leg_exercises if 'quad' in ex['target'].lower()]
+            quad_exercises = leg_exercises('quads')
             
             # Add 2-3 quad exercises
             quad_selection = self._select_random_exercises(quad_exercises, 2)
@@ -641,8 +528,7 @@ class WorkoutPlanner:
             exercises.extend(quad_selection)
             
             # Add 1-2 hamstring/glute exercises
-            hamstring_exercises = [ex for ex in leg_exercises 
-                                 if 'hamstring' in ex['target'].lower() or 'glute' in ex['target'].lower()]
+            hamstring_exercises = leg_exercises('hamstrings', 'glutes')
             hamstring_selection = self._select_random_exercises(hamstring_exercises, 2)
             for ex in hamstring_selection:
                 ex['development_status'] = leg_development_status
@@ -651,7 +537,7 @@ class WorkoutPlanner:
             exercises.extend(hamstring_selection)
         
         # Add calf exercises
-        calf_exercises = [ex for ex in leg_exercises if 'calf' in ex['target'].lower()]
+        calf_exercises = leg_exercises('calves')
         if calf_exercises:
             calf_selection = self._select_random_exercises(calf_exercises, 1)
             for ex in calf_selection:
@@ -661,8 +547,7 @@ class WorkoutPlanner:
             exercises.extend(calf_selection)
         
         # Add core exercises
-        core_exercises = self.base_exercises['core']
-        core_exercises = self._filter_by_experience(core_exercises, experience)
+        core_exercises = self._candidates(experience, primary='core')
         core_selection = self._select_random_exercises(core_exercises, 2)
         # Core is its own category, not tied to leg development
         for ex in core_selection:
@@ -673,12 +558,8 @@ class WorkoutPlanner:
         
         # Add cardio if high body fat
         if high_body_fat:
-            cardio_exercises = self.base_exercises['cardio']
-            cardio_specific = self.specialized_exercises.get('fat_loss', [])
-            cardio_exercises = cardio_specific + cardio_exercises
-            
-            # Filter by experience level
-            cardio_exercises = self._filter_by_experience(cardio_exercises, experience)
+            # Conditioning, including the fat loss specializations
+            cardio_exercises = self._candidates(experience, 'fat_loss', primary='conditioning')
             
             # Add 1 cardio exercise
             cardio_selection = self._select_random_exercises(cardio_exercises, 1)
@@ -733,177 +614,162 @@ class WorkoutPlanner:
         
         return activities
     
-    def generate_workout_plan(self, user_data):
+    def generate_workout_plan(self, user_data, seed=None):
         """
         Generate a personalized weekly workout plan based on user data.
         
         Args:
             user_data (dict): User metrics including height, weight, body measurements, 
                               body fat percentage, and training experience.
+            seed (int): Optional seed (see utils.plan_cache.plan_seed); seeded
+                        plans are reproducible and cached across workers
         
         Returns:
             dict: Weekly workout plan with exercises for each day.
         """
+        # Analyze physique to identify weak points
+        analysis = self.analyze_physique(user_data)
         try:
-            # Analyze physique to identify weak points
-            analysis = self.analyze_physique(user_data)
-            weak_points = analysis['weak_points']
-            experience = analysis['experience_level']
-            high_body_fat = analysis['high_body_fat']
-            muscle_assessment = analysis.get('muscle_assessment', {})
-            
-            # Add visual indicators for muscle development status in the workout plan
-            muscle_status_indicators = {
-                "Needs Growth": "🔴", # Red indicator for muscles that need growth
-                "Normal": "🟡",      # Yellow indicator for normal muscles
-                "Developed": "🟢"    # Green indicator for well-developed muscles
-            }
-            
-            # Add development status to exercises
-            def add_status_to_exercises(exercises, muscle_group):
-                status = muscle_assessment.get(muscle_group, "Normal")
-                for ex in exercises:
-                    ex['development_status'] = status
-                    ex['status_indicator'] = muscle_status_indicators.get(status, "")
-                return exercises
-            
-            # Generate weekly workout plan based on Push/Pull/Legs split
-            workout_plan = {
-                'Monday': {
-                    'category': 'push',
-                    'focus': 'Chest, Shoulders, Triceps',
-                    'exercises': add_status_to_exercises(
-                        self.create_push_day(weak_points, experience, high_body_fat),
-                        'chest'  # Primary muscle group for push day
-                    )
-                },
-                'Tuesday': {
-                    'category': 'pull',
-                    'focus': 'Back, Biceps, Rear Delts',
-                    'exercises': add_status_to_exercises(
-                        self.create_pull_day(weak_points, experience, high_body_fat),
-                        'back'  # Primary muscle group for pull day
-                    )
-                },
-                'Wednesday': {
-                    'category': 'legs',
-                    'focus': 'Quadriceps, Hamstrings, Core',
-                    'exercises': add_status_to_exercises(
-                        self.create_leg_day(weak_points, experience, high_body_fat),
-                        'legs'  # Primary muscle group for leg day
-                    )
-                },
-                'Thursday': {
-                    'category': 'rest',
-                    'focus': 'Active Recovery',
-                    'exercises': self.create_rest_day_activities()
-                },
-                'Friday': {
-                    'category': 'push',
-                    'focus': 'Chest, Shoulders, Triceps',
-                    'exercises': add_status_to_exercises(
-                        self.create_push_day(weak_points, experience, high_body_fat),
-                        'chest'  # Primary muscle group for push day
-                    )
-                },
-                'Saturday': {
-                    'category': 'pull',
-                    'focus': 'Back, Biceps, Rear Delts',
-                    'exercises': add_status_to_exercises(
-                        self.create_pull_day(weak_points, experience, high_body_fat),
-                        'back'  # Primary muscle group for pull day
-                    )
-                },
-                'Sunday': {
-                    'category': 'legs',
-                    'focus': 'Posterior Chain Focus',
-                    'exercises': add_status_to_exercises(
-                        self.create_leg_day(weak_points, experience, high_body_fat, posterior_chain_focus=True),
-                        'legs'  # Primary muscle group for leg day
-                    )
-                }
-            }
-            
-            # Adjust exercise selection based on muscle assessment
-            for day, workout in workout_plan.items():
-                if day == 'Thursday':  # Skip rest day
-                    continue
-                    
-                exercises = workout['exercises']
-                category = workout['category']
-                
-                # Prioritize exercises for underdeveloped muscles
-                if category == 'push':
-                    if muscle_assessment.get('chest') == 'Needs Growth':
-                        # Add more chest exercises or prioritize them
-                        chest_exercises = [ex for ex in exercises if 'chest' in ex['focus'].lower()]
-                        for ex in chest_exercises:
-                            ex['priority'] = 'high'
-                    
-                    if muscle_assessment.get('shoulder_width') == 'Needs Growth':
-                        # Add more shoulder exercises or prioritize them
-                        shoulder_exercises = [ex for ex in exercises if 'shoulder' in ex['focus'].lower() or 'delt' in ex['focus'].lower()]
-                        for ex in shoulder_exercises:
-                            ex['priority'] = 'high'
-                
-                elif category == 'pull':
-                    if muscle_assessment.get('back') == 'Needs Growth':
-                        # Add more back exercises or prioritize them
-                        back_exercises = [ex for ex in exercises if 'back' in ex['focus'].lower() or 'lat' in ex['focus'].lower()]
-                        for ex in back_exercises:
-                            ex['priority'] = 'high'
-                    
-                    if muscle_assessment.get('arm') == 'Needs Growth':
-                        # Add more bicep exercises or prioritize them
-                        bicep_exercises = [ex for ex in exercises if 'bicep' in ex['focus'].lower()]
-                        for ex in bicep_exercises:
-                            ex['priority'] = 'high'
-                
-                elif category == 'legs':
-                    if muscle_assessment.get('legs') == 'Needs Growth':
-                        # Add more leg exercises or prioritize them
-                        leg_exercises = [ex for ex in exercises if 'quad' in ex['focus'].lower() or 'hamstring' in ex['focus'].lower() or 'glute' in ex['focus'].lower()]
-                        for ex in leg_exercises:
-                            ex['priority'] = 'high'
-                    
-                    if muscle_assessment.get('calves') == 'Needs Growth':
-                        # Add more calf exercises or prioritize them
-                        calf_exercises = [ex for ex in exercises if 'calf' in ex['focus'].lower()]
-                        for ex in calf_exercises:
-                            ex['priority'] = 'high'
-            
-            return {
-                'workout_plan': workout_plan,
-                'analysis': analysis,
-                'muscle_assessment': muscle_assessment,
-                'training_tips': self._generate_training_tips(experience, high_body_fat),
-                'equipment': self._recommend_equipment(experience),
-                'progression_methods': self._progression_methods(experience)
-            }
-            
+            return cached_plan(
+                'WorkoutPlanner.generate_workout_plan', seed,
+                lambda: self._build_workout_plan(analysis, user_data, seed),
+                weak_points=analysis['weak_points'], experience=analysis['experience_level'],
+                high_body_fat=analysis['high_body_fat'], muscles=analysis.get('muscle_assessment', {}))
         except Exception as e:
             logger.error(f"Error in generate_workout_plan: {str(e)}")
-            # Return a default plan if something goes wrong
+            # Return a default plan if something goes wrong; it is never cached
             return self._generate_default_workout_plan(user_data.get('experience', 'beginner'))
     
-    def _filter_by_experience(self, exercises, experience):
-        """Filter exercises based on user experience level."""
-        if experience == 'beginner':
-            return [ex for ex in exercises if ex['difficulty'] == 'beginner']
-        elif experience == 'intermediate':
-            return [ex for ex in exercises if ex['difficulty'] in ['beginner', 'intermediate']]
-        else:  # advanced
+    def _build_workout_plan(self, analysis, user_data, seed):
+        """Generate the weekly plan for an analyzed physique."""
+        self._rng = random.Random(seed) if seed is not None else random
+        weak_points = analysis['weak_points']
+        experience = analysis['experience_level']
+        high_body_fat = analysis['high_body_fat']
+        muscle_assessment = analysis.get('muscle_assessment', {})
+        
+        # Add visual indicators for muscle development status in the workout plan
+        muscle_status_indicators = {
+            "Needs Growth": "🔴", # Red indicator for muscles that need growth
+            "Normal": "🟡",      # Yellow indicator for normal muscles
+            "Developed": "🟢"    # Green indicator for well-developed muscles
+        }
+        
+        # Add development status to exercises
+        def add_status_to_exercises(exercises, muscle_group):
+            status = muscle_assessment.get(muscle_group, "Normal")
+            for ex in exercises:
+                ex['development_status'] = status
+                ex['status_indicator'] = muscle_status_indicators.get(status, "")
             return exercises
+        
+        # Generate weekly workout plan based on Push/Pull/Legs split
+        workout_plan = {
+            'Monday': {
+                'category': 'push',
+                'focus': 'Chest, Shoulders, Triceps',
+                'exercises': add_status_to_exercises(
+                    self.create_push_day(weak_points, experience, high_body_fat),
+                    'chest'  # Primary muscle group for push day
+                )
+            },
+            'Tuesday': {
+                'category': 'pull',
+                'focus': 'Back, Biceps, Rear Delts',
+                'exercises': add_status_to_exercises(
+                    self.create_pull_day(weak_points, experience, high_body_fat),
+                    'back'  # Primary muscle group for pull day
+                )
+            },
+            'Wednesday': {
+                'category': 'legs',
+                'focus': 'Quadriceps, Hamstrings, Core',
+                'exercises': add_status_to_exercises(
+                    self.create_leg_day(weak_points, experience, high_body_fat),
+                    'legs'  # Primary muscle group for leg day
+                )
+            },
+            'Thursday': {
+                'category': 'rest',
+                'focus': 'Active Recovery',
+                'exercises': self.create_rest_day_activities()
+            },
+            'Friday': {
+                'category': 'push',
+                'focus': 'Chest, Shoulders, Triceps',
+                'exercises': add_status_to_exercises(
+                    self.create_push_day(weak_points, experience, high_body_fat),
+                    'chest'  # Primary muscle group for push day
+                )
+            },
+            'Saturday': {
+                'category': 'pull',
+                'focus': 'Back, Biceps, Rear Delts',
+                'exercises': add_status_to_exercises(
+                    self.create_pull_day(weak_points, experience, high_body_fat),
+                    'back'  # Primary muscle group for pull day
+                )
+            },
+            'Sunday': {
+                'category': 'legs',
+                'focus': 'Posterior Chain Focus',
+                'exercises': add_status_to_exercises(
+                    self.create_leg_day(weak_points, experience, high_body_fat, posterior_chain_focus=True),
+                    'legs'  # Primary muscle group for leg day
+                )
+            }
+        }
+        
+        # Bitset of the exercises working each underdeveloped muscle group
+        priority_masks = {}
+        for category, areas in PRIORITY_MUSCLES.items():
+            mask = 0
+            for area, muscles in areas.items():
+                if muscle_assessment.get(area) == 'Needs Growth':
+                    mask |= self.catalog.mask(muscle=muscles)
+            priority_masks[category] = mask
+        
+        # Prioritize exercises for underdeveloped muscles
+        for day, workout in workout_plan.items():
+            mask = priority_masks.get(workout['category'])
+            if not mask:
+                continue
+            for ex in workout['exercises']:
+                if self.catalog.matches(ex['name'], mask):
+                    ex['priority'] = 'high'
+        
+        return {
+            'workout_plan': workout_plan,
+            'analysis': analysis,
+            'muscle_assessment': muscle_assessment,
+            'training_tips': self._generate_training_tips(experience, high_body_fat),
+            'equipment': self._recommend_equipment(experience),
+            'progression_methods': self._progression_methods(experience)
+        }
+        
+    
+    def _candidates(self, experience, specialization=None, **criteria):
+        """
+        Catalog exercises for a selection, within the experience level.
+        
+        Staple exercises always qualify; a weak point's specialization
+        exercises are added when ``specialization`` names it.
+        """
+        emphasis = ('general', specialization) if specialization else 'general'
+        return self.catalog.select(experience=experience, emphasis=emphasis, **criteria)
     
     def _select_random_exercises(self, exercises, count):
-        """Select a random subset of exercises, ensuring no duplicates."""
-        import random
+        """
+        Select a random subset of exercises, ensuring no duplicates.
         
+        Draws catalog records with the plan's seeded generator and returns
+        new dictionaries that the caller may annotate.
+        """
         if not exercises:
             return []
         
         count = min(count, len(exercises))
-        return random.sample(exercises, count)
+        return [ex.prescription() for ex in self._rng.sample(exercises, count)]
     
     def _generate_training_tips(self, experience, high_body_fat):
         """Generate training tips based on experience level and body composition."""